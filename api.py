@@ -2,6 +2,9 @@ from flask import Flask, jsonify, request, send_file, make_response
 from flask_cors import CORS
 import pandas as pd
 import asyncio
+import base64
+import hashlib
+import html
 import json
 import os
 import shutil
@@ -18,7 +21,28 @@ import traceback
 import tempfile
 import subprocess
 import aiohttp
+import io
+import itertools
 from flask_cors import cross_origin
+from call_store import CALL_ID_COLUMN, SNIPPET_END, SNIPPET_START, CallStore
+from calls_cache import CallsCache
+from calls_fragments import CallFragmentCache
+from calls_filters import DERIVED_TAGS, CallFilters
+from calls_tag_index import TagIndex
+from calls_keywords import KEYWORDS
+from calls_text import cache_stats as text_cache_stats
+from llm_structured import extract_structured_data
+from write_behind import WriteBehindWriter
+from upload_validation import UploadStats
+from store_backups import BackupManager
+from calls_compact import (
+    DURATION_SECONDS_COLUMN, ENDED_AT_COLUMN, ENDED_AT_SOURCE_COLUMN, HAS_TRANSCRIPT_COLUMN, TAG_LIST_COLUMN,
+    TAGS_COLUMN, compact_dataframe, format_duration, has_text, normalize_calls, parse_tag_list,
+)
+from calls_transcripts import TranscriptStore
+from http_cache import compress_response, conditional
+from calls_serializer import AGENT_NAME, CALL_FIELDS, DEFAULT_CALL_FIELDS, TRANSCRIPT_PREVIEW_CHARS, iter_serialized_calls, sort_calls
+from ndjson_stream import ndjson_response, wants_ndjson
 
 load_dotenv()
 
@@ -272,9 +296,15 @@ else:
 
 app = Flask(__name__)
 CORS(app)  # Разрешаем кросс-доменные запросы
+app.after_request(compress_response)  # gzip/brotli для больших JSON-ответов
 
 # Константы
-EXCEL_FILE = "DFASDF.xlsx"  # Реальный файл Excel
+EXCEL_FILE = "DFASDF.xlsx"  # Excel-файл для первичного импорта и экспорта
+STORE_FILE = "calls.db"  # SQLite-хранилище звонков (основной источник данных)
+SNAPSHOT_FILE = "calls.parquet"  # Колоночный снимок хранилища для быстрой холодной загрузки
+TRANSCRIPTS_FILE = "calls.transcripts"  # Тексты транскрипций вне DataFrame (calls.transcripts.<ID базы>.<поколение>.arrow)
+RESULTS_JOURNAL = "calls_pending.jsonl"  # Журнал результатов, еще не уплотненных в хранилище
+BACKUP_FOLDER = './backups'  # Резервные копии хранилища (построчные, с дедупликацией)
 BATCH_SIZE = 10  # Количество звонков для обработки за один раз
 UPLOAD_FOLDER = './uploads'
 ALLOWED_EXTENSIONS = {'xlsx', 'xls'}
@@ -287,46 +317,113 @@ if not os.path.exists(UPLOAD_FOLDER):
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-# Функция загрузки данных из Excel файла
-def load_calls_from_excel():
-    """Загружает данные звонков из Excel файла."""
+# Хранилище звонков: SQLite является основным источником данных, Excel - только импорт/экспорт
+store = CallStore(STORE_FILE, snapshot_path=SNAPSHOT_FILE)
+backups = BackupManager(store, BACKUP_FOLDER, keep_last=10, keep_daily=7)
+
+# Тяжелые текстовые колонки: в общий DataFrame не загружаются, тексты отдает transcripts()
+TRANSCRIPT_COLUMN = 'Транскрибация'
+TRANSCRIPT_COLUMNS = (TRANSCRIPT_COLUMN,)
+
+def bootstrap_store_from_excel():
+    """Импортирует EXCEL_FILE в пустое хранилище при первом запуске"""
     try:
-        print(f"Чтение файла Excel: {EXCEL_FILE}")
-        df = pd.read_excel(EXCEL_FILE)
-        
-        # Обработка дат/времени если они есть
-        if 'Дата/Время завершения звонка' in df.columns:
-            try:
-                df['Дата/Время завершения звонка'] = pd.to_datetime(df['Дата/Время завершения звонка'], errors='coerce')
-                df['date'] = df['Дата/Время завершения звонка'].dt.strftime('%d.%m.%Y')
-                df['time'] = df['Дата/Время завершения звонка'].dt.strftime('%H:%M')
-            except Exception as e:
-                print(f"Предупреждение: Ошибка обработки дат: {e}")
-                # Используем текущую дату/время как запасной вариант
-                now = datetime.now()
-                df['date'] = now.strftime('%d.%m.%Y')
-                df['time'] = now.strftime('%H:%M')
-        
-        print(f"Успешно загружено {len(df)} строк из Excel")
+        if store.count() == 0 and os.path.exists(EXCEL_FILE):
+            print(f"Хранилище {STORE_FILE} пустое, импортируем {EXCEL_FILE}...")
+            store.import_excel(EXCEL_FILE)
+    except Exception as e:
+        print(f"Ошибка при импорте {EXCEL_FILE} в хранилище: {e}")
+        traceback.print_exc()
+
+bootstrap_store_from_excel()
+
+# Результаты анализа и транскрибации пишутся в журнал, фоновый поток уплотняет его в хранилище
+result_writer = WriteBehindWriter(store, RESULTS_JOURNAL)
+result_writer.replay()
+result_writer.start()
+
+def prepare_calls_df(df, has_transcript=None):
+    """Нормализует строки хранилища (duration_sec, ended_at, source_kind, tag_list, has_transcript)
+    и добавляет колонки date/time"""
+    if has_transcript is None and TRANSCRIPT_COLUMN in df.columns:
+        has_transcript = df[TRANSCRIPT_COLUMN].map(has_text).to_numpy(dtype=bool)
+    # Разбор длительности, дат, ссылок и тегов делается один раз при загрузке
+    normalize_calls(df, has_transcript)
+    if ENDED_AT_SOURCE_COLUMN in df.columns:
+        try:
+            df['date'] = df[ENDED_AT_COLUMN].dt.strftime('%d.%m.%Y')
+            df['time'] = df[ENDED_AT_COLUMN].dt.strftime('%H:%M')
+            return df
+        except Exception as e:
+            print(f"Предупреждение: Ошибка обработки дат: {e}")
+    # Нет колонки с датой или ошибка - используем текущую дату/время как запасной вариант
+    now = datetime.now()
+    df['date'] = now.strftime('%d.%m.%Y')
+    df['time'] = now.strftime('%H:%M')
+    return df
+
+# Функция загрузки данных из хранилища
+def load_calls_from_store(exclude=()):
+    """Загружает данные звонков из хранилища (без колонок exclude) в компактном виде."""
+    try:
+        print(f"Чтение хранилища звонков: {STORE_FILE}")
+        df = store.load_dataframe(exclude=exclude)
+        # Тексты транскрипций не загружаются в DataFrame - наличие текста берем из файла текстов
+        has_transcript = None
+        if TRANSCRIPT_COLUMN not in df.columns:
+            has_transcript = transcripts().lengths(df.index) > 0
+        # Повторяющиеся значения (статусы, теги, типы звонков) хранятся как category
+        df = compact_dataframe(prepare_calls_df(df, has_transcript))
+        print(f"Успешно загружено {len(df)} строк из хранилища")
         return df
     except Exception as e:
-        print(f"Ошибка при загрузке Excel файла {EXCEL_FILE}: {e}")
+        print(f"Ошибка при загрузке хранилища {STORE_FILE}: {e}")
         traceback.print_exc()
         # Возвращаем пустой DataFrame в случае ошибки
         return pd.DataFrame()
 
-# Глобальная переменная для хранения данных (или загрузка при старте)
-# Убедимся, что calls_df загружается корректно при старте или при первом запросе
-calls_df = pd.DataFrame() # Инициализируем пустым DataFrame
+def load_transcripts(column):
+    """Открывает отображенный в память файл текстов колонки для текущего поколения хранилища"""
+    return TranscriptStore.load(TRANSCRIPTS_FILE, store, column)
+
+# Общий кэш DataFrame звонков: перечитывается только при изменении файлов хранилища,
+# собственные записи сервера подменяют его исправленной копией
+calls_cache = CallsCache(
+    store, loader=load_calls_from_store, prepare=prepare_calls_df,
+    text_loader=load_transcripts, text_columns=TRANSCRIPT_COLUMNS,
+    derived={TRANSCRIPT_COLUMN: (HAS_TRANSCRIPT_COLUMN, has_text), TAGS_COLUMN: (TAG_LIST_COLUMN, parse_tag_list)}
+)
+
+# Готовые JSON-фрагменты звонков для /api/calls по id и версии строки
+# (создается после calls_cache: версия строки растет уже после патча DataFrame)
+call_fragments = CallFragmentCache(store, epoch=lambda: calls_cache.loaded_at)
+
+# Индекс тегов: тег -> id строк, обновляется при записи тегов анализом
+tag_index = TagIndex(store, epoch=lambda: calls_cache.loaded_at)
+
+# Маски фильтров звонков (/api/calls, чат, произвольный анализ) по общему DataFrame
+call_filters = CallFilters(store, tag_index)
+
+def transcripts():
+    """Транскрипции звонков общего кэша: transcripts().get(idx) по id строки DataFrame"""
+    return calls_cache.texts(TRANSCRIPT_COLUMN)
 
-def load_or_get_calls_df():
-    """Загружает или возвращает глобальный DataFrame."""
-    global calls_df
-    if calls_df.empty:
-        print("Загрузка данных из Excel в глобальный DataFrame...")
-        calls_df = load_calls_from_excel()
-        print(f"Загружено {len(calls_df)} строк.")
-    return calls_df
+def with_transcripts(df):
+    """Копия небольшой выборки звонков с колонкой Транскрибация"""
+    df = df.copy()
+    df[TRANSCRIPT_COLUMN] = transcripts().series(df.index)
+    return df
+
+def call_id_of(idx, row):
+    """Стабильный ID звонка для API (старый числовой id строки, если ID еще не назначен)"""
+    call_id = row.get(CALL_ID_COLUMN)
+    if isinstance(call_id, str) and call_id:
+        return call_id
+    return str(idx)
+
+def load_or_get_calls_df(exclude=()):
+    """Возвращает актуальный DataFrame звонков из общего кэша (только для чтения)."""
+    return calls_cache.get(exclude=exclude)
 
 # Новый эндпоинт для загрузки файла Excel
 @app.route('/api/upload', methods=['POST'])
@@ -350,25 +447,29 @@ def upload_file():
             # Сохраняем загруженный файл
             file.save(upload_path)
             
-            # Делаем резервное копирование текущего файла
-            if os.path.exists(EXCEL_FILE):
-                backup_name = f"backup_{int(time.time())}_{EXCEL_FILE}"
-                shutil.copy2(EXCEL_FILE, backup_name)
-                print(f"Создана резервная копия: {backup_name}")
-            
-            # Копируем загруженный файл вместо основного
-            shutil.copy2(upload_path, EXCEL_FILE)
-            print(f"Файл сохранен как: {EXCEL_FILE}")
+            # Накопленные результаты анализа записываются в хранилище до резервной копии и замены данных,
+            # новые результаты ждут окончания импорта (журнал привязан к ID звонков, см. WriteBehindWriter).
+            # Если их не удалось записать, exclusive() бросает RuntimeError: копия и импорт не выполняются, ответ 500
+            with result_writer.exclusive():
+                # Делаем резервное копирование текущих данных хранилища
+                if store.count() > 0:
+                    backups.create(reason=f"upload {filename}")
+                
+                # Импортируем загруженный файл в хранилище вместо текущих данных,
+                # статистика для проверки считается в том же потоковом проходе по строкам
+                stats = UploadStats()
+                try:
+                    rows_count = store.import_excel(upload_path, on_row=stats)
+                except Exception as e:
+                    error_msg = f"Ошибка при чтении файла: {str(e)}"
+                    print(error_msg)
+                    return jsonify({"error": error_msg}), 500
             
-            # Пытаемся прочитать файл для проверки
             try:
-                df = pd.read_excel(EXCEL_FILE)
-                rows_count = len(df)
-                print(f"Файл успешно прочитан. Строк: {rows_count}")
+                print(f"Файл успешно импортирован в хранилище. Строк: {rows_count}")
                 
                 # Проверяем необходимые столбцы
-                required_columns = ['Ссылка на запись', 'Транскрибация']
-                missing_columns = [col for col in required_columns if col not in df.columns]
+                missing_columns = stats.missing_columns(store.columns())
                 
                 if missing_columns:
                     print(f"Отсутствуют столбцы: {missing_columns}")
@@ -379,37 +480,24 @@ def upload_file():
                     }), 200
                 
                 # Проверяем наличие и корректность данных
-                empty_links = int(df['Ссылка на запись'].isna().sum())
-                invalid_links = int(len(df[~df['Ссылка на запись'].isna() & ~df['Ссылка на запись'].astype(str).str.startswith('http')]))
-                
-                # Проверяем количество звонков для транскрибации
-                # Здесь мы учитываем различные варианты пустых или специальных значений
-                # Звонок требует транскрибации, если:
-                # 1. Значение равно '-' (стандартное для предыдущих файлов)
-                # 2. Значение отсутствует (NaN/None)
-                # 3. Значение - пустая строка
-                # 4. Значение содержит только пробелы
+                empty_links = stats.empty_links
+                invalid_links = stats.invalid_links
                 
-                # Проверяем разные условия для транскрибации
-                needs_transcribe_dash = int((df['Транскрибация'] == '-').sum())
-                needs_transcribe_empty = int(df['Транскрибация'].isna().sum())
-                needs_transcribe_blank = int((df['Транскрибация'] == '').sum())
-                needs_transcribe_spaces = int((df['Транскрибация'].astype(str).str.strip() == '').sum())
-                
-                total_needs_transcribe = int(needs_transcribe_dash + needs_transcribe_empty + needs_transcribe_blank + needs_transcribe_spaces)
+                # Количество звонков для транскрибации ('-', пусто или только пробелы)
+                total_needs_transcribe = stats.needs_transcribe
                 
                 # Проверяем, есть ли уже транскрипции
-                has_transcriptions = int(rows_count - total_needs_transcribe)
+                has_transcriptions = stats.has_transcriptions
                 
                 # Если все уже транскрибировано, но есть ссылки, предлагаем перетранскрибировать
-                if total_needs_transcribe == 0 and int(df['Ссылка на запись'].notna().sum()) > 0:
+                if total_needs_transcribe == 0 and stats.present_links > 0:
                     print("Все звонки уже имеют транскрипции, но можно перетранскрибировать")
                     needs_analysis = int(rows_count)  # Все звонки требуют анализа
                 else:
                     needs_analysis = int(total_needs_transcribe)
                 
                 response_data = {
-                    "message": f"Файл успешно загружен как {EXCEL_FILE}",
+                    "message": f"Файл успешно загружен в хранилище {STORE_FILE}",
                     "rows": int(rows_count),
                     "transcribe_count": int(total_needs_transcribe),
                     "filename": EXCEL_FILE,
@@ -425,7 +513,7 @@ def upload_file():
                 if invalid_links > 0:
                     warnings.append(f"Обнаружено {invalid_links} строк с некорректными ссылками (не начинаются с http)")
                 
-                if total_needs_transcribe == 0 and int(df['Ссылка на запись'].notna().sum()) > 0:
+                if total_needs_transcribe == 0 and stats.present_links > 0:
                     warnings.append("Все звонки уже имеют транскрипции. Можно выполнить анализ или перетранскрибировать.")
                 
                 if warnings:
@@ -446,6 +534,59 @@ def upload_file():
         print(error_msg)
         return jsonify({"error": error_msg}), 500
 
+# Эндпоинт для выгрузки звонков из хранилища в Excel
+@app.route('/api/export', methods=['GET'])
+def export_file():
+    """Выгрузить все звонки из хранилища в файл Excel"""
+    try:
+        buffer = io.BytesIO()
+        rows_count = store.export_excel(buffer)
+        buffer.seek(0)
+        print(f"Выгружено {rows_count} звонков в Excel")
+        return send_file(
+            buffer,
+            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+            as_attachment=True,
+            download_name=EXCEL_FILE
+        )
+    except Exception as e:
+        error_msg = f"Ошибка при выгрузке файла: {str(e)}"
+        print(error_msg)
+        return jsonify({"error": error_msg}), 500
+
+@app.route('/api/backups', methods=['GET'])
+def list_backups():
+    """Список резервных копий хранилища (от новых к старым)"""
+    return jsonify(backups.list_backups())
+
+@app.route('/api/backups/<backup_id>/restore', methods=['POST'])
+def restore_backup(backup_id):
+    """Восстановить хранилище из резервной копии"""
+    try:
+        # Журнал уплотняется до восстановления, новые результаты ждут его окончания;
+        # ошибка записи накопленного отменяет восстановление (RuntimeError, ответ 500)
+        with result_writer.exclusive():
+            rows_count = backups.restore(backup_id)
+        print(f"Хранилище восстановлено из копии {backup_id}: {rows_count} строк")
+        return jsonify({"message": f"Хранилище восстановлено из копии {backup_id}", "rows": rows_count})
+    except KeyError:
+        return jsonify({"error": f"Резервная копия {backup_id} не найдена"}), 404
+    except Exception as e:
+        error_msg = f"Ошибка при восстановлении из копии: {str(e)}"
+        print(error_msg)
+        return jsonify({"error": error_msg}), 500
+
+@app.route('/api/cache-stats', methods=['GET'])
+def cache_stats():
+    """Статистика общего кэша звонков, кэша JSON-фрагментов /api/calls, масок фильтров, индекса тегов, разобранных текстов и ключевых слов"""
+    stats = calls_cache.stats()
+    stats['fragments'] = call_fragments.stats()
+    stats['filters'] = call_filters.stats()
+    stats['tags'] = tag_index.stats()
+    stats['text'] = text_cache_stats()
+    stats['keywords'] = KEYWORDS.stats()
+    return jsonify(stats)
+
 def analyze_transcript(transcript, key_questions=None):
     """
     Анализирует транскрипцию звонка с помощью LLM и возвращает детальные результаты анализа
@@ -771,16 +912,19 @@ def analyze_transcript(transcript, key_questions=None):
         # Мы добавили много новых полей для более глубокого анализа
         
         # Заглушка для анализа (с расширенными полями)
+        # Все ключевые слова ищутся одним проходом по транскрипции (вектор совпадений кэшируется)
+        hits = KEYWORDS.hits(transcript)
+        
         # Определяем тип звонка на основе контента транскрипции
-        call_type = "входящий" if "могу помочь" in transcript.lower() else "исходящий"
+        call_type = "входящий" if KEYWORDS.found(hits, 'incoming') else "исходящий"
         
         # Определяем примерный результат на основе контента
-        if "спасибо" in transcript.lower() or "договорились" in transcript.lower():
+        if KEYWORDS.found(hits, 'agreement'):
             result = "успешный"
             score = 8
             conversion_probability = 80
             sales_readiness = 8
-        elif "перезвоните" in transcript.lower() or "подумаю" in transcript.lower():
+        elif KEYWORDS.found(hits, 'postpone'):
             result = "требует follow-up"
             score = 5
             conversion_probability = 40
@@ -801,13 +945,13 @@ def analyze_transcript(transcript, key_questions=None):
         
         # Определяем теги
         tags = []
-        if "цена" in transcript.lower() or "стоимость" in transcript.lower():
+        if KEYWORDS.found(hits, 'price_mention'):
             tags.append("ценовое возражение")
-        if "конкурент" in transcript.lower():
+        if KEYWORDS.found(hits, 'competitor'):
             tags.append("упоминание конкурентов")
-        if "акция" in transcript.lower() or "скидка" in transcript.lower():
+        if KEYWORDS.found(hits, 'promo'):
             tags.append("обсуждение скидок")
-        if "доставка" in transcript.lower():
+        if KEYWORDS.found(hits, 'delivery'):
             tags.append("вопрос о доставке")
         if len(tags) < 3:
             tags.append("общее обсуждение")
@@ -823,41 +967,41 @@ def analyze_transcript(transcript, key_questions=None):
         
         # Анализируем возражения клиента
         objections = []
-        if "дорого" in transcript.lower():
+        if KEYWORDS.found(hits, 'expensive'):
             objections.append("Высокая цена")
-        if "подумаю" in transcript.lower():
+        if KEYWORDS.found(hits, 'thinking'):
             objections.append("Требуется время на размышление")
-        if "нет времени" in transcript.lower():
+        if KEYWORDS.found(hits, 'no_time'):
             objections.append("Нет времени на разговор")
         
         # Определяем причины отказа
         rejection_reasons = []
         if result == "неуспешный":
-            if "дорого" in transcript.lower():
+            if KEYWORDS.found(hits, 'expensive'):
                 rejection_reasons.append("Цена не соответствует ожиданиям")
-            if "не интересно" in transcript.lower():
+            if KEYWORDS.found(hits, 'not_interested'):
                 rejection_reasons.append("Отсутствие интереса к предложению")
-            if "не подходит" in transcript.lower():
+            if KEYWORDS.found(hits, 'not_suitable'):
                 rejection_reasons.append("Предложение не подходит под нужды клиента")
             if len(rejection_reasons) == 0:
                 rejection_reasons.append("Причина отказа не выявлена")
         
         # Находим проблемные места в разговоре
         pain_points = []
-        if "не понятно" in transcript.lower():
+        if KEYWORDS.found(hits, 'unclear'):
             pain_points.append("Неясное объяснение условий")
-        if "долго" in transcript.lower():
+        if KEYWORDS.found(hits, 'slow'):
             pain_points.append("Затянутый разговор")
-        if "повторите" in transcript.lower():
+        if KEYWORDS.found(hits, 'repeat'):
             pain_points.append("Плохое качество связи или неясная речь")
         
         # Определяем запросы клиента
         customer_requests = []
-        if "скидка" in transcript.lower():
+        if KEYWORDS.found(hits, 'discount'):
             customer_requests.append("Запрос скидки")
-        if "доставка" in transcript.lower():
+        if KEYWORDS.found(hits, 'delivery'):
             customer_requests.append("Интерес к условиям доставки")
-        if "гарантия" in transcript.lower():
+        if KEYWORDS.found(hits, 'warranty'):
             customer_requests.append("Вопрос о гарантии")
         
         # Оценка работы менеджера
@@ -868,8 +1012,8 @@ def analyze_transcript(transcript, key_questions=None):
         
         # Оценка потенциала клиента
         customer_potential = {
-            "score": 8 if "интересно" in transcript.lower() else 5,
-            "details": "Высокий интерес к продукту" if "интересно" in transcript.lower() else "Средний потенциал"
+            "score": 8 if KEYWORDS.found(hits, 'interested') else 5,
+            "details": "Высокий интерес к продукту" if KEYWORDS.found(hits, 'interested') else "Средний потенциал"
         }
         
         # Рекомендуемые следующие шаги
@@ -882,13 +1026,13 @@ def analyze_transcript(transcript, key_questions=None):
         
         # Определяем интересы клиента
         client_interests = []
-        if "цена" in transcript.lower() or "стоимость" in transcript.lower():
+        if KEYWORDS.found(hits, 'price_mention'):
             client_interests.append("Интерес к ценовым условиям")
-        if "продукт" in transcript.lower() or "товар" in transcript.lower():
+        if KEYWORDS.found(hits, 'interest_product'):
             client_interests.append("Интерес к товару/продукту")
-        if "доставка" in transcript.lower() or "условия" in transcript.lower():
+        if KEYWORDS.found(hits, 'delivery_terms'):
             client_interests.append("Интерес к условиям обслуживания")
-        if "вопрос" in transcript.lower() or "спросить" in transcript.lower():
+        if KEYWORDS.found(hits, 'asking'):
             client_interests.append("Консультационные вопросы")
             
         # Определяем факторы принятия решения
@@ -898,19 +1042,19 @@ def analyze_transcript(transcript, key_questions=None):
         }
         
         # Положительные факторы
-        if "качество" in transcript.lower() and "хорошее" in transcript.lower():
+        if KEYWORDS.found(hits, 'interest_quality') and KEYWORDS.found(hits, 'good'):
             decision_factors["positive"].append("Высокое качество продукта")
-        if "цена" in transcript.lower() and ("устраивает" in transcript.lower() or "согласен" in transcript.lower()):
+        if KEYWORDS.found(hits, 'price') and KEYWORDS.found(hits, 'price_ok'):
             decision_factors["positive"].append("Приемлемая цена")
-        if "сроки" in transcript.lower() and "устраивают" in transcript.lower():
+        if KEYWORDS.found(hits, 'interest_terms') and KEYWORDS.found(hits, 'deadlines_ok'):
             decision_factors["positive"].append("Подходящие сроки доставки")
             
         # Отрицательные факторы
-        if "дорого" in transcript.lower():
+        if KEYWORDS.found(hits, 'expensive'):
             decision_factors["negative"].append("Высокая цена")
-        if "долго" in transcript.lower() and "ждать" in transcript.lower():
+        if KEYWORDS.found(hits, 'slow') and KEYWORDS.found(hits, 'wait'):
             decision_factors["negative"].append("Длительные сроки доставки")
-        if "сомневаюсь" in transcript.lower() or "не уверен" in transcript.lower():
+        if KEYWORDS.found(hits, 'doubt'):
             decision_factors["negative"].append("Сомнения в необходимости приобретения")
         
         result = {
@@ -979,141 +1123,349 @@ def analyze_transcript(transcript, key_questions=None):
         }
 
 @app.route('/api/calls', methods=['GET'])
+@conditional(lambda: store.generation())
 def get_calls():
-    """Получить список всех звонков из Excel файла"""
+    """Получить список звонков из хранилища.
+
+    Без параметров возвращает все звонки целиком. Параметры запроса:
+    limit/offset (или cursor из nextCursor предыдущего ответа) - страница,
+    sort - поля сортировки через запятую ('-date,score', '-' - по убыванию),
+    fields - нужные поля через запятую; по умолчанию все, кроме полного
+    текста transcription (он отдается /api/calls/<id>/transcript), вместо
+    него - transcriptLength и начало текста transcriptPreview,
+    search/status/purpose - фильтры таблицы звонков, ids - звонки по ID
+    через запятую, result/operator/date/dateFrom/dateTo/duration/tags -
+    фильтры аналитики и чата (см. calls_filters). Сериализуются только строки страницы, total - число
+    звонков после фильтров. format=ndjson - потоковый ответ, звонок на строку.
+    """
     source = request.args.get('source', 'all')  # all, cloud, local
     
     try:
-        # Чтение файла Excel
-        df = pd.read_excel(EXCEL_FILE)
-        
-        # Фильтрация по источнику
-        if source == 'cloud':
-            # Только облачные записи (Yandex Cloud)
-            df = df[df['Ссылка на запись'].str.contains('storage.yandexcloud.net', na=False)]
-        elif source == 'local':
-            # Только локальные записи
-            df = df[df['Ссылка на запись'].str.startswith('/api/recordings/', na=False)]
-        # elif source == 'all' - показываем все без фильтрации
-        
-        # Проверяем и конвертируем даты в строковый формат для JSON
+        offset, limit = _calls_page_params(request.args)
+        fields = _calls_fields_param(request.args.get('fields'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    try:
+        # Чтение звонков из общего кэша (колонки date/time уже подготовлены);
+        # метка кэша фрагментов берется до DataFrame, см. CallFragmentCache.snapshot
+        fragments_snapshot = call_fragments.snapshot()
+        df = load_or_get_calls_df()
+        texts = transcripts()
+        
+        # Фильтры таблицы звонков - маски по кэшированной таблице, до сериализации
         try:
-            if 'Дата/Время завершения звонка' in df.columns:
-                # Преобразуем столбец в datetime, если он не является таковым
-                if not pd.api.types.is_datetime64_any_dtype(df['Дата/Время завершения звонка']):
-                    df['Дата/Время завершения звонка'] = pd.to_datetime(df['Дата/Время завершения звонка'], errors='coerce')
-                
-                # Теперь безопасно используем .dt аксессор
-                df['date'] = df['Дата/Время завершения звонка'].dt.strftime('%d.%m.%Y')
-                df['time'] = df['Дата/Время завершения звонка'].dt.strftime('%H:%M')
-            else:
-                # Если нет колонки с датой, используем текущую дату
-                now = datetime.now()
-                df['date'] = now.strftime('%d.%m.%Y')
-                df['time'] = now.strftime('%H:%M')
-        except Exception as e:
-            print(f"Ошибка при обработке даты: {str(e)}")
-            # Простое решение: используем текущую дату вместо ошибочных
-            now = datetime.now()
-            df['date'] = now.strftime('%d.%m.%Y')
-            df['time'] = now.strftime('%H:%M')
-        
-        # Создаем список звонков в формате, ожидаемом фронтендом
-        calls = []
-        for idx, row in df.iterrows():
-            # Берем номер как имя клиента (в реальном приложении можно будет заменить на имя из CRM)
-            customer = str(row.get('Номер телефона', 'Неизвестный клиент'))
-            
-            # Определяем источник файла
-            source_file = str(row.get('Источник файла', ''))
-            if not source_file:  # Если нет значения в столбце, генерируем его
-                record_url = str(row.get('Ссылка на запись', ''))
-                if record_url.startswith('/api/recordings/'):
-                    # Локальный файл - извлекаем имя файла из URL
-                    source_file = record_url.split('/')[-1] if '/' in record_url else 'Локальный файл'
-                else:
-                    # Облачный файл - используем номер телефона или ID
-                    source_file = customer if customer != 'Неизвестный клиент' else f"Запись #{idx}"
-            
-            # Форматируем длительность
-            try:
-                duration = str(row.get('lanth', '0.00'))
-                if not isinstance(duration, str):
-                    duration = f"{int(duration // 1)}м {int(duration % 1 * 60)}с"
-                elif '.' in duration:
-                    mins, secs = duration.split('.')
-                    duration = f"{mins}м {secs}с"
-            except Exception:
-                duration = "0м 0с"  # Безопасное значение по умолчанию
-            
-            # Статус звонка (в примере определяем на основе дозвона)
+            df = call_filters.apply(df, _calls_filter_spec(request.args))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        sort = request.args.get('sort')
+        if sort:
             try:
-                status_map = {
-                    'doz': 'успешный',
-                    'nedoz': 'неуспешный',
-                    'не дозвон': 'неуспешный',
-                    'дозвон': 'успешный'
-                }
-                raw_status = str(row.get('Дозвон/Недозвон', '')).lower()
-                status = status_map.get(raw_status, 'требует внимания')
-            except Exception:
-                status = 'требует внимания'  # Безопасное значение по умолчанию
-            
-            # Формируем объект звонка с безопасной обработкой всех полей
-            call = {
-                'id': str(idx),
-                'agent': 'Оператор',  # В реальном приложении заменить на имя из данных
-                'customer': customer,
-                'date': row.get('date', datetime.now().strftime('%d.%m.%Y')),
-                'time': row.get('time', datetime.now().strftime('%H:%M')),
-                'duration': duration,
-                'status': status,
-                'purpose': str(row.get('Цели', 'Не указана')),
-                'transcription': str(row.get('Транскрибация', '-')),
-                'recordUrl': str(row.get('Ссылка на запись', '')),
-                'tag': str(row.get('Tag', '')),
-                
-                # Читаем сохраненные поля анализа из Excel
-                'aiSummary': str(row.get('AI-резюме', '')),
-                'keyInsight': str(row.get('Ключевой вывод', '')),
-                'recommendation': str(row.get('Рекомендации', '')),
-                'score': _safe_numeric(row.get('AI-оценка', 0)),
-                'callType': str(row.get('Тип звонка', '')),
-                'callResult': str(row.get('Результат звонка', '')),
-                'salesReadiness': _safe_numeric(row.get('Готовность к продаже', 0)),
-                'conversionProbability': _safe_numeric(row.get('Вероятность конверсии', 0)),
-                
-                # Обрабатываем сложные поля
-                'managerPerformance': _parse_manager_performance(row.get('Оценка менеджера', '')),
-                'clientInterests': _parse_client_interests(row.get('Интересы клиента', '')),
-                'decisionFactors': _parse_decision_factors(row.get('Факторы решения', '')),
-                
-                # Ответы на ключевые вопросы
-                'keyQuestion1Answer': str(row.get('Ответ на вопрос 1', '')),
-                'keyQuestion2Answer': str(row.get('Ответ на вопрос 2', '')),
-                'keyQuestion3Answer': str(row.get('Ответ на вопрос 3', '')),
-                
-                # Теги из JSON
-                'tags': _parse_tags(row.get('tags', '')),
-                
-                # Источник файла
-                'sourceFile': source_file,
-                
-                # Длительность аудио в формате MM:SS
-                'audioDuration': _format_audio_duration(row.get('lanth', 0)),
-                
-                # Количество символов в транскрипции
-                'transcriptLength': _calculate_transcript_length(row.get('Транскрибация', ''))
+                df = sort_calls(df, sort, texts)
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+        
+        total = len(df)
+        page = df.iloc[offset:] if limit is None else df.iloc[offset:offset + limit]
+        
+        # format=ndjson - звонок на строку, сериализация кусками по мере отправки; total и курсор - в заголовках
+        if wants_ndjson():
+            next_offset = offset + len(page)
+            headers = {
+                'X-Total-Count': str(total),
+                'Access-Control-Expose-Headers': 'X-Total-Count, X-Next-Cursor',
             }
-            calls.append(call)
-        
-        # Возвращаем данные в формате JSON
-        print(f"Успешно получено {len(calls)} звонков из Excel (источник: {source})")
-        return jsonify({"calls": calls})
+            if limit is not None and next_offset < total:
+                headers['X-Next-Cursor'] = _encode_calls_cursor(next_offset)
+            print(f"Потоковая отправка {len(page)} из {total} звонков (источник: {source})")
+            return ndjson_response(iter_serialized_calls(page, texts, fields=fields), headers=headers)
+        
+        # Звонки в формате, ожидаемом фронтендом: готовые JSON-фрагменты неизменных строк
+        # берутся из кэша, заново сериализуются (по колонкам) только новые и измененные
+        fragments = call_fragments.encode(page, texts, fragments_snapshot, fields=fields)
+        next_offset = offset + len(fragments)
+        next_cursor = _encode_calls_cursor(next_offset) if limit is not None and next_offset < total else None
+        
+        # Ответ склеивается из фрагментов без повторного кодирования звонков
+        print(f"Успешно получено {len(fragments)} из {total} звонков из хранилища (источник: {source})")
+        meta = json.dumps({"total": total, "offset": offset, "limit": limit, "nextCursor": next_cursor})
+        body = '{"calls":[' + ','.join(fragments) + '],' + meta[1:]
+        return app.response_class(body, mimetype='application/json')
     except Exception as e:
         print(f"Ошибка при получении звонков: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
+# Параметры запроса /api/calls -> условия фильтра звонков (calls_filters.normalize_spec)
+CALLS_FILTER_PARAMS = {
+    'source': 'source', 'search': 'search', 'status': 'status', 'purpose': 'purpose', 'ids': 'ids',
+    'result': 'result', 'operator': 'operator', 'date': 'date', 'dateFrom': 'date_from', 'dateTo': 'date_to',
+    'duration': 'duration', 'tags': 'tags',
+}
+
+def _calls_filter_spec(args):
+    return {name: args.get(param) for param, name in CALLS_FILTER_PARAMS.items() if args.get(param)}
+
+def _encode_calls_cursor(offset):
+    return base64.urlsafe_b64encode(json.dumps({"offset": offset}).encode('utf-8')).decode('ascii')
+
+def _calls_page_params(args):
+    """(offset, limit) из параметров запроса; limit None - без ограничения"""
+    cursor = args.get('cursor')
+    try:
+        if cursor:
+            offset = int(json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))['offset'])
+        else:
+            offset = int(args.get('offset', 0))
+    except Exception:
+        raise ValueError("Некорректный параметр cursor/offset")
+    limit = args.get('limit')
+    try:
+        limit = int(limit) if limit not in (None, '') else None
+    except ValueError:
+        raise ValueError("Некорректный параметр limit")
+    if offset < 0 or (limit is not None and limit < 0):
+        raise ValueError("limit и offset не могут быть отрицательными")
+    return offset, limit
+
+def _calls_fields_param(value):
+    """Список полей из параметра fields (по умолчанию - все, кроме текста транскрипции)"""
+    if not value:
+        return DEFAULT_CALL_FIELDS
+    fields = [field.strip() for field in value.split(',') if field.strip()]
+    unknown = [field for field in fields if field not in CALL_FIELDS]
+    if unknown:
+        raise ValueError(f"Неизвестные поля: {', '.join(unknown)}")
+    return fields
+
+@app.route('/api/calls/changes', methods=['GET'])
+@conditional(lambda: store.generation())
+def get_call_changes():
+    """Звонки, измененные после поколения since (журнал изменений хранилища).
+
+    Ответ: generation - новое поколение для следующего запроса, calls -
+    добавленные и измененные звонки (поля как в /api/calls, параметр fields),
+    deleted - ID удаленных звонков. reset: true - журнал не покрывает since
+    (хранилище заменено или since слишком старый): нужна полная загрузка
+    /api/calls. Объем ответа пропорционален числу изменений, а повторный
+    запрос без изменений получает 304.
+    """
+    try:
+        since = int(request.args['since'])
+        fields = _calls_fields_param(request.args.get('fields'))
+    except (KeyError, ValueError) as e:
+        return jsonify({"error": f"Некорректный параметр since или fields: {str(e)}"}), 400
+    
+    try:
+        generation, changes = store.changes_since(since)
+        if changes is None:
+            return jsonify({"generation": generation, "reset": True, "calls": [], "deleted": []})
+        
+        deleted = [call_id for row_id, call_id, op in changes if op == 'delete']
+        changed_ids = [row_id for row_id, call_id, op in changes if op != 'delete']
+        fragments_snapshot = call_fragments.snapshot()
+        df = load_or_get_calls_df()
+        changed = df[df.index.isin(changed_ids)]
+        fragments = call_fragments.encode(changed, transcripts(), fragments_snapshot, fields=fields)
+        
+        print(f"Изменения с поколения {since}: {len(fragments)} звонков, удалено {len(deleted)}")
+        meta = json.dumps({"generation": generation, "reset": False, "deleted": deleted}, ensure_ascii=False)
+        body = '{"calls":[' + ','.join(fragments) + '],' + meta[1:]
+        return app.response_class(body, mimetype='application/json')
+    except Exception as e:
+        print(f"Ошибка при получении изменений звонков: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/calls/<call_id>/transcript', methods=['GET'])
+def get_call_transcript(call_id):
+    """Полный текст транскрипции звонка (text/plain, UTF-8).
+
+    Списки звонков отдают только длину и начало текста, полный текст
+    загружается отсюда при открытии звонка. Поддерживаются Range-запросы
+    (Range: bytes=0-65535) для очень длинных текстов - ответ 206 с
+    Content-Range. ETag - хэш текста, поэтому работают If-None-Match и If-Range.
+    """
+    try:
+        idx, row = store.find_call(call_id)
+        if row is None:
+            return jsonify({"error": f"Звонок {call_id} не найден"}), 404
+        text = row.get(TRANSCRIPT_COLUMN)
+        data = ('' if text is None or str(text) in ('-', 'nan') else str(text)).encode('utf-8')
+        
+        response = app.response_class(data, mimetype='text/plain')
+        response.set_etag(hashlib.sha1(data).hexdigest()[:24])
+        response.headers['Cache-Control'] = 'no-cache'
+        response.headers['Access-Control-Expose-Headers'] = 'Content-Range, Content-Length, ETag'
+        if not data:
+            return response  # Пустой текст: диапазоны не применимы (иначе 416)
+        return response.make_conditional(request, accept_ranges=True, complete_length=len(data))
+    except Exception as e:
+        print(f"Ошибка при получении транскрипции звонка {call_id}: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+SEARCH_MAX_LIMIT = 100  # Максимум результатов поиска на страницу
+
+def _snippet_html(snippet):
+    """Фрагмент поиска для вывода: текст экранирован, совпадения - в <mark>"""
+    return html.escape(snippet or '').replace(SNIPPET_START, '<mark>').replace(SNIPPET_END, '</mark>')
+
+@app.route('/api/search', methods=['GET'])
+@conditional(lambda: store.generation())
+def search_calls():
+    """Полнотекстовый поиск по транскрипциям, AI-резюме и ключевым выводам.
+
+    Параметры: q - слова запроса (звонок подходит, если в нем есть все
+    слова, слово ищется и как начало более длинного: 'достав' находит
+    'доставка'), limit (по умолчанию 20, не больше 100) и offset. Ответ:
+    total - число найденных звонков, results - ID звонка, оценка
+    релевантности (больше - лучше) и фрагмент текста с совпадениями в <mark>,
+    от более релевантных к менее. Поля звонков - через /api/calls?ids=.
+    """
+    query = request.args.get('q', '')
+    try:
+        offset, limit = _calls_page_params(request.args)
+        limit = min(limit if limit is not None else 20, SEARCH_MAX_LIMIT)
+        total, rows = store.search(query, limit=limit, offset=offset)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except RuntimeError as e:
+        return jsonify({"error": str(e)}), 503
+    except Exception as e:
+        print(f"Ошибка полнотекстового поиска '{query}': {str(e)}")
+        return jsonify({"error": str(e)}), 500
+    
+    results = [
+        {"id": call_id, "score": score, "snippet": _snippet_html(snippet)}
+        for row_id, call_id, score, snippet in rows
+    ]
+    print(f"Поиск '{query}': найдено {total} звонков")
+    return jsonify({"query": query, "total": total, "offset": offset, "limit": limit, "results": results})
+
+def _analyze_call(call_id, key_questions):
+    """Анализ одного звонка по ID для /api/analyze: результат для ответа или None (звонок не найден, ошибка)"""
+    try:
+        idx, row = store.find_call(call_id)
+        if row is None:
+            return None
+        columns = set(store.columns())
+        updates = {}  # Построчные изменения для хранилища
+        transcript = str(row.get('Транскрибация', '-'))
+        
+        # Проверяем, есть ли транскрипция для анализа
+        has_transcript = transcript and transcript != '-' and transcript.strip() != '' and transcript != 'nan'
+        
+        if has_transcript:
+            print(f"Анализ звонка {call_id} с существующей транскрипцией (длина: {len(transcript)} символов)")
+        else:
+            print(f"Звонок {call_id} не имеет транскрипции для анализа")
+            transcript = "Транскрипция отсутствует"
+        
+        # Анализируем транскрипцию с помощью LLM с учетом ключевых вопросов (до 3)
+        analysis_result = analyze_transcript(transcript, key_questions[:3] if key_questions else None)
+        
+        # Обновляем колонки с новой информацией в хранилище, если анализ успешен
+        if 'status' in analysis_result or 'callResult' in analysis_result:
+            updated_status = analysis_result.get('status', analysis_result.get('callResult', 'требует внимания'))
+            if 'Статус' in columns:
+                updates['Статус'] = updated_status
+            
+        if 'callType' in analysis_result and 'Тип звонка' in columns:
+            updates['Тип звонка'] = analysis_result.get('callType', 'не определен')
+        
+        # Сохраняем теги в JSON-формате
+        if 'tags' in analysis_result and analysis_result['tags']:
+            if 'tags' in columns:
+                updates['tags'] = json.dumps(analysis_result['tags'], ensure_ascii=False)
+            if 'Tag' in columns:
+                updates['Tag'] = analysis_result['tags'][0] if analysis_result['tags'] else ''
+        
+        # Формируем результат с расширенными полями анализа
+        call = {
+            'id': call_id,
+            'aiSummary': analysis_result.get('aiSummary', ''),
+            'keyInsight': analysis_result.get('keyInsight', ''),
+            'recommendation': analysis_result.get('recommendation', ''),
+            'score': analysis_result.get('score', 0),
+            'callType': analysis_result.get('callType', 'не определен'),
+            'callResult': analysis_result.get('callResult', 'требует внимания'),
+            'status': analysis_result.get('status', analysis_result.get('callResult', 'требует внимания')),
+            'tags': analysis_result.get('tags', []),
+            'supportingQuote': analysis_result.get('supportingQuote', ''),
+            'salesReadiness': analysis_result.get('salesReadiness', 0),
+            'conversionProbability': analysis_result.get('conversionProbability', 0),
+            'objections': analysis_result.get('objections', []),
+            'managerPerformance': analysis_result.get('managerPerformance', {"общая_оценка": 0, "details": "Нет данных"}),
+            'customerPotential': analysis_result.get('customerPotential', {"score": 0, "reason": "Нет данных"}),
+            'keyQuestion1Answer': analysis_result.get('keyQuestion1Answer', ''),
+            'keyQuestion2Answer': analysis_result.get('keyQuestion2Answer', ''),
+            'keyQuestion3Answer': analysis_result.get('keyQuestion3Answer', ''),
+            'clientInterests': analysis_result.get('clientInterests', []),
+            'decisionFactors': analysis_result.get('decisionFactors', {"positive": [], "negative": []})
+        }
+        
+        # Сохраняем ответы на ключевые вопросы в отдельные колонки
+        if key_questions and len(key_questions) > 0:
+            try:
+                for i, question_text in enumerate(key_questions[:3]):
+                    col_name = f"Ответ на вопрос {i+1}"
+                    # Колонка создается в хранилище автоматически, если ее нет
+                    updates[col_name] = analysis_result.get(f'keyQuestion{i+1}Answer', '')
+            except Exception as col_err:
+                print(f"Предупреждение: не удалось обновить колонки ответов: {col_err}")
+        
+        # Сохраняем все поля анализа в хранилище
+        try:
+            # Создаем новые столбцы если их нет
+            analysis_columns = {
+                'Ключевой вывод': analysis_result.get('keyInsight', ''),
+                'AI-оценка': analysis_result.get('score', ''),
+                'Результат звонка': analysis_result.get('callResult', ''),
+                'AI-резюме': analysis_result.get('aiSummary', ''),
+                'Рекомендации': analysis_result.get('recommendation', ''),
+                'Готовность к продаже': analysis_result.get('salesReadiness', ''),
+                'Вероятность конверсии': analysis_result.get('conversionProbability', '')
+            }
+            
+            # Обеспечиваем наличие столбца "Источник файла"
+            store.ensure_columns(['Источник файла'])
+            
+            for col_name, value in analysis_columns.items():
+                if value != '':  # Только если есть значение
+                    updates[col_name] = value
+                    print(f"💾 Сохранено {col_name}: {str(value)[:50]}...")
+            
+            # Сохраняем сложные объекты как строки
+            if analysis_result.get('managerPerformance'):
+                perf = analysis_result['managerPerformance']
+                if isinstance(perf, dict) and perf.get('общая_оценка'):
+                    updates['Оценка менеджера'] = f"{perf['общая_оценка']}/10"
+            
+            if analysis_result.get('clientInterests'):
+                updates['Интересы клиента'] = ', '.join(analysis_result['clientInterests'])
+            
+            if analysis_result.get('decisionFactors'):
+                factors = analysis_result['decisionFactors']
+                factor_text = ""
+                if factors.get('positive'):
+                    factor_text += f"Положительные: {', '.join(factors['positive'])}; "
+                if factors.get('negative'):
+                    factor_text += f"Отрицательные: {', '.join(factors['negative'])}"
+                if factor_text:
+                    updates['Факторы решения'] = factor_text
+        except Exception as analysis_save_err:
+            print(f"Предупреждение: не удалось сохранить поля анализа: {analysis_save_err}")
+        
+        # Ставим изменения строки в очередь, запись в хранилище идет пакетами
+        try:
+            result_writer.put(call_id_of(idx, row), updates, kind='analysis')
+            print(f"✅ Анализ звонка {call_id} поставлен в очередь записи")
+        except Exception as save_error:
+            print(f"❌ Ошибка сохранения анализа звонка {call_id}: {save_error}")
+        return call
+    except Exception as e:
+        print(f"Ошибка при анализе звонка {call_id}: {str(e)}")
+        traceback.print_exc()
+        return None
+
 @app.route('/api/analyze', methods=['POST'])
 def analyze_calls():
     """Анализировать выбранные звонки с помощью LLM"""
@@ -1124,151 +1476,24 @@ def analyze_calls():
         if not call_ids:
             return jsonify({"error": "Не указаны ID звонков для анализа"}), 400
         
-        df = pd.read_excel(EXCEL_FILE)
-        
-        # Фильтруем по переданным ID
+        # format=ndjson - каждый проанализированный звонок отправляется отдельной строкой сразу после анализа
+        if wants_ndjson():
+            def stream():
+                try:
+                    for call_id in call_ids:
+                        call = _analyze_call(call_id, key_questions)
+                        if call is not None:
+                            yield call
+                finally:
+                    result_writer.flush()
+            return ndjson_response(stream(), flush_bytes=0)
+        
+        # Анализируем звонки по переданным ID
         selected_calls = []
         for call_id in call_ids:
-            try:
-                idx = int(call_id)
-                if idx < len(df):
-                    transcript = str(df.iloc[idx].get('Транскрибация', '-'))
-                    
-                    # Проверяем, есть ли транскрипция для анализа
-                    has_transcript = transcript and transcript != '-' and transcript.strip() != '' and transcript != 'nan'
-                    
-                    if has_transcript:
-                        print(f"Анализ звонка {call_id} с существующей транскрипцией (длина: {len(transcript)} символов)")
-                    else:
-                        print(f"Звонок {call_id} не имеет транскрипции для анализа")
-                        transcript = "Транскрипция отсутствует"
-                    
-                    # Анализируем транскрипцию с помощью LLM с учетом ключевых вопросов (до 3)
-                    analysis_result = analyze_transcript(transcript, key_questions[:3] if key_questions else None)
-                    
-                    # Обновляем колонки с новой информацией в Excel, если анализ успешен
-                    if 'status' in analysis_result or 'callResult' in analysis_result:
-                        updated_status = analysis_result.get('status', analysis_result.get('callResult', 'требует внимания'))
-                        if 'Статус' in df.columns:
-                            df.at[idx, 'Статус'] = updated_status
-                        
-                    if 'callType' in analysis_result and 'Тип звонка' in df.columns:
-                        df.at[idx, 'Тип звонка'] = analysis_result.get('callType', 'не определен')
-                    
-                    # Сохраняем теги в JSON-формате
-                    if 'tags' in analysis_result and analysis_result['tags']:
-                        if 'tags' in df.columns:
-                            df.at[idx, 'tags'] = json.dumps(analysis_result['tags'], ensure_ascii=False)
-                        if 'Tag' in df.columns:
-                            df.at[idx, 'Tag'] = analysis_result['tags'][0] if analysis_result['tags'] else ''
-                    
-                    # Формируем результат с расширенными полями анализа
-                    call = {
-                        'id': call_id,
-                        'aiSummary': analysis_result.get('aiSummary', ''),
-                        'keyInsight': analysis_result.get('keyInsight', ''),
-                        'recommendation': analysis_result.get('recommendation', ''),
-                        'score': analysis_result.get('score', 0),
-                        'callType': analysis_result.get('callType', 'не определен'),
-                        'callResult': analysis_result.get('callResult', 'требует внимания'),
-                        'status': analysis_result.get('status', analysis_result.get('callResult', 'требует внимания')),
-                        'tags': analysis_result.get('tags', []),
-                        'supportingQuote': analysis_result.get('supportingQuote', ''),
-                        'salesReadiness': analysis_result.get('salesReadiness', 0),
-                        'conversionProbability': analysis_result.get('conversionProbability', 0),
-                        'objections': analysis_result.get('objections', []),
-                        'managerPerformance': analysis_result.get('managerPerformance', {"общая_оценка": 0, "details": "Нет данных"}),
-                        'customerPotential': analysis_result.get('customerPotential', {"score": 0, "reason": "Нет данных"}),
-                        'keyQuestion1Answer': analysis_result.get('keyQuestion1Answer', ''),
-                        'keyQuestion2Answer': analysis_result.get('keyQuestion2Answer', ''),
-                        'keyQuestion3Answer': analysis_result.get('keyQuestion3Answer', ''),
-                        'clientInterests': analysis_result.get('clientInterests', []),
-                        'decisionFactors': analysis_result.get('decisionFactors', {"positive": [], "negative": []})
-                    }
-                    
-                    # Сохраняем ответы на ключевые вопросы в отдельные колонки Excel
-                    if key_questions and len(key_questions) > 0:
-                        try:
-                            for i, question_text in enumerate(key_questions[:3]):
-                                col_name = f"Ответ на вопрос {i+1}"
-                                if col_name not in df.columns:
-                                    df[col_name] = ''  # Добавляем колонку, если ее нет
-                                df.at[idx, col_name] = analysis_result.get(f'keyQuestion{i+1}Answer', '')
-                        except Exception as col_err:
-                            print(f"Предупреждение: не удалось обновить колонки ответов: {col_err}")
-                    
-                    # Сохраняем все поля анализа в Excel
-                    try:
-                        # Создаем новые столбцы если их нет
-                        analysis_columns = {
-                            'Ключевой вывод': analysis_result.get('keyInsight', ''),
-                            'AI-оценка': analysis_result.get('score', ''),
-                            'Результат звонка': analysis_result.get('callResult', ''),
-                            'AI-резюме': analysis_result.get('aiSummary', ''),
-                            'Рекомендации': analysis_result.get('recommendation', ''),
-                            'Готовность к продаже': analysis_result.get('salesReadiness', ''),
-                            'Вероятность конверсии': analysis_result.get('conversionProbability', '')
-                        }
-                        
-                        # Обеспечиваем наличие столбца "Источник файла"
-                        if 'Источник файла' not in df.columns:
-                            df['Источник файла'] = ''
-                        
-                        for col_name, value in analysis_columns.items():
-                            if col_name not in df.columns:
-                                df[col_name] = ''
-                                print(f"🆕 Создан новый столбец: {col_name}")
-                            if value != '':  # Только если есть значение
-                                df.at[idx, col_name] = value
-                                print(f"💾 Сохранено {col_name}: {str(value)[:50]}...")
-                        
-                        # Сохраняем сложные объекты как строки
-                        if analysis_result.get('managerPerformance'):
-                            if 'Оценка менеджера' not in df.columns:
-                                df['Оценка менеджера'] = ''
-                            perf = analysis_result['managerPerformance']
-                            if isinstance(perf, dict) and perf.get('общая_оценка'):
-                                df.at[idx, 'Оценка менеджера'] = f"{perf['общая_оценка']}/10"
-                        
-                        if analysis_result.get('clientInterests'):
-                            if 'Интересы клиента' not in df.columns:
-                                df['Интересы клиента'] = ''
-                            df.at[idx, 'Интересы клиента'] = ', '.join(analysis_result['clientInterests'])
-                        
-                        if analysis_result.get('decisionFactors'):
-                            if 'Факторы решения' not in df.columns:
-                                df['Факторы решения'] = ''
-                            factors = analysis_result['decisionFactors']
-                            factor_text = ""
-                            if factors.get('positive'):
-                                factor_text += f"Положительные: {', '.join(factors['positive'])}; "
-                            if factors.get('negative'):
-                                factor_text += f"Отрицательные: {', '.join(factors['negative'])}"
-                            if factor_text:
-                                df.at[idx, 'Факторы решения'] = factor_text
-                    except Exception as analysis_save_err:
-                        print(f"Предупреждение: не удалось сохранить поля анализа: {analysis_save_err}")
-                    
-                    selected_calls.append(call)
-                    
-                    # Сохраняем изменения в Excel после каждого звонка
-                    print(f"💾 Сохраняем анализ звонка {call_id} в Excel...")
-                    try:
-                        df.to_excel(EXCEL_FILE, index=False)
-                        print(f"✅ Анализ звонка {call_id} успешно сохранен в Excel")
-                    except Exception as save_error:
-                        print(f"❌ Ошибка сохранения анализа звонка {call_id}: {save_error}")
-                        # Попытка резервного сохранения
-                        try:
-                            import time
-                            backup_file = f"DFASDF_backup_{int(time.time())}.xlsx"
-                            df.to_excel(backup_file, index=False)
-                            print(f"💾 Анализ сохранен в резервный файл: {backup_file}")
-                        except Exception as backup_error:
-                            print(f"❌ Резервное сохранение тоже не удалось: {backup_error}")
-            except Exception as e:
-                print(f"Ошибка при анализе звонка {call_id}: {str(e)}")
-                traceback.print_exc()
+            call = _analyze_call(call_id, key_questions)
+            if call is not None:
+                selected_calls.append(call)
         
         if not selected_calls:
             return jsonify({"warning": "Не найдено звонков с транскрипциями для анализа"}), 200
@@ -1278,6 +1503,9 @@ def analyze_calls():
         print(f"Ошибка при анализе звонков: {str(e)}")
         traceback.print_exc()
         return jsonify({"error": str(e)}), 500
+    finally:
+        # Сбрасываем оставшиеся изменения в конце запроса
+        result_writer.flush()
 
 @app.route('/api/transcribe', methods=['POST'])
 def transcribe_calls():
@@ -1290,17 +1518,15 @@ def transcribe_calls():
         if not call_ids:
             return jsonify({"error": "Не указаны ID звонков для транскрибации"}), 400
         
-        df = pd.read_excel(EXCEL_FILE)
-        
         # Собираем URLs для транскрибации
         urls_to_transcribe = []
-        indices = []
+        indices = []  # Стабильные ID выбранных звонков (результаты пишутся по ID, а не по id строки)
         for call_id in call_ids:
             try:
-                idx = int(call_id)
-                if idx < len(df):
-                    transcript = str(df.iloc[idx].get('Транскрибация', '-'))
-                    url = str(df.iloc[idx].get('Ссылка на запись', ''))
+                idx, row = store.find_call(call_id)
+                if row is not None:
+                    transcript = str(row.get('Транскрибация', '-'))
+                    url = str(row.get('Ссылка на запись', ''))
                     
                     # Критерии для транскрибирования:
                     # 1. Если транскрипция отсутствует ('-', пусто, None)
@@ -1314,12 +1540,12 @@ def transcribe_calls():
                     if needs_transcription and url and (url.startswith('http') or url.startswith('/api/recordings/')):
                         print(f"Добавляем звонок {call_id} на транскрибацию, URL: {url}")
                         urls_to_transcribe.append(url)
-                        indices.append(idx)
+                        indices.append(call_id_of(idx, row))
                     elif url and (url.startswith('http') or url.startswith('/api/recordings/')) and not needs_transcription:
                         # Если есть URL и транскрипция уже существует, но не запрошено перетранскрибирование,
                         # добавляем в список для анализа, но не транскрибируем заново
                         print(f"Звонок {call_id} уже имеет транскрипцию, добавляем для анализа")
-                        indices.append(idx)
+                        indices.append(call_id_of(idx, row))
             except Exception as e:
                 print(f"Ошибка при подготовке звонка {call_id} к транскрибации: {str(e)}")
         
@@ -1347,34 +1573,33 @@ def transcribe_calls():
                         "status": "success"
                     })
             
-            # Обновляем Excel файл для транскрибированных звонков
+            # Записываем транскрипции в журнал результатов
             results_idx = 0
-            for i, idx in enumerate(indices):
+            for i, stable_id in enumerate(indices):
                 if i < len(urls_to_transcribe):  # Только для реально транскрибированных
                     result = results[results_idx]
                     if result["status"] == "success":
-                        df.at[idx, 'Транскрибация'] = result["text"]
-                        df.at[idx, 'Tag'] = 'gemini'
+                        result_writer.put(stable_id, {'Транскрибация': result["text"], 'Tag': 'gemini'}, kind='transcription')
                     results_idx += 1
+            
+            # Уплотняем журнал, чтобы ответ ниже прочитал актуальные строки
+            result_writer.flush()
         else:
             print("Нет звонков для транскрибации, но есть звонки для анализа")
         
-        # Сохраняем изменения
-        df.to_excel(EXCEL_FILE, index=False)
-        
         # Формируем ответ, включая звонки с уже существующими транскрипциями
         updated_calls = []
         for i, call_id in enumerate(call_ids):
-            idx = int(call_id) if i < len(indices) else -1
-            if idx >= 0 and idx < len(df):
+            row = store.find_call(call_id)[1] if i < len(indices) else None
+            if row is not None:
                 # Проверяем, был ли этот звонок транскрибирован или у него уже была транскрипция
                 is_in_transcribed_list = i < len(urls_to_transcribe)
                 was_transcribed = is_in_transcribed_list and i < len(results)
-                transcription = df.at[idx, 'Транскрибация'] if idx < len(df) else None
+                transcription = row.get('Транскрибация')
                 
                 if was_transcribed:
                     # Звонок был транскрибирован
-                    result_idx = urls_to_transcribe.index(str(df.iloc[idx].get('Ссылка на запись', ''))) if is_in_transcribed_list else -1
+                    result_idx = urls_to_transcribe.index(str(row.get('Ссылка на запись', ''))) if is_in_transcribed_list else -1
                     result = results[result_idx] if result_idx >= 0 and result_idx < len(results) else {"status": "error", "error": "Ошибка индексации"}
                     updated_calls.append({
                         'id': call_id,
@@ -1402,12 +1627,12 @@ def transcribe_calls():
 
 @app.route('/api/process', methods=['POST'])
 def process_excel():
-    """Обработать весь Excel файл: транскрибировать и анализировать звонки"""
+    """Обработать все звонки хранилища: транскрибировать и анализировать звонки"""
     try:
-        df = pd.read_excel(EXCEL_FILE)
+        df = load_or_get_calls_df()
         
         # Подсчитываем количество звонков без транскрипции
-        no_transcription = df[df['Транскрибация'] == '-']
+        no_transcription = df[transcripts().equals(df.index, '-')]
         if len(no_transcription) == 0:
             return jsonify({"message": "Все звонки уже транскрибированы"})
         
@@ -1504,62 +1729,49 @@ def custom_analyze():
         status_filter = data.get('statusFilter', '')
         operator_filter = data.get('operatorFilter', '')
         date_filter = data.get('dateFilter', '')
+        date_from_filter = data.get('dateFromFilter', '')  # Диапазон дат, включительно
+        date_to_filter = data.get('dateToFilter', '')
         duration_filter = data.get('durationFilter', '')  # Новый фильтр по длительности
         tag_filter = data.get('tagFilter', '')  # Новый фильтр по тегу
         
         # Получаем выбранные ID звонков, если они указаны
         selected_call_ids = data.get('callIds', [])
         
-        # Получаем все данные о звонках
-        all_calls = get_calls_data()
-        print(f"Получено {len(all_calls)} звонков из базы данных")
+        # Фильтры произвольного анализа в условиях общего движка фильтров (calls_filters)
+        spec = {
+            'result': status_filter,
+            'operator': operator_filter,
+            'date': date_filter,
+            'date_from': date_from_filter,
+            'date_to': date_to_filter,
+            'duration': duration_filter,
+            'tags': [tag_filter] if tag_filter else None,
+        }
+        # Если указаны конкретные ID звонков, фильтруем по ним (старые числовые ID приводим к стабильным)
+        if selected_call_ids:
+            selected_ids = set()
+            for call_id in selected_call_ids:
+                row_id, row = store.find_call(call_id)
+                selected_ids.add(call_id_of(row_id, row) if row is not None else call_id)
+            spec['ids'] = selected_ids
         
-        # Применяем фильтры
-        filtered_calls = all_calls
+        # Все фильтры - маски по общему DataFrame, звонки с транскрипциями собираются только для анализа
+        try:
+            filtered_df = call_filters.apply(load_or_get_calls_df(), spec)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
-        # Если указаны конкретные ID звонков, фильтруем по ним
-        if selected_call_ids:
-            filtered_calls = [call for call in filtered_calls if call.get('id', '') in selected_call_ids]
-        
-        # Фильтр по статусу
-        if status_filter:
-            filtered_calls = [call for call in filtered_calls if 
-                             (call.get('callResult', '') or call.get('status', '')).lower() == status_filter.lower()]
-        
-        # Фильтр по оператору
-        if operator_filter:
-            filtered_calls = [call for call in filtered_calls if 
-                             (call.get('agent', '') or '').lower() == operator_filter.lower()]
-        
-        # Фильтр по дате
-        if date_filter:
-            filtered_calls = [call for call in filtered_calls if call.get('date', '') == date_filter]
-        
-        # Фильтр по длительности звонка
-        if duration_filter:
-            # Отфильтруем звонки по длительности
-            if duration_filter == 'short':  # до 1 минуты
-                filtered_calls = filter_by_duration(filtered_calls, 0, 60)
-            elif duration_filter == 'medium':  # от 1 до 3 минут
-                filtered_calls = filter_by_duration(filtered_calls, 60, 180)
-            elif duration_filter == 'long':  # более 3 минут
-                filtered_calls = filter_by_duration(filtered_calls, 180, float('inf'))
-        
-        # Фильтр по тегу
-        if tag_filter:
-            filtered_calls = filter_by_tag(filtered_calls, tag_filter)
-        
-        print(f"После применения фильтров осталось {len(filtered_calls)} звонков")
+        # Анализируем не более 5 звонков для экономии ресурсов, остальные только считаем
+        total_filtered = len(filtered_df)
+        selected_calls = list(itertools.islice(iter_calls_data(filtered_df), 5))
+        
+        print(f"После применения фильтров осталось {total_filtered} звонков")
         
         # Если нет звонков после фильтрации
-        if not filtered_calls:
+        if not selected_calls:
             return jsonify({'result': 'Не найдено звонков, соответствующих заданным фильтрам.'})
         
-        # Анализируем не более 5 звонков для экономии ресурсов
-        sample_size = min(5, len(filtered_calls))
-        selected_calls = filtered_calls[:sample_size]
-        
-        print(f"Выбрано {sample_size} звонков для анализа")
+        print(f"Выбрано {len(selected_calls)} звонков для анализа")
         
         # Формируем контекст для анализа с учетом фильтров
         filter_context = ""
@@ -1567,6 +1779,8 @@ def custom_analyze():
         if status_filter: filter_list.append(f"статус: {status_filter}")
         if operator_filter: filter_list.append(f"оператор: {operator_filter}")
         if date_filter: filter_list.append(f"дата: {date_filter}")
+        if date_from_filter or date_to_filter:
+            filter_list.append(f"период: {date_from_filter or '...'} - {date_to_filter or '...'}")
         if duration_filter: 
             duration_text = {"short": "до 1 минуты", "medium": "от 1 до 3 минут", "long": "более 3 минут"}.get(duration_filter, duration_filter)
             filter_list.append(f"длительность: {duration_text}")
@@ -1576,218 +1790,216 @@ def custom_analyze():
             filter_context = f"Применены фильтры: {', '.join(filter_list)}. "
         
         # Выполняем анализ звонков
-        results = []
-        
-        # Загружаем Excel файл перед изменениями
-        df = load_or_get_calls_df()
         tags_updated = False  # Флаг для отслеживания обновлений
         
-        for call in selected_calls:
-            call_id = call.get('id', 'unknown')
-            transcript = call.get('transcript', '') or call.get('transcription', '')
-            
-            if not transcript or transcript == '-' or transcript.strip() == '':
-                print(f"У звонка {call_id} отсутствует транскрипция. Пропускаем.")
-                continue
-            
-            try:
-                print(f"Анализ звонка {call_id} с запросом: '{custom_prompt}'")
-                # Анализируем транскрипцию с помощью LLM и пользовательского запроса
-                # custom_analyze_transcript теперь возвращает словарь
-                analysis_data = custom_analyze_transcript(transcript, custom_prompt)
+        def analyzed_calls():
+            """Результаты анализа выбранных звонков по одному, по мере готовности"""
+            nonlocal tags_updated
+            for call in selected_calls:
+                call_id = call.get('id', 'unknown')
+                transcript = call.get('transcript', '') or call.get('transcription', '')
+                
+                if not transcript or transcript == '-' or transcript.strip() == '':
+                    print(f"У звонка {call_id} отсутствует транскрипция. Пропускаем.")
+                    continue
                 
-                # Обновляем теги в базе данных, если они есть в результате анализа
                 try:
-                    if 'tags' in analysis_data and analysis_data['tags']:
-                        # Найдем звонок в DataFrame по ID
-                        if call_id.isdigit() and int(call_id) < len(df):
-                            row_idx = int(call_id)
-                            
-                            # Добавляем колонку tags, если её нет
-                            if 'tags' not in df.columns:
-                                df['tags'] = None
-                            
-                            # Сохраняем теги в JSON-формате
-                            df.at[row_idx, 'tags'] = json.dumps(analysis_data['tags'], ensure_ascii=False)
-                            
-                            # Обновляем также Tag для совместимости
-                            if 'Tag' in df.columns and analysis_data['tags']:
-                                df.at[row_idx, 'Tag'] = analysis_data['tags'][0]
-                            
-                            # Сохраняем все поля анализа в Excel (custom_analyze)
-                            try:
-                                # Создаем новые столбцы если их нет
-                                analysis_columns = {
-                                    'Ключевой вывод': analysis_data.get('keyInsight', ''),
-                                    'AI-оценка': analysis_data.get('score', ''),
-                                    'Результат звонка': analysis_data.get('callResult', ''),
-                                    'AI-резюме': analysis_data.get('keyPoints', ''),
-                                    'Рекомендации': analysis_data.get('recommendations', ''),
-                                    'Готовность к продаже': analysis_data.get('salesReadiness', ''),
-                                    'Вероятность конверсии': analysis_data.get('conversionProbability', '')
-                                }
-                                
-                                # Обеспечиваем наличие столбца "Источник файла"
-                                if 'Источник файла' not in df.columns:
-                                    df['Источник файла'] = ''
+                    print(f"Анализ звонка {call_id} с запросом: '{custom_prompt}'")
+                    # Анализируем транскрипцию с помощью LLM и пользовательского запроса
+                    # custom_analyze_transcript теперь возвращает словарь
+                    analysis_data = custom_analyze_transcript(transcript, custom_prompt)
+                    
+                    # Обновляем теги в базе данных, если они есть в результате анализа
+                    try:
+                        if 'tags' in analysis_data and analysis_data['tags']:
+                            # Найдем звонок в хранилище по ID
+                            row_idx, row = store.find_call(call_id)
+                            if row is not None:
+                                updates = {}  # Построчные изменения для хранилища
                                 
-                                for col_name, value in analysis_columns.items():
-                                    if col_name not in df.columns:
-                                        df[col_name] = ''
-                                    if value != '':  # Только если есть значение
-                                        df.at[row_idx, col_name] = value
+                                # Сохраняем теги в JSON-формате (колонка tags создается, если её нет)
+                                updates['tags'] = json.dumps(analysis_data['tags'], ensure_ascii=False)
                                 
-                                # Сохраняем сложные объекты как строки
-                                if analysis_data.get('managerPerformance'):
-                                    if 'Оценка менеджера' not in df.columns:
-                                        df['Оценка менеджера'] = ''
-                                    perf = analysis_data['managerPerformance']
-                                    if isinstance(perf, dict) and perf.get('общая_оценка'):
-                                        df.at[row_idx, 'Оценка менеджера'] = f"{perf['общая_оценка']}/10"
+                                # Обновляем также Tag для совместимости
+                                if 'Tag' in store.columns() and analysis_data['tags']:
+                                    updates['Tag'] = analysis_data['tags'][0]
                                 
-                                if analysis_data.get('clientInterests'):
-                                    if 'Интересы клиента' not in df.columns:
-                                        df['Интересы клиента'] = ''
-                                    df.at[row_idx, 'Интересы клиента'] = ', '.join(analysis_data['clientInterests'])
+                                # Сохраняем все поля анализа в хранилище (custom_analyze)
+                                try:
+                                    # Создаем новые столбцы если их нет
+                                    analysis_columns = {
+                                        'Ключевой вывод': analysis_data.get('keyInsight', ''),
+                                        'AI-оценка': analysis_data.get('score', ''),
+                                        'Результат звонка': analysis_data.get('callResult', ''),
+                                        'AI-резюме': analysis_data.get('keyPoints', ''),
+                                        'Рекомендации': analysis_data.get('recommendations', ''),
+                                        'Готовность к продаже': analysis_data.get('salesReadiness', ''),
+                                        'Вероятность конверсии': analysis_data.get('conversionProbability', '')
+                                    }
+                                    
+                                    # Обеспечиваем наличие столбца "Источник файла"
+                                    store.ensure_columns(['Источник файла'])
+                                    
+                                    for col_name, value in analysis_columns.items():
+                                        if value != '':  # Только если есть значение
+                                            updates[col_name] = value
+                                    
+                                    # Сохраняем сложные объекты как строки
+                                    if analysis_data.get('managerPerformance'):
+                                        perf = analysis_data['managerPerformance']
+                                        if isinstance(perf, dict) and perf.get('общая_оценка'):
+                                            updates['Оценка менеджера'] = f"{perf['общая_оценка']}/10"
+                                    
+                                    if analysis_data.get('clientInterests'):
+                                        updates['Интересы клиента'] = ', '.join(analysis_data['clientInterests'])
+                                    
+                                    if analysis_data.get('decisionFactors'):
+                                        factors = analysis_data['decisionFactors']
+                                        factor_text = ""
+                                        if factors.get('positive'):
+                                            factor_text += f"Положительные: {', '.join(factors['positive'])}; "
+                                        if factors.get('negative'):
+                                            factor_text += f"Отрицательные: {', '.join(factors['negative'])}"
+                                        if factor_text:
+                                            updates['Факторы решения'] = factor_text
+                                except Exception as analysis_save_err:
+                                    print(f"Предупреждение: не удалось сохранить поля анализа (custom): {analysis_save_err}")
                                 
-                                if analysis_data.get('decisionFactors'):
-                                    if 'Факторы решения' not in df.columns:
-                                        df['Факторы решения'] = ''
-                                    factors = analysis_data['decisionFactors']
-                                    factor_text = ""
-                                    if factors.get('positive'):
-                                        factor_text += f"Положительные: {', '.join(factors['positive'])}; "
-                                    if factors.get('negative'):
-                                        factor_text += f"Отрицательные: {', '.join(factors['negative'])}"
-                                    if factor_text:
-                                        df.at[row_idx, 'Факторы решения'] = factor_text
-                            except Exception as analysis_save_err:
-                                print(f"Предупреждение: не удалось сохранить поля анализа (custom): {analysis_save_err}")
-                            
-                            tags_updated = True
-                            print(f"Теги для звонка {call_id} обновлены: {analysis_data['tags']}")
-                except Exception as tag_error:
-                    print(f"Ошибка при обновлении тегов для звонка {call_id}: {tag_error}")
-                
-                # Формируем результат с расширенными полями анализа
-                # Убедимся, что все ожидаемые ключи есть, иначе используем значения по умолчанию
-                call_result = {
-                    'id': call_id,
-                    'date': call.get('date', 'Нет данных'),
-                    'agent': call.get('agent', 'Не указан'),
-                    'status': analysis_data.get('status', call.get('status', 'требует внимания')),
-                    'duration': call.get('duration', 'Нет данных'),
-                    'transcript_preview': transcript[:150] + '...' if len(transcript) > 150 else transcript,
+                                # Ставим изменения строки в очередь записи в хранилище
+                                result_writer.put(call_id_of(row_idx, row), updates, kind='custom_analysis')
+                                tags_updated = True
+                                print(f"Теги для звонка {call_id} обновлены: {analysis_data['tags']}")
+                    except Exception as tag_error:
+                        print(f"Ошибка при обновлении тегов для звонка {call_id}: {tag_error}")
                     
-                    # Копируем все поля из оригинального звонка
-                    'customer': call.get('customer', ''),
-                    'purpose': call.get('purpose', ''),
-                    'transcription': transcript,
-                    'recordUrl': call.get('recordUrl', ''),
-                    'tag': call.get('tag', ''),
-                    
-                    # Новые поля из структурированного анализа:
-                    'aiSummary': analysis_data.get('keyPoints', 'Нет данных'), 
-                    'keyInsight': analysis_data.get('keyInsight', 'Нет данных'),
-                    'recommendation': analysis_data.get('recommendations', ''),
-                    'score': analysis_data.get('score', 5),
-                    'callType': analysis_data.get('callType', call.get('callType', 'не определен')),
-                    'callResult': analysis_data.get('callResult', 'требует внимания'),
-                    'tags': analysis_data.get('tags', []),
-                    'supportingQuote': '',
-                    'customResponse': analysis_data.get('customResponse', f"Ответ на запрос '{custom_prompt}': {analysis_data.get('keyPoints', 'Информация недоступна')}"),
-                    
-                    # Копируем все остальные поля из анализа в результат
-                    'evaluation': analysis_data.get('evaluation', ''),
-                    'keyPoints': analysis_data.get('keyPoints', ''),
-                    'issues': analysis_data.get('issues', ''),
+                    # Формируем результат с расширенными полями анализа
+                    # Убедимся, что все ожидаемые ключи есть, иначе используем значения по умолчанию
+                    call_result = {
+                        'id': call_id,
+                        'date': call.get('date', 'Нет данных'),
+                        'agent': call.get('agent', 'Не указан'),
+                        'status': analysis_data.get('status', call.get('status', 'требует внимания')),
+                        'duration': call.get('duration', 'Нет данных'),
+                        'transcript_preview': transcript[:150] + '...' if len(transcript) > 150 else transcript,
+                        
+                        # Копируем все поля из оригинального звонка
+                        'customer': call.get('customer', ''),
+                        'purpose': call.get('purpose', ''),
+                        'transcription': transcript,
+                        'recordUrl': call.get('recordUrl', ''),
+                        'tag': call.get('tag', ''),
+                        
+                        # Новые поля из структурированного анализа:
+                        'aiSummary': analysis_data.get('keyPoints', 'Нет данных'), 
+                        'keyInsight': analysis_data.get('keyInsight', 'Нет данных'),
+                        'recommendation': analysis_data.get('recommendations', ''),
+                        'score': analysis_data.get('score', 5),
+                        'callType': analysis_data.get('callType', call.get('callType', 'не определен')),
+                        'callResult': analysis_data.get('callResult', 'требует внимания'),
+                        'tags': analysis_data.get('tags', []),
+                        'supportingQuote': '',
+                        'customResponse': analysis_data.get('customResponse', f"Ответ на запрос '{custom_prompt}': {analysis_data.get('keyPoints', 'Информация недоступна')}"),
+                        
+                        # Копируем все остальные поля из анализа в результат
+                        'evaluation': analysis_data.get('evaluation', ''),
+                        'keyPoints': analysis_data.get('keyPoints', ''),
+                        'issues': analysis_data.get('issues', ''),
+                        
+                        # Специальные поля для дополнительных столбцов
+                        'salesReadiness': analysis_data.get('salesReadiness', 0),
+                        'conversionProbability': analysis_data.get('conversionProbability', 0),
+                        'objections': analysis_data.get('objections', []),
+                        'managerPerformance': analysis_data.get('managerPerformance', {"общая_оценка": 0, "details": "Нет данных"}),
+                        'customerPotential': analysis_data.get('customerPotential', {"score": 0, "reason": "Нет данных"}),
+                        'keyQuestion1Answer': analysis_data.get('keyQuestion1Answer', ''),
+                        'keyQuestion2Answer': analysis_data.get('keyQuestion2Answer', ''),
+                        'keyQuestion3Answer': analysis_data.get('keyQuestion3Answer', ''),
+                        
+                        # Интересы клиента и факторы принятия решения
+                        'clientInterests': analysis_data.get('clientInterests', []),
+                        'decisionFactors': analysis_data.get('decisionFactors', {"positive": [], "negative": []}),
+                        
+                        # Весь анализ для использования в интерфейсе
+                        'analysis': analysis_data
+                    }
                     
-                    # Специальные поля для дополнительных столбцов
-                    'salesReadiness': analysis_data.get('salesReadiness', 0),
-                    'conversionProbability': analysis_data.get('conversionProbability', 0),
-                    'objections': analysis_data.get('objections', []),
-                    'managerPerformance': analysis_data.get('managerPerformance', {"общая_оценка": 0, "details": "Нет данных"}),
-                    'customerPotential': analysis_data.get('customerPotential', {"score": 0, "reason": "Нет данных"}),
-                    'keyQuestion1Answer': analysis_data.get('keyQuestion1Answer', ''),
-                    'keyQuestion2Answer': analysis_data.get('keyQuestion2Answer', ''),
-                    'keyQuestion3Answer': analysis_data.get('keyQuestion3Answer', ''),
+                    # Обновляем 'tags' в исходном объекте call, чтобы они правильно фильтровались
+                    # и отображались в интерфейсе, если tags приходят из анализа
+                    if 'tags' in analysis_data and analysis_data['tags']:
+                         call['tags'] = list(set((call.get('tags', []) if isinstance(call.get('tags'), list) else []) + analysis_data['tags']))
                     
-                    # Интересы клиента и факторы принятия решения
-                    'clientInterests': analysis_data.get('clientInterests', []),
-                    'decisionFactors': analysis_data.get('decisionFactors', {"positive": [], "negative": []}),
+                    # Проверим, что в результате есть обязательные поля для отображения в таблице
+                    if not call_result.get('customResponse'):
+                        call_result['customResponse'] = f"Ответ на запрос '{custom_prompt}': {call_result.get('keyPoints', 'Информация недоступна')}"
+                    if not call_result.get('keyInsight'):
+                        call_result['keyInsight'] = call_result.get('keyPoints', 'Нет данных')
                     
-                    # Весь анализ для использования в интерфейсе
-                    'analysis': analysis_data
-                }
-                
-                # Обновляем 'tags' в исходном объекте call, чтобы они правильно фильтровались
-                # и отображались в интерфейсе, если tags приходят из анализа
-                if 'tags' in analysis_data and analysis_data['tags']:
-                     call['tags'] = list(set((call.get('tags', []) if isinstance(call.get('tags'), list) else []) + analysis_data['tags']))
-                
-                # Добавляем результат в список
-                results.append(call_result)
-                print(f"Звонок {call_id} успешно проанализирован (структурированные данные)")
-            except Exception as e:
-                print(f"Ошибка при анализе звонка {call_id} (структурирование): {str(e)}")
-                traceback.print_exc()
+                    print(f"Звонок {call_id} успешно проанализирован (структурированные данные)")
+                    yield call_result
+                except Exception as e:
+                    print(f"Ошибка при анализе звонка {call_id} (структурирование): {str(e)}")
+                    traceback.print_exc()
         
-        # Сохраняем обновленный DataFrame в Excel, если были изменения
-        if tags_updated:
+        def summary_of(results):
+            """Итоговый текст анализа и полный список доступных тегов"""
+            # Формируем итоговый ответ
+            total_analyzed = len(results)
+            
+            summary = f"{filter_context}Проанализировано {total_analyzed} из {total_filtered} звонков, отвечающих критериям фильтрации."
+            
+            # Получаем уникальные теги из проанализированных звонков
+            all_tags = []
+            for call in results:
+                if 'tags' in call:
+                    all_tags.extend(call['tags'])
+            
+            unique_tags = list(set(all_tags))
+            if unique_tags:
+                summary += f" Основные теги: {', '.join(unique_tags[:5])}"
+            
+            print(f"Анализ завершен. Итоговый ответ: {summary}")
+            
+            # Получаем полный список доступных тегов для обновления интерфейса
+            available_tags, tag_counts = [], {}
             try:
-                df.to_excel(EXCEL_FILE, index=False)
-                print(f"Excel файл обновлен с новыми тегами")
-            except Exception as save_error:
-                print(f"Ошибка при сохранении Excel файла: {save_error}")
+                available_tags, tag_counts = all_tags_with_counts()
+            except Exception as tags_error:
+                print(f"Ошибка при получении тегов: {tags_error}")
                 traceback.print_exc()
         
-        if not results:
-            return jsonify({'result': 'Не удалось проанализировать ни один звонок. Пожалуйста, проверьте запрос и транскрипции.'})
-        
-        # Формируем итоговый ответ
-        total_analyzed = len(results)
-        total_filtered = len(filtered_calls)
-        
-        summary = f"{filter_context}Проанализировано {total_analyzed} из {total_filtered} звонков, отвечающих критериям фильтрации."
+            return {'result': summary, 'availableTags': available_tags, 'tagCounts': tag_counts}
         
-        # Получаем уникальные теги из проанализированных звонков
-        all_tags = []
-        for call in results:
-            if 'tags' in call:
-                all_tags.extend(call['tags'])
+        # format=ndjson - каждый результат отправляется строкой сразу после анализа, последняя строка - итог
+        if wants_ndjson():
+            def stream():
+                results = []
+                try:
+                    for call_result in analyzed_calls():
+                        results.append(call_result)
+                        yield call_result
+                finally:
+                    result_writer.flush()
+                if results:
+                    yield summary_of(results)
+                else:
+                    yield {'result': 'Не удалось проанализировать ни один звонок. Пожалуйста, проверьте запрос и транскрипции.'}
+            return ndjson_response(stream(), flush_bytes=0)
         
-        unique_tags = list(set(all_tags))
-        if unique_tags:
-            summary += f" Основные теги: {', '.join(unique_tags[:5])}"
+        results = list(analyzed_calls())
         
-        print(f"Анализ завершен. Итоговый ответ: {summary}")
+        if tags_updated:
+            result_writer.flush()
+            print("Хранилище обновлено с новыми тегами")
         
-        # Получаем полный список доступных тегов для обновления интерфейса
-        available_tags = []
-        try:
-            tags_response = get_all_tags()
-            if isinstance(tags_response, tuple):
-                tags_data = tags_response[0].get_json()
-            else:
-                tags_data = tags_response.get_json()
-            available_tags = tags_data.get('tags', [])
-        except Exception as tags_error:
-            print(f"Ошибка при получении тегов: {tags_error}")
-            traceback.print_exc()
+        if not results:
+            return jsonify({'result': 'Не удалось проанализировать ни один звонок. Пожалуйста, проверьте запрос и транскрипции.'})
         
-        # Проверяем, что в ответе есть все нужные поля для отображения в таблице
         print(f"Результаты для отправки клиенту: {len(results)} звонков с полным анализом")
-        for idx, call_result in enumerate(results):
-            # Проверим, что в каждом результате есть обязательные поля
-            if 'customResponse' not in call_result or not call_result['customResponse']:
-                results[idx]['customResponse'] = f"Ответ на запрос '{custom_prompt}': {call_result.get('keyPoints', 'Информация недоступна')}"
-            if 'keyInsight' not in call_result or not call_result['keyInsight']:
-                results[idx]['keyInsight'] = call_result.get('keyPoints', 'Нет данных')
-                
+        summary = summary_of(results)
         return jsonify({
-            'result': summary,
+            'result': summary['result'],
             'calls': results,
-            'availableTags': available_tags
+            'availableTags': summary['availableTags']
         })
         
     except Exception as e:
@@ -1795,76 +2007,8 @@ def custom_analyze():
         print(error_msg)
         traceback.print_exc()
         return jsonify({'error': error_msg}), 500
-
-# Функция для фильтрации по длительности звонка
-def filter_by_duration(calls, min_seconds, max_seconds):
-    filtered = []
-    
-    for call in calls:
-        duration = call.get('duration', '')
-        if not duration:
-            continue
-        
-        seconds = 0
-        try:
-            if isinstance(duration, str):
-                # Парсинг формата "Xм Yс"
-                min_match = re.search(r'(\d+)м', duration)
-                sec_match = re.search(r'(\d+)с', duration)
-                
-                minutes = int(min_match.group(1)) if min_match else 0
-                secs = int(sec_match.group(1)) if sec_match else 0
-                seconds = minutes * 60 + secs
-            elif isinstance(duration, (int, float)):
-                seconds = int(duration)
-        except Exception as e:
-            print(f"Ошибка при парсинге длительности '{duration}': {e}")
-            continue
-        
-        if min_seconds <= seconds < max_seconds:
-            filtered.append(call)
-    
-    return filtered
-
-# Функция для фильтрации по тегу
-def filter_by_tag(calls, tag):
-    filtered = []
-    tag = tag.lower()
-    
-    for call in calls:
-        # Проверяем массив тегов
-        if call.get('tags') and isinstance(call.get('tags'), list):
-            if any(t.lower() == tag for t in call['tags']):
-                filtered.append(call)
-                continue
-        
-        # Проверяем тег как JSON-строку
-        if call.get('tags') and isinstance(call.get('tags'), str):
-            try:
-                # Попытка разобрать JSON
-                import json
-                tags_list = json.loads(call['tags'])
-                if isinstance(tags_list, list) and any(tag in str(t).lower() for t in tags_list):
-                    filtered.append(call)
-                    continue
-            except:
-                # Если не удалось разобрать как JSON, ищем как в обычной строке
-                if tag in call['tags'].lower():
-                    filtered.append(call)
-                    continue
-        
-        # Проверяем одиночный тег
-        if call.get('tag') and call['tag'].lower() == tag:
-            filtered.append(call)
-            continue
-        
-        # Проверяем через функцию извлечения тегов
-        call_tags = extract_tags_from_analysis(call)
-        if any(t.lower() == tag for t in call_tags):
-            call['tags'] = call_tags  # Сохраняем теги в звонке для будущего использования
-            filtered.append(call)
-    
-    return filtered
+    finally:
+        result_writer.flush()
 
 def handle_cors_options():
     response = jsonify({})
@@ -1874,142 +2018,29 @@ def handle_cors_options():
     response.headers.add("Access-Control-Allow-Credentials", "true")
     return response
 
-# Вспомогательные функции для парсинга сложных полей из Excel
-def _parse_manager_performance(value):
-    """Парсинг поля 'Оценка менеджера'"""
-    if not value or value == '' or value == 'nan':
-        return None
-    try:
-        # Если это строка вида "8/10", извлекаем число
-        if isinstance(value, str) and '/10' in value:
-            score = int(value.split('/')[0])
-            return {"общая_оценка": score, "details": f"Оценка: {score}/10"}
-        elif isinstance(value, (int, float)):
-            return {"общая_оценка": int(value), "details": f"Оценка: {int(value)}/10"}
-    except:
-        pass
-    return None
-
-def _parse_client_interests(value):
-    """Парсинг поля 'Интересы клиента'"""
-    if not value or value == '' or value == 'nan':
-        return []
-    try:
-        # Разделяем по запятой и очищаем
-        interests = [interest.strip() for interest in str(value).split(',') if interest.strip()]
-        return interests
-    except:
-        return []
-
-def _parse_decision_factors(value):
-    """Парсинг поля 'Факторы решения'"""
-    if not value or value == '' or value == 'nan':
-        return {"positive": [], "negative": []}
-    try:
-        factors = {"positive": [], "negative": []}
-        text = str(value)
-        
-        # Ищем положительные факторы
-        if "Положительные:" in text:
-            pos_part = text.split("Положительные:")[1]
-            if "Отрицательные:" in pos_part:
-                pos_part = pos_part.split("Отрицательные:")[0]
-            pos_part = pos_part.strip().rstrip(';').strip()
-            if pos_part:
-                factors["positive"] = [f.strip() for f in pos_part.split(',') if f.strip()]
-        
-        # Ищем отрицательные факторы
-        if "Отрицательные:" in text:
-            neg_part = text.split("Отрицательные:")[1].strip()
-            if neg_part:
-                factors["negative"] = [f.strip() for f in neg_part.split(',') if f.strip()]
-        
-        return factors
-    except:
-        return {"positive": [], "negative": []}
-
-def _parse_tags(value):
-    """Парсинг JSON тегов"""
-    if not value or value == '' or value == 'nan':
-        return []
-    try:
-        import json
-        return json.loads(str(value))
-    except:
-        # Если не JSON, возвращаем как список с одним элементом
-        return [str(value)] if str(value) else []
-
-def _safe_numeric(value, default=0):
-    """Безопасно преобразует значение в число, заменяя NaN и None на default"""
-    try:
-        if pd.isna(value) or value is None:
-            return default
-        
-        # Попытка преобразования в число
-        if isinstance(value, (int, float)):
-            # Проверяем на NaN для float
-            if pd.isna(value):
-                return default
-            return value
-        
-        # Если строка, пытаемся парсить
-        if isinstance(value, str):
-            value = value.strip()
-            if not value:
-                return default
-            
-            # Пытаемся извлечь число из строки (например "5/10" -> 5)
-            if '/' in value:
-                value = value.split('/')[0]
-            
-            return float(value)
-        
-        return default
-    except (ValueError, TypeError, AttributeError):
-        return default
-
-def _format_audio_duration(duration_seconds):
-    """Форматирует длительность в секундах в формат MM:SS"""
-    if not duration_seconds or duration_seconds == 0:
-        return ""
-    try:
-        duration = float(duration_seconds)
-        minutes = int(duration // 60)
-        seconds = int(duration % 60)
-        return f"{minutes:02d}:{seconds:02d}"
-    except:
-        return ""
-
-def _calculate_transcript_length(transcript):
-    """Подсчитывает количество символов в транскрипции"""
-    if not transcript or transcript in ['-', 'nan', '']:
-        return 0
-    return len(str(transcript).strip())
-
-def get_calls_data():
-    # Здесь должна быть реализация получения данных о звонках из базы данных или другого источника
-    # На данный момент мы используем данные из Excel файла
-    df = pd.read_excel(EXCEL_FILE)
-    calls = []
+def iter_calls_data(df=None):
+    """Звонки общего кэша (или его выборки df) с транскрипциями по одному (строки не накапливаются в памяти)"""
+    if df is None:
+        df = load_or_get_calls_df()
+    texts = transcripts()
     for idx, row in df.iterrows():
-        calls.append({
-            'id': str(idx),
+        yield {
+            'id': call_id_of(idx, row),
             'agent': 'Оператор',
             'customer': str(row.get('Номер телефона', 'Неизвестный клиент')),
             'date': row.get('date', datetime.now().strftime('%d.%m.%Y')),
             'time': row.get('time', datetime.now().strftime('%H:%M')),
-            'duration': str(row.get('lanth', '0.00')),
+            'duration': format_duration(row.get(DURATION_SECONDS_COLUMN)),
             'status': str(row.get('Дозвон/Недозвон', '')),
-            'transcript': str(row.get('Транскрибация', '-')),
-            'transcription': str(row.get('Транскрибация', '-')),  # Для совместимости оставляем оба поля
+            'transcript': str(texts.get(idx, '-')),
+            'transcription': str(texts.get(idx, '-')),  # Для совместимости оставляем оба поля
             'recordUrl': str(row.get('Ссылка на запись', '')),
             'tag': str(row.get('Tag', '')),
             'aiSummary': '',
             'keyInsight': '',
             'recommendation': '',
             'score': 0
-        })
-    return calls
+        }
 
 # Функция для анализа транскрипции звонка с пользовательским запросом
 def custom_analyze_transcript(transcript, query):
@@ -2247,13 +2278,14 @@ def custom_analyze_transcript(transcript, query):
 # Функция для базового анализа, когда API недоступно
 def basic_analysis_dict(transcript, query):
     """Базовый анализ транскрипции без использования LLM"""
-    transcript_lower = transcript.lower()
+    # Все ключевые слова ищутся одним проходом по транскрипции (вектор совпадений кэшируется)
+    hits = KEYWORDS.hits(transcript)
     
     # Определяем основные характеристики звонка
-    is_greeting = "здравствуйте" in transcript_lower or "добрый день" in transcript_lower
-    is_sales = "купить" in transcript_lower or "цена" in transcript_lower or "стоимость" in transcript_lower
-    is_complaint = "проблема" in transcript_lower or "не работает" in transcript_lower or "жалоба" in transcript_lower
-    is_question = "подскажите" in transcript_lower or "вопрос" in transcript_lower
+    is_greeting = KEYWORDS.found(hits, 'greeting')
+    is_sales = KEYWORDS.found(hits, 'sales')
+    is_complaint = KEYWORDS.found(hits, 'complaint')
+    is_question = KEYWORDS.found(hits, 'question')
     
     # Формируем теги
     tags = []
@@ -2274,7 +2306,7 @@ def basic_analysis_dict(transcript, query):
     evaluation = "нейтральная"
     if is_complaint:
         evaluation = "негативная"
-    elif is_sales and "спасибо" in transcript_lower:
+    elif is_sales and KEYWORDS.found(hits, 'thanks'):
         evaluation = "позитивная"
     
     # Определяем готовность к продаже и вероятность конверсии
@@ -2282,10 +2314,10 @@ def basic_analysis_dict(transcript, query):
     conversion_probability = 50  # среднее значение по умолчанию
     
     if is_sales:
-        if "спасибо" in transcript_lower or "договорились" in transcript_lower:
+        if KEYWORDS.found(hits, 'agreement'):
             sales_readiness = 8
             conversion_probability = 80
-        elif "подумаю" in transcript_lower or "перезвоните" in transcript_lower:
+        elif KEYWORDS.found(hits, 'postpone'):
             sales_readiness = 4
             conversion_probability = 30
     elif is_complaint:
@@ -2294,11 +2326,11 @@ def basic_analysis_dict(transcript, query):
     
     # Определяем возможные возражения
     objections = []
-    if "дорого" in transcript_lower:
+    if KEYWORDS.found(hits, 'expensive'):
         objections.append("Цена слишком высокая")
-    if "не уверен" in transcript_lower or "подумаю" in transcript_lower:
+    if KEYWORDS.found(hits, 'unsure'):
         objections.append("Требуется время на размышление")
-    if "конкурент" in transcript_lower:
+    if KEYWORDS.found(hits, 'competitor'):
         objections.append("Упоминание конкурентов")
     
     # Оценка менеджера
@@ -2334,15 +2366,15 @@ def basic_analysis_dict(transcript, query):
     # Определяем клиентские интересы
     client_interests = []
     
-    if "товар" in transcript_lower or "продукт" in transcript_lower:
+    if KEYWORDS.found(hits, 'interest_product'):
         client_interests.append("Товар/продукт")
-    if "цен" in transcript_lower or "стоимост" in transcript_lower:
+    if KEYWORDS.found(hits, 'interest_price'):
         client_interests.append("Ценовые условия")
-    if "доставк" in transcript_lower or "отправк" in transcript_lower:
+    if KEYWORDS.found(hits, 'interest_delivery'):
         client_interests.append("Условия доставки")
-    if "качеств" in transcript_lower:
+    if KEYWORDS.found(hits, 'interest_quality'):
         client_interests.append("Качество продукта")
-    if "срок" in transcript_lower:
+    if KEYWORDS.found(hits, 'interest_terms'):
         client_interests.append("Сроки")
     
     # Определяем факторы принятия решения
@@ -2352,23 +2384,23 @@ def basic_analysis_dict(transcript, query):
     }
     
     # Положительные факторы
-    if "хорош" in transcript_lower or "нравится" in transcript_lower:
+    if KEYWORDS.found(hits, 'positive'):
         decision_factors["positive"].append("Положительная оценка продукта")
-    if "подход" in transcript_lower and ("хорош" in transcript_lower or "нравится" in transcript_lower):
+    if KEYWORDS.found(hits, 'suitable') and KEYWORDS.found(hits, 'positive'):
         decision_factors["positive"].append("Подходящие условия")
-    if "скидк" in transcript_lower:
+    if KEYWORDS.found(hits, 'discount'):
         decision_factors["positive"].append("Наличие скидки")
-    if "быстр" in transcript_lower and "доставк" in transcript_lower:
+    if KEYWORDS.found(hits, 'fast') and KEYWORDS.found(hits, 'delivery'):
         decision_factors["positive"].append("Быстрая доставка")
     
     # Отрицательные факторы
-    if "дорого" in transcript_lower:
+    if KEYWORDS.found(hits, 'expensive'):
         decision_factors["negative"].append("Высокая цена")
-    if "долго" in transcript_lower:
+    if KEYWORDS.found(hits, 'slow'):
         decision_factors["negative"].append("Длительное время ожидания")
-    if "не уверен" in transcript_lower or "подумаю" in transcript_lower:
+    if KEYWORDS.found(hits, 'unsure'):
         decision_factors["negative"].append("Неуверенность в необходимости")
-    if "не устраивает" in transcript_lower:
+    if KEYWORDS.found(hits, 'unsatisfied'):
         decision_factors["negative"].append("Неподходящие условия")
     
     # Формируем ответ на запрос пользователя
@@ -2403,7 +2435,7 @@ def basic_analysis_dict(transcript, query):
     key_question2_answer = "Явных проблем в звонке не выявлено."
     if is_complaint:
         key_question2_answer = "В звонке выявлены проблемы или жалобы клиента."
-    elif "дорого" in transcript_lower:
+    elif KEYWORDS.found(hits, 'expensive'):
         key_question2_answer = "Клиент высказал возражение по цене."
     
     key_question3_answer = "Рекомендуется следовать стандартному скрипту."
@@ -2448,638 +2480,50 @@ def basic_analysis_dict(transcript, query):
         "decisionFactors": decision_factors
     }
 
-# Функция для извлечения структурированных данных из текстового ответа LLM
-def extract_structured_data(text, query):
-    """
-    Извлекает структурированные данные из текстового ответа LLM, если JSON не удалось распарсить
-    """
-    result = {
-        "evaluation": "нейтральная",
-        "keyPoints": "",
-        "issues": "",
-        "recommendations": "",
-        "tags": [],
-        "customResponse": f"Ответ на запрос '{query}': ",
-        "salesReadiness": 5,
-        "conversionProbability": 50,
-        "objections": [],
-        "managerPerformance": {"общая_оценка": 5, "details": "Информация недоступна"},
-        "customerPotential": {"score": 5, "reason": "Информация недоступна"},
-        "keyQuestion1Answer": "",
-        "keyQuestion2Answer": "",
-        "keyQuestion3Answer": "",
-        "callType": "не определен",
-        "callResult": "требует внимания",
-        "status": "требует внимания",
-        "score": 5,
-        "keyInsight": "",
-        "clientInterests": [],
-        "decisionFactors": {
-            "positive": [],
-            "negative": []
-        }
-    }
-    
-    # Ищем оценку звонка
-    evaluation_patterns = [
-        r'["\']?evaluation["\']?\s*:?\s*["\']([^"\']+)["\']',
-        r'оценка\s*:?\s*([^\n.,]+)',
-        r'звонок\s+прошел\s+([^\n.,]+)'
-    ]
-    
-    for pattern in evaluation_patterns:
-        match = re.search(pattern, text, re.IGNORECASE)
-        if match:
-            result["evaluation"] = match.group(1).strip().lower()
-            break
-    
-    # Ищем ключевые моменты
-    key_points_patterns = [
-        r'["\']?keyPoints["\']?\s*:?\s*["\']([^"\']+)["\']',
-        r'ключевые\s+моменты\s*:?\s*([^\n]+)',
-        r'основные\s+моменты\s*:?\s*([^\n]+)'
-    ]
-    
-    for pattern in key_points_patterns:
-        match = re.search(pattern, text, re.IGNORECASE)
-        if match:
-            result["keyPoints"] = match.group(1).strip()
-            break
-    
-    # Ищем проблемы
-    issues_patterns = [
-        r'["\']?issues["\']?\s*:?\s*["\']([^"\']+)["\']',
-        r'проблемы\s*:?\s*([^\n]+)',
-        r'сложности\s*:?\s*([^\n]+)'
-    ]
-    
-    for pattern in issues_patterns:
-        match = re.search(pattern, text, re.IGNORECASE)
-        if match:
-            result["issues"] = match.group(1).strip()
-            break
-    
-    # Ищем рекомендации
-    recommendations_patterns = [
-        r'["\']?recommendations["\']?\s*:?\s*["\']([^"\']+)["\']',
-        r'рекомендации\s*:?\s*([^\n]+)',
-        r'советы\s*:?\s*([^\n]+)'
-    ]
-    
-    for pattern in recommendations_patterns:
-        match = re.search(pattern, text, re.IGNORECASE)
-        if match:
-            result["recommendations"] = match.group(1).strip()
-            break
-    
-    # Ищем теги
-    tags_patterns = [
-        r'["\']?tags["\']?\s*:?\s*\[(.*?)\]',
-        r'теги\s*:?\s*\[(.*?)\]',
-        r'теги\s*:?\s*([^\n]+)'
-    ]
-    
-    for pattern in tags_patterns:
-        match = re.search(pattern, text, re.IGNORECASE | re.DOTALL)
-        if match:
-            tags_text = match.group(1).strip()
-            # Обрабатываем разные форматы тегов
-            if "," in tags_text:
-                # Список тегов разделенных запятыми
-                tags = [t.strip().strip('"\'') for t in tags_text.split(",")]
-            else:
-                # Разделение по пробелам если нет запятых
-                tags = [t.strip().strip('"\'') for t in tags_text.split()]
-            
-            result["tags"] = [tag for tag in tags if tag]
-            break
-    
-    # Если не удалось найти теги, добавляем стандартные
-    if not result["tags"]:
-        result["tags"] = ["анализ", "неструктурированный_ответ"]
-    
-    # Ищем прямой ответ на запрос пользователя
-    custom_response_patterns = [
-        r'["\']?customResponse["\']?\s*:?\s*["\']([^"\']+)["\']',
-        r'ответ\s+на\s+запрос\s*:?\s*([^\n]+)',
-        r'ответ\s*:?\s*([^\n]+)'
-    ]
-    
-    for pattern in custom_response_patterns:
-        match = re.search(pattern, text, re.IGNORECASE)
-        if match:
-            result["customResponse"] = match.group(1).strip()
-            break
-    
-    # Добавим поиск для salesReadiness - готовность к продаже
-    sales_readiness_patterns = [
-        r'["\']?salesReadiness["\']?\s*:?\s*(\d+)',
-        r'готовность\s+к\s+продаже\s*:?\s*(\d+)'
-    ]
-    
-    for pattern in sales_readiness_patterns:
-        match = re.search(pattern, text, re.IGNORECASE)
-        if match:
-            try:
-                readiness = int(match.group(1).strip())
-                if 0 <= readiness <= 10:
-                    result["salesReadiness"] = readiness
-            except:
-                pass
-            break
-    
-    # Вероятность конверсии
-    conversion_patterns = [
-        r'["\']?conversionProbability["\']?\s*:?\s*(\d+)',
-        r'вероятность\s+конверсии\s*:?\s*(\d+)'
-    ]
-    
-    for pattern in conversion_patterns:
-        match = re.search(pattern, text, re.IGNORECASE)
-        if match:
-            try:
-                probability = int(match.group(1).strip())
-                if 0 <= probability <= 100:
-                    result["conversionProbability"] = probability
-            except:
-                pass
-            break
-    
-    # Ищем статус звонка
-    status_patterns = [
-        r'["\']?status["\']?\s*:?\s*["\']([^"\']+)["\']',
-        r'статус\s*:?\s*([^\n.,]+)',
-        r'статус звонка\s*:?\s*([^\n.,]+)'
-    ]
-    
-    for pattern in status_patterns:
-        match = re.search(pattern, text, re.IGNORECASE)
-        if match:
-            status = match.group(1).strip().lower()
-            # Нормализуем значение
-            if "успеш" in status:
-                result["status"] = "успешный"
-            elif "неуспеш" in status or "не успеш" in status:
-                result["status"] = "неуспешный"
-            else:
-                result["status"] = "требует внимания"
-            break
-    
-    # Ищем результат звонка
-    result_patterns = [
-        r'["\']?callResult["\']?\s*:?\s*["\']([^"\']+)["\']',
-        r'результат\s*:?\s*([^\n.,]+)',
-        r'результат звонка\s*:?\s*([^\n.,]+)'
-    ]
-    
-    for pattern in result_patterns:
-        match = re.search(pattern, text, re.IGNORECASE)
-        if match:
-            call_result = match.group(1).strip().lower()
-            # Нормализуем значение
-            if "успеш" in call_result:
-                result["callResult"] = "успешный"
-            elif "неуспеш" in call_result or "не успеш" in call_result:
-                result["callResult"] = "неуспешный"
-            else:
-                result["callResult"] = "требует внимания"
-            break
-    
-    # Если статус не найден, используем результат звонка
-    if result["status"] == "требует внимания" and result["callResult"] != "требует внимания":
-        result["status"] = result["callResult"]
-    
-    # Ищем оценку (score)
-    score_patterns = [
-        r'["\']?score["\']?\s*:?\s*(\d+(?:\.\d+)?)',
-        r'оценка\s*:?\s*(\d+(?:\.\d+)?)/10',
-        r'оценка звонка\s*:?\s*(\d+(?:\.\d+)?)'
-    ]
-    
-    for pattern in score_patterns:
-        match = re.search(pattern, text, re.IGNORECASE)
-        if match:
-            try:
-                score = float(match.group(1).strip())
-                # Округляем до целого числа и проверяем диапазон
-                score = round(score)
-                if 0 <= score <= 10:
-                    result["score"] = score
-            except:
-                pass
-            break
-    
-    # Ищем ключевой вывод
-    key_insight_patterns = [
-        r'["\']?keyInsight["\']?\s*:?\s*["\']([^"\']+)["\']',
-        r'ключевой вывод\s*:?\s*([^\n.,]+)',
-        r'главный вывод\s*:?\s*([^\n.,]+)'
-    ]
-    
-    for pattern in key_insight_patterns:
-        match = re.search(pattern, text, re.IGNORECASE)
-        if match:
-            result["keyInsight"] = match.group(1).strip()
-            break
-    
-    # Если ключевой вывод не найден, используем первое предложение из ключевых моментов
-    if not result["keyInsight"] and result["keyPoints"]:
-        sentences = result["keyPoints"].split('. ')
-        if sentences:
-            result["keyInsight"] = sentences[0]
-    
-    # Ищем интересы клиента
-    client_interests_patterns = [
-        r'["\']?clientInterests["\']?\s*:?\s*\[(.*?)\]',
-        r'интересы клиента\s*:?\s*\[(.*?)\]',
-        r'интересы клиента\s*:?\s*([^\n]+)'
-    ]
-    
-    for pattern in client_interests_patterns:
-        match = re.search(pattern, text, re.IGNORECASE | re.DOTALL)
-        if match:
-            interests_text = match.group(1).strip()
-            # Обрабатываем разные форматы записи
-            if "," in interests_text:
-                # Список интересов разделенных запятыми
-                interests = [i.strip().strip('"\'') for i in interests_text.split(",")]
-            else:
-                # Разделение по пробелам если нет запятых
-                interests = [i.strip().strip('"\'') for i in interests_text.split()]
-            
-            result["clientInterests"] = [interest for interest in interests if interest]
-            break
-    
-    # Ищем факторы принятия решения (положительные)
-    positive_factors_patterns = [
-        r'["\']?positive["\']?\s*:?\s*\[(.*?)\]',
-        r'положительные факторы\s*:?\s*\[(.*?)\]',
-        r'положительные факторы\s*:?\s*([^\n]+)',
-        r'что заинтересовало\s*:?\s*([^\n]+)'
-    ]
-    
-    for pattern in positive_factors_patterns:
-        match = re.search(pattern, text, re.IGNORECASE | re.DOTALL)
-        if match:
-            factors_text = match.group(1).strip()
-            # Обрабатываем разные форматы записи
-            if "," in factors_text:
-                # Список факторов разделенных запятыми
-                factors = [f.strip().strip('"\'') for f in factors_text.split(",")]
-            else:
-                # Разделение по пробелам если нет запятых
-                factors = [f.strip().strip('"\'') for f in factors_text.split()]
-            
-            result["decisionFactors"]["positive"] = [factor for factor in factors if factor]
-            break
-    
-    # Ищем факторы принятия решения (отрицательные)
-    negative_factors_patterns = [
-        r'["\']?negative["\']?\s*:?\s*\[(.*?)\]',
-        r'отрицательные факторы\s*:?\s*\[(.*?)\]',
-        r'отрицательные факторы\s*:?\s*([^\n]+)',
-        r'что не устроило\s*:?\s*([^\n]+)'
-    ]
-    
-    for pattern in negative_factors_patterns:
-        match = re.search(pattern, text, re.IGNORECASE | re.DOTALL)
-        if match:
-            factors_text = match.group(1).strip()
-            # Обрабатываем разные форматы записи
-            if "," in factors_text:
-                # Список факторов разделенных запятыми
-                factors = [f.strip().strip('"\'') for f in factors_text.split(",")]
-            else:
-                # Разделение по пробелам если нет запятых
-                factors = [f.strip().strip('"\'') for f in factors_text.split()]
-            
-            result["decisionFactors"]["negative"] = [factor for factor in factors if factor]
-            break
-    
-    # Если не удалось найти значение полей из текста, 
-    # установим их на основе имеющихся данных
-    
-    # Определяем статус по evaluation, если еще нет
-    if result["status"] == "требует внимания" and result["evaluation"]:
-        if result["evaluation"] == "позитивная":
-            result["status"] = "успешный"
-        elif result["evaluation"] == "негативная":
-            result["status"] = "неуспешный"
-    
-    # Определяем результат звонка по статусу, если еще нет
-    if result["callResult"] == "требует внимания" and result["status"] != "требует внимания":
-        result["callResult"] = result["status"]
-    
-    # Если score отсутствует, определяем по статусу
-    if result["score"] == 5:
-        if result["status"] == "успешный":
-            result["score"] = 8
-        elif result["status"] == "неуспешный":
-            result["score"] = 3
-    
-    return result
-
-# Функция для извлечения тегов из анализа звонка
-def extract_tags_from_analysis(call):
-    tags = []
-    
-    # Извлекаем существующие теги
-    if call.get("tags") and isinstance(call["tags"], list):
-        tags.extend(call["tags"])
-    elif call.get("tag"):
-        tags.append(call["tag"])
-    
-    # Добавляем теги на основе статуса звонка
-    status = call.get("callResult", call.get("status", "")).lower()
-    if status:
-        if "успешн" in status:
-            tags.append("успешный")
-        elif "неуспешн" in status:
-            tags.append("неуспешный")
-        elif "отмен" in status:
-            tags.append("отменен")
-    
-    # Добавляем теги на основе длительности
-    duration = call.get("duration", "")
-    if duration:
-        # Преобразуем длительность в секунды
-        seconds = 0
-        try:
-            if isinstance(duration, str):
-                # Парсинг формата "Xм Yс"
-                min_match = re.search(r'(\d+)м', duration)
-                sec_match = re.search(r'(\d+)с', duration)
-                
-                minutes = int(min_match.group(1)) if min_match else 0
-                seconds = int(sec_match.group(1)) if sec_match else 0
-                seconds += minutes * 60
-            elif isinstance(duration, (int, float)):
-                seconds = int(duration)
-        except:
-            pass
-        
-        # Добавляем тег по длительности
-        if seconds > 0:
-            if seconds < 60:
-                tags.append("короткий разговор")
-            elif seconds > 180:
-                tags.append("длинный разговор")
-            else:
-                tags.append("средний разговор")
-    
-    return tags
-
 # --- Новые функции для чата ---
 
 def filter_calls(filters, data_source='all'):
     """Фильтрует DataFrame звонков на основе предоставленных фильтров и источника данных."""
     df = load_or_get_calls_df()
+    spec = chat_filter_spec(filters, data_source)
+    print(f"Фильтрация звонков (источник: {data_source}). Исходное количество: {len(df)}, условия: {spec}")
     
-    # Фильтруем по источнику данных СНАЧАЛА
-    if data_source == 'cloud':
-        # Только облачные записи (Yandex Cloud)
-        df = df[df['Ссылка на запись'].str.contains('storage.yandexcloud.net', na=False)]
-        print(f"Фильтрация по источнику 'cloud': {len(df)} записей")
-    elif data_source == 'local':
-        # Только локальные записи
-        df = df[df['Ссылка на запись'].str.startswith('/api/recordings/', na=False)]
-        print(f"Фильтрация по источнику 'local': {len(df)} записей")
-    else:
-        print(f"Используем все записи (источник: {data_source}): {len(df)} записей")
-    
-    filtered_df = df.copy()
-    
-    print(f"Фильтрация звонков. Исходное количество: {len(filtered_df)}")
-    
-    # Проверяем, есть ли реальные фильтры (не пустые)
-    has_filters = False
-    
-    # Применяем фильтры, если они есть и не пустые
-    if filters:
-        # Фильтр по статусу звонка
-        if filters.get("status") and filters["status"].strip():
-            has_filters = True
-            status_filter = filters["status"].lower()
-            print(f"Применяется фильтр по статусу: {status_filter}")
-            
-            # Проверяем наличие нужных столбцов перед фильтрацией
-            status_mask = pd.Series(False, index=filtered_df.index)
-            
-            # Фильтрация по столбцу "Результат", если он есть
-            if "Результат" in filtered_df.columns:
-                status_mask = status_mask | filtered_df["Результат"].astype(str).str.lower().str.contains(status_filter, na=False)
-            
-            # Фильтрация по столбцу "Статус", если он есть
-            if "Статус" in filtered_df.columns:
-                status_mask = status_mask | filtered_df["Статус"].astype(str).str.lower().str.contains(status_filter, na=False)
-            
-            # Дополнительные проверки для других столбцов, которые могут содержать информацию о статусе
-            if "callResult" in filtered_df.columns:
-                status_mask = status_mask | filtered_df["callResult"].astype(str).str.lower().str.contains(status_filter, na=False)
-            
-            if "status" in filtered_df.columns:
-                status_mask = status_mask | filtered_df["status"].astype(str).str.lower().str.contains(status_filter, na=False)
-            
-            # Дополнительная проверка для столбца Дозвон/Недозвон
-            if "Дозвон/Недозвон" in filtered_df.columns:
-                status_mask = status_mask | filtered_df["Дозвон/Недозвон"].astype(str).str.lower().str.contains(status_filter, na=False)
-            
-            # Применяем созданную маску фильтрации
-            filtered_df = filtered_df[status_mask]
-            print(f"После фильтрации по статусу: {len(filtered_df)} звонков")
-        
-        # Фильтр по оператору
-        if filters.get("operator") and filters["operator"].strip() and filters["operator"].strip().lower() != "оператор":
-            # Пропускаем фильтрацию, если значение - это дефолтное "Оператор"
-            has_filters = True
-            operator_filter = filters["operator"].lower()
-            print(f"Применяется фильтр по оператору: {operator_filter}")
-            
-            # Получаем доступные столбцы для отладки
-            available_columns = [col for col in ["Имя", "agent", "Оператор", "Менеджер"] if col in filtered_df.columns]
-            print(f"Доступные столбцы операторов: {available_columns}")
-            
-            if available_columns:
-                # Проверяем наличие нужных столбцов перед фильтрацией
-                operator_mask = pd.Series(False, index=filtered_df.index)
-                
-                # Фильтрация по столбцу "Имя", если он есть
-                if "Имя" in filtered_df.columns:
-                    operator_mask = operator_mask | filtered_df["Имя"].astype(str).str.lower().str.contains(operator_filter, na=False)
-                
-                # Дополнительные проверки для других столбцов, которые могут содержать информацию об операторе
-                if "agent" in filtered_df.columns:
-                    operator_mask = operator_mask | filtered_df["agent"].astype(str).str.lower().str.contains(operator_filter, na=False)
-                
-                if "Оператор" in filtered_df.columns:
-                    operator_mask = operator_mask | filtered_df["Оператор"].astype(str).str.lower().str.contains(operator_filter, na=False)
-                
-                if "Менеджер" in filtered_df.columns:
-                    operator_mask = operator_mask | filtered_df["Менеджер"].astype(str).str.lower().str.contains(operator_filter, na=False)
-                
-                # Применяем созданную маску фильтрации
-                filtered_df = filtered_df[operator_mask]
-                print(f"После фильтрации по оператору: {len(filtered_df)} звонков")
-            else:
-                print(f"⚠️ Столбцы операторов отсутствуют в данных источника '{data_source}', пропускаем фильтр по оператору")
-        elif filters.get("operator") and filters["operator"].strip().lower() == "оператор":
-            print(f"⚠️ Пропускаем дефолтный фильтр по оператору: '{filters['operator']}'")
-        
-        # Если был применен фильтр по оператору и результат пустой, но есть доступные столбцы
-        elif filters.get("operator") and filters["operator"].strip() and len(filtered_df) == 0:
-            print(f"⚠️ Фильтр по оператору '{filters['operator']}' не дал результатов")
-        
-        # Фильтр по дате
-        if filters.get("date") and filters["date"].strip():
-            has_filters = True
-            date_filter = filters["date"]
-            print(f"Применяется фильтр по дате: {date_filter}")
-            
-            try:
-                # Создаем маску для фильтрации
-                date_mask = pd.Series(False, index=filtered_df.index)
-                
-                # Проверяем наличие столбца date
-                if "date" in filtered_df.columns:
-                    date_mask = date_mask | (filtered_df["date"] == date_filter)
-                
-                # Проверяем другие возможные столбцы с датой
-                if "Дата" in filtered_df.columns:
-                    date_mask = date_mask | (filtered_df["Дата"] == date_filter)
-                
-                # Применяем фильтр по дате
-                filtered_df = filtered_df[date_mask]
-                print(f"После фильтрации по дате: {len(filtered_df)} звонков")
-            except Exception as e:
-                print(f"Ошибка при применении фильтра по дате: {e}")
-        
-        # Фильтр по длительности звонка
-        if filters.get("duration") and filters["duration"].strip():
-            has_filters = True
-            duration_type = filters["duration"]
-            print(f"Применяется фильтр по длительности: {duration_type}")
-            
-            try:
-                # Преобразуем строковое представление длительности в секунды
-                def duration_to_seconds(duration_str):
-                    if pd.isna(duration_str):
-                        return 0
-                    try:
-                        # Для формата "Xм Yс"
-                        minutes = 0
-                        seconds = 0
-                        duration_str = str(duration_str)
-                        if "м" in duration_str:
-                            minutes_match = re.search(r'(\d+)м', duration_str)
-                            if minutes_match:
-                                minutes = int(minutes_match.group(1))
-                        if "с" in duration_str:
-                            seconds_match = re.search(r'(\d+)с', duration_str)
-                            if seconds_match:
-                                seconds = int(seconds_match.group(1))
-                        return minutes * 60 + seconds
-                    except:
-                        # В случае ошибки возвращаем 0
-                        return 0
-                
-                # Убедимся, что у нас есть столбец для фильтрации по длительности
-                has_duration_column = False
-                
-                # Проверяем наличие столбца Длительность
-                if "Длительность" in filtered_df.columns:
-                    has_duration_column = True
-                    # Добавляем столбец с длительностью в секундах
-                    filtered_df['duration_seconds'] = filtered_df['Длительность'].apply(duration_to_seconds)
-                
-                # Проверяем наличие других возможных столбцов с длительностью
-                elif "duration" in filtered_df.columns:
-                    has_duration_column = True
-                    filtered_df['duration_seconds'] = filtered_df['duration'].apply(duration_to_seconds)
-                elif "lanth" in filtered_df.columns:
-                    has_duration_column = True
-                    filtered_df['duration_seconds'] = filtered_df['lanth'].apply(duration_to_seconds)
-                
-                # Применяем фильтр по длительности, если нашли столбец
-                if has_duration_column:
-                    # Применяем фильтр по длительности
-                    if duration_type == "short":  # короткие, до 1 минуты
-                        filtered_df = filtered_df[filtered_df['duration_seconds'] < 60]
-                    elif duration_type == "medium":  # средние, от 1 до 3 минут
-                        filtered_df = filtered_df[(filtered_df['duration_seconds'] >= 60) & (filtered_df['duration_seconds'] <= 180)]
-                    elif duration_type == "long":  # длинные, больше 3 минут
-                        filtered_df = filtered_df[filtered_df['duration_seconds'] > 180]
-                    
-                    # Удаляем временный столбец
-                    filtered_df = filtered_df.drop('duration_seconds', axis=1)
-                    print(f"После фильтрации по длительности: {len(filtered_df)} звонков")
-                else:
-                    print("Предупреждение: не найдено подходящего столбца для фильтрации по длительности")
-            except Exception as e:
-                print(f"Ошибка при применении фильтра по длительности: {e}")
-        
-        # Фильтр по тегам
-        if filters.get("tags") and isinstance(filters["tags"], list) and len(filters["tags"]) > 0:
-            has_filters = True
-            print(f"Применяется фильтр по тегам: {filters['tags']}")
-            
-            try:
-                # Создаем маску для фильтрации
-                tag_mask = pd.Series(False, index=filtered_df.index)
-                
-                for tag in filters["tags"]:
-                    tag_lower = tag.lower()
-                    # Проверяем столбец "Теги" если он есть
-                    if "Теги" in filtered_df.columns:
-                        # Для случая когда теги хранятся в виде строки
-                        tag_mask = tag_mask | filtered_df["Теги"].astype(str).str.lower().str.contains(tag_lower, na=False)
-                    
-                    # Проверяем столбец "Тег" если он есть
-                    if "Тег" in filtered_df.columns:
-                        tag_mask = tag_mask | filtered_df["Тег"].astype(str).str.lower().str.contains(tag_lower, na=False)
-                    
-                    # Проверяем столбец "Tag" если он есть
-                    if "Tag" in filtered_df.columns:
-                        tag_mask = tag_mask | filtered_df["Tag"].astype(str).str.lower().str.contains(tag_lower, na=False)
-                    
-                    # Проверяем столбец "tags" если он есть (для массивов тегов)
-                    if "tags" in filtered_df.columns:
-                        # Если в столбце tags хранятся списки тегов, обрабатываем их особым образом
-                        try:
-                            # Проверка тегов как JSON-строк
-                            def check_tag_in_json(tag_json, search_tag):
-                                if not tag_json or pd.isna(tag_json):
-                                    return False
-                                try:
-                                    import json
-                                    tags_list = json.loads(str(tag_json))
-                                    if isinstance(tags_list, list):
-                                        return any(search_tag in str(t).lower() for t in tags_list)
-                                except:
-                                    return search_tag in str(tag_json).lower()
-                                return False
-                            
-                            # Применяем функцию к каждой строке
-                            json_mask = filtered_df['tags'].apply(lambda x: check_tag_in_json(x, tag_lower))
-                            tag_mask = tag_mask | json_mask
-                        except Exception as tags_error:
-                            print(f"Ошибка при фильтрации по tags как JSON: {tags_error}")
-                            # Запасной вариант - просто проверяем наличие подстроки
-                            tag_mask = tag_mask | filtered_df["tags"].astype(str).str.lower().str.contains(tag_lower, na=False)
-                
-                filtered_df = filtered_df[tag_mask]
-                print(f"После фильтрации по тегам: {len(filtered_df)} звонков")
-            except Exception as e:
-                print(f"Ошибка при применении фильтра по тегам: {e}")
+    try:
+        filtered_df = call_filters.apply(df, spec)
+    except ValueError as e:
+        # Некорректное значение фильтра из чата - отбираем только по источнику
+        print(f"Ошибка в фильтрах чата: {e}")
+        filtered_df = call_filters.apply(df, {'source': data_source})
     
     print(f"Итоговое количество звонков после фильтрации: {len(filtered_df)}")
     
-    # Если нет звонков после фильтрации И были применены фильтры, 
-    # возвращаем исходный DataFrame с пометкой
-    if len(filtered_df) == 0 and has_filters:
+    if len(filtered_df) == 0 and len(spec) > 1:
         print("Предупреждение: после фильтрации не осталось звонков. Возможно, критерии фильтрации слишком строгие.")
     
     return filtered_df
 
+def chat_filter_spec(filters, data_source='all'):
+    """Фильтры чата (status/operator/date/dateFrom/dateTo/duration/tags) -> условия фильтра звонков"""
+    filters = filters or {}
+    spec = {'source': data_source}
+    if (filters.get('status') or '').strip():
+        spec['result'] = filters['status']
+    operator = (filters.get('operator') or '').strip()
+    if operator and operator.lower() != AGENT_NAME.lower():
+        spec['operator'] = operator
+    elif operator:
+        print(f"⚠️ Пропускаем дефолтный фильтр по оператору: '{operator}'")
+    for name in ('date', 'duration'):
+        if (filters.get(name) or '').strip():
+            spec[name] = filters[name]
+    # Диапазон дат (включительно) - двоичный поиск по отсортированному индексу ended_at
+    for param, name in (('dateFrom', 'date_from'), ('dateTo', 'date_to')):
+        if (filters.get(param) or '').strip():
+            spec[name] = filters[param]
+    if isinstance(filters.get('tags'), list) and filters['tags']:
+        spec['tags'] = filters['tags']
+    return spec
+
 def generate_chat_response(message, filtered_calls, limit=5):
     """Генерирует ответ на запрос пользователя на основе отфильтрованных звонков."""
     try:
@@ -3090,8 +2534,8 @@ def generate_chat_response(message, filtered_calls, limit=5):
         if num_filtered == 0:
             return "По вашему запросу не найдено звонков с указанными фильтрами."
         
-        # Берем только первые несколько звонков для анализа
-        calls_sample = filtered_calls.head(limit)
+        # Берем только первые несколько звонков для анализа (с текстами транскрипций)
+        calls_sample = with_transcripts(filtered_calls.head(limit))
         
         # Выводим структуру данных для диагностики
         print(f"Столбцы доступные для анализа: {calls_sample.columns.tolist()}")
@@ -3158,8 +2602,10 @@ def generate_chat_response(message, filtered_calls, limit=5):
                 time = call['Время']
             
             # Длительность
-            duration_fields = ['Длительность', 'duration', 'lanth']
+            duration_fields = ['Длительность', 'duration']
             duration = "Неизвестно"
+            if not pd.isna(call.get(DURATION_SECONDS_COLUMN)):
+                duration = format_duration(call[DURATION_SECONDS_COLUMN])
             for field in duration_fields:
                 if field in call and call[field] and str(call[field]).strip() and str(call[field]).strip().lower() not in ['nan', 'none']:
                     duration = call[field]
@@ -3189,14 +2635,9 @@ def generate_chat_response(message, filtered_calls, limit=5):
                 tag = f"Тег: {call['tag']}\n"
             elif 'Тег' in call and call['Тег'] and str(call['Тег']).strip() and str(call['Тег']).strip().lower() != 'nan':
                 tag = f"Тег: {call['Тег']}\n"
-            elif 'tags' in call and call['tags'] and str(call['tags']).strip() and str(call['tags']).strip().lower() != 'nan':
-                try:
-                    # Попытка распарсить JSON с тегами
-                    tags_json = json.loads(str(call['tags']))
-                    if isinstance(tags_json, list) and tags_json:
-                        tag = f"Теги: {', '.join(tags_json)}\n"
-                except:
-                    tag = f"Теги: {call['tags']}\n"
+            elif call.get(TAG_LIST_COLUMN):
+                # Теги уже разобраны из JSON при загрузке
+                tag = f"Теги: {', '.join(call[TAG_LIST_COLUMN])}\n"
                 
             purpose = ""
             if 'purpose' in call and call['purpose'] and str(call['purpose']).strip() and str(call['purpose']).strip().lower() != 'nan':
@@ -3324,27 +2765,11 @@ def generate_chat_response(message, filtered_calls, limit=5):
                 elif "неуспешн" in status or "недозвон" in status or "отрицательн" in status:
                     unsuccessful_count += 1
                 
-                # Считаем общую длительность
-                try:
-                    duration_str = str(call.get("Длительность", "0"))
-                    minutes = 0
-                    seconds = 0
-                    
-                    if "м" in duration_str:
-                        min_match = re.search(r"(\d+)м", duration_str)
-                        if min_match:
-                            minutes = int(min_match.group(1))
-                    
-                    if "с" in duration_str:
-                        sec_match = re.search(r"(\d+)с", duration_str)
-                        if sec_match:
-                            seconds = int(sec_match.group(1))
-                    
-                    duration_in_seconds = minutes * 60 + seconds
-                    total_duration += duration_in_seconds
+                # Считаем общую длительность (секунды посчитаны при загрузке)
+                duration_in_seconds = call.get(DURATION_SECONDS_COLUMN)
+                if not pd.isna(duration_in_seconds):
+                    total_duration += int(duration_in_seconds)
                     call_count += 1
-                except Exception as duration_error:
-                    print(f"Ошибка при подсчете длительности: {duration_error}")
             
             # Вычисляем среднюю длительность
             if call_count > 0:
@@ -3449,18 +2874,10 @@ def chat():
         # Фильтруем звонки на основе предоставленных фильтров И источника данных
         filtered_calls = filter_calls(filters, data_source)
         
-        # Получаем список всех уникальных тегов для обновления фильтров
-        all_tags = []
+        # Получаем список всех уникальных тегов для обновления фильтров (поиск по индексу тегов)
+        all_tags, tag_counts = [], {}
         try:
-            # Используем функцию get_all_tags для получения тегов
-            tags_response = get_all_tags()
-            if isinstance(tags_response, tuple):
-                # Если ответ содержит статус код (ошибка), берем только первый элемент
-                tags_data = tags_response[0].get_json()
-            else:
-                tags_data = tags_response.get_json()
-            
-            all_tags = tags_data.get('tags', [])
+            all_tags, tag_counts = all_tags_with_counts()
         except Exception as tags_error:
             print(f"Ошибка при получении тегов для чата: {tags_error}")
             # В случае ошибки продолжаем без тегов
@@ -3478,7 +2895,8 @@ def chat():
                 # Возвращаем ответ вместе со списком тегов
                 return jsonify({
                     'reply': response,
-                    'availableTags': all_tags
+                    'availableTags': all_tags,
+                    'tagCounts': tag_counts
                 })
         
         # Генерируем ответ на основе отфильтрованных звонков
@@ -3487,7 +2905,8 @@ def chat():
         # Возвращаем ответ вместе со списком тегов
         return jsonify({
             'reply': response,
-            'availableTags': all_tags
+            'availableTags': all_tags,
+            'tagCounts': tag_counts
         })
     except Exception as e:
         error_trace = traceback.format_exc()
@@ -3498,114 +2917,60 @@ def chat():
 
 # --- Новый эндпоинт для получения всех уникальных тегов ---
 @app.route('/api/get-tags', methods=['GET'])
+@conditional(lambda: store.generation())
 def get_all_tags():
-    """Возвращает список всех уникальных тегов из всех звонков"""
+    """Возвращает список всех уникальных тегов из всех звонков и число звонков с каждым тегом (counts)"""
     try:
-        df = load_or_get_calls_df()
-        
-        # Собираем все теги из различных источников
-        all_tags = set()
-        
-        # Проверяем столбец Tag, если он есть
-        if 'Tag' in df.columns:
-            tag_values = df['Tag'].dropna().unique()
-            for tag in tag_values:
-                if tag and str(tag).strip() and str(tag).strip().lower() != 'nan':
-                    all_tags.add(str(tag).strip())
-        
-        # Проверяем столбец Тег, если он есть
-        if 'Тег' in df.columns:
-            tag_values = df['Тег'].dropna().unique()
-            for tag in tag_values:
-                if tag and str(tag).strip() and str(tag).strip().lower() != 'nan':
-                    all_tags.add(str(tag).strip())
-        
-        # Проверяем столбец tags, если он есть (массивы тегов)
-        if 'tags' in df.columns:
-            for _, row in df.iterrows():
-                tags = row.get('tags')
-                if tags and isinstance(tags, list):
-                    for tag in tags:
-                        if tag and str(tag).strip():
-                            all_tags.add(str(tag).strip())
-                elif tags and isinstance(tags, str):
-                    # Если tags - строка, предполагаем что это может быть сериализованный список
-                    try:
-                        import json
-                        parsed_tags = json.loads(tags)
-                        if isinstance(parsed_tags, list):
-                            for tag in parsed_tags:
-                                if tag and str(tag).strip():
-                                    all_tags.add(str(tag).strip())
-                    except:
-                        # Если не удалось распарсить JSON, используем как обычную строку
-                        if tags.strip():
-                            all_tags.add(tags.strip())
-        
-        # Добавляем стандартные теги из функции анализа, если их еще нет
-        standard_tags = [
-            "ценовое возражение", "упоминание конкурентов", "запрос скидки",
-            "вопрос о доставке", "техническая проблема", "консультация",
-            "жалоба", "успешный", "неуспешный", "короткий разговор", 
-            "длинный разговор", "средний разговор"
-        ]
-        
-        for tag in standard_tags:
-            all_tags.add(tag)
-        
-        # Извлекаем теги из результатов анализа, если они сохранились
-        # Это попытка найти теги, которые были добавлены при анализе, но не сохранены в основных столбцах
-        for _, row in df.iterrows():
-            # Пытаемся найти теги в поле analysis, которое может быть JSON-строкой
-            if 'analysis' in df.columns:
-                analysis = row.get('analysis')
-                if analysis and isinstance(analysis, str):
-                    try:
-                        import json
-                        analysis_data = json.loads(analysis)
-                        if isinstance(analysis_data, dict) and 'tags' in analysis_data:
-                            tags = analysis_data['tags']
-                            if isinstance(tags, list):
-                                for tag in tags:
-                                    if tag and str(tag).strip():
-                                        all_tags.add(str(tag).strip())
-                    except:
-                        pass
-        
-        # Преобразуем набор в список и сортируем
-        tags_list = sorted(list(all_tags))
-        
+        tags_list, counts = all_tags_with_counts()
         print(f"Найдено {len(tags_list)} уникальных тегов для фильтрации")
-        return jsonify({"tags": tags_list})
+        return jsonify({"tags": tags_list, "counts": counts})
     except Exception as e:
         print(f"Ошибка при получении списка тегов: {str(e)}")
         traceback.print_exc()
         return jsonify({"error": str(e)}), 500
 
+# Стандартные теги из функции анализа: показываются в фильтрах, даже если еще не встречались
+STANDARD_TAGS = (
+    "ценовое возражение", "упоминание конкурентов", "запрос скидки",
+    "вопрос о доставке", "техническая проблема", "консультация",
+    "жалоба", "успешный", "неуспешный", "короткий разговор",
+    "длинный разговор", "средний разговор"
+)
+
+def all_tags_with_counts():
+    """(отсортированный список тегов, {тег: число звонков}) по индексу тегов.
+
+    Число звонков - столько же, сколько отберет фильтр по этому тегу (с учетом
+    тегов, выводимых из результата звонка и длительности).
+    """
+    df = load_or_get_calls_df()
+    counts = tag_index.counts(df)
+    known = {tag.lower() for tag in counts}
+    for tag in STANDARD_TAGS:
+        if tag not in known:
+            counts[tag] = 0
+    for tag in counts:
+        if tag.lower() in DERIVED_TAGS:
+            counts[tag] = int(call_filters.mask(df, {'tags': [tag]}).sum())
+    return sorted(counts), counts
+
 # Новый эндпоинт для обновления списка доступных тегов в интерфейсе
 @app.route('/api/refresh-tags', methods=['GET', 'OPTIONS'])
+@conditional(lambda: store.generation())
 def refresh_tags():
     """Обновляет и возвращает список всех уникальных тегов"""
     if request.method == 'OPTIONS':
         return handle_cors_options()
         
     try:
-        # Перезагружаем данные из Excel файла для актуальности
-        global calls_df
-        calls_df = load_calls_from_excel()
-        print(f"Данные перезагружены из Excel, загружено {len(calls_df)} строк")
-        
-        # Получаем обновленный список тегов
-        tags_response = get_all_tags()
-        if isinstance(tags_response, tuple):
-            tags_data = tags_response[0].get_json()
-        else:
-            tags_data = tags_response.get_json()
+        # Кэш звонков сам перечитывает хранилище при изменении его файлов
+        tags_list, counts = all_tags_with_counts()
         
         return jsonify({
             "success": True,
             "message": "Список тегов успешно обновлен",
-            "tags": tags_data.get('tags', [])
+            "tags": tags_list,
+            "counts": counts
         })
     except Exception as e:
         print(f"Ошибка при обновлении списка тегов: {str(e)}")
@@ -3729,15 +3094,11 @@ def basic_preview_analysis(transcriptions):
     """
     Базовый анализ транскрипций без использования LLM
     """
-    # Выделяем ключевые слова для определения контекста
-    combined_text = " ".join(transcriptions).lower()
-    sales_keywords = ["продажа", "купить", "цена", "стоимость", "предложение", "скидка"]
-    support_keywords = ["проблема", "помощь", "техподдержка", "неисправность", "ошибка"]
-    consultation_keywords = ["консультация", "вопрос", "информация", "узнать"]
-    
-    sales_count = sum(word in combined_text for word in sales_keywords)
-    support_count = sum(word in combined_text for word in support_keywords)
-    consultation_count = sum(word in combined_text for word in consultation_keywords)
+    # Выделяем ключевые слова для определения контекста: слово засчитывается, если есть хотя бы в одной транскрипции
+    found = KEYWORDS.hits_any(transcriptions)
+    sales_count = KEYWORDS.present(found, 'preview_sales')
+    support_count = KEYWORDS.present(found, 'preview_support')
+    consultation_count = KEYWORDS.present(found, 'preview_consultation')
     
     # Определяем тип звонков на основе ключевых слов
     if sales_count > support_count and sales_count > consultation_count:
@@ -3816,18 +3177,13 @@ def import_folder():
         if limit:
             audio_files = audio_files[:limit]
         
-        # Загружаем существующий Excel файл
-        df = pd.read_excel(EXCEL_FILE)
-        
-        # Обеспечиваем наличие необходимых колонок
+        # Обеспечиваем наличие необходимых колонок в хранилище
         required_columns = [
             'Ссылка на запись', 'Транскрибация', 'Tag', 'lanth',
             'Дата/Время завершения звонка', 'Цели', 'Дозвон/Недозвон',
             'Статус', 'Тип звонка', 'tags', 'Источник файла'
         ]
-        for col in required_columns:
-            if col not in df.columns:
-                df[col] = ''
+        store.ensure_columns(required_columns)
         
         imported_count = 0
         transcribed_count = 0
@@ -3838,7 +3194,7 @@ def import_folder():
             # Проверяем, не импортирован ли уже этот файл
             record_url = f"/api/recordings/{audio_file['rel_path'].replace(os.sep, '/')}"
             
-            if not df[df['Ссылка на запись'] == record_url].empty:
+            if store.find_id_by_record_url(record_url) is not None:
                 continue  # Файл уже импортирован
             
             # Получаем длительность аудио
@@ -3868,7 +3224,8 @@ def import_folder():
                 'Источник файла': audio_file['name']  # Имя файла для локальных записей
             }
             
-            df = pd.concat([df, pd.DataFrame([new_row])], ignore_index=True)
+            row_id = store.insert_rows([new_row])[0]
+            new_call_id = call_id_of(row_id, store.get_row(row_id))
             imported_count += 1
             
             # Транскрибируем, если нужно
@@ -3876,8 +3233,8 @@ def import_folder():
                 try:
                     # Используем синхронную версию для локальных файлов
                     result = transcribe_local_file_sync(audio_file['full_path'])
-                    df.iloc[-1, df.columns.get_loc('Транскрибация')] = result["text"]
-                    df.iloc[-1, df.columns.get_loc('Tag')] = 'gemini'
+                    new_row['Транскрибация'] = result["text"]
+                    result_writer.put(new_call_id, {'Транскрибация': result["text"], 'Tag': 'gemini'}, kind='transcription')
                     transcribed_count += 1
                     print(f"Файл {audio_file['name']} успешно транскрибирован")
                 except Exception as e:
@@ -3886,61 +3243,58 @@ def import_folder():
             # Анализируем, если нужно и есть транскрипция
             if analyze and transcribe:
                 try:
-                    transcript = df.iloc[-1]['Транскрибация']
+                    transcript = new_row['Транскрибация']
                     if transcript:
                         analysis_result = analyze_transcript(transcript)
                         
                         # Обновляем статус и другие поля
+                        updates = {}
                         if 'status' in analysis_result:
-                            df.iloc[-1, df.columns.get_loc('Статус')] = analysis_result['status']
+                            updates['Статус'] = analysis_result['status']
                         if 'callResult' in analysis_result:
-                            df.iloc[-1, df.columns.get_loc('Дозвон/Недозвон')] = analysis_result['callResult']
+                            updates['Дозвон/Недозвон'] = analysis_result['callResult']
+                        result_writer.put(new_call_id, updates, kind='analysis')
                         
                         analyzed_count += 1
                 except Exception as e:
                     print(f"Ошибка анализа {audio_file['name']}: {str(e)}")
         
-        # Сохраняем изменения
-        try:
-            df.to_excel(EXCEL_FILE, index=False)
-        except Exception as save_err:
-            print(f"Предупреждение: не удалось сохранить Excel немедленно: {save_err}")
-            try:
-                ts = int(time.time())
-                fallback_path = f"DFASDF_imported_{ts}.xlsx"
-                df.to_excel(fallback_path, index=False)
-                print(f"Изменения (импорт) сохранены в новый файл: {fallback_path}")
-            except Exception as fallback_err:
-                print(f"Ошибка резервного сохранения Excel (импорт): {fallback_err}")
+        # Записываем накопленные транскрипции и результаты анализа
+        result_writer.flush()
         
         # После импорта возвращаем ТОЛЬКО импортированные локальные записи
-        # Читаем обновленный Excel и фильтруем локальные файлы
-        df_updated = pd.read_excel(EXCEL_FILE)
+        # Читаем обновленное хранилище и фильтруем локальные файлы
+        df_updated = load_or_get_calls_df()
+        texts = transcripts()
+        local_df = call_filters.apply(df_updated, {'source': 'local'})
+        # Вместо текста транскрипции - длина и начало (полный текст: /api/calls/<id>/transcript)
+        lengths = texts.lengths(local_df.index)
+        previews = texts.previews(local_df.index, TRANSCRIPT_PREVIEW_CHARS)
         local_calls = []
         
-        for idx, row in df_updated.iterrows():
+        for (idx, row), transcript_length, transcript_preview in zip(local_df.iterrows(), lengths, previews):
+            # Локальный файл (ссылка /api/recordings/...) - добавляем в результат
             record_url = str(row.get('Ссылка на запись', ''))
-            if record_url.startswith('/api/recordings/'):
-                # Это локальный файл - добавляем в результат
-                call_data = {
-                    'id': str(idx),
-                    'agent': 'Оператор',
-                    'customer': str(row.get('Номер телефона', '')),
-                    'date': str(row.get('Дата/Время завершения звонка', '')),
-                    'duration': str(row.get('lanth', '0')),
-                    'status': str(row.get('Статус', 'Доступна')),
-                    'recordUrl': record_url,
-                    'transcript': str(row.get('Транскрибация', '')),
-                    'tag': str(row.get('Tag', '')),
-                    'summary': str(row.get('Краткое содержание', '')),
-                    'aiSummary': str(row.get('ИИ Анализ', '')),
-                    'evaluation': str(row.get('Оценка', '')),
-                    'goals': str(row.get('Цели', '')),
-                    'callResult': str(row.get('Дозвон/Недозвон', '')),
-                    'callType': str(row.get('Тип звонка', '')),
-                    'tags': str(row.get('tags', ''))
-                }
-                local_calls.append(call_data)
+            call_data = {
+                'id': call_id_of(idx, row),
+                'agent': 'Оператор',
+                'customer': str(row.get('Номер телефона', '')),
+                'date': str(row.get('Дата/Время завершения звонка', '')),
+                'duration': str(row.get('lanth', '0')),
+                'status': str(row.get('Статус', 'Доступна')),
+                'recordUrl': record_url,
+                'transcriptLength': int(transcript_length),
+                'transcriptPreview': transcript_preview,
+                'tag': str(row.get('Tag', '')),
+                'summary': str(row.get('Краткое содержание', '')),
+                'aiSummary': str(row.get('ИИ Анализ', '')),
+                'evaluation': str(row.get('Оценка', '')),
+                'goals': str(row.get('Цели', '')),
+                'callResult': str(row.get('Дозвон/Недозвон', '')),
+                'callType': str(row.get('Тип звонка', '')),
+                'tags': str(row.get('tags', ''))
+            }
+            local_calls.append(call_data)
         
         return jsonify({
             "success": True,
@@ -3954,6 +3308,8 @@ def import_folder():
     except Exception as e:
         print(f"Ошибка при импорте папки: {str(e)}")
         return jsonify({"error": str(e)}), 500
+    finally:
+        result_writer.flush()
 
 @app.route('/api/recordings/<path:filename>')
 def serve_recording(filename):
@@ -3983,10 +3339,17 @@ def preview_analyze_endpoint():
         data = request.get_json()
         calls = data.get('calls')
         
-        # Если звонки не переданы, получаем из базы данных
+        # Если звонки не переданы, берем первые звонки из базы данных (анализируются максимум 5)
         if not calls:
-            calls = get_calls_data()
-        
+            calls = list(itertools.islice(iter_calls_data(), 5))
+
+        # Список звонков без полей transcription (fields= в /api/calls) - дочитываем тексты из хранилища
+        for call in calls[:5]:
+            if isinstance(call, dict) and 'transcription' not in call and call.get('id'):
+                idx, row = store.find_call(call['id'])
+                if row is not None:
+                    call['transcription'] = str(row.get(TRANSCRIPT_COLUMN, '-'))
+
         # Выполняем предварительный анализ
         result = preview_analyze_calls(calls)
         return jsonify(result)
@@ -3997,10 +3360,9 @@ def preview_analyze_endpoint():
 
 if __name__ == '__main__':
     print("\n=== Запуск API-сервера для работы с реальными данными о звонках ===")
-    print(f"Файл данных: {EXCEL_FILE}")
+    print(f"Хранилище данных: {STORE_FILE}")
     try:
-        df = pd.read_excel(EXCEL_FILE)
-        print(f"Загружено {len(df)} звонков из Excel")
+        print(f"Загружено {store.count()} звонков из хранилища")
     except Exception as e:
-        print(f"Ошибка при загрузке Excel: {str(e)}")
+        print(f"Ошибка при чтении хранилища: {str(e)}")
     app.run(debug=True, port=5000) 
\ No newline at end of file
@@ -0,0 +1,131 @@
+"""Бенчмарк сборки ответа /api/calls: строк в секунду.
+
+Сравнивает прежний построчный обход df.iterrows() с колоночной сборкой
+calls_serializer.serialize_calls на подготовленном DataFrame звонков
+(как в общем кэше сервера) и отдельно показывает сериализацию в JSON.
+Последние строки - ответ из кэша JSON-фрагментов calls_fragments (поля без
+transcription, как запрашивает фронтенд): первый запрос и повторный.
+
+Запуск из корня проекта:
+    python benchmarks/bench_calls_payload.py --rows 10000 100000
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_cold_load import make_calls  # noqa: E402
+from call_store import CallStore  # noqa: E402
+from calls_compact import DURATION_SECONDS_COLUMN, compact_dataframe, format_duration, normalize_calls, parse_tag_list  # noqa: E402
+from calls_fragments import CallFragmentCache  # noqa: E402
+from calls_serializer import (  # noqa: E402
+    CALL_FIELDS, _call_status, _format_audio_duration, _parse_client_interests,
+    _parse_decision_factors, _parse_manager_performance, _safe_numeric, serialize_calls,
+)
+from calls_transcripts import TranscriptStore, _text_length  # noqa: E402
+
+TRANSCRIPT_COLUMN = 'Транскрибация'
+
+
+def make_analyzed_calls(rows):
+    """Звонки с заполненными полями анализа, которые разбирает /api/calls"""
+    df = make_calls(rows)
+    rng = np.random.default_rng(1)
+    df['AI-резюме'] = [f'Клиент интересовался доставкой, звонок {i}' for i in range(rows)]
+    df['Оценка менеджера'] = rng.choice(['8/10', '6/10', '9/10', ''], rows)
+    df['Интересы клиента'] = rng.choice(['цена, доставка', 'скидка', 'сроки, гарантия', ''], rows)
+    df['Факторы решения'] = rng.choice(['Положительные: цена; Отрицательные: сроки', 'Отрицательные: дорого', ''], rows)
+    df['tags'] = rng.choice(['["приветствие", "продажа"]', '["жалоба"]', ''], rows)
+    df['Готовность к продаже'] = rng.integers(0, 11, rows)
+    df['Тип звонка'] = rng.choice(['входящий', 'исходящий'], rows)
+    return df
+
+
+def iterrows_baseline(df, texts):
+    """Прежний способ: все поля звонка считаются внутри df.iterrows()"""
+    calls = []
+    for idx, row in df.iterrows():
+        transcript = texts.get(idx, '-')
+        calls.append({
+            'id': str(row.get('ID звонка') or idx),
+            'customer': str(row.get('Номер телефона', 'Неизвестный клиент')),
+            'date': row.get('date'),
+            'time': row.get('time'),
+            'duration': format_duration(row.get(DURATION_SECONDS_COLUMN)),
+            'status': _call_status(row.get('Дозвон/Недозвон', '')),
+            'purpose': str(row.get('Цели', 'Не указана')),
+            'transcription': str(transcript),
+            'recordUrl': str(row.get('Ссылка на запись', '')),
+            'tag': str(row.get('Tag', '')),
+            'aiSummary': str(row.get('AI-резюме', '')),
+            'score': _safe_numeric(row.get('AI-оценка', 0)),
+            'callType': str(row.get('Тип звонка', '')),
+            'salesReadiness': _safe_numeric(row.get('Готовность к продаже', 0)),
+            'managerPerformance': _parse_manager_performance(row.get('Оценка менеджера', '')),
+            'clientInterests': _parse_client_interests(row.get('Интересы клиента', '')),
+            'decisionFactors': _parse_decision_factors(row.get('Факторы решения', '')),
+            'tags': list(parse_tag_list(row.get('tags', ''))),
+            'audioDuration': _format_audio_duration(row.get(DURATION_SECONDS_COLUMN, 0)),
+            'transcriptLength': _text_length(transcript),
+        })
+    return calls
+
+
+def timed(func, repeat):
+    best, result = None, None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def run(rows, repeat):
+    with tempfile.TemporaryDirectory() as tmp:
+        store = CallStore(os.path.join(tmp, 'calls.db'))
+        store.replace_from_dataframe(make_analyzed_calls(rows))
+        store._snapshot_timer.cancel()
+        store.refresh_snapshot()
+        df = store.load_dataframe(exclude=(TRANSCRIPT_COLUMN,))
+        normalize_calls(df, np.zeros(len(df), dtype=bool))
+        df['date'] = df['Дата/Время завершения звонка'].dt.strftime('%d.%m.%Y')
+        df['time'] = df['Дата/Время завершения звонка'].dt.strftime('%H:%M')
+        compact_dataframe(df)
+        texts = TranscriptStore.load(os.path.join(tmp, 'calls.transcripts'), store, TRANSCRIPT_COLUMN)
+
+        old_elapsed, _ = timed(lambda: iterrows_baseline(df, texts), 1)
+        new_elapsed, calls = timed(lambda: serialize_calls(df, texts), repeat)
+        json_elapsed, _ = timed(lambda: json.dumps({'calls': calls}, ensure_ascii=False), repeat)
+        fields = [field for field in CALL_FIELDS if field != 'transcription']
+        fragments = CallFragmentCache(store, epoch=lambda: 0)
+        snapshot = fragments.snapshot()
+        cold_elapsed, _ = timed(lambda: ','.join(fragments.encode(df, texts, snapshot, fields)), 1)
+        warm_elapsed, _ = timed(lambda: ','.join(fragments.encode(df, texts, snapshot, fields)), repeat)
+        del texts, calls
+
+    print(f"\n{rows} строк")
+    print(f"  {'df.iterrows()':<28} {rows / old_elapsed:12,.0f} строк/с  ({old_elapsed * 1000:.0f} мс)")
+    print(f"  {'serialize_calls':<28} {rows / new_elapsed:12,.0f} строк/с  ({new_elapsed * 1000:.0f} мс)")
+    print(f"  {'json.dumps ответа':<28} {rows / json_elapsed:12,.0f} строк/с  ({json_elapsed * 1000:.0f} мс)")
+    print(f"  {'фрагменты: первый запрос':<28} {rows / cold_elapsed:12,.0f} строк/с  ({cold_elapsed * 1000:.0f} мс)")
+    print(f"  {'фрагменты: повтор':<28} {rows / warm_elapsed:12,.0f} строк/с  ({warm_elapsed * 1000:.0f} мс)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    for rows in args.rows:
+        run(rows, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""Бенчмарк холодной загрузки таблицы звонков.
+
+Сравнивает чтение исходного Excel (pd.read_excel), чтение SQLite-хранилища
+(разбор JSON по строкам) и чтение Parquet-снимка целиком и без Транскрибации.
+
+Запуск из корня проекта:
+    python benchmarks/bench_cold_load.py --rows 10000 100000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from call_store import CallStore  # noqa: E402
+
+
+def make_calls(rows, seed=0):
+    """Синтетическая таблица звонков в формате DFASDF.xlsx"""
+    rng = np.random.default_rng(seed)
+    phrases = [
+        'Оператор: Здравствуйте, компания слушает, чем могу помочь?',
+        'Клиент: Подскажите цену доставки и есть ли скидка на заказ.',
+        'Оператор: Стоимость зависит от объема, могу рассчитать прямо сейчас.',
+        'Клиент: Дороговато, я подумаю и перезвоню позже.',
+    ]
+    transcripts = [
+        '-' if i % 4 == 0 else ' '.join(phrases[j % len(phrases)] for j in range(i % 12 + 4))
+        for i in range(rows)
+    ]
+    return pd.DataFrame({
+        'Номер телефона': [f'7701{i:07d}' for i in range(rows)],
+        'Дата/Время завершения звонка': pd.date_range('2025-05-01', periods=rows, freq='7min'),
+        'lanth': rng.integers(5, 1500, rows) / 100,
+        'Дозвон/Недозвон': rng.choice(['doz', 'nedoz'], rows),
+        'Транскрибация': transcripts,
+        'Ссылка на запись': [f'https://storage.yandexcloud.net/rec/{i}.mp3' for i in range(rows)],
+        'Tag': rng.choice(['groq', 'gemini', None], rows),
+        'Статус': rng.choice(['успешный', 'неуспешный', 'требует внимания'], rows),
+        # Смешанные типы, как после сохранения результатов анализа
+        'AI-оценка': [int(v) if v % 3 else '' for v in rng.integers(1, 11, rows)],
+        'Цели': 'продажа',
+    })
+
+
+def timed(func, repeat=3):
+    best = None
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def run(rows, skip_excel):
+    df = make_calls(rows)
+    with tempfile.TemporaryDirectory() as tmp:
+        results = []
+        if not skip_excel:
+            excel_path = os.path.join(tmp, 'calls.xlsx')
+            df.to_excel(excel_path, index=False)
+            elapsed, _ = timed(lambda: pd.read_excel(excel_path), repeat=1)
+            results.append(('Excel (pd.read_excel)', elapsed))
+
+        store = CallStore(os.path.join(tmp, 'calls.db'))
+        store.replace_from_dataframe(df)
+        # Таймер фонового обновления снимка не нужен: перестраиваем снимок явно
+        store._snapshot_timer.cancel()
+        elapsed, _ = timed(store._load_from_db)
+        results.append(('SQLite (JSON по строкам)', elapsed))
+
+        store.refresh_snapshot()
+        elapsed, _ = timed(store.load_dataframe)
+        results.append(('Parquet-снимок, все колонки', elapsed))
+        elapsed, light = timed(lambda: store.load_dataframe(exclude=('Транскрибация',)))
+        results.append(('Parquet-снимок без Транскрибации', elapsed))
+        assert 'Транскрибация' not in light.columns and len(light) == rows
+
+    print(f"\n{rows} строк")
+    for name, elapsed in results:
+        print(f"  {name:<36} {elapsed * 1000:10.1f} мс")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000])
+    parser.add_argument('--skip-excel', action='store_true', help='не измерять pd.read_excel (долго на 100k)')
+    args = parser.parse_args()
+    for rows in args.rows:
+        run(rows, args.skip_excel)
+
+
+if __name__ == '__main__':
+    main()
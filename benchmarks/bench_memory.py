@@ -0,0 +1,70 @@
+"""Память таблицы звонков в процессе: до и после компактного представления.
+
+"До" - DataFrame из хранилища как раньше (все колонки object, транскрипции
+внутри DataFrame). "После" - low-cardinality колонки в category, lanth
+переведен в секунды (duration_sec), транскрипции в отображенном в память
+Arrow-файле (TranscriptStore) вне DataFrame.
+
+Запуск из корня проекта:
+    python benchmarks/bench_memory.py --rows 100000
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_cold_load import make_calls  # noqa: E402
+from call_store import CallStore  # noqa: E402
+from calls_compact import DURATION_SECONDS_COLUMN, compact_dataframe, duration_seconds, memory_report  # noqa: E402
+from calls_transcripts import TranscriptStore  # noqa: E402
+
+TRANSCRIPT_COLUMN = 'Транскрибация'
+
+
+def mb(size):
+    return f"{size / 1024 / 1024:8.1f} МБ"
+
+
+def run(rows, top):
+    with tempfile.TemporaryDirectory() as tmp:
+        store = CallStore(os.path.join(tmp, 'calls.db'))
+        store.replace_from_dataframe(make_calls(rows))
+        store._snapshot_timer.cancel()
+        store.refresh_snapshot()
+
+        before = store.load_dataframe()
+        before_report = memory_report(before)
+
+        after = store.load_dataframe(exclude=(TRANSCRIPT_COLUMN,))
+        after[DURATION_SECONDS_COLUMN] = duration_seconds(after['lanth'], after['Ссылка на запись'])
+        compact_dataframe(after)
+        after_report = memory_report(after)
+        texts = TranscriptStore.load(os.path.join(tmp, 'calls.transcripts'), store, TRANSCRIPT_COLUMN)
+        assert texts.get(before.index[1]) == before.loc[before.index[1], TRANSCRIPT_COLUMN]
+        text_file = sum(
+            os.path.getsize(os.path.join(tmp, name)) for name in os.listdir(tmp) if name.endswith('.arrow')
+        )
+
+        print(f"\n{rows} строк")
+        print(f"  {'колонка':<32} {'до':>11} {'после':>11}  тип после")
+        columns = list(before_report)[:top] + [col for col in after_report if col not in before_report]
+        for col in columns:
+            dtype = str(after[col].dtype) if col in after.columns else ('mmap-файл' if col == TRANSCRIPT_COLUMN else '')
+            print(f"  {col:<32} {mb(before_report.get(col, 0))} {mb(after_report.get(col, 0))}  {dtype}")
+        print(f"  {'DataFrame итого':<32} {mb(sum(before_report.values()))} {mb(sum(after_report.values()))}")
+        print(f"  Транскрипции вне DataFrame: файл {mb(text_file).strip()} (страницы в памяти по обращению)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, nargs='+', default=[100000])
+    parser.add_argument('--top', type=int, default=12, help='сколько самых тяжелых колонок показать')
+    args = parser.parse_args()
+    for rows in args.rows:
+        run(rows, args.top)
+
+
+if __name__ == '__main__':
+    main()
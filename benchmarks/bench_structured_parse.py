@@ -0,0 +1,102 @@
+"""Бенчмарк разбора текстового ответа LLM без JSON (extract_structured_data).
+
+Сравнивает прежний поиск полей - re.search по каждому образцу каждого поля
+с флагами IGNORECASE/DOTALL и ленивыми списками [.*?] - с однопроходным
+сканером llm_structured.scan_fields на корпусе ответов из
+benchmarks/data/llm_responses_synthetic.jsonl и проверяет, что найденные
+значения совпадают. Корпус синтетический: ответы написаны вручную по
+типичным сбоям формата у модели (оборванный JSON, markdown, одинарные
+кавычки, подписи вместо ключей, длинные рассуждения перед ответом), а не
+выгружены из рабочих логов, поэтому цифры - ориентир, а не замер на
+реальном трафике.
+
+Запуск из корня проекта:
+    python benchmarks/bench_structured_parse.py --repeat 200
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from llm_structured import FIELD_PATTERNS, extract_structured_data, scan_fields  # noqa: E402
+
+CORPUS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'llm_responses_synthetic.jsonl')
+LIST_FIELDS = ('tags', 'clientInterests', 'positive', 'negative')
+
+
+def baseline_patterns():
+    """Образцы в прежнем виде: необязательная кавычка перед ключом JSON, списки через .*? с DOTALL"""
+    patterns = {}
+    for field, field_patterns in FIELD_PATTERNS.items():
+        patterns[field] = [(r'["\']?' if i == 0 else '') + p.replace(r'\[([^\]]*)\]', r'\[(.*?)\]')
+                           for i, p in enumerate(field_patterns)]
+    return patterns
+
+
+BASELINE_PATTERNS = baseline_patterns()
+
+
+def search_baseline(text):
+    """Прежний способ: поочередный re.search по образцам поля, до первого найденного"""
+    found = {}
+    for field, patterns in BASELINE_PATTERNS.items():
+        flags = re.IGNORECASE | re.DOTALL if field in LIST_FIELDS else re.IGNORECASE
+        for pattern in patterns:
+            match = re.search(pattern, text, flags)
+            if match:
+                found[field] = match.group(1)
+                break
+    return found
+
+
+def load_corpus(path):
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def timed(func, texts, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for text in texts:
+            func(text)
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--corpus', default=CORPUS_PATH)
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.corpus)
+    texts = [entry['text'] for entry in corpus]
+    for entry in corpus:
+        expected, actual = search_baseline(entry['text']), scan_fields(entry['text'])
+        assert actual == expected, f"{entry['kind']}: {actual} != {expected}"
+
+    kinds = Counter(entry['kind'] for entry in corpus)
+    total = len(texts) * args.repeat
+    print(f"{len(texts)} синтетических ответов ({sum(map(len, texts)):,} символов), повторов: {args.repeat}")
+    print("  " + ", ".join(f"{kind}: {count}" for kind, count in kinds.items()))
+    for name, func in (
+        ('re.search по образцам', search_baseline),
+        ('scan_fields', scan_fields),
+        ('extract_structured_data', lambda text: extract_structured_data(text, 'запрос')),
+    ):
+        elapsed = timed(func, texts, args.repeat)
+        print(f"  {name:<28} {total / elapsed:12,.0f} ответов/с  ({elapsed * 1000000 / total:.1f} мкс на ответ)")
+
+    # Самые длинные ответы отдельно: на них ленивые списки с DOTALL обходятся дороже всего
+    longest = sorted(texts, key=len)[-3:]
+    for name, func in (('re.search по образцам', search_baseline), ('scan_fields', scan_fields)):
+        elapsed = timed(func, longest, args.repeat)
+        print(f"  длинные, {name:<19} {elapsed * 1000000 / (len(longest) * args.repeat):10.1f} мкс на ответ")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,938 @@
+import hashlib
+import json
+import math
+import os
+import queue
+import re
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+from datetime import date, datetime
+
+import numpy as np
+import openpyxl
+import pandas as pd
+from filelock import FileLock
+
+from calls_snapshot import CallsSnapshot
+from calls_text import fold_yo, stem, tokenize
+
+# Колонка со стабильным идентификатором звонка (производным от ссылки на запись)
+CALL_ID_COLUMN = 'ID звонка'
+
+# Колонки Excel, которые дублируются в индексируемые столбцы таблицы calls
+INDEXED_COLUMNS = {
+    'call_id': CALL_ID_COLUMN,
+    'record_url': 'Ссылка на запись',
+    'ended_at': 'Дата/Время завершения звонка',
+    'status': 'Статус',
+    'tag': 'Tag',
+}
+
+# Колонки, которые при загрузке приводятся обратно к datetime
+DATETIME_COLUMNS = ('Дата/Время завершения звонка',)
+
+# Через сколько секунд после последней записи обновляется Parquet-снимок
+SNAPSHOT_REFRESH_DELAY = 10.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS calls (
+    id INTEGER PRIMARY KEY,
+    call_id TEXT,
+    record_url TEXT,
+    ended_at TEXT,
+    status TEXT,
+    tag TEXT,
+    data TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_calls_record_url ON calls(record_url);
+CREATE INDEX IF NOT EXISTS idx_calls_ended_at ON calls(ended_at);
+CREATE INDEX IF NOT EXISTS idx_calls_status ON calls(status);
+CREATE INDEX IF NOT EXISTS idx_calls_tag ON calls(tag);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+INSERT OR IGNORE INTO meta (key, value) VALUES ('generation', '0');
+-- Случайный ID базы: поколение новой базы снова начинается с 0, и файлы, построенные
+-- из удаленной или замененной базы (снимки), отличаются от текущих по этому ID
+INSERT OR IGNORE INTO meta (key, value) VALUES ('store_id', lower(hex(randomblob(16))));
+-- Журнал изменений: последнее изменение каждой строки и поколение, в котором оно сделано
+CREATE TABLE IF NOT EXISTS call_changes (
+    row_id INTEGER PRIMARY KEY,
+    call_id TEXT,
+    op TEXT NOT NULL,
+    generation INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_call_changes_generation ON call_changes(generation);
+-- Журнал покрывает изменения после этого поколения (раньше - только полная загрузка)
+INSERT OR IGNORE INTO meta (key, value) SELECT 'changes_since', value FROM meta WHERE key = 'generation';
+-- Поколение растет при любом изменении строк, в том числе из внешних скриптов,
+-- и в том же триггере изменение записывается в журнал
+DROP TRIGGER IF EXISTS trg_calls_insert_generation;
+DROP TRIGGER IF EXISTS trg_calls_update_generation;
+DROP TRIGGER IF EXISTS trg_calls_delete_generation;
+CREATE TRIGGER IF NOT EXISTS trg_calls_insert_changes AFTER INSERT ON calls
+BEGIN
+    UPDATE meta SET value = CAST(value AS INTEGER) + 1 WHERE key = 'generation';
+    INSERT OR REPLACE INTO call_changes (row_id, call_id, op, generation)
+    SELECT NEW.id, NEW.call_id, 'upsert', CAST(value AS INTEGER) FROM meta WHERE key = 'generation';
+END;
+CREATE TRIGGER IF NOT EXISTS trg_calls_update_changes AFTER UPDATE ON calls
+BEGIN
+    UPDATE meta SET value = CAST(value AS INTEGER) + 1 WHERE key = 'generation';
+    INSERT OR REPLACE INTO call_changes (row_id, call_id, op, generation)
+    SELECT NEW.id, NEW.call_id, 'upsert', CAST(value AS INTEGER) FROM meta WHERE key = 'generation';
+END;
+CREATE TRIGGER IF NOT EXISTS trg_calls_delete_changes AFTER DELETE ON calls
+BEGIN
+    UPDATE meta SET value = CAST(value AS INTEGER) + 1 WHERE key = 'generation';
+    INSERT OR REPLACE INTO call_changes (row_id, call_id, op, generation)
+    SELECT OLD.id, OLD.call_id, 'delete', CAST(value AS INTEGER) FROM meta WHERE key = 'generation';
+END;
+"""
+
+# Полнотекстовый индекс (SQLite FTS5) по текстам звонков: колонка индекса -> колонка звонка.
+# Индекс ведется из Python в тех же транзакциях, что и запись звонков (data хранит NaN,
+# который json_extract в SQLite не разбирает, поэтому триггеры на JSON не подходят)
+SEARCH_COLUMNS = {
+    'transcript': 'Транскрибация',
+    'summary': 'AI-резюме',
+    'insight': 'Ключевой вывод',
+}
+SEARCH_INDEX_VERSION = '2'  # Меняется вместе с подготовкой текста для индекса - индекс перестраивается
+SEARCH_WEIGHTS = (1.0, 2.0, 2.0)  # Вес совпадения в каждой колонке для ранжирования bm25
+SNIPPET_TOKENS = 16  # Длина фрагмента с подсветкой в словах
+SNIPPET_START, SNIPPET_END = '\x02', '\x03'  # Маркеры совпадений во фрагменте (заменяются при выводе)
+
+SEARCH_SCHEMA = f"""
+CREATE VIRTUAL TABLE IF NOT EXISTS calls_search USING fts5(
+    {', '.join(SEARCH_COLUMNS)}, tokenize='unicode61 remove_diacritics 2'
+);
+"""
+SEARCH_INSERT_SQL = "INSERT INTO calls_search (rowid, {}) VALUES (?, {})".format(
+    ', '.join(SEARCH_COLUMNS), ', '.join('?' * len(SEARCH_COLUMNS))
+)
+
+
+def search_match_query(text):
+    """Запрос FTS5 из текста пользователя: все слова (AND), каждое - по основе (calls_text.stem).
+
+    'доставка' находит 'доставки' и 'доставкой', ё и е не различаются.
+    Синтаксис FTS5 (кавычки, NEAR, AND/OR) в тексте не интерпретируется.
+    ValueError - в запросе нет ни одного слова.
+    """
+    words = tokenize(text)
+    if not words:
+        raise ValueError("Пустой поисковый запрос")
+    return ' '.join(f'"{stem(word)}"*' for word in words)
+
+
+def _search_text(value):
+    # '-' и 'nan' - заглушки пустых значений, в индекс не попадают.
+    # Токенизатор FTS5 не отождествляет ё и е - текст индексируется с е (регистр сохраняется для фрагментов)
+    if not isinstance(value, str) or value.strip() in ('', '-', 'nan'):
+        return None
+    return fold_yo(value)
+
+
+def _search_params(row_id, data):
+    """Параметры SEARCH_INSERT_SQL для строки или None, если искать в ней нечего"""
+    texts = [_search_text(data.get(col)) for col in SEARCH_COLUMNS.values()]
+    if not any(texts):
+        return None
+    return [row_id] + texts
+
+
+INSERT_SQL = "INSERT INTO calls (id, {}, data, updated_at) VALUES ({})".format(
+    ', '.join(INDEXED_COLUMNS), ', '.join('?' * (len(INDEXED_COLUMNS) + 3))
+)
+UPDATE_SQL = "UPDATE calls SET {}, data = ?, updated_at = ? WHERE id = ?".format(
+    ', '.join(f"{col} = ?" for col in INDEXED_COLUMNS)
+)
+
+
+def derive_call_id(data):
+    """Стабильный ID звонка: хэш ссылки на запись, а без неё - хэш содержимого строки"""
+    record_url = _index_value(data.get('Ссылка на запись'))
+    if record_url:
+        source = record_url
+    else:
+        source = json.dumps(
+            {col: value for col, value in data.items() if col != CALL_ID_COLUMN},
+            ensure_ascii=False, sort_keys=True, default=str
+        )
+    return hashlib.sha1(source.encode('utf-8')).hexdigest()[:16]
+
+
+# Строки, которые pd.read_excel по умолчанию превращает в NaN
+EXCEL_NA_STRINGS = frozenset([
+    '', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN',
+    '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null',
+])
+
+_INT_RE = re.compile(r'^[+-]?\d+$')
+
+
+def _parse_number(text):
+    """Разбирает число из строки так же строго, как pandas при выводе типов колонки"""
+    text = text.strip()
+    if _INT_RE.match(text):
+        return int(text)
+    if '_' in text:
+        raise ValueError(text)
+    return float(text)
+
+
+def _excel_cell_value(value):
+    """Значение ячейки как у pd.read_excel: пусто -> NaN, целые float -> int"""
+    if value is None or (isinstance(value, str) and value in EXCEL_NA_STRINGS):
+        return math.nan
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def _iter_sheet_rows(excel_path):
+    """Потоково отдает строки первого листа .xlsx (openpyxl read_only), первая - заголовок"""
+    workbook = openpyxl.load_workbook(excel_path, read_only=True, data_only=True)
+    try:
+        yield from workbook.worksheets[0].iter_rows(values_only=True)
+    finally:
+        workbook.close()
+
+
+class ExcelTypeInference:
+    """Определяет за один проход, какие колонки pd.read_excel привел бы к числам.
+
+    pandas превращает колонку в числовую, если все её непустые значения - числа
+    или строки, похожие на числа (например '01.01' в lanth). Держим только флаги
+    по колонкам, поэтому память не зависит от числа строк.
+    """
+
+    def __init__(self, width):
+        self.numeric = [True] * width
+        self.has_text_numbers = [False] * width
+
+    def observe(self, values):
+        for position, value in enumerate(values):
+            if not self.numeric[position] or isinstance(value, float) or (isinstance(value, int) and not isinstance(value, bool)):
+                continue
+            if isinstance(value, str):
+                try:
+                    _parse_number(value)
+                    self.has_text_numbers[position] = True
+                    continue
+                except ValueError:
+                    pass
+            self.numeric[position] = False
+
+    def columns_to_convert(self, columns):
+        return [col for col, numeric, text in zip(columns, self.numeric, self.has_text_numbers) if numeric and text]
+
+
+def iter_excel_rows(excel_path):
+    """Потоково читает первый лист .xlsx: возвращает (колонки, итератор кортежей, вывод типов).
+
+    Значения приводятся к тому же виду, что дает pd.read_excel: пустые ячейки и
+    строки вроде 'NA' - NaN, безымянные колонки - 'Unnamed: N', повторяющиеся
+    имена - 'имя.1', пустые строки в конце листа отбрасываются. Какие колонки
+    нужно привести к числам, становится известно только после прохода - см.
+    ExcelTypeInference.columns_to_convert.
+    """
+    sheet_rows = _iter_sheet_rows(excel_path)
+    header = next(sheet_rows, None) or ()
+    columns = []
+    for position, name in enumerate(header):
+        name = f"Unnamed: {position}" if name is None else str(name)
+        base, suffix = name, 1
+        while name in columns:
+            name = f"{base}.{suffix}"
+            suffix += 1
+        columns.append(name)
+    width = len(columns)
+    inference = ExcelTypeInference(width)
+
+    def rows():
+        empty_rows = 0
+        for values in sheet_rows:
+            values = tuple(values[:width]) + (None,) * (width - len(values))
+            if all(value is None for value in values):
+                empty_rows += 1
+                continue
+            # Пустые строки внутри таблицы сохраняем, как pandas
+            for _ in range(empty_rows):
+                yield (math.nan,) * width
+            empty_rows = 0
+            values = tuple(_excel_cell_value(value) for value in values)
+            inference.observe(values)
+            yield values
+
+    return columns, rows(), inference
+
+
+def to_storage_value(value):
+    """Приводит значение ячейки DataFrame к типу, который можно сохранить в JSON"""
+    if value is None:
+        return None
+    if isinstance(value, (pd.Timestamp, datetime)):
+        if pd.isna(value):
+            return None
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+    if isinstance(value, date):
+        return value.strftime('%Y-%m-%d')
+    if isinstance(value, np.bool_):
+        return bool(value)
+    if isinstance(value, np.integer):
+        return int(value)
+    if isinstance(value, (float, np.floating)):
+        # NaN сохраняем как есть: json пишет его как NaN и читает обратно в float('nan')
+        return float(value)
+    if isinstance(value, (str, int, bool)):
+        return value
+    if value is pd.NaT or value is pd.NA:
+        return None
+    return str(value)
+
+
+def _index_value(value):
+    """Значение для индексируемого столбца: строка без пустых/NaN значений"""
+    if value is None:
+        return None
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    text = str(value).strip()
+    return text or None
+
+
+class CallStore:
+    """Хранилище звонков на встроенной SQLite (WAL) с построчными обновлениями.
+
+    Каждая строка исходной Excel-таблицы хранится как JSON-объект в столбце data,
+    а часто используемые поля (ссылка на запись, дата, статус, тег) продублированы
+    в индексируемые столбцы. Идентификатор строки (id) совпадает с её позицией
+    в импортированной таблице, новые строки получают следующий свободный id.
+
+    Каждое изменение строк увеличивает поколение хранилища (meta.generation, триггеры)
+    и записывается в журнал call_changes (changes_since). Рядом с базой
+    лежит Parquet-снимок того же поколения, из которого load_dataframe читает данные
+    без разбора JSON; после записей снимок обновляется в фоне. Снимок помечается
+    и случайным ID базы (meta.store_id): у пересозданной базы поколения совпадают
+    со старыми, но ID другой.
+
+    Все изменения выполняет один поток-писатель: публичные методы записи ставят
+    построчные изменения в очередь и ждут результата. Каждая транзакция идет под
+    файловой блокировкой <база>.lock (file_lock), которую берут и внешние скрипты
+    (process_table_batch.py), и начинается с BEGIN IMMEDIATE, поэтому параллельные
+    запросы анализа не затирают результаты друг друга.
+    """
+
+    def __init__(self, path, snapshot_path=None):
+        self.path = path
+        self._local = threading.local()
+        self._columns_lock = threading.Lock()
+        self._listeners = []
+        if snapshot_path is None:
+            snapshot_path = os.path.splitext(path)[0] + '.parquet'
+        self.snapshot = CallsSnapshot(snapshot_path) if snapshot_path else None
+        self._snapshot_timer = None
+        self._snapshot_lock = threading.Lock()  # Таймер отложенного обновления
+        self._snapshot_write_lock = threading.Lock()  # Перестроение файла снимка
+        self._call_index = {}  # ID звонка -> id строки (проверяется при каждом обращении)
+        self.file_lock = FileLock(path + '.lock')
+        self._writes = queue.Queue()
+        self._writer_thread = None
+        self._writer_start_lock = threading.Lock()
+        with self.file_lock:
+            conn = self._connect()
+            conn.executescript(SCHEMA)
+            with self._transaction() as conn:
+                self._migrate_call_ids(conn)
+            self.search_available = self._create_search_index(conn)
+            self.store_id = conn.execute("SELECT value FROM meta WHERE key = 'store_id'").fetchone()[0]
+
+    def _create_search_index(self, conn):
+        """Создает полнотекстовый индекс и заполняет его для строк, записанных до его появления"""
+        try:
+            version = conn.execute("SELECT value FROM meta WHERE key = 'search_version'").fetchone()
+            exists = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'calls_search'").fetchone() is not None
+            conn.executescript(SEARCH_SCHEMA)
+        except sqlite3.OperationalError as e:
+            # SQLite собран без FTS5 - поиск недоступен, остальное хранилище работает
+            print(f"Полнотекстовый поиск недоступен: {e}")
+            return False
+        if not exists or version is None or version[0] != SEARCH_INDEX_VERSION:
+            print("Построение полнотекстового индекса звонков...")
+            with self._transaction() as conn:
+                self._rebuild_search_index(conn)
+                conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('search_version', ?)", (SEARCH_INDEX_VERSION,))
+        return True
+
+    def _rebuild_search_index(self, conn, chunk_size=1000):
+        conn.execute("DELETE FROM calls_search")
+        max_id = conn.execute("SELECT COALESCE(MAX(id), -1) FROM calls").fetchone()[0]
+        for start in range(0, max_id + 1, chunk_size):
+            params = [
+                _search_params(row_id, json.loads(raw)) for row_id, raw in conn.execute(
+                    "SELECT id, data FROM calls WHERE id >= ? AND id < ?", (start, start + chunk_size)
+                )
+            ]
+            conn.executemany(SEARCH_INSERT_SQL, [p for p in params if p is not None])
+
+    def _index_search(self, conn, row_id, data, replace=True):
+        """Обновляет строку полнотекстового индекса (внутри транзакции записи)"""
+        if not self.search_available:
+            return
+        if replace:
+            conn.execute("DELETE FROM calls_search WHERE rowid = ?", (row_id,))
+        params = _search_params(row_id, data)
+        if params is not None:
+            conn.execute(SEARCH_INSERT_SQL, params)
+
+    def _migrate_call_ids(self, conn):
+        """Добавляет колонку call_id в базы, созданные до её появления, и заполняет её"""
+        table_columns = [row[1] for row in conn.execute("PRAGMA table_info(calls)")]
+        if 'call_id' not in table_columns:
+            conn.execute("ALTER TABLE calls ADD COLUMN call_id TEXT")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_calls_call_id ON calls(call_id)")
+        if conn.execute("SELECT 1 FROM calls WHERE call_id IS NULL LIMIT 1").fetchone() is None:
+            return
+        print("Назначение стабильных ID звонков...")
+        self._ensure_columns(conn, [CALL_ID_COLUMN])
+        now = time.time()
+        while True:
+            rows = conn.execute("SELECT id, data FROM calls WHERE call_id IS NULL LIMIT 1000").fetchall()
+            if not rows:
+                break
+            params = []
+            for row_id, raw in rows:
+                data = json.loads(raw)
+                data[CALL_ID_COLUMN] = _index_value(data.get(CALL_ID_COLUMN)) or derive_call_id(data)
+                params.append(self._row_params(data) + [json.dumps(data, ensure_ascii=False), now, row_id])
+            conn.executemany(UPDATE_SQL, params)
+        self._dedupe_call_ids(conn)
+
+    def _dedupe_call_ids(self, conn):
+        """Добавляет суффиксы -2, -3... к повторяющимся ID (одна и та же запись в нескольких строках)"""
+        duplicates = conn.execute(
+            "SELECT id, call_id, data FROM calls WHERE call_id IN "
+            "(SELECT call_id FROM calls GROUP BY call_id HAVING COUNT(*) > 1) ORDER BY call_id, id"
+        ).fetchall()
+        now = time.time()
+        previous = None
+        for row_id, call_id, raw in duplicates:
+            if call_id != previous:
+                previous, suffix = call_id, 1  # Первая строка сохраняет исходный ID
+                continue
+            suffix += 1
+            while conn.execute("SELECT 1 FROM calls WHERE call_id = ?", (f"{call_id}-{suffix}",)).fetchone():
+                suffix += 1
+            data = json.loads(raw)
+            data[CALL_ID_COLUMN] = f"{call_id}-{suffix}"
+            conn.execute(UPDATE_SQL, self._row_params(data) + [json.dumps(data, ensure_ascii=False), now, row_id])
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        """Транзакция записи: блокировка базы берется сразу, а не при первом UPDATE"""
+        conn = self._connect()
+        with conn:
+            conn.execute('BEGIN IMMEDIATE')
+            yield conn
+
+    # --- Поток-писатель ---
+
+    def _write(self, func, *args, **kwargs):
+        """Выполняет изменение в потоке-писателе и возвращает его результат"""
+        if threading.current_thread() is self._writer_thread:
+            return func(*args, **kwargs)
+        future = Future()
+        self._writes.put((func, args, kwargs, future))
+        self._start_writer()
+        return future.result()
+
+    def _start_writer(self):
+        with self._writer_start_lock:
+            if self._writer_thread is None:
+                self._writer_thread = threading.Thread(target=self._writer_loop, name='call-store-writer', daemon=True)
+                self._writer_thread.start()
+
+    def _writer_loop(self):
+        while True:
+            batch = [self._writes.get()]
+            # Забираем все накопившиеся изменения и применяем их под одной файловой блокировкой
+            while len(batch) < 100:
+                try:
+                    batch.append(self._writes.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                with self.file_lock:
+                    for func, args, kwargs, future in batch:
+                        try:
+                            future.set_result(func(*args, **kwargs))
+                        except Exception as e:
+                            future.set_exception(e)
+            except Exception as e:
+                # Не удалось взять файловую блокировку - сообщаем об ошибке всем ожидающим
+                print(f"Ошибка потока записи хранилища: {e}")
+                for *_, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+    # --- Подписка на изменения ---
+
+    def subscribe(self, listener):
+        """Регистрирует обработчик listener(event, payload), вызываемый после каждой записи.
+
+        События: 'update' - {id: {колонка: значение}}, 'insert' - {id: строка},
+        'replace' - None (содержимое хранилища заменено целиком).
+        """
+        self._listeners.append(listener)
+
+    def _notify(self, event, payload):
+        self._schedule_snapshot_refresh()
+        for listener in self._listeners:
+            try:
+                listener(event, payload)
+            except Exception as e:
+                print(f"Ошибка в обработчике изменений хранилища ({event}): {e}")
+
+    # --- Метаданные ---
+
+    def generation(self):
+        """Номер поколения данных, растет с каждой записью"""
+        row = self._connect().execute("SELECT value FROM meta WHERE key = 'generation'").fetchone()
+        return int(row[0]) if row else 0
+
+    def _bump_generation(self, conn):
+        """Изменения строк учитывают триггеры, явно поколение поднимается только при смене колонок"""
+        conn.execute("UPDATE meta SET value = CAST(value AS INTEGER) + 1 WHERE key = 'generation'")
+
+    def changes_since(self, generation):
+        """Строки, измененные после поколения generation, по журналу call_changes.
+
+        Возвращает (текущее поколение, изменения) - изменения это список
+        (id строки, ID звонка, 'upsert' или 'delete') в порядке поколений, - или
+        (текущее поколение, None), если журнал не покрывает generation (поколение
+        до замены хранилища или до появления журнала) и нужна полная загрузка.
+        Поколение читается первым: изменение, попавшее между запросами, придет
+        еще раз при следующей синхронизации, но не потеряется.
+        """
+        conn = self._connect()
+        current = self.generation()
+        row = conn.execute("SELECT value FROM meta WHERE key = 'changes_since'").fetchone()
+        if generation < (int(row[0]) if row else 0) or generation > current:
+            return current, None
+        changes = conn.execute(
+            "SELECT row_id, COALESCE(NULLIF(call_id, ''), CAST(row_id AS TEXT)), op FROM call_changes "
+            "WHERE generation > ? ORDER BY generation",
+            (int(generation),)
+        ).fetchall()
+        return current, changes
+
+    def search(self, query, limit=20, offset=0):
+        """Полнотекстовый поиск по транскрипциям, AI-резюме и ключевым выводам.
+
+        Возвращает (число найденных звонков, страница результатов) - результаты
+        это (id строки, ID звонка, оценка, фрагмент) от более релевантных к менее,
+        в фрагменте совпадения отмечены SNIPPET_START/SNIPPET_END. ValueError -
+        пустой запрос, RuntimeError - поиск недоступен (SQLite без FTS5).
+        """
+        if not self.search_available:
+            raise RuntimeError("Полнотекстовый поиск недоступен: SQLite собран без FTS5")
+        match = search_match_query(query)
+        conn = self._connect()
+        total = conn.execute("SELECT COUNT(*) FROM calls_search WHERE calls_search MATCH ?", (match,)).fetchone()[0]
+        rows = conn.execute(
+            "SELECT s.rowid, COALESCE(NULLIF(c.call_id, ''), CAST(s.rowid AS TEXT)), "
+            f"bm25(calls_search, {', '.join(map(str, SEARCH_WEIGHTS))}) AS score, "
+            "snippet(calls_search, -1, ?, ?, '…', ?) "
+            "FROM calls_search s JOIN calls c ON c.id = s.rowid "
+            "WHERE calls_search MATCH ? ORDER BY score LIMIT ? OFFSET ?",
+            (SNIPPET_START, SNIPPET_END, SNIPPET_TOKENS, match, int(limit), int(offset))
+        ).fetchall()
+        # bm25 в SQLite отрицательный: чем меньше, тем релевантнее
+        return total, [(row_id, call_id, round(-score, 6), snippet) for row_id, call_id, score, snippet in rows]
+
+    def columns(self):
+        """Возвращает порядок колонок таблицы звонков"""
+        row = self._connect().execute("SELECT value FROM meta WHERE key = 'columns'").fetchone()
+        return json.loads(row[0]) if row else []
+
+    @contextmanager
+    def _read_transaction(self):
+        """Отдельное соединение в транзакции чтения: (соединение, поколение)"""
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            # Все запросы в блоке видят одно и то же состояние базы (одна транзакция чтения WAL)
+            conn.execute('BEGIN')
+            row = conn.execute("SELECT value FROM meta WHERE key = 'generation'").fetchone()
+            yield conn, int(row[0]) if row else 0
+        finally:
+            conn.close()
+
+    @contextmanager
+    def read_rows(self):
+        """Согласованное чтение всей таблицы: (колонки, поколение, курсор строк (id, JSON))"""
+        with self._read_transaction() as (conn, generation):
+            row = conn.execute("SELECT value FROM meta WHERE key = 'columns'").fetchone()
+            columns = json.loads(row[0]) if row else []
+            yield columns, generation, conn.execute("SELECT id, data FROM calls ORDER BY id")
+
+    def _set_columns(self, conn, columns):
+        conn.execute(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES ('columns', ?)",
+            (json.dumps(list(columns), ensure_ascii=False),)
+        )
+
+    def _ensure_columns(self, conn, names):
+        """Добавляет новые колонки в конец списка колонок (аналог df[col] = '')"""
+        with self._columns_lock:
+            columns = self.columns()
+            missing = [name for name in names if name not in columns]
+            if missing:
+                self._set_columns(conn, columns + missing)
+                self._bump_generation(conn)
+                for name in missing:
+                    print(f"🆕 Создан новый столбец: {name}")
+
+    def ensure_columns(self, names):
+        self._write(self._ensure_columns_tx, names)
+
+    def _ensure_columns_tx(self, names):
+        with self._transaction() as conn:
+            self._ensure_columns(conn, names)
+
+    # --- Чтение ---
+
+    def count(self):
+        return self._connect().execute("SELECT COUNT(*) FROM calls").fetchone()[0]
+
+    def get_row(self, row_id):
+        """Возвращает строку звонка в виде словаря или None"""
+        row = self._connect().execute("SELECT data FROM calls WHERE id = ?", (int(row_id),)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def find_id_by_record_url(self, record_url):
+        """Ищет id звонка по ссылке на запись (использует индекс)"""
+        row = self._connect().execute(
+            "SELECT id FROM calls WHERE record_url = ? LIMIT 1", (record_url,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def find_call(self, call_id):
+        """Ищет звонок по ID: возвращает (id строки, строка) или (None, None).
+
+        Сначала используется хэш-индекс в памяти (с проверкой, что строка не
+        сменилась), затем индекс call_id в базе. Числовые ID старого формата
+        (позиция строки) по-прежнему принимаются.
+        """
+        call_id = str(call_id).strip()
+        conn = self._connect()
+        row_id = self._call_index.get(call_id)
+        if row_id is not None:
+            row = conn.execute("SELECT data FROM calls WHERE id = ? AND call_id = ?", (row_id, call_id)).fetchone()
+            if row is not None:
+                return row_id, json.loads(row[0])
+        row = conn.execute("SELECT id, data FROM calls WHERE call_id = ? LIMIT 1", (call_id,)).fetchone()
+        if row is not None:
+            self._call_index[call_id] = row[0]
+            return row[0], json.loads(row[1])
+        if call_id.isdigit():
+            data = self.get_row(int(call_id))
+            if data is not None:
+                return int(call_id), data
+        return None, None
+
+    def load_dataframe(self, exclude=()):
+        """Загружает все звонки в DataFrame (индекс = id звонка) без колонок exclude.
+
+        Если Parquet-снимок актуален, данные читаются из него и колонки exclude
+        не материализуются вовсе; иначе читается база и снимок перезаписывается.
+        """
+        generation = self.generation()
+        if self.snapshot is not None:
+            df = self.snapshot.load(self.store_id, generation, exclude)
+            if df is not None:
+                return df
+        df = self._load_from_db()
+        if self.snapshot is not None and self.snapshot.available:
+            with self._snapshot_write_lock:
+                self.snapshot.write(df, self.store_id, generation)
+        if exclude:
+            df = df.drop(columns=[col for col in exclude if col in df.columns])
+        return df
+
+    def read_text_column(self, column):
+        """Значения одной колонки всех строк: (поколение, id строк, значения) без разбора JSON строк в Python.
+
+        Поколение и значения читаются в одной транзакции чтения. Из снимка этого
+        поколения колонка читается Arrow-массивом, иначе - через json_extract.
+        """
+        with self._read_transaction() as (conn, generation):
+            if self.snapshot is not None:
+                result = self.snapshot.read_column(self.store_id, generation, column)
+                if result is not None:
+                    return (generation,) + tuple(result)
+            path = '$."' + column.replace('"', '\\"') + '"'
+            rows = conn.execute("SELECT id, json_extract(data, ?) FROM calls ORDER BY id", (path,)).fetchall()
+            return generation, [row[0] for row in rows], [row[1] for row in rows]
+
+    def _load_from_db(self):
+        conn = self._connect()
+        rows = conn.execute("SELECT id, data FROM calls ORDER BY id").fetchall()
+        return self.frame_from_rows([row[0] for row in rows], [json.loads(row[1]) for row in rows])
+
+    def refresh_snapshot(self):
+        """Перестраивает Parquet-снимок, если он отстал от базы"""
+        if self.snapshot is None or not self.snapshot.available:
+            return False
+        with self._snapshot_lock:
+            self._snapshot_timer = None
+        with self._snapshot_write_lock:
+            generation = self.generation()
+            if self.snapshot.version() == (self.store_id, generation):
+                return False
+            return self.snapshot.write(self._load_from_db(), self.store_id, generation)
+
+    def _schedule_snapshot_refresh(self):
+        """Откладывает обновление снимка, чтобы серия записей перестраивала его один раз"""
+        if self.snapshot is None or not self.snapshot.available:
+            return
+        with self._snapshot_lock:
+            if self._snapshot_timer is not None:
+                self._snapshot_timer.cancel()
+            self._snapshot_timer = threading.Timer(SNAPSHOT_REFRESH_DELAY, self._refresh_snapshot_safe)
+            self._snapshot_timer.daemon = True
+            self._snapshot_timer.start()
+
+    def _refresh_snapshot_safe(self):
+        try:
+            self.refresh_snapshot()
+        except Exception as e:
+            print(f"Ошибка фонового обновления снимка {self.snapshot.path}: {e}")
+
+    def frame_from_rows(self, ids, records):
+        """Строит DataFrame из сохраненных строк так же, как load_dataframe"""
+        columns = self.columns()
+        df = pd.DataFrame.from_records(records, index=pd.Index(ids, dtype='int64'))
+        # Сохраняем исходный порядок колонок, добавляя неизвестные в конец
+        df = df.reindex(columns=columns + [col for col in df.columns if col not in columns])
+        for col in DATETIME_COLUMNS:
+            if col in df.columns:
+                df[col] = pd.to_datetime(df[col], errors='coerce')
+        return df
+
+    # --- Запись ---
+
+    def _row_params(self, data):
+        return [_index_value(data.get(excel_col)) for excel_col in INDEXED_COLUMNS.values()]
+
+    def update_row(self, row_id, values):
+        """Обновляет отдельные поля одной строки. Возвращает False, если строки нет"""
+        return self.update_rows({row_id: values}) == 1
+
+    def update_rows(self, updates):
+        """Применяет построчные обновления {id: {колонка: значение}} в одной транзакции"""
+        if not updates:
+            return 0
+        return self._write(self._update_rows_tx, updates)
+
+    def _update_rows_tx(self, updates):
+        with self._transaction() as conn:
+            applied = self._apply_updates(conn, updates)
+        self._notify('update', applied)
+        return len(applied)
+
+    def update_calls(self, updates):
+        """Применяет изменения {ID звонка: {колонка: значение}} в одной транзакции.
+
+        Строки находятся по стабильному ID внутри транзакции записи, поэтому
+        изменение не попадет на другой звонок, даже если хранилище было
+        заменено (id строк нумеруются заново) после того, как оно было
+        подготовлено. Возвращает (число обновленных строк, ID звонков, которых нет).
+        """
+        if not updates:
+            return 0, []
+        return self._write(self._update_calls_tx, updates)
+
+    def _update_calls_tx(self, updates):
+        with self._transaction() as conn:
+            row_updates, missing = {}, []
+            for call_id, values in updates.items():
+                row = conn.execute("SELECT id FROM calls WHERE call_id = ? LIMIT 1", (str(call_id),)).fetchone()
+                if row is None:
+                    missing.append(call_id)
+                else:
+                    row_updates.setdefault(row[0], {}).update(values)
+            applied = self._apply_updates(conn, row_updates)
+        self._notify('update', applied)
+        return len(applied), missing
+
+    def _apply_updates(self, conn, updates):
+        """Построчные изменения {id строки: значения} внутри транзакции записи; возвращает примененные"""
+        applied = {}
+        new_columns = []
+        for values in updates.values():
+            new_columns.extend(col for col in values if col not in new_columns)
+        self._ensure_columns(conn, new_columns)
+        now = time.time()
+        for row_id, values in updates.items():
+            row = conn.execute("SELECT data FROM calls WHERE id = ?", (int(row_id),)).fetchone()
+            if row is None:
+                continue
+            data = json.loads(row[0])
+            patch = {col: to_storage_value(value) for col, value in values.items()}
+            data.update(patch)
+            conn.execute(UPDATE_SQL, self._row_params(data) + [json.dumps(data, ensure_ascii=False), now, int(row_id)])
+            if patch.keys() & SEARCH_COLUMNS.values():
+                self._index_search(conn, int(row_id), data)
+            applied[int(row_id)] = patch
+        return applied
+
+    def insert_rows(self, rows):
+        """Добавляет новые строки в конец таблицы и возвращает их id"""
+        if not rows:
+            return []
+        return self._write(self._insert_rows_tx, rows)
+
+    def _insert_rows_tx(self, rows):
+        inserted = {}
+        with self._transaction() as conn:
+            new_columns = []
+            for values in rows:
+                new_columns.extend(col for col in values if col not in new_columns)
+            self._ensure_columns(conn, new_columns + [CALL_ID_COLUMN])
+            next_id = conn.execute("SELECT COALESCE(MAX(id) + 1, 0) FROM calls").fetchone()[0]
+            now = time.time()
+            for values in rows:
+                data = {col: to_storage_value(value) for col, value in values.items()}
+                data[CALL_ID_COLUMN] = self._free_call_id(conn, _index_value(data.get(CALL_ID_COLUMN)) or derive_call_id(data))
+                conn.execute(INSERT_SQL, [next_id] + self._row_params(data) + [json.dumps(data, ensure_ascii=False), now])
+                self._index_search(conn, next_id, data, replace=False)
+                self._call_index[data[CALL_ID_COLUMN]] = next_id
+                inserted[next_id] = data
+                next_id += 1
+        self._notify('insert', inserted)
+        return list(inserted)
+
+    def _free_call_id(self, conn, call_id):
+        """Возвращает call_id или его вариант с суффиксом, если такой ID уже занят"""
+        candidate, suffix = call_id, 1
+        while conn.execute("SELECT 1 FROM calls WHERE call_id = ?", (candidate,)).fetchone():
+            suffix += 1
+            candidate = f"{call_id}-{suffix}"
+        return candidate
+
+    def replace_from_dataframe(self, df):
+        """Полностью заменяет содержимое хранилища строками DataFrame"""
+        return self.replace_rows([str(col) for col in df.columns], df.itertuples(index=False, name=None))
+
+    def replace_rows(self, columns, rows, on_row=None, chunk_size=1000, finalize=None):
+        """Полностью заменяет содержимое хранилища строками-кортежами из итератора.
+
+        Строки вставляются пачками по chunk_size, поэтому память не зависит от
+        размера таблицы. on_row(data) вызывается для каждой строки (словарь
+        колонка -> значение) - например, для подсчета статистики загрузки.
+        finalize(conn) выполняется в той же транзакции после вставки всех строк.
+        """
+        return self._write(self._replace_rows_tx, columns, rows, on_row, chunk_size, finalize)
+
+    def _replace_rows_tx(self, columns, rows, on_row, chunk_size, finalize):
+        now = time.time()
+        count = 0
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM calls")
+            if self.search_available:
+                conn.execute("DELETE FROM calls_search")
+            self._call_index.clear()
+            self._set_columns(conn, columns if CALL_ID_COLUMN in columns else columns + [CALL_ID_COLUMN])
+            params, search_params = [], []
+            for values in rows:
+                data = {col: to_storage_value(value) for col, value in zip(columns, values)}
+                if on_row is not None:
+                    on_row(data)
+                # ID из файла (после экспорта) сохраняется, новым строкам он вычисляется
+                data[CALL_ID_COLUMN] = _index_value(data.get(CALL_ID_COLUMN)) or derive_call_id(data)
+                params.append([count] + self._row_params(data) + [json.dumps(data, ensure_ascii=False), now])
+                if self.search_available:
+                    row_search = _search_params(count, data)
+                    if row_search is not None:
+                        search_params.append(row_search)
+                count += 1
+                if len(params) >= chunk_size:
+                    conn.executemany(INSERT_SQL, params)
+                    conn.executemany(SEARCH_INSERT_SQL, search_params)
+                    params, search_params = [], []
+            if params:
+                conn.executemany(INSERT_SQL, params)
+                conn.executemany(SEARCH_INSERT_SQL, search_params)
+            self._dedupe_call_ids(conn)
+            if finalize is not None:
+                finalize(conn)
+            # После замены изменились все строки: журнал начинается заново, клиенты загружают всё
+            conn.execute("DELETE FROM call_changes")
+            conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) "
+                "SELECT 'changes_since', value FROM meta WHERE key = 'generation'"
+            )
+        self._notify('replace', None)
+        return count
+
+    # --- Импорт/экспорт Excel ---
+
+    def import_excel(self, excel_path, on_row=None):
+        """Импортирует Excel-файл, заменяя текущие данные. Возвращает число строк.
+
+        .xlsx читается потоково (openpyxl read_only), старый .xls - через pandas.
+        """
+        if excel_path.lower().endswith(('.xlsx', '.xlsm')):
+            columns, rows, inference = iter_excel_rows(excel_path)
+            count = self.replace_rows(
+                columns, rows, on_row=on_row,
+                finalize=lambda conn: self._convert_text_numbers(conn, inference.columns_to_convert(columns))
+            )
+        else:
+            df = pd.read_excel(excel_path)
+            count = self.replace_rows([str(col) for col in df.columns], df.itertuples(index=False, name=None), on_row=on_row)
+        print(f"Импортировано {count} строк из {excel_path} в {self.path}")
+        return count
+
+    def _convert_text_numbers(self, conn, columns, chunk_size=1000):
+        """Приводит строки-числа в указанных колонках к числам (редкий случай, пачками по id)"""
+        if not columns:
+            return
+        print(f"Приведение к числам колонок: {', '.join(columns)}")
+        max_id = conn.execute("SELECT COALESCE(MAX(id), -1) FROM calls").fetchone()[0]
+        for start in range(0, max_id + 1, chunk_size):
+            params = []
+            for row_id, raw in conn.execute(
+                "SELECT id, data FROM calls WHERE id >= ? AND id < ?", (start, start + chunk_size)
+            ).fetchall():
+                data = json.loads(raw)
+                changed = False
+                for col in columns:
+                    if isinstance(data.get(col), str):
+                        data[col] = _parse_number(data[col])
+                        changed = True
+                if changed:
+                    params.append(self._row_params(data) + [json.dumps(data, ensure_ascii=False), time.time(), row_id])
+            conn.executemany(UPDATE_SQL, params)
+
+    def export_excel(self, target):
+        """Выгружает звонки в Excel (путь или файловый объект)"""
+        df = self.load_dataframe()
+        df.to_excel(target, index=False)
+        return len(df)
@@ -0,0 +1,219 @@
+import os
+import threading
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from call_store import DATETIME_COLUMNS
+from calls_compact import DURATION_COLUMN, RECORD_URL_COLUMN
+
+# Изменение этих колонок затрагивает производные колонки (date/time, ended_at, duration_sec,
+# source_kind) - кэш перечитывается
+DERIVED_SOURCE_COLUMNS = frozenset(DATETIME_COLUMNS) | {DURATION_COLUMN, RECORD_URL_COLUMN}
+
+
+def _set_cell(df, row_id, col, value):
+    """Записывает значение в ячейку, расширяя тип колонки до object при несовпадении"""
+    if col not in df.columns:
+        df[col] = pd.Series(np.nan, index=df.index, dtype=object)
+    if isinstance(df[col].dtype, pd.CategoricalDtype) and not pd.isna(value) and value not in df[col].cat.categories:
+        try:
+            df[col] = df[col].cat.add_categories([value])
+        except (TypeError, ValueError):
+            df[col] = df[col].astype(object)
+    try:
+        with warnings.catch_warnings():
+            # pandas 2.x предупреждает о смене типа колонки, pandas 3.x бросает TypeError
+            warnings.simplefilter('error', FutureWarning)
+            df.at[row_id, col] = value
+    except (TypeError, ValueError, FutureWarning):
+        df[col] = df[col].astype(object)
+        df.at[row_id, col] = value
+
+
+class CallsCache:
+    """Общий для всех эндпоинтов DataFrame звонков, проверяемый по подписи файлов хранилища.
+
+    Подпись - это (путь, mtime, размер) файла базы и её WAL-журнала. Пока подпись
+    не изменилась, get() отдает уже загруженный DataFrame без обращения к SQLite.
+    Записи самого сервера приходят через store.subscribe и применяются к кэшу
+    копированием при записи: изменения вносятся в новый DataFrame (копируются
+    только затронутые колонки), который под блокировкой заменяет прежний, поэтому
+    запрос, уже получивший DataFrame, читает его целиком в одном состоянии.
+    После патча подпись обновляется, так что полная перезагрузка происходит
+    только при изменении базы извне (другой процесс, ручное редактирование).
+
+    get(exclude=...) отдает проекцию без тяжелых колонок (например, Транскрибация):
+    если полный DataFrame уже загружен, возвращается он, иначе загружается
+    и кэшируется отдельная проекция, в которой эти колонки не материализуются.
+
+    Колонки text_columns никогда не попадают в DataFrame: их значения отдает
+    texts(column) - объект, загруженный text_loader(column) (TranscriptStore),
+    который обновляется вместе с кэшем.
+
+    derived - производные колонки, зависящие от одной ячейки: {колонка:
+    (производная колонка, функция значения)}. При записи в колонку (в том
+    числе в колонку text_columns) производная ячейка пересчитывается вместе с ней.
+    """
+
+    def __init__(self, store, loader, prepare=None, text_loader=None, text_columns=(), derived=None):
+        self.store = store
+        self._loader = loader  # loader(exclude) -> подготовленный DataFrame
+        self._prepare = prepare
+        self._text_loader = text_loader  # text_loader(column) -> TranscriptStore
+        self._text_columns = frozenset(text_columns)
+        self._derived = dict(derived or {})
+        self._lock = threading.RLock()
+        self._frames = {}  # frozenset(exclude) -> DataFrame
+        self._texts = {}  # колонка -> TranscriptStore
+        self._signature = None
+        self.hits = 0
+        self.misses = 0
+        self.patches = 0
+        self.loaded_at = None
+        store.subscribe(self._on_store_change)
+
+    def _file_signature(self):
+        signature = []
+        for path in (self.store.path, self.store.path + '-wal'):
+            try:
+                st = os.stat(path)
+                signature.append((path, st.st_mtime_ns, st.st_size))
+            except FileNotFoundError:
+                signature.append((path, None, None))
+        return tuple(signature)
+
+    def _check_signature(self):
+        signature = self._file_signature()
+        if signature != self._signature:
+            self._frames = {}
+            self._texts = {}
+        return signature
+
+    def get(self, exclude=()):
+        """Возвращает актуальный DataFrame звонков (не изменяйте его на месте)"""
+        key = frozenset(exclude) | self._text_columns
+        with self._lock:
+            signature = self._check_signature()
+            for candidate in (self._text_columns, key):
+                df = self._frames.get(candidate)
+                if df is not None:
+                    self.hits += 1
+                    return df
+            self.misses += 1
+            # Подпись берем до чтения: запись, попавшая между ними, вызовет еще одну перезагрузку
+            df = self._loader(tuple(key))
+            self._frames[key] = df
+            self._signature = signature
+            self.loaded_at = time.time()
+            return df
+
+    def texts(self, column):
+        """Возвращает актуальные значения колонки из text_columns (TranscriptStore)"""
+        with self._lock:
+            signature = self._check_signature()
+            texts = self._texts.get(column)
+            if texts is None:
+                texts = self._text_loader(column)
+                self._texts[column] = texts
+                self._signature = signature
+            return texts
+
+    def invalidate(self):
+        """Сбрасывает кэш, следующий get() перечитает хранилище"""
+        with self._lock:
+            self._frames = {}
+            self._texts = {}
+            self._signature = None
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hitRate': round(self.hits / total, 4) if total else 0.0,
+                'patches': self.patches,
+                'rows': max((len(df) for df in self._frames.values()), default=0),
+                'projections': len(self._frames),
+                'loadedAt': self.loaded_at,
+                'frameBytes': sum(int(df.memory_usage(deep=True).sum()) for df in self._frames.values()),
+                'textBytes': sum(texts.nbytes() for texts in self._texts.values()),
+            }
+
+    def _on_store_change(self, event, payload):
+        with self._lock:
+            if not self._frames and not self._texts:
+                return
+            applied = event in ('update', 'insert')
+            if applied:
+                self._apply_texts(event, payload)
+            for key in list(self._frames):
+                if event == 'update':
+                    applied = applied and self._apply_updates(key, payload)
+                elif event == 'insert':
+                    applied = applied and self._apply_inserts(key, payload)
+            if applied:
+                self.patches += 1
+                self._signature = self._file_signature()
+            else:
+                self._frames = {}
+                self._texts = {}
+                self._signature = None
+
+    def _apply_texts(self, event, payload):
+        for column, texts in self._texts.items():
+            for row_id, values in payload.items():
+                if column in values:
+                    texts.set(row_id, values[column])
+                elif event == 'insert':
+                    texts.set(row_id, np.nan)
+
+    def _apply_updates(self, key, updates):
+        df = self._frames[key]
+        for row_id, values in updates.items():
+            # Даты и длительность влияют на производные колонки - проще перечитать
+            if row_id not in df.index or any(col in DERIVED_SOURCE_COLUMNS for col in values):
+                return False
+        # Копия при записи: общие с прежним DataFrame массивы колонок не изменяются
+        columns = set()
+        for values in updates.values():
+            columns.update(col for col in values if col not in key)
+            columns.update(self._derived[col][0] for col in values if col in self._derived)
+        df = df.copy(deep=False)
+        for col in columns:
+            if col in df.columns:
+                df[col] = df[col].copy()
+        for row_id, values in updates.items():
+            for col, value in values.items():
+                if col not in key:
+                    _set_cell(df, row_id, col, value)
+                if col in self._derived:
+                    derived_col, func = self._derived[col]
+                    _set_cell(df, row_id, derived_col, func(value))
+        self._frames[key] = df
+        return True
+
+    def _apply_inserts(self, key, rows):
+        if not rows:
+            return True
+        new_df = self.store.frame_from_rows(list(rows), list(rows.values()))
+        # prepare видит и колонки text_columns (производные от них колонки), в кэш они не попадают
+        if self._prepare is not None:
+            new_df = self._prepare(new_df)
+        new_df = new_df.drop(columns=[col for col in key if col in new_df.columns])
+        old_df = self._frames[key]
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', FutureWarning)
+            df = pd.concat([old_df, new_df])
+        # concat категориальной колонки с обычной дает object - возвращаем category
+        for col in old_df.columns:
+            if isinstance(old_df[col].dtype, pd.CategoricalDtype) and not isinstance(df[col].dtype, pd.CategoricalDtype):
+                try:
+                    df[col] = df[col].astype('category')
+                except TypeError:
+                    pass  # Несравнимые значения разных типов - оставляем object
+        self._frames[key] = df
+        return True
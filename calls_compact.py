@@ -0,0 +1,172 @@
+import json
+import re
+
+import numpy as np
+import pandas as pd
+
+DURATION_COLUMN = 'lanth'
+DURATION_SECONDS_COLUMN = 'duration_sec'
+LOCAL_RECORDING_PREFIX = '/api/recordings/'
+CLOUD_RECORDING_HOST = 'storage.yandexcloud.net'
+
+RECORD_URL_COLUMN = 'Ссылка на запись'
+ENDED_AT_SOURCE_COLUMN = 'Дата/Время завершения звонка'
+TAGS_COLUMN = 'tags'
+
+# Нормализованные колонки, которые строятся один раз при загрузке (normalize_calls)
+ENDED_AT_COLUMN = 'ended_at'
+SOURCE_KIND_COLUMN = 'source_kind'
+HAS_TRANSCRIPT_COLUMN = 'has_transcript'
+TAG_LIST_COLUMN = 'tag_list'
+SOURCE_KINDS = ('cloud', 'local', 'other')
+
+# Колонка становится категориальной, если различных значений не больше половины строк
+CATEGORY_MAX_RATIO = 0.5
+CATEGORY_MAX_VALUES = 1000
+
+_MINUTES_RE = re.compile(r'(\d+)\s*м')
+_SECONDS_RE = re.compile(r'(\d+)\s*с')
+
+
+def _parse_duration_text(text):
+    """Длительность из строки 'Xм Yс' или 'MM:SS' в секундах (NaN, если не распознана)"""
+    text = str(text).strip()
+    if ':' in text:
+        parts = text.split(':')
+        try:
+            seconds = 0
+            for part in parts:
+                seconds = seconds * 60 + int(part)
+            return float(seconds)
+        except ValueError:
+            return np.nan
+    minutes = _MINUTES_RE.search(text)
+    seconds = _SECONDS_RE.search(text)
+    if minutes or seconds:
+        return float((int(minutes.group(1)) if minutes else 0) * 60 + (int(seconds.group(1)) if seconds else 0))
+    return np.nan
+
+
+def duration_seconds(values, record_urls=None):
+    """Переводит колонку lanth в секунды.
+
+    В выгрузке звонков lanth записан как минуты.секунды (3.25 - 3 мин 25 с),
+    у локальных записей (import_folder) - целым числом секунд. Строки вида
+    'Xм Yс' и 'MM:SS' тоже распознаются.
+    """
+    values = pd.Series(values)
+    numeric = pd.to_numeric(values, errors='coerce').astype('float64')
+    minutes = np.floor(numeric)
+    seconds = minutes * 60 + np.round((numeric - minutes) * 100)
+    if record_urls is not None:
+        local = pd.Series(record_urls, index=values.index).astype(str).str.startswith(LOCAL_RECORDING_PREFIX)
+        seconds = seconds.where(~local.to_numpy(), numeric)
+    text = values[numeric.isna() & values.notna()]
+    if len(text):
+        seconds.loc[text.index] = text.map(_parse_duration_text).astype('float64')
+    return seconds
+
+
+def format_duration(seconds):
+    """Длительность в секундах в виде 'Xм Yс' ('0м 0с', если неизвестна)"""
+    if pd.isna(seconds):
+        return "0м 0с"
+    seconds = int(seconds)
+    return f"{seconds // 60}м {seconds % 60}с"
+
+
+def source_kinds(record_urls):
+    """Источник записи по ссылке: cloud (Yandex Cloud), local (/api/recordings/) или other"""
+    urls = pd.Series(record_urls, dtype=object)
+    text = urls.where(urls.map(type).eq(str), '')
+    kinds = np.where(
+        text.str.startswith(LOCAL_RECORDING_PREFIX).to_numpy(dtype=bool), 'local',
+        np.where(text.str.contains(CLOUD_RECORDING_HOST, regex=False).to_numpy(dtype=bool), 'cloud', 'other'),
+    )
+    return pd.Categorical(kinds, categories=SOURCE_KINDS)
+
+
+def has_text(value):
+    """Есть ли в ячейке текст (пустые значения, '-' и 'nan' - нет)"""
+    return not pd.isna(value) and str(value).strip() not in ('', '-', 'nan')
+
+
+def parse_tag_list(value):
+    """Теги из колонки tags (JSON-список) кортежем строк; не JSON - один тег"""
+    if not has_text(value):
+        return ()
+    try:
+        parsed = json.loads(str(value))
+    except (ValueError, TypeError):
+        return (str(value),)
+    if not isinstance(parsed, list):
+        parsed = [parsed]
+    return tuple(str(tag) for tag in parsed if tag is not None and str(tag) != '')
+
+
+def normalize_calls(df, has_transcript=None):
+    """Нормализованные колонки звонков, которые иначе разбирались бы на каждом запросе.
+
+    duration_sec (Int32) - длительность lanth в секундах, ended_at
+    (datetime64) - время завершения звонка, source_kind (category:
+    cloud/local/other) - источник записи, tag_list - разобранные JSON-теги
+    (кортежи), has_transcript (bool) - есть ли текст транскрипции: по колонке
+    Транскрибация, если она в df, иначе из has_transcript (массив по строкам).
+    Изменяет и возвращает тот же DataFrame.
+    """
+    urls = df[RECORD_URL_COLUMN] if RECORD_URL_COLUMN in df.columns else pd.Series('', index=df.index)
+    if DURATION_COLUMN in df.columns:
+        seconds = duration_seconds(df[DURATION_COLUMN], urls)
+    else:
+        seconds = pd.Series(np.nan, index=df.index)
+    df[DURATION_SECONDS_COLUMN] = seconds.round().astype('Int32')
+    if ENDED_AT_SOURCE_COLUMN in df.columns:
+        df[ENDED_AT_COLUMN] = pd.to_datetime(df[ENDED_AT_SOURCE_COLUMN], errors='coerce')
+    else:
+        df[ENDED_AT_COLUMN] = pd.Series(pd.NaT, index=df.index, dtype='datetime64[ns]')
+    df[SOURCE_KIND_COLUMN] = source_kinds(urls.to_numpy(dtype=object))
+    tags = df[TAGS_COLUMN] if TAGS_COLUMN in df.columns else pd.Series(np.nan, index=df.index, dtype=object)
+    df[TAG_LIST_COLUMN] = pd.Series(_map_values(tags, parse_tag_list), index=df.index, dtype=object)
+    if has_transcript is not None:
+        df[HAS_TRANSCRIPT_COLUMN] = np.asarray(has_transcript, dtype=bool)
+    return df
+
+
+def _map_values(series, func):
+    """func для каждого уникального значения колонки, разложенный по строкам"""
+    codes, uniques = pd.factorize(series.astype(object), use_na_sentinel=False)
+    mapped = np.empty(len(uniques), dtype=object)
+    mapped[:] = [func(value) for value in uniques.tolist()]
+    return mapped[codes]
+
+
+def _is_text_column(series):
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return False
+    if not (pd.api.types.is_object_dtype(series.dtype) or pd.api.types.is_string_dtype(series.dtype)):
+        return False
+    values = series.dropna()
+    return len(values) > 0 and values.map(type).eq(str).all()
+
+
+def compact_dataframe(df, exclude=()):
+    """Переводит повторяющиеся текстовые колонки (статусы, теги, типы звонков) в category.
+
+    Изменяет и возвращает тот же DataFrame. Колонки exclude не трогаются.
+    """
+    if df.empty:
+        return df
+    limit = min(CATEGORY_MAX_VALUES, len(df) * CATEGORY_MAX_RATIO)
+    for col in df.columns:
+        if col in exclude or not _is_text_column(df[col]):
+            continue
+        if df[col].nunique(dropna=True) <= limit:
+            df[col] = df[col].astype('category')
+    return df
+
+
+def memory_report(df):
+    """Память DataFrame по колонкам в байтах (с учетом содержимого строк), от больших к меньшим"""
+    usage = df.memory_usage(deep=True, index=True)
+    report = {str(col): int(size) for col, size in usage.items()}
+    return dict(sorted(report.items(), key=lambda item: item[1], reverse=True))
@@ -0,0 +1,343 @@
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from call_store import CALL_ID_COLUMN
+from calls_compact import (
+    DURATION_SECONDS_COLUMN, ENDED_AT_COLUMN, ENDED_AT_SOURCE_COLUMN, SOURCE_KIND_COLUMN, TAG_LIST_COLUMN,
+)
+from calls_serializer import AGENT_NAME, UNKNOWN_CUSTOMER, _call_status, _column
+
+MAX_MASKS = 256  # Сколько масок условий и целых фильтров держать в памяти
+
+# Границы длительности звонка в секундах: short - до минуты, medium - от 1 до 3 минут, long - больше 3 минут
+DURATION_BUCKETS = {
+    'short': (None, 60),
+    'medium': (60, 180),
+    'long': (180, None),
+}
+DURATION_TAGS = {'short': 'короткий разговор', 'medium': 'средний разговор', 'long': 'длинный разговор'}
+
+OPERATOR_COLUMNS = ('Имя', 'Оператор', 'Менеджер')
+
+
+def _lower_set(values):
+    return frozenset(str(value).strip().lower() for value in values if str(value).strip())
+
+
+def normalize_spec(spec):
+    """Спецификация фильтра в каноническом виде: кортеж пар (условие, значение) без пустых условий.
+
+    Условия:
+      source     - 'cloud' (Yandex Cloud) или 'local' (/api/recordings/), 'all' - без отбора
+      ids        - ID звонков (поле id ответа /api/calls)
+      search     - подстрока в номере клиента (менеджер - всегда 'Оператор')
+      status     - статус звонка таблицы: успешный / неуспешный / требует внимания
+      purpose    - подстрока в цели звонка
+      result     - результат звонка (Результат звонка, а без него - статус), как в фильтрах аналитики
+      operator   - имя оператора
+      date       - дата в формате дд.мм.гггг
+      date_from, date_to - диапазон дат завершения звонка включительно (гггг-мм-дд или дд.мм.гггг)
+      duration   - short / medium / long
+      tags       - список тегов, звонок подходит, если у него есть любой из них
+    Строки сравниваются без учета регистра. ValueError - неизвестное условие или значение.
+    """
+    conditions = []
+    for name, value in (spec or {}).items():
+        if name not in CONDITIONS:
+            raise ValueError(f"Неизвестное условие фильтра: {name}")
+        if value is None:
+            continue
+        if name in ('ids', 'tags'):
+            if isinstance(value, str):
+                value = value.split(',')
+            value = _lower_set(value) if name == 'tags' else frozenset(str(v).strip() for v in value if str(v).strip())
+        elif name in ('date_from', 'date_to'):
+            if not str(value).strip():
+                continue
+            try:
+                value = pd.Timestamp(pd.to_datetime(str(value).strip(), dayfirst='.' in str(value))).normalize()
+            except (ValueError, TypeError):
+                raise ValueError(f"Некорректная дата в фильтре {name}: {value}")
+        else:
+            value = str(value).strip()
+            if name != 'date':
+                value = value.lower()
+            if name == 'duration' and value and value not in DURATION_BUCKETS:
+                raise ValueError(f"Некорректная длительность в фильтре: {value}")
+        if not value or (name in ('source', 'status', 'purpose', 'result') and value == 'all'):
+            continue
+        conditions.append((name, value))
+    return tuple(sorted(conditions, key=lambda item: item[0]))
+
+
+# --- Маски отдельных условий (массивы bool по строкам df) ---
+
+def _text_mask(df, col, predicate, default=''):
+    return _column(df, col, predicate, default).astype(bool)
+
+
+def _source_mask(df, value):
+    if value not in ('cloud', 'local'):
+        return np.ones(len(df), dtype=bool)
+    if SOURCE_KIND_COLUMN not in df.columns:
+        return np.zeros(len(df), dtype=bool)
+    return (df[SOURCE_KIND_COLUMN] == value).to_numpy(dtype=bool)
+
+
+def _ids_mask(df, ids):
+    mask = np.zeros(len(df), dtype=bool)
+    if CALL_ID_COLUMN in df.columns:
+        mask |= df[CALL_ID_COLUMN].isin(ids).to_numpy(dtype=bool, na_value=False)
+    # Старые числовые ID (id строки) для строк без ID звонка
+    mask |= df.index.astype(str).isin(ids)
+    return mask
+
+
+def _search_mask(df, query):
+    if query in AGENT_NAME.lower():
+        return np.ones(len(df), dtype=bool)
+    return _text_mask(df, 'Номер телефона', lambda value: query in str(value).lower(), UNKNOWN_CUSTOMER)
+
+
+def _status_mask(df, status):
+    return _column(df, 'Дозвон/Недозвон', _call_status, '') == status
+
+
+def _purpose_mask(df, query):
+    return _text_mask(df, 'Цели', lambda value: query in str(value).lower(), 'Не указана')
+
+
+def call_results(df):
+    """Результат звонка для фильтров аналитики: колонка 'Результат звонка', а без значения - статус"""
+    statuses = _column(df, 'Дозвон/Недозвон', _call_status, '')
+    if 'Результат звонка' not in df.columns:
+        return statuses
+    results = _column(df, 'Результат звонка', lambda value: '' if pd.isna(value) else str(value).strip().lower(), '')
+    return np.where(results != '', results, statuses)
+
+
+def _result_mask(df, result):
+    return call_results(df) == result
+
+
+def _operator_mask(df, operator):
+    for col in OPERATOR_COLUMNS:
+        if col in df.columns:
+            return _text_mask(df, col, lambda value: str(value).strip().lower() == operator)
+    # Колонки оператора нет - у всех звонков менеджер по умолчанию
+    return np.full(len(df), operator == AGENT_NAME.lower(), dtype=bool)
+
+
+def _ended_at(df):
+    if ENDED_AT_COLUMN not in df.columns:
+        return pd.Series(pd.NaT, index=df.index, dtype='datetime64[ns]')
+    return df[ENDED_AT_COLUMN]
+
+
+class EndedAtIndex:
+    """Отсортированный индекс времени завершения звонков: позиции строк df по возрастанию ended_at.
+
+    Строки без даты (NaT) в индекс не входят. Диапазон дат - два двоичных
+    поиска (searchsorted) по отсортированным значениям и позиции между ними,
+    то есть O(log n + k) вместо сравнения всей колонки.
+    """
+
+    def __init__(self, df):
+        values = _ended_at(df).to_numpy()
+        if not np.issubdtype(values.dtype, np.datetime64):
+            values = pd.to_datetime(pd.Series(values), errors='coerce').to_numpy()
+        positions = np.flatnonzero(~np.isnat(values))
+        order = np.argsort(values[positions], kind='stable')
+        self.size = len(df)
+        self.positions = positions[order]
+        self.values = values[self.positions]
+
+    def range_positions(self, start=None, end=None):
+        """Позиции строк с ended_at в [start, end) по возрастанию времени; None - без границы"""
+        low = 0 if start is None else self.values.searchsorted(np.datetime64(start), side='left')
+        high = len(self.values) if end is None else self.values.searchsorted(np.datetime64(end), side='left')
+        return self.positions[low:max(low, high)]
+
+    def range_mask(self, start=None, end=None):
+        mask = np.zeros(self.size, dtype=bool)
+        mask[self.range_positions(start, end)] = True
+        return mask
+
+
+def _parse_day(value):
+    """'дд.мм.гггг' -> начало дня или None"""
+    try:
+        return pd.Timestamp(datetime.strptime(value, '%d.%m.%Y'))
+    except ValueError:
+        return None
+
+
+def _date_mask(df, value):
+    return _text_mask(df, 'date', lambda date: date == value)
+
+
+def duration_values(df):
+    if DURATION_SECONDS_COLUMN not in df.columns:
+        return np.full(len(df), np.nan)
+    return df[DURATION_SECONDS_COLUMN].to_numpy(dtype='float64', na_value=np.nan)
+
+
+def _duration_mask(df, bucket):
+    seconds = duration_values(df)
+    low, high = DURATION_BUCKETS[bucket]
+    # Звонки без длительности не попадают ни в одну группу (NaN дает False)
+    with np.errstate(invalid='ignore'):
+        mask = ~np.isnan(seconds)
+        if low is not None:
+            mask &= seconds >= low
+        if high is not None:
+            mask &= seconds <= high if bucket == 'medium' else seconds < high
+    return mask
+
+
+def _duration_tag_mask(bucket):
+    def mask(df):
+        # Тег длительности - только у звонков с известной ненулевой длительностью
+        return _duration_mask(df, bucket) & (duration_values(df) > 0)
+    return mask
+
+
+# Теги, которые выводятся из результата звонка и длительности, а не хранятся в колонках
+DERIVED_TAGS = {
+    'успешный': lambda df: call_results(df) == 'успешный',
+    'неуспешный': lambda df: call_results(df) == 'неуспешный',
+    'отменен': lambda df: np.array(['отмен' in result and result not in ('успешный', 'неуспешный')
+                                    for result in call_results(df)], dtype=bool),
+}
+DERIVED_TAGS.update({tag: _duration_tag_mask(bucket) for bucket, tag in DURATION_TAGS.items()})
+
+
+CONDITIONS = {
+    'source': _source_mask,
+    'ids': _ids_mask,
+    'search': _search_mask,
+    'status': _status_mask,
+    'purpose': _purpose_mask,
+    'result': _result_mask,
+    'operator': _operator_mask,
+    'date': _date_mask,
+    # Даты и диапазон дат - по отсортированному индексу ended_at (см. CallFilters._date_range_mask)
+    'date_from': None,
+    'date_to': None,
+    'duration': _duration_mask,
+    'tags': None,  # Маска по тегам - из индекса тегов и DERIVED_TAGS (см. CallFilters._tags_mask)
+}
+
+
+class CallFilters:
+    """Единый движок фильтров звонков для /api/calls, /api/chat и /api/custom-analyze.
+
+    Спецификация фильтра (см. normalize_spec) раскладывается на условия,
+    каждое условие - булева маска по строкам общего DataFrame звонков.
+    Маски условий и итоговые маски фильтров запоминаются, поэтому повторный
+    запрос с теми же фильтрами (страницы таблицы, сообщения чата) не
+    пересчитывает ни одного условия. Запомненное сбрасывается при смене
+    DataFrame (перезагрузка, новые строки) и при любом изменении хранилища.
+    """
+
+    def __init__(self, store, tag_index, max_masks=MAX_MASKS):
+        self.tag_index = tag_index  # calls_tag_index.TagIndex
+        self.max_masks = max_masks
+        self._lock = threading.Lock()
+        self._frame = None
+        self._epoch = 0
+        self._masks = OrderedDict()  # условие или фильтр целиком -> маска
+        self.hits = 0
+        self.misses = 0
+        store.subscribe(self._on_store_change)
+
+    def _on_store_change(self, event, payload):
+        with self._lock:
+            self._epoch += 1
+            self._masks = OrderedDict()
+
+    def _cached(self, df, key, compute):
+        with self._lock:
+            if df is not self._frame:
+                self._frame = df
+                self._masks = OrderedDict()
+            mask = self._masks.get(key)
+            if mask is not None:
+                self._masks.move_to_end(key)
+                self.hits += 1
+                return mask
+            self.misses += 1
+            epoch = self._epoch
+        mask = compute()
+        with self._lock:
+            # Изменение хранилища во время расчета - результат не запоминаем
+            if epoch == self._epoch and df is self._frame:
+                self._masks[key] = mask
+                while len(self._masks) > self.max_masks:
+                    self._masks.popitem(last=False)
+        return mask
+
+    def _tags_mask(self, df, tags):
+        def compute():
+            mask = np.asarray(self.tag_index.mask(df, tags), dtype=bool)
+            for tag in tags & DERIVED_TAGS.keys():
+                mask = mask | self._cached(df, ('derived_tag', tag), lambda: DERIVED_TAGS[tag](df))
+            return mask
+        return self._cached(df, ('tags', tags), compute)
+
+    def ended_at_index(self, df):
+        """Отсортированный индекс ended_at для df (строится один раз до смены DataFrame или хранилища)"""
+        return self._cached(df, ('ended_at_index',), lambda: EndedAtIndex(df))
+
+    def _date_range_mask(self, df, start, end):
+        """Звонки, завершенные в [start, end): двоичный поиск по индексу ended_at"""
+        return self._cached(df, ('date_range', start, end), lambda: self.ended_at_index(df).range_mask(start, end))
+
+    def _condition_mask(self, df, name, value):
+        if name == 'tags':
+            return self._tags_mask(df, value)
+        if name == 'date' and ENDED_AT_SOURCE_COLUMN in df.columns:
+            # Колонка date - это ended_at в формате дд.мм.гггг, поэтому день - диапазон по индексу
+            day = _parse_day(value)
+            if day is not None:
+                return self._date_range_mask(df, day, day + pd.Timedelta(days=1))
+        return self._cached(df, (name, value), lambda: np.asarray(CONDITIONS[name](df, value), dtype=bool))
+
+    def mask(self, df, spec):
+        """Булева маска строк df, подходящих под спецификацию фильтра"""
+        conditions = normalize_spec(spec)
+        # date_from и date_to - одно условие диапазона (dateTo включительно - до начала следующего дня)
+        dates = {name: value for name, value in conditions if name in ('date_from', 'date_to')}
+        conditions_without_dates = [(name, value) for name, value in conditions if name not in dates]
+
+        def combine():
+            mask = np.ones(len(df), dtype=bool)
+            if dates:
+                end = dates['date_to'] + pd.Timedelta(days=1) if 'date_to' in dates else None
+                mask = mask & self._date_range_mask(df, dates.get('date_from'), end)
+            for name, value in conditions_without_dates:
+                mask = mask & self._condition_mask(df, name, value)
+            return mask
+
+        if len(conditions) <= 1:
+            return combine()
+        return self._cached(df, ('spec', conditions), combine)
+
+    def apply(self, df, spec):
+        """Строки df, подходящие под фильтр (сам df, если подходят все)"""
+        mask = self.mask(df, spec)
+        return df if mask.all() else df[mask]
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hitRate': round(self.hits / total, 4) if total else 0.0,
+                'masks': len(self._masks),
+            }
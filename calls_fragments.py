@@ -0,0 +1,135 @@
+import json
+import threading
+from collections import OrderedDict
+
+from calls_serializer import CALL_FIELDS, serialize_calls
+
+MAX_PROJECTIONS = 4  # Сколько разных наборов полей (fields) держать в кэше
+
+
+def encode_call(call):
+    """JSON-фрагмент одного звонка (компактный, без экранирования кириллицы)"""
+    return json.dumps(call, ensure_ascii=False, separators=(',', ':'))
+
+
+class CallFragmentCache:
+    """Кэш уже закодированных JSON-фрагментов звонков для ответа /api/calls.
+
+    Ключ фрагмента - id строки хранилища и версия строки: номер последнего
+    события хранилища, изменившего строку (update/insert - результаты анализа
+    и транскрибации через журнал, новые звонки import_folder), так что
+    фрагмент измененного звонка просто перестает совпадать и собирается заново,
+    а неизменные строки берутся готовыми. Фрагменты хранятся отдельно для
+    каждого набора полей. replace хранилища, полная перезагрузка общего кэша
+    звонков (epoch() изменился) и новая колонка в DataFrame (значение по
+    умолчанию меняется на пустое у всех строк) сбрасывают всё.
+
+    snapshot() берется до получения DataFrame из общего кэша и передается в
+    encode(): такой DataFrame содержит все изменения до номера snapshot.
+    Строки, измененные после него, сериализуются из DataFrame, но в кэш не
+    попадают - иначе устаревший фрагмент сохранился бы под новой версией.
+
+    Поле transcription не кэшируется: транскрипции намеренно лежат вне памяти
+    (TranscriptStore), такие ответы собираются как раньше.
+
+    Подписывается на хранилище после CallsCache: версия строки растет уже
+    после того, как изменение применено к DataFrame.
+    """
+
+    def __init__(self, store, epoch, max_projections=MAX_PROJECTIONS):
+        self._epoch = epoch  # epoch() -> метка загрузки DataFrame общего кэша
+        self.max_projections = max_projections
+        self._lock = threading.Lock()
+        self._versions = {}  # id строки -> номер последнего изменения строки
+        self._counter = 0  # номер последнего события хранилища
+        self._cleared_at = 0  # номер последней замены хранилища
+        self._fragments = OrderedDict()  # набор полей -> {id строки: (версия, фрагмент)}
+        self._loaded_epoch = None
+        self._columns = None
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        store.subscribe(self._on_store_change)
+
+    def _on_store_change(self, event, payload):
+        with self._lock:
+            self._counter += 1
+            if event in ('update', 'insert'):
+                for row_id in payload:
+                    self._versions[row_id] = self._counter
+            else:
+                self._versions = {}
+                self._fragments = OrderedDict()
+                self._cleared_at = self._counter
+
+    def snapshot(self):
+        """Метка состояния для encode(): берется до получения DataFrame из общего кэша"""
+        with self._lock:
+            return self._epoch(), self._counter
+
+    def _projection(self, key, columns):
+        epoch = self._epoch()
+        if epoch != self._loaded_epoch or columns != self._columns:
+            self._fragments = OrderedDict()
+            self._loaded_epoch = epoch
+            self._columns = columns
+        cached = self._fragments.get(key)
+        if cached is None:
+            cached = self._fragments[key] = {}
+            while len(self._fragments) > self.max_projections:
+                self._fragments.popitem(last=False)
+        self._fragments.move_to_end(key)
+        return cached
+
+    def encode(self, df, texts, snapshot, fields=None):
+        """JSON-фрагменты звонков df в порядке строк: из кэша или сериализованные заново.
+
+        snapshot - результат snapshot(), взятый до получения df.
+        """
+        key = tuple(field for field in CALL_FIELDS if fields is None or field in fields)
+        if 'transcription' in key:
+            with self._lock:
+                self.bypassed += len(df)
+            return [encode_call(call) for call in serialize_calls(df, texts, fields=key)]
+
+        epoch, counter = snapshot
+        row_ids = df.index.tolist()
+        result = [None] * len(row_ids)
+        missing = []
+        with self._lock:
+            # df другой загрузки общего кэша или полученный до замены хранилища кэш не трогает
+            cacheable = epoch == self._epoch() and counter >= self._cleared_at
+            cached = self._projection(key, tuple(df.columns)) if cacheable else {}
+            versions = [self._versions.get(row_id, 0) for row_id in row_ids]
+            for pos, (row_id, version) in enumerate(zip(row_ids, versions)):
+                entry = cached.get(row_id)
+                if entry is not None and entry[0] == version <= counter:
+                    result[pos] = entry[1]
+                else:
+                    missing.append(pos)
+            self.hits += len(row_ids) - len(missing)
+            self.misses += len(missing)
+
+        if missing:
+            # Версии взяты до сериализации: запись, попавшая между ними, даст промах в следующий раз.
+            # Строки с версией после snapshot в df могут быть старыми - их не кэшируем
+            fragments = [encode_call(call) for call in serialize_calls(df.iloc[missing], texts, fields=key)]
+            with self._lock:
+                for pos, fragment in zip(missing, fragments):
+                    result[pos] = fragment
+                    if cacheable and versions[pos] <= counter:
+                        cached[row_ids[pos]] = (versions[pos], fragment)
+        return result
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hitRate': round(self.hits / total, 4) if total else 0.0,
+                'bypassed': self.bypassed,
+                'projections': len(self._fragments),
+                'rows': sum(len(cached) for cached in self._fragments.values()),
+                'chars': sum(len(entry[1]) for cached in self._fragments.values() for entry in cached.values()),
+            }
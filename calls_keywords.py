@@ -0,0 +1,214 @@
+import threading
+from functools import lru_cache
+
+import numpy as np
+
+from calls_text import stem, text_tokens, tokenize
+
+HITS_CACHE_SIZE = 4096  # Сколько векторов совпадений транскрипций держать в памяти
+
+# Группы ключевых слов для анализа звонков без LLM: группа -> слова и фразы.
+# Слово совпадает со словом текста, которое начинается с его основы ('доставка' -
+# 'доставки', 'цен' - 'цены', но не 'оценка'); во фразе слова до последнего
+# сравниваются целиком и идут подряд ('не работает')
+KEYWORD_GROUPS = {
+    # basic_analysis_dict
+    'greeting': ('здравствуйте', 'добрый день'),
+    'sales': ('купить', 'цена', 'стоимость'),
+    'complaint': ('проблема', 'не работает', 'жалоба'),
+    'question': ('подскажите', 'вопрос'),
+    'thanks': ('спасибо',),
+    'agreement': ('спасибо', 'договорились'),
+    'postpone': ('подумаю', 'перезвоните'),
+    'expensive': ('дорого',),
+    'unsure': ('не уверен', 'подумаю'),
+    'competitor': ('конкурент',),
+    'interest_product': ('товар', 'продукт'),
+    'interest_price': ('цен', 'стоимост'),
+    'interest_delivery': ('доставк', 'отправк'),
+    'interest_quality': ('качеств',),
+    'interest_terms': ('срок',),
+    'positive': ('хорош', 'нравится'),
+    'suitable': ('подход',),
+    'discount': ('скидк',),
+    'fast': ('быстр',),
+    'slow': ('долго',),
+    'unsatisfied': ('не устраивает',),
+    # Заглушка analyze_transcript
+    'incoming': ('могу помочь',),
+    'price': ('цена',),
+    'price_mention': ('цена', 'стоимость'),
+    'promo': ('акция', 'скидка'),
+    'delivery': ('доставка',),
+    'thinking': ('подумаю',),
+    'no_time': ('нет времени',),
+    'not_interested': ('не интересно',),
+    'not_suitable': ('не подходит',),
+    'unclear': ('не понятно',),
+    'repeat': ('повторите',),
+    'warranty': ('гарантия',),
+    'interested': ('интересно',),
+    'delivery_terms': ('доставка', 'условия'),
+    'asking': ('вопрос', 'спросить'),
+    'good': ('хорошее',),
+    'price_ok': ('устраивает', 'согласен'),
+    'deadlines_ok': ('устраивают',),
+    'wait': ('ждать',),
+    'doubt': ('сомневаюсь', 'не уверен'),
+    # basic_preview_analysis: тип звонков по числу найденных слов группы
+    'preview_sales': ('продажа', 'купить', 'цена', 'стоимость', 'предложение', 'скидка'),
+    'preview_support': ('проблема', 'помощь', 'техподдержка', 'неисправность', 'ошибка'),
+    'preview_consultation': ('консультация', 'вопрос', 'информация', 'узнать'),
+}
+
+
+MAX_WORD_CLASSES = 200000  # Предел таблицы слово -> класс (при переполнении таблица очищается)
+
+
+def keyword_pattern(keyword):
+    """Ключевое слово или фраза -> последовательность условий на слова текста.
+
+    Условие ('=', слово) - слово совпадает целиком (слова фразы до последнего),
+    ('^', основа) - слово начинается с основы (последнее слово).
+    """
+    words = tokenize(keyword)
+    if not words:
+        raise ValueError(f"Пустое ключевое слово: {keyword!r}")
+    return tuple(('=', word) for word in words[:-1]) + (('^', stem(words[-1])),)
+
+
+class KeywordMatcher:
+    """Автомат Ахо-Корасик по всем ключевым словам групп: все совпадения за один проход по тексту.
+
+    Автомат работает над словами, а не над символами: каждое слово текста
+    сначала переводится в класс - набор условий ключевых слов, которым оно
+    удовлетворяет (таблица слово -> класс общая для всех текстов), затем
+    делается один переход. Состояние - набор незавершенных совпадений фраз,
+    переходы строятся по мере встречи и запоминаются, поэтому проход по
+    тексту - это поиск в словаре на слово. Слова вне ключевых (класс 0) в
+    начальном состоянии пропускаются.
+
+    hits(text) - вектор числа совпадений каждого ключевого слова (позиции -
+    self.keywords), он кэшируется по тексту транскрипции. Правила анализа
+    читают вектор через found/present по имени группы.
+    """
+
+    def __init__(self, groups, cache_size=HITS_CACHE_SIZE):
+        positions = {}
+        self.groups = {}
+        for name, keywords in groups.items():
+            ids = [positions.setdefault(keyword_pattern(keyword), len(positions)) for keyword in keywords]
+            self.groups[name] = np.array(ids, dtype=np.intp)
+        self.keywords = list(positions)
+        # Условия -> номера; у слова класс - набор номеров выполненных условий
+        self._conditions = {}
+        self._patterns = [tuple(self._conditions.setdefault(c, len(self._conditions)) for c in pattern)
+                          for pattern in self.keywords]
+        self._exact = {value: cid for (kind, value), cid in self._conditions.items() if kind == '='}
+        self._prefixes = {value: cid for (kind, value), cid in self._conditions.items() if kind == '^'}
+        self._max_prefix = max((len(value) for value in self._prefixes), default=0)
+        self._word_classes = {}  # слово -> номер класса (0 - слово не участвует в ключевых)
+        self._classes = {frozenset(): 0}  # набор условий -> номер класса
+        self._class_sets = [frozenset()]
+        self._states = {frozenset(): 0}  # набор незавершенных совпадений (образец, позиция) -> номер состояния
+        self._state_sets = [frozenset()]
+        self._transitions = {}  # (состояние, класс) -> (состояние, завершенные образцы)
+        self._lock = threading.Lock()
+        self._hits = lru_cache(maxsize=cache_size)(self._scan_text)
+
+    def _word_class(self, word):
+        conditions = set()
+        if word in self._exact:
+            conditions.add(self._exact[word])
+        for length in range(1, min(len(word), self._max_prefix) + 1):
+            cid = self._prefixes.get(word[:length])
+            if cid is not None:
+                conditions.add(cid)
+        key = frozenset(conditions)
+        with self._lock:
+            class_id = self._classes.get(key)
+            if class_id is None:
+                class_id = self._classes[key] = len(self._class_sets)
+                self._class_sets.append(key)
+            if len(self._word_classes) >= MAX_WORD_CLASSES:
+                self._word_classes = {}
+            self._word_classes[word] = class_id
+        return class_id
+
+    def _step(self, state, class_id):
+        """Переход автомата: продолжение незавершенных совпадений и начало новых"""
+        conditions = self._class_sets[class_id]
+        active, done = set(), []
+        candidates = [(p, 0) for p in range(len(self._patterns))]
+        candidates.extend(self._state_sets[state])
+        for pattern_id, position in candidates:
+            pattern = self._patterns[pattern_id]
+            if pattern[position] not in conditions:
+                continue
+            if position + 1 == len(pattern):
+                done.append(pattern_id)
+            else:
+                active.add((pattern_id, position + 1))
+        key = frozenset(active)
+        with self._lock:
+            next_state = self._states.get(key)
+            if next_state is None:
+                next_state = self._states[key] = len(self._state_sets)
+                self._state_sets.append(key)
+            result = self._transitions[state, class_id] = (next_state, tuple(sorted(set(done))) or None)
+        return result
+
+    def _scan_text(self, text):
+        counts = [0] * len(self.keywords)
+        word_classes, transitions = self._word_classes, self._transitions
+        state = 0
+        for word in text_tokens(text).words:
+            class_id = word_classes.get(word)
+            if class_id is None:
+                class_id = self._word_class(word)
+            if not class_id and not state:
+                continue
+            step = transitions.get((state, class_id))
+            if step is None:
+                step = self._step(state, class_id)
+            state, done = step
+            if done is not None:
+                for pattern_id in done:
+                    counts[pattern_id] += 1
+        hits = np.array(counts, dtype=np.int32)
+        hits.flags.writeable = False
+        return hits
+
+    def hits(self, text):
+        """Вектор числа совпадений ключевых слов в тексте"""
+        return self._hits(text if isinstance(text, str) else ('' if text is None else str(text)))
+
+    def hits_any(self, texts):
+        """Вектор: встречается ли ключевое слово хотя бы в одном из текстов"""
+        found = np.zeros(len(self.keywords), dtype=bool)
+        for text in texts:
+            found |= self.hits(text) > 0
+        return found
+
+    def found(self, hits, group):
+        """Есть ли в тексте хотя бы одно слово группы"""
+        return bool(hits[self.groups[group]].any())
+
+    def present(self, hits, group):
+        """Сколько разных слов группы встречается в тексте"""
+        return int(np.count_nonzero(hits[self.groups[group]]))
+
+    def stats(self):
+        info = self._hits.cache_info()
+        return {
+            'keywords': len(self.keywords),
+            'states': len(self._state_sets),
+            'wordClasses': len(self._class_sets),
+            'words': len(self._word_classes),
+            'hits': info.hits,
+            'misses': info.misses,
+            'size': info.currsize,
+        }
+
+
+KEYWORDS = KeywordMatcher(KEYWORD_GROUPS)
@@ -0,0 +1,316 @@
+from datetime import datetime
+import functools
+
+import numpy as np
+import pandas as pd
+
+from call_store import CALL_ID_COLUMN
+from calls_compact import (
+    DURATION_SECONDS_COLUMN, ENDED_AT_COLUMN, SOURCE_KIND_COLUMN, TAG_LIST_COLUMN, format_duration,
+)
+
+UNKNOWN_CUSTOMER = 'Неизвестный клиент'
+AGENT_NAME = 'Оператор'
+TRANSCRIPT_PREVIEW_CHARS = 200
+
+STATUS_MAP = {
+    'doz': 'успешный',
+    'nedoz': 'неуспешный',
+    'не дозвон': 'неуспешный',
+    'дозвон': 'успешный'
+}
+
+
+# Вспомогательные функции для парсинга сложных полей из Excel
+def _parse_manager_performance(value):
+    """Парсинг поля 'Оценка менеджера'"""
+    if not value or value == '' or value == 'nan':
+        return None
+    try:
+        # Если это строка вида "8/10", извлекаем число
+        if isinstance(value, str) and '/10' in value:
+            score = int(value.split('/')[0])
+            return {"общая_оценка": score, "details": f"Оценка: {score}/10"}
+        elif isinstance(value, (int, float)):
+            return {"общая_оценка": int(value), "details": f"Оценка: {int(value)}/10"}
+    except (TypeError, ValueError, OverflowError):
+        pass
+    return None
+
+def _parse_client_interests(value):
+    """Парсинг поля 'Интересы клиента'"""
+    if not value or value == '' or value == 'nan':
+        return []
+    try:
+        # Разделяем по запятой и очищаем
+        interests = [interest.strip() for interest in str(value).split(',') if interest.strip()]
+        return interests
+    except (TypeError, ValueError):
+        return []
+
+def _parse_decision_factors(value):
+    """Парсинг поля 'Факторы решения'"""
+    if not value or value == '' or value == 'nan':
+        return {"positive": [], "negative": []}
+    try:
+        factors = {"positive": [], "negative": []}
+        text = str(value)
+
+        # Ищем положительные факторы
+        if "Положительные:" in text:
+            pos_part = text.split("Положительные:")[1]
+            if "Отрицательные:" in pos_part:
+                pos_part = pos_part.split("Отрицательные:")[0]
+            pos_part = pos_part.strip().rstrip(';').strip()
+            if pos_part:
+                factors["positive"] = [f.strip() for f in pos_part.split(',') if f.strip()]
+
+        # Ищем отрицательные факторы
+        if "Отрицательные:" in text:
+            neg_part = text.split("Отрицательные:")[1].strip()
+            if neg_part:
+                factors["negative"] = [f.strip() for f in neg_part.split(',') if f.strip()]
+
+        return factors
+    except (TypeError, ValueError):
+        return {"positive": [], "negative": []}
+
+def _safe_numeric(value, default=0):
+    """Безопасно преобразует значение в число, заменяя NaN и None на default"""
+    try:
+        if pd.isna(value) or value is None:
+            return default
+
+        # Попытка преобразования в число
+        if isinstance(value, (int, float)):
+            # Проверяем на NaN для float
+            if pd.isna(value):
+                return default
+            return value
+
+        # Если строка, пытаемся парсить
+        if isinstance(value, str):
+            value = value.strip()
+            if not value:
+                return default
+
+            # Пытаемся извлечь число из строки (например "5/10" -> 5)
+            if '/' in value:
+                value = value.split('/')[0]
+
+            return float(value)
+
+        return default
+    except (ValueError, TypeError, AttributeError):
+        return default
+
+def _format_audio_duration(duration_seconds):
+    """Форматирует длительность в секундах в формат MM:SS"""
+    if pd.isna(duration_seconds) or not duration_seconds:
+        return ""
+    try:
+        duration = float(duration_seconds)
+        minutes = int(duration // 60)
+        seconds = int(duration % 60)
+        return f"{minutes:02d}:{seconds:02d}"
+    except (TypeError, ValueError, OverflowError):
+        return ""
+
+def _call_status(value):
+    """Статус звонка по значению Дозвон/Недозвон"""
+    return STATUS_MAP.get(str(value).lower(), 'требует внимания')
+
+
+# --- Колоночная сборка ---
+
+def _map_unique(series, func):
+    """Применяет func к каждому уникальному значению колонки и раскладывает результат по строкам"""
+    try:
+        codes, uniques = pd.factorize(series, use_na_sentinel=False)
+    except TypeError:
+        # Нехэшируемые значения (списки) - считаем построчно
+        return np.array([func(value) for value in series], dtype=object)
+    mapped = np.empty(len(uniques), dtype=object)
+    mapped[:] = [func(value) for value in uniques.tolist()]
+    return mapped[codes]
+
+
+def _column(df, col, func, default):
+    """Поле ответа из колонки df (или одно значение default для всех строк, если колонки нет)"""
+    if col in df.columns:
+        return _map_unique(df[col], func)
+    result = np.empty(len(df), dtype=object)
+    result[:] = [func(default)]
+    return result
+
+
+def _str_column(df, col, default):
+    return _column(df, col, str, default)
+
+
+# Поля звонка в ответе /api/calls (в порядке вывода)
+CALL_FIELDS = (
+    'id', 'agent', 'customer', 'date', 'time', 'duration', 'status', 'purpose', 'transcription',
+    'recordUrl', 'tag', 'aiSummary', 'keyInsight', 'recommendation', 'score', 'callType', 'callResult',
+    'salesReadiness', 'conversionProbability', 'managerPerformance', 'clientInterests', 'decisionFactors',
+    'keyQuestion1Answer', 'keyQuestion2Answer', 'keyQuestion3Answer', 'tags', 'sourceFile',
+    'audioDuration', 'transcriptLength', 'transcriptPreview',
+)
+
+# Поля по умолчанию: полный текст транскрипции отдается только по запросу (fields=...,transcription
+# или /api/calls/<id>/transcript), в списке - длина и начало текста
+DEFAULT_CALL_FIELDS = tuple(field for field in CALL_FIELDS if field != 'transcription')
+
+# Поля, по которым можно сортировать, и колонки таблицы за ними
+SORT_COLUMNS = {
+    'id': CALL_ID_COLUMN,
+    'customer': 'Номер телефона',
+    'date': ENDED_AT_COLUMN,
+    'duration': DURATION_SECONDS_COLUMN,
+    'status': 'Дозвон/Недозвон',
+    'purpose': 'Цели',
+    'tag': 'Tag',
+    'score': 'AI-оценка',
+    'salesReadiness': 'Готовность к продаже',
+    'conversionProbability': 'Вероятность конверсии',
+}
+NUMERIC_SORT_FIELDS = {'score', 'salesReadiness', 'conversionProbability'}
+
+
+def sort_calls(df, sort, texts):
+    """Сортирует строки df по параметру sort вида '-date,score' ('-' - по убыванию).
+
+    Пустые значения всегда в конце, порядок равных строк сохраняется.
+    ValueError - если поле сортировки неизвестно.
+    """
+    keys, ascending = {}, []
+    for item in sort.split(','):
+        item = item.strip()
+        name = item.lstrip('+-')
+        if not name:
+            continue
+        if name == 'transcriptLength':
+            values = pd.Series(texts.lengths(df.index))
+        elif name in SORT_COLUMNS:
+            col = SORT_COLUMNS[name]
+            if col not in df.columns:
+                continue
+            values = df[col].reset_index(drop=True)
+            if name == 'status':
+                values = pd.Series(_map_unique(values, _call_status)).astype('string')
+            elif name in NUMERIC_SORT_FIELDS:
+                values = pd.to_numeric(pd.Series(_map_unique(values, _safe_numeric)), errors='coerce')
+            elif not (pd.api.types.is_numeric_dtype(values) or pd.api.types.is_datetime64_any_dtype(values)):
+                values = values.astype('string')
+        else:
+            raise ValueError(f"Неизвестное поле сортировки: {name}")
+        keys[f"key{len(keys)}"] = values
+        ascending.append(not item.startswith('-'))
+    if not keys:
+        return df
+    order = pd.DataFrame(keys).sort_values(list(keys), ascending=ascending, na_position='last', kind='stable')
+    return df.iloc[order.index.to_numpy()]
+
+
+def serialize_calls(df, texts, fields=None):
+    """Строит список звонков для /api/calls целиком по колонкам.
+
+    Каждое поле вычисляется один раз для всей колонки: функции разбора
+    применяются только к уникальным значениям (статусы, теги, оценки
+    повторяются), транскрипции и их длины берутся из texts (TranscriptStore)
+    одним запросом. Затем записи собираются за один проход. Результат
+    совпадает с прежним построчным обходом df.iterrows().
+
+    fields - список полей из CALL_FIELDS для ответа (None - все поля);
+    не запрошенные поля не вычисляются.
+    """
+    n = len(df)
+    if n == 0:
+        return []
+    index = df.index
+
+    @functools.cache
+    def customer():
+        return _str_column(df, 'Номер телефона', UNKNOWN_CUSTOMER)
+
+    @functools.cache
+    def record_url():
+        return _str_column(df, 'Ссылка на запись', '')
+
+    def ids():
+        if CALL_ID_COLUMN in df.columns:
+            call_ids = df[CALL_ID_COLUMN].astype(object).to_numpy()
+            has_id = np.array([isinstance(value, str) and value != '' for value in call_ids], dtype=bool)
+        else:
+            call_ids = np.empty(n, dtype=object)
+            has_id = np.zeros(n, dtype=bool)
+        return np.where(has_id, call_ids, index.astype(str).to_numpy(dtype=object))
+
+    def source_file():
+        # Источник файла: из колонки, а без неё - имя локального файла или номер телефона
+        result = _str_column(df, 'Источник файла', '')
+        missing_source = result == ''
+        if missing_source.any():
+            urls = record_url()
+            local = _column(df, SOURCE_KIND_COLUMN, lambda kind: kind == 'local', 'other').astype(bool)
+            fallback = np.where(
+                local,
+                [url.split('/')[-1] for url in urls],
+                np.where(customer() != UNKNOWN_CUSTOMER, customer(), [f"Запись #{idx}" for idx in index]),
+            )
+            result = np.where(missing_source, fallback, result)
+        return result
+
+    def transcription():
+        return np.array([str(value) for value in texts.values(index, default='-')], dtype=object)
+
+    now = datetime.now()
+    builders = {
+        'id': ids,
+        'agent': lambda: np.full(n, AGENT_NAME, dtype=object),
+        'customer': customer,
+        'date': lambda: _column(df, 'date', lambda value: value, now.strftime('%d.%m.%Y')),
+        'time': lambda: _column(df, 'time', lambda value: value, now.strftime('%H:%M')),
+        'duration': lambda: _column(df, DURATION_SECONDS_COLUMN, format_duration, np.nan),
+        'status': lambda: _column(df, 'Дозвон/Недозвон', _call_status, ''),
+        'purpose': lambda: _str_column(df, 'Цели', 'Не указана'),
+        'transcription': transcription,
+        'recordUrl': record_url,
+        'tag': lambda: _str_column(df, 'Tag', ''),
+
+        # Сохраненные поля анализа
+        'aiSummary': lambda: _str_column(df, 'AI-резюме', ''),
+        'keyInsight': lambda: _str_column(df, 'Ключевой вывод', ''),
+        'recommendation': lambda: _str_column(df, 'Рекомендации', ''),
+        'score': lambda: _column(df, 'AI-оценка', _safe_numeric, 0),
+        'callType': lambda: _str_column(df, 'Тип звонка', ''),
+        'callResult': lambda: _str_column(df, 'Результат звонка', ''),
+        'salesReadiness': lambda: _column(df, 'Готовность к продаже', _safe_numeric, 0),
+        'conversionProbability': lambda: _column(df, 'Вероятность конверсии', _safe_numeric, 0),
+
+        # Сложные поля
+        'managerPerformance': lambda: _column(df, 'Оценка менеджера', _parse_manager_performance, ''),
+        'clientInterests': lambda: _column(df, 'Интересы клиента', _parse_client_interests, ''),
+        'decisionFactors': lambda: _column(df, 'Факторы решения', _parse_decision_factors, ''),
+
+        # Ответы на ключевые вопросы
+        'keyQuestion1Answer': lambda: _str_column(df, 'Ответ на вопрос 1', ''),
+        'keyQuestion2Answer': lambda: _str_column(df, 'Ответ на вопрос 2', ''),
+        'keyQuestion3Answer': lambda: _str_column(df, 'Ответ на вопрос 3', ''),
+
+        'tags': lambda: _column(df, TAG_LIST_COLUMN, list, ()),
+        'sourceFile': source_file,
+        'audioDuration': lambda: _column(df, DURATION_SECONDS_COLUMN, _format_audio_duration, 0),
+        'transcriptLength': lambda: texts.lengths(index),
+        'transcriptPreview': lambda: np.array(texts.previews(index, TRANSCRIPT_PREVIEW_CHARS), dtype=object),
+    }
+
+    keys = [key for key in CALL_FIELDS if fields is None or key in fields]
+    columns = [builders[key]().tolist() for key in keys]
+    return [dict(zip(keys, values)) for values in zip(*columns)]
+
+
+def iter_serialized_calls(df, texts, fields=None, chunk_rows=1000):
+    """Звонки df по одному: сериализуются кусками по chunk_rows строк (для потоковых ответов)"""
+    for start in range(0, len(df), chunk_rows):
+        yield from serialize_calls(df.iloc[start:start + chunk_rows], texts, fields=fields)
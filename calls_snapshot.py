@@ -0,0 +1,141 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+# Ключи в метаданных Parquet-файла
+GENERATION_KEY = b'calls_generation'
+STORE_ID_KEY = b'calls_store_id'
+JSON_COLUMNS_KEY = b'calls_json_columns'
+
+
+class CallsSnapshot:
+    """Колоночный снимок таблицы звонков в Parquet для быстрой холодной загрузки.
+
+    Снимок помечается ID базы (CallStore.store_id) и поколением хранилища
+    (CallStore.generation) и считается актуальным, только пока совпадают оба:
+    у пересозданной базы поколения начинаются заново. Колонки со смешанными типами
+    значений (число и строка в одной колонке) сохраняются как JSON-строки и
+    разворачиваются обратно при чтении.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._version = None  # (ID базы, поколение) последнего записанного/прочитанного снимка
+
+    @property
+    def available(self):
+        return pq is not None
+
+    def version(self):
+        """(ID базы, поколение), из которых построен снимок (None - снимка нет)"""
+        if self._version is None and self.available and os.path.exists(self.path):
+            try:
+                metadata = pq.read_schema(self.path).metadata or {}
+                if GENERATION_KEY in metadata and STORE_ID_KEY in metadata:
+                    self._version = (metadata[STORE_ID_KEY].decode(), int(metadata[GENERATION_KEY]))
+            except Exception as e:
+                print(f"Не удалось прочитать снимок {self.path}: {e}")
+        return self._version
+
+    def load(self, store_id, generation, exclude=()):
+        """Читает снимок без колонок exclude. Возвращает None, если снимок устарел"""
+        if not self.available or self.version() != (store_id, generation):
+            return None
+        try:
+            schema = pq.read_schema(self.path)
+            metadata = schema.metadata or {}
+            pandas_meta = json.loads(metadata.get(b'pandas', b'{}'))
+            index_columns = set(pandas_meta.get('index_columns', []))
+            columns = [name for name in schema.names if name not in index_columns and name not in exclude]
+            df = pd.read_parquet(self.path, columns=columns, engine='pyarrow', memory_map=True)
+            json_columns = json.loads(metadata.get(JSON_COLUMNS_KEY, b'[]'))
+            for col in df.columns:
+                if col in json_columns:
+                    df[col] = _decode_json_column(df[col])
+                elif df[col].dtype == object:
+                    # Пустые значения в хранилище - NaN, Arrow возвращает их как None
+                    df[col] = df[col].where(df[col].notna(), np.nan)
+            return df
+        except Exception as e:
+            print(f"Ошибка чтения снимка {self.path}: {e}")
+            return None
+
+    def read_column(self, store_id, generation, column):
+        """Читает одну колонку снимка как Arrow-массив: (id строк, значения) или None.
+
+        Значения не превращаются в объекты Python, поэтому так удобно читать
+        тяжелые текстовые колонки. None - снимок устарел, колонки нет или она
+        сохранена как JSON (смешанные типы).
+        """
+        if not self.available or self.version() != (store_id, generation):
+            return None
+        try:
+            schema = pq.read_schema(self.path)
+            metadata = schema.metadata or {}
+            if column not in schema.names or column in json.loads(metadata.get(JSON_COLUMNS_KEY, b'[]')):
+                return None
+            index_columns = json.loads(metadata.get(b'pandas', b'{}')).get('index_columns', [])
+            if len(index_columns) != 1 or not isinstance(index_columns[0], str):
+                return None
+            table = pq.read_table(self.path, columns=[index_columns[0], column], memory_map=True)
+            return table.column(index_columns[0]).to_numpy(), table.column(column).combine_chunks()
+        except Exception as e:
+            print(f"Ошибка чтения колонки {column} из снимка {self.path}: {e}")
+            return None
+
+    def write(self, df, store_id, generation):
+        """Атомарно перезаписывает снимок содержимым DataFrame"""
+        if not self.available:
+            return False
+        try:
+            df = df.copy()
+            json_columns = []
+            for col in df.columns:
+                if df[col].dtype != object:
+                    continue
+                try:
+                    pa.array(df[col], from_pandas=True)
+                except (pa.ArrowInvalid, pa.ArrowTypeError, TypeError):
+                    df[col] = [None if _is_missing(value) else json.dumps(value, ensure_ascii=False) for value in df[col]]
+                    json_columns.append(col)
+            table = pa.Table.from_pandas(df, preserve_index=True)
+            metadata = dict(table.schema.metadata or {})
+            metadata[GENERATION_KEY] = str(generation).encode()
+            metadata[STORE_ID_KEY] = store_id.encode()
+            metadata[JSON_COLUMNS_KEY] = json.dumps(json_columns, ensure_ascii=False).encode('utf-8')
+            table = table.replace_schema_metadata(metadata)
+            # Свое временное имя у каждого процесса: снимок могут писать и сервер, и скрипты
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            try:
+                pq.write_table(table, tmp_path)
+                os.replace(tmp_path, self.path)
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+            self._version = (store_id, generation)
+            return True
+        except Exception as e:
+            print(f"Ошибка записи снимка {self.path}: {e}")
+            return False
+
+
+def _decode_json_column(series):
+    """Разворачивает JSON-строки колонки, разбирая каждое уникальное значение один раз"""
+    codes, uniques = pd.factorize(series, use_na_sentinel=True)
+    decoded = np.empty(len(uniques) + 1, dtype=object)
+    decoded[:-1] = [json.loads(value) for value in uniques]
+    decoded[-1] = np.nan  # Код -1 (пустое значение) указывает на последний элемент
+    return pd.Series(decoded[codes], index=series.index, dtype=object)
+
+
+def _is_missing(value):
+    return value is None or (isinstance(value, float) and np.isnan(value))
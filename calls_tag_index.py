@@ -0,0 +1,179 @@
+import json
+import threading
+
+import numpy as np
+import pandas as pd
+
+from calls_compact import TAG_LIST_COLUMN, TAGS_COLUMN, parse_tag_list
+
+# Колонки-источники тегов: разобранный JSON tags, одиночные теги и теги в JSON анализа
+SINGLE_TAG_COLUMNS = ('Tag', 'Тег')
+ANALYSIS_COLUMN = 'analysis'
+
+
+def _single_tag(value):
+    if pd.isna(value) or not str(value).strip() or str(value).strip().lower() == 'nan':
+        return ()
+    return (str(value),)
+
+
+def _analysis_tags(value):
+    """Теги из поля analysis (JSON-объект с ключом tags)"""
+    if not isinstance(value, str) or not value:
+        return ()
+    try:
+        data = json.loads(value)
+    except ValueError:
+        return ()
+    tags = data.get('tags') if isinstance(data, dict) else None
+    return tuple(str(tag) for tag in tags) if isinstance(tags, list) else ()
+
+
+# Колонка DataFrame -> теги ячейки; колонка хранилища -> колонка DataFrame с её тегами
+TAG_SOURCES = {TAG_LIST_COLUMN: tuple, ANALYSIS_COLUMN: _analysis_tags}
+TAG_SOURCES.update({col: _single_tag for col in SINGLE_TAG_COLUMNS})
+STORE_TAG_SOURCES = {TAGS_COLUMN: (TAG_LIST_COLUMN, parse_tag_list), ANALYSIS_COLUMN: (ANALYSIS_COLUMN, _analysis_tags)}
+STORE_TAG_SOURCES.update({col: (col, _single_tag) for col in SINGLE_TAG_COLUMNS})
+
+
+class TagIndex:
+    """Инвертированный индекс тегов звонков: тег -> отсортированный массив id строк.
+
+    Строится по DataFrame общего кэша при первом обращении и дальше
+    поддерживается по событиям хранилища: запись тегов анализом (update),
+    новые звонки (insert). replace и перезагрузка DataFrame (epoch() изменился)
+    сбрасывают индекс, он строится заново при следующем обращении. Теги
+    сравниваются без учета регистра и пробелов по краям, в ответах - написание,
+    встреченное первым.
+
+    df во всех методах - полный DataFrame общего кэша звонков (не выборка).
+    """
+
+    def __init__(self, store, epoch):
+        self._epoch = epoch  # epoch() -> метка загрузки DataFrame общего кэша
+        self._lock = threading.Lock()
+        self._built_epoch = None
+        self._rows = {}  # тег (нижний регистр) -> множество id строк
+        self._sorted = {}  # тег -> отсортированный массив id строк (строится по запросу)
+        self._names = {}  # тег (нижний регистр) -> написание для ответа
+        self._row_tags = {}  # id строки -> {колонка: теги}, только строки с тегами
+        self.builds = 0
+        self.patches = 0
+        store.subscribe(self._on_store_change)
+
+    # --- Построение и обновление ---
+
+    def _reset(self):
+        self._built_epoch = None
+        self._rows, self._sorted, self._names, self._row_tags = {}, {}, {}, {}
+
+    def _ensure(self, df):
+        epoch = self._epoch()
+        if self._built_epoch == epoch and self._built_epoch is not None:
+            return
+        self._reset()
+        for col, func in TAG_SOURCES.items():
+            if col not in df.columns:
+                continue
+            codes, uniques = pd.factorize(df[col].astype(object), use_na_sentinel=False)
+            values = [func(value) for value in uniques.tolist()]
+            # Строки, сгруппированные по значению ячейки: один проход сортировки вместо прохода на значение
+            order = np.argsort(codes, kind='stable')
+            ends = np.cumsum(np.bincount(codes, minlength=len(values)))
+            row_index = df.index.to_numpy()[order]
+            start = 0
+            for tags, end in zip(values, ends):
+                if tags:
+                    row_ids = row_index[start:end].tolist()
+                    for row_id in row_ids:
+                        self._row_tags.setdefault(row_id, {})[col] = tags
+                    for tag in tags:
+                        self._add(tag, row_ids)
+                start = end
+        self._built_epoch = epoch
+        self.builds += 1
+
+    def _add(self, tag, row_ids):
+        name = str(tag).strip()
+        key = name.lower()
+        if not key:
+            return
+        self._names.setdefault(key, name)
+        self._rows.setdefault(key, set()).update(row_ids)
+        self._sorted.pop(key, None)
+
+    def _remove(self, tag, row_id):
+        key = str(tag).strip().lower()
+        rows = self._rows.get(key)
+        if rows is None:
+            return
+        rows.discard(row_id)
+        self._sorted.pop(key, None)
+        if not rows:
+            del self._rows[key]
+            del self._names[key]
+
+    def _set_row(self, row_id, col, tags):
+        current = self._row_tags.get(row_id, {})
+        for tag in current.get(col, ()):
+            self._remove(tag, row_id)
+        if tags:
+            self._row_tags.setdefault(row_id, {})[col] = tags
+            for tag in tags:
+                self._add(tag, [row_id])
+        elif col in current:
+            del current[col]
+            if not current:
+                del self._row_tags[row_id]
+        # Тег мог остаться у строки из другой колонки - возвращаем его
+        for other_col, other_tags in self._row_tags.get(row_id, {}).items():
+            if other_col != col:
+                for tag in other_tags:
+                    self._add(tag, [row_id])
+
+    def _on_store_change(self, event, payload):
+        with self._lock:
+            if self._built_epoch is None:
+                return
+            if event not in ('update', 'insert'):
+                self._reset()
+                return
+            for row_id, values in payload.items():
+                for store_col, (col, func) in STORE_TAG_SOURCES.items():
+                    if store_col in values:
+                        self._set_row(row_id, col, func(values[store_col]))
+            self.patches += 1
+
+    # --- Чтение ---
+
+    def rows(self, df, tag):
+        """Отсортированный массив id строк с тегом"""
+        key = str(tag).strip().lower()
+        with self._lock:
+            self._ensure(df)
+            ids = self._sorted.get(key)
+            if ids is None:
+                ids = np.array(sorted(self._rows.get(key, ())), dtype='int64')
+                self._sorted[key] = ids
+            return ids
+
+    def mask(self, df, tags):
+        """Булева маска строк df, у которых есть любой из тегов"""
+        ids = [self.rows(df, tag) for tag in tags]
+        ids = np.unique(np.concatenate(ids)) if ids else np.array([], dtype='int64')
+        return df.index.isin(ids)
+
+    def counts(self, df):
+        """{тег: число звонков} по всем тегам индекса"""
+        with self._lock:
+            self._ensure(df)
+            return {self._names[key]: len(rows) for key, rows in self._rows.items()}
+
+    def stats(self):
+        with self._lock:
+            return {
+                'tags': len(self._rows),
+                'rows': len(self._row_tags),
+                'builds': self.builds,
+                'patches': self.patches,
+            }
@@ -0,0 +1,90 @@
+import re
+import unicodedata
+from functools import lru_cache
+
+TOKEN_CACHE_SIZE = 4096  # Сколько разобранных транскрипций держать в памяти
+MIN_STEM_LENGTH = 4  # Окончание не отрезается, если от слова остается меньше
+
+_WORD_RE = re.compile(r'[^\W_]+')
+# Слова из кириллицы, латиницы и цифр разбираются более простым (и в разы более быстрым) выражением
+_BASIC_WORD_RE = re.compile(r'[0-9a-zа-я]+')
+_OTHER_LETTER_RE = re.compile(r'[^\W\d_a-zа-я]')
+_STRESS = '\u0301'  # Знак ударения (в расшифровках встречается внутри слов)
+
+# Окончания для облегченного стемминга: возвратные частицы, затем окончания
+# прилагательных, глаголов и существительных (длинные раньше коротких)
+REFLEXIVE_ENDINGS = ('ся', 'сь')
+WORD_ENDINGS = tuple(sorted({
+    'ими', 'ыми', 'ого', 'его', 'ому', 'ему', 'ая', 'яя', 'ое', 'ее', 'ые', 'ие', 'ый', 'ий', 'ой',
+    'ую', 'юю', 'ых', 'их', 'ым', 'им',
+    'йте', 'ите', 'ете', 'ешь', 'ишь', 'ать', 'ять', 'еть', 'ить', 'уть', 'ает', 'яет', 'ует', 'ают',
+    'яют', 'уют', 'ила', 'ала', 'ило', 'ало', 'или', 'али', 'ит', 'ат', 'ят', 'ут', 'ют', 'ет',
+    'ил', 'ал', 'ла', 'ли', 'ло', 'ть',
+    'иями', 'ями', 'ами', 'иях', 'ях', 'ах', 'ией', 'ей', 'ом', 'ем', 'ам', 'ям', 'ов', 'ев',
+    'ию', 'ью', 'ия', 'ья', 'а', 'я', 'о', 'е', 'ы', 'и', 'у', 'ю', 'ь', 'й',
+}, key=lambda ending: (-len(ending), ending)))
+
+
+def fold_yo(text):
+    """Замена ё на е с сохранением регистра"""
+    # str.replace, а не str.translate: translate на кириллице на два порядка медленнее
+    return text.replace('ё', 'е').replace('Ё', 'Е')
+
+
+def normalize_text(text):
+    """Текст для сравнения: Unicode NFKC, нижний регистр, ё -> е, без знаков ударения"""
+    if not isinstance(text, str):
+        text = '' if text is None else str(text)
+    return fold_yo(unicodedata.normalize('NFKC', text).lower()).replace(_STRESS, '')
+
+
+def tokenize(text):
+    """Слова нормализованного текста (буквы и цифры, без знаков препинания)"""
+    text = normalize_text(text)
+    if _OTHER_LETTER_RE.search(text) is None:
+        return _BASIC_WORD_RE.findall(text)
+    return _WORD_RE.findall(text)
+
+
+@lru_cache(maxsize=65536)
+def stem(word):
+    """Облегченный стемминг русского слова: отрезает одно окончание (и возвратную частицу).
+
+    Основа не короче MIN_STEM_LENGTH, поэтому короткие слова и уже усеченные
+    ключевые слова ('цен', 'доставк') не меняются.
+    """
+    for ending in REFLEXIVE_ENDINGS:
+        if word.endswith(ending) and len(word) - len(ending) >= MIN_STEM_LENGTH:
+            word = word[:-len(ending)]
+            break
+    for ending in WORD_ENDINGS:
+        if word.endswith(ending) and len(word) - len(ending) >= MIN_STEM_LENGTH:
+            return word[:-len(ending)]
+    return word
+
+
+class TextTokens:
+    """Разобранный текст: нормализованные слова по порядку (ключевые слова в них ищет calls_keywords)"""
+
+    __slots__ = ('words',)
+
+    def __init__(self, words):
+        self.words = tuple(words)
+
+    def __len__(self):
+        return len(self.words)
+
+
+@lru_cache(maxsize=TOKEN_CACHE_SIZE)
+def _text_tokens(text):
+    return TextTokens(tokenize(text))
+
+
+def text_tokens(text):
+    """TextTokens транскрипции; разбор кэшируется по тексту, повторный анализ того же звонка не перечитывает текст"""
+    return _text_tokens(text if isinstance(text, str) else ('' if text is None else str(text)))
+
+
+def cache_stats():
+    info = _text_tokens.cache_info()
+    return {'hits': info.hits, 'misses': info.misses, 'size': info.currsize, 'maxSize': info.maxsize}
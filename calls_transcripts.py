@@ -0,0 +1,207 @@
+import glob
+import os
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute  # noqa: F401 - pa.compute
+except ImportError:
+    pa = None
+
+PREVIEW_MARGIN = 64  # Запас на пробелы в начале текста при обрезке превью
+
+
+class TranscriptStore:
+    """Тексты транскрипций вне DataFrame звонков.
+
+    Тексты лежат в Arrow IPC файле <база>.<ID базы>.<поколение>.arrow без
+    сжатия и отображаются в память (mmap): в процессе хранятся только id строк
+    и смещения, сами строки читаются из страниц файла по обращению. Файл
+    строится один раз для поколения хранилища (ID базы в имени не дает взять
+    файл пересозданной базы с тем же поколением); изменения, сделанные после
+    загрузки (транскрибация, новые звонки), держатся в небольшом словаре
+    поверх файла. Без pyarrow тексты хранятся в памяти как раньше.
+
+    get() возвращает NaN для пустых значений - так же, как DataFrame.
+    """
+
+    def __init__(self, ids, texts, source=None):
+        self._positions = pd.Index(ids, dtype='int64')
+        self._texts = texts  # pa.LargeStringArray (mmap) или список строк
+        self._source = source  # Держит отображение файла, пока жив объект
+        self._overlay = {}
+
+    # --- Построение и открытие ---
+
+    @staticmethod
+    def _file_path(base_path, store_id, generation):
+        return f"{base_path}.{store_id}.{generation}.arrow"
+
+    @classmethod
+    def load(cls, base_path, store, column):
+        """Открывает файл текстов текущего поколения хранилища, при необходимости строит его"""
+        if pa is None:
+            generation, ids, values = store.read_text_column(column)
+            return cls(ids, values)
+        path = cls._file_path(base_path, store.store_id, store.generation())
+        if not os.path.exists(path):
+            # Имя файла - по поколению, прочитанному в той же транзакции, что и тексты
+            generation, ids, values = store.read_text_column(column)
+            path = cls._file_path(base_path, store.store_id, generation)
+            cls._write(path, ids, values)
+            cls._remove_stale(base_path, path)
+        source = pa.memory_map(path, 'r')
+        table = pa.ipc.open_file(source).read_all()
+        return cls(table.column('id').to_numpy(), table.column('text').combine_chunks(), source)
+
+    @staticmethod
+    def _write(path, ids, values):
+        if not isinstance(values, pa.Array):
+            values = pa.array([None if _is_missing(value) else str(value) for value in values], type=pa.large_string())
+        table = pa.table({'id': pa.array(np.asarray(ids, dtype='int64')), 'text': values.cast(pa.large_string())})
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with pa.OSFile(tmp_path, 'wb') as sink:
+                with pa.ipc.new_file(sink, table.schema) as writer:
+                    writer.write_table(table)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    @staticmethod
+    def _remove_stale(base_path, current_path):
+        for path in glob.glob(glob.escape(base_path) + '.*.arrow'):
+            if path != current_path:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass  # Файл еще отображен в память (Windows) - удалим в следующий раз
+
+    # --- Чтение ---
+
+    def __contains__(self, row_id):
+        return row_id in self._overlay or row_id in self._positions
+
+    def get(self, row_id, default=np.nan):
+        """Текст транскрипции строки row_id (default, если такой строки нет)"""
+        if row_id in self._overlay:
+            return self._overlay[row_id]
+        try:
+            position = self._positions.get_loc(row_id)
+        except KeyError:
+            return default
+        value = self._texts[position]
+        if pa is not None and isinstance(value, pa.Scalar):
+            value = value.as_py()
+        return np.nan if value is None else value
+
+    def series(self, index):
+        """Тексты для строк index в виде Series (материализуются только эти строки)"""
+        return pd.Series([self.get(row_id) for row_id in index], index=index, dtype=object)
+
+    def _take(self, positions):
+        """Тексты в позициях файла: Arrow-массив (из mmap) или список"""
+        if pa is not None and isinstance(self._texts, pa.Array):
+            return self._texts.take(pa.array(positions, type=pa.int64()))
+        return [self._texts[position] for position in positions]
+
+    def values(self, index, default=np.nan):
+        """Тексты строк index списком - то же, что get() для каждой строки, но одним запросом"""
+        positions = self._positions.get_indexer(index)
+        found = positions >= 0
+        result = [default] * len(positions)
+        if found.any():
+            taken = self._take(positions[found])
+            if not isinstance(taken, list):
+                taken = taken.to_pylist()
+            for i, value in zip(np.flatnonzero(found), taken):
+                result[i] = np.nan if value is None else value
+        for i, value in self._overlay_positions(index):
+            result[i] = value
+        return result
+
+    def lengths(self, index):
+        """Длина текста без пробелов по краям для строк index (0 для пустых и '-')"""
+        positions = self._positions.get_indexer(index)
+        result = np.zeros(len(positions), dtype='int64')
+        found = positions >= 0
+        if found.any():
+            # Сначала выбираем нужные строки, потом считаем: проход только по ним, а не по всему файлу
+            taken = self._take(positions[found])
+            if isinstance(taken, list):
+                result[found] = [_text_length(text) for text in taken]
+            else:
+                lengths = pa.compute.utf8_length(pa.compute.utf8_trim_whitespace(taken))
+                placeholder = pa.compute.is_in(taken, value_set=pa.array(['-', 'nan', ''], type=taken.type))
+                result[found] = pa.compute.if_else(placeholder, 0, lengths).fill_null(0).to_numpy(zero_copy_only=False)
+        for i, value in self._overlay_positions(index):
+            result[i] = _text_length(value)
+        return result
+
+    def previews(self, index, length):
+        """Начало текста (до length символов, '…' при обрезке) для строк index, '' для пустых и '-'"""
+        positions = self._positions.get_indexer(index)
+        found = positions >= 0
+        result = [''] * len(positions)
+        if found.any():
+            heads = self._take(positions[found])
+            if not isinstance(heads, list):
+                # Обрезаем в Arrow (с запасом на пробелы в начале): целиком тексты в Python не попадают
+                heads = pa.compute.utf8_slice_codeunits(heads, 0, length + PREVIEW_MARGIN).to_pylist()
+            for i, value in zip(np.flatnonzero(found), heads):
+                result[i] = _text_preview(value, length)
+        for i, value in self._overlay_positions(index):
+            result[i] = _text_preview(value, length)
+        return result
+
+    def _overlay_positions(self, index):
+        """Пары (позиция в index, значение) для строк, измененных после загрузки файла"""
+        if not self._overlay:
+            return []
+        keys = list(self._overlay)
+        return [(i, self._overlay[row_id]) for row_id, i in zip(keys, pd.Index(index).get_indexer(keys)) if i >= 0]
+
+    def equals(self, index, value):
+        """Булева маска по строкам index: текст равен value (строки в Python не материализуются)"""
+        positions = self._positions.get_indexer(index)
+        mask = np.zeros(len(positions), dtype=bool)
+        found = positions >= 0
+        if found.any():
+            taken = self._take(positions[found])
+            if isinstance(taken, list):
+                mask[found] = [text == value for text in taken]
+            else:
+                mask[found] = pa.compute.equal(taken, value).fill_null(False).to_numpy(zero_copy_only=False)
+        for i, text in self._overlay_positions(index):
+            mask[i] = text == value
+        return mask
+
+    def nbytes(self):
+        """Объем текстов в файле (байты UTF-8 и смещения) и в словаре изменений"""
+        base = self._texts.nbytes if pa is not None and isinstance(self._texts, pa.Array) else 0
+        return base + sum(len(str(value).encode('utf-8')) for value in self._overlay.values())
+
+    # --- Изменения ---
+
+    def set(self, row_id, value):
+        self._overlay[int(row_id)] = np.nan if _is_missing(value) else value
+
+
+def _is_missing(value):
+    return value is None or (isinstance(value, float) and np.isnan(value))
+
+
+def _text_length(text):
+    if _is_missing(text) or text in ('-', 'nan', ''):
+        return 0
+    return len(str(text).strip())
+
+
+def _text_preview(text, length):
+    if _is_missing(text) or text in ('-', 'nan', ''):
+        return ''
+    text = str(text).strip()
+    return text if len(text) <= length else text[:length].rstrip() + '…'
@@ -0,0 +1,89 @@
+import functools
+import gzip
+import hashlib
+import os
+import time
+
+from flask import make_response, request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+MIN_COMPRESS_SIZE = 1024  # Меньшие ответы отдаются без сжатия
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5  # Быстрый режим: ответы сжимаются на каждый запрос
+COMPRESSIBLE_TYPES = ('application/json', 'application/x-ndjson', 'text/')
+
+# ETag меняется и после перезапуска сервера: формат ответа мог измениться вместе с кодом
+_SERVER_TOKEN = f"{os.getpid()}-{time.time_ns()}"
+
+
+def request_etag(version):
+    """ETag ответа: версия данных, путь и параметры запроса"""
+    args = sorted(request.args.items(multi=True))
+    key = f"{_SERVER_TOKEN}|{version}|{request.path}|{args}"
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()[:24]
+
+
+def conditional(version):
+    """Декоратор GET-эндпоинта с условными запросами.
+
+    version() - дешевая версия данных (поколение хранилища). Ответ получает
+    ETag, а повторный запрос с тем же If-None-Match получает 304 без
+    вычисления тела. Cache-Control: no-cache заставляет браузер каждый раз
+    сверять версию, так что устаревшие данные не показываются.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.method != 'GET':
+                return view(*args, **kwargs)
+            etag = request_etag(version())
+            if request.if_none_match.contains_weak(etag):
+                response = make_response('', 304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag, weak=True)
+            response.headers['Cache-Control'] = 'no-cache'
+            return response
+        return wrapper
+    return decorator
+
+
+def _accepted_encoding():
+    accepted = request.accept_encodings
+    if brotli is not None and accepted['br']:
+        return 'br'
+    if accepted['gzip']:
+        return 'gzip'
+    return None
+
+
+def compress_response(response):
+    """after_request: сжимает большие JSON/текстовые ответы в br или gzip по Accept-Encoding"""
+    if (
+        response.status_code != 200
+        or response.direct_passthrough  # send_file и потоковые ответы
+        or response.is_streamed
+        or 'Content-Encoding' in response.headers
+        or not (response.mimetype or '').startswith(COMPRESSIBLE_TYPES)
+    ):
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = _accepted_encoding()
+    if encoding is None:
+        return response
+    data = response.get_data()
+    if len(data) < MIN_COMPRESS_SIZE:
+        return response
+    if encoding == 'br':
+        data = brotli.compress(data, quality=BROTLI_QUALITY)
+    else:
+        data = gzip.compress(data, compresslevel=GZIP_LEVEL)
+    response.set_data(data)
+    response.headers['Content-Encoding'] = encoding
+    return response
@@ -0,0 +1,277 @@
+import re
+
+# Образцы полей в текстовом ответе LLM (когда JSON не разобрался): поле -> образцы по приоритету.
+# Значение поля берется из первого по приоритету образца, который встречается в тексте
+# (самое левое совпадение), как при поочередном re.search по списку. Образец начинается
+# со слова-якоря: ключ JSON (кавычка перед ним не влияет на значение и опущена) или подпись
+RESULT_OPTIONS = re.IGNORECASE
+
+FIELD_PATTERNS = {
+    'evaluation': (
+        r'evaluation["\']?\s*:?\s*["\']([^"\']+)["\']',
+        r'оценка\s*:?\s*([^\n.,]+)',
+        r'звонок\s+прошел\s+([^\n.,]+)',
+    ),
+    'keyPoints': (
+        r'keyPoints["\']?\s*:?\s*["\']([^"\']+)["\']',
+        r'ключевые\s+моменты\s*:?\s*([^\n]+)',
+        r'основные\s+моменты\s*:?\s*([^\n]+)',
+    ),
+    'issues': (
+        r'issues["\']?\s*:?\s*["\']([^"\']+)["\']',
+        r'проблемы\s*:?\s*([^\n]+)',
+        r'сложности\s*:?\s*([^\n]+)',
+    ),
+    'recommendations': (
+        r'recommendations["\']?\s*:?\s*["\']([^"\']+)["\']',
+        r'рекомендации\s*:?\s*([^\n]+)',
+        r'советы\s*:?\s*([^\n]+)',
+    ),
+    # Списки в скобках: [^\]]* вместо ленивого .*? с DOTALL - то же совпадение без возвратов
+    'tags': (
+        r'tags["\']?\s*:?\s*\[([^\]]*)\]',
+        r'теги\s*:?\s*\[([^\]]*)\]',
+        r'теги\s*:?\s*([^\n]+)',
+    ),
+    'customResponse': (
+        r'customResponse["\']?\s*:?\s*["\']([^"\']+)["\']',
+        r'ответ\s+на\s+запрос\s*:?\s*([^\n]+)',
+        r'ответ\s*:?\s*([^\n]+)',
+    ),
+    'salesReadiness': (
+        r'salesReadiness["\']?\s*:?\s*(\d+)',
+        r'готовность\s+к\s+продаже\s*:?\s*(\d+)',
+    ),
+    'conversionProbability': (
+        r'conversionProbability["\']?\s*:?\s*(\d+)',
+        r'вероятность\s+конверсии\s*:?\s*(\d+)',
+    ),
+    'status': (
+        r'status["\']?\s*:?\s*["\']([^"\']+)["\']',
+        r'статус\s*:?\s*([^\n.,]+)',
+        r'статус звонка\s*:?\s*([^\n.,]+)',
+    ),
+    'callResult': (
+        r'callResult["\']?\s*:?\s*["\']([^"\']+)["\']',
+        r'результат\s*:?\s*([^\n.,]+)',
+        r'результат звонка\s*:?\s*([^\n.,]+)',
+    ),
+    'score': (
+        r'score["\']?\s*:?\s*(\d+(?:\.\d+)?)',
+        r'оценка\s*:?\s*(\d+(?:\.\d+)?)/10',
+        r'оценка звонка\s*:?\s*(\d+(?:\.\d+)?)',
+    ),
+    'keyInsight': (
+        r'keyInsight["\']?\s*:?\s*["\']([^"\']+)["\']',
+        r'ключевой вывод\s*:?\s*([^\n.,]+)',
+        r'главный вывод\s*:?\s*([^\n.,]+)',
+    ),
+    'clientInterests': (
+        r'clientInterests["\']?\s*:?\s*\[([^\]]*)\]',
+        r'интересы клиента\s*:?\s*\[([^\]]*)\]',
+        r'интересы клиента\s*:?\s*([^\n]+)',
+    ),
+    'positive': (
+        r'positive["\']?\s*:?\s*\[([^\]]*)\]',
+        r'положительные факторы\s*:?\s*\[([^\]]*)\]',
+        r'положительные факторы\s*:?\s*([^\n]+)',
+        r'что заинтересовало\s*:?\s*([^\n]+)',
+    ),
+    'negative': (
+        r'negative["\']?\s*:?\s*\[([^\]]*)\]',
+        r'отрицательные факторы\s*:?\s*\[([^\]]*)\]',
+        r'отрицательные факторы\s*:?\s*([^\n]+)',
+        r'что не устроило\s*:?\s*([^\n]+)',
+    ),
+}
+
+_ANCHOR_RE = re.compile(r'\w+')
+
+
+def _compile_dispatch(field_patterns):
+    """Якорь (первое слово образца, нижний регистр) -> [(поле, приоритет, скомпилированный образец)]"""
+    dispatch = {}
+    for field, patterns in field_patterns.items():
+        for priority, pattern in enumerate(patterns):
+            anchor = _ANCHOR_RE.match(pattern).group(0).lower()
+            dispatch.setdefault(anchor, []).append((field, priority, re.compile(pattern, RESULT_OPTIONS)))
+    # В одной позиции может начинаться только один якорь
+    for anchor in dispatch:
+        for other in dispatch:
+            if anchor != other and other.startswith(anchor):
+                raise ValueError(f"Якорь '{anchor}' - начало другого якоря '{other}'")
+    return dispatch
+
+
+_DISPATCH = _compile_dispatch(FIELD_PATTERNS)
+_ANCHORS = tuple(_DISPATCH)
+# Запасной сканер: просмотр вперед с группой на каждый якорь (re перебирает ветви в каждой позиции - медленно)
+_SCANNER_RE = re.compile('(?=%s)' % '|'.join(f'({re.escape(anchor)})' for anchor in _ANCHORS), RESULT_OPTIONS)
+
+# Символы, которые IGNORECASE сопоставляет с буквой якоря, хотя str.lower() дает другое:
+# 'İ', 'ı' - i, 'ſ' - s, старые начертания кириллицы U+1C80-U+1C85 - в, д, о, с, т, т.
+# Зависит от букв якорей: тест сверяет набор с перебором всех символов Юникода
+_CASE_VARIANTS_RE = re.compile('[\u0130\u0131\u017f\u1c80-\u1c85]')
+
+
+def _anchor_positions(text):
+    """Позиции якорей по порядку: [(позиция, якорь)].
+
+    Якоря ищутся str.find в тексте нижнего регистра - это в разы быстрее
+    регулярного выражения с ветвями. Если нижний регистр меняет длину текста
+    или в тексте есть редкие варианты букв, позиции находит запасной сканер.
+    """
+    lowered = text.lower()
+    if len(lowered) != len(text) or _CASE_VARIANTS_RE.search(text):
+        return [(match.start(), _ANCHORS[match.lastindex - 1]) for match in _SCANNER_RE.finditer(text)]
+    positions = []
+    for anchor in _ANCHORS:
+        start = lowered.find(anchor)
+        while start != -1:
+            positions.append((start, anchor))
+            start = lowered.find(anchor, start + 1)
+    positions.sort()
+    return positions
+
+
+def scan_fields(text):
+    """Поле -> захваченное значение лучшего по приоритету образца, за один проход по якорям текста.
+
+    В позиции каждого якоря проверяются только образцы, которые с него
+    начинаются (re.match в этой позиции); поле берет первый по приоритету
+    образец, а из его совпадений - самое левое, как поочередный re.search.
+    """
+    found = {}  # поле -> (приоритет, значение)
+    remaining = len(FIELD_PATTERNS)  # Поля, еще не найденные по первому образцу
+    for start, anchor in _anchor_positions(text):
+        for field, priority, pattern in _DISPATCH[anchor]:
+            current = found.get(field)
+            if current is not None and current[0] <= priority:
+                continue  # Уже найдено более приоритетным образцом или раньше в тексте
+            match = pattern.match(text, start)
+            if match:
+                found[field] = (priority, match.group(1))
+                if priority == 0:
+                    remaining -= 1
+        if remaining == 0:
+            break  # Все поля найдены по первым образцам
+    return {field: value for field, (priority, value) in found.items()}
+
+
+def _split_list(value):
+    value = value.strip()
+    # Список через запятую, а без запятых - через пробел
+    items = value.split(",") if "," in value else value.split()
+    return [item for item in (i.strip().strip('"\'') for i in items) if item]
+
+
+def _normalize_result(value):
+    value = value.strip().lower()
+    if "успеш" in value:
+        return "успешный"
+    if "неуспеш" in value or "не успеш" in value:
+        return "неуспешный"
+    return "требует внимания"
+
+
+def extract_structured_data(text, query):
+    """
+    Извлекает структурированные данные из текстового ответа LLM, если JSON не удалось распарсить
+    """
+    result = {
+        "evaluation": "нейтральная",
+        "keyPoints": "",
+        "issues": "",
+        "recommendations": "",
+        "tags": [],
+        "customResponse": f"Ответ на запрос '{query}': ",
+        "salesReadiness": 5,
+        "conversionProbability": 50,
+        "objections": [],
+        "managerPerformance": {"общая_оценка": 5, "details": "Информация недоступна"},
+        "customerPotential": {"score": 5, "reason": "Информация недоступна"},
+        "keyQuestion1Answer": "",
+        "keyQuestion2Answer": "",
+        "keyQuestion3Answer": "",
+        "callType": "не определен",
+        "callResult": "требует внимания",
+        "status": "требует внимания",
+        "score": 5,
+        "keyInsight": "",
+        "clientInterests": [],
+        "decisionFactors": {
+            "positive": [],
+            "negative": []
+        }
+    }
+    fields = scan_fields(text)
+
+    for field in ("keyPoints", "issues", "recommendations", "customResponse", "keyInsight"):
+        if field in fields:
+            result[field] = fields[field].strip()
+    if "evaluation" in fields:
+        result["evaluation"] = fields["evaluation"].strip().lower()
+
+    # Теги: если не удалось найти, добавляем стандартные
+    if "tags" in fields:
+        result["tags"] = _split_list(fields["tags"])
+    if not result["tags"]:
+        result["tags"] = ["анализ", "неструктурированный_ответ"]
+
+    # Готовность к продаже и вероятность конверсии - только значения в допустимом диапазоне
+    if "salesReadiness" in fields and 0 <= int(fields["salesReadiness"]) <= 10:
+        result["salesReadiness"] = int(fields["salesReadiness"])
+    if "conversionProbability" in fields and 0 <= int(fields["conversionProbability"]) <= 100:
+        result["conversionProbability"] = int(fields["conversionProbability"])
+
+    # Статус и результат звонка нормализуются к трем значениям
+    if "status" in fields:
+        result["status"] = _normalize_result(fields["status"])
+    if "callResult" in fields:
+        result["callResult"] = _normalize_result(fields["callResult"])
+
+    # Если статус не найден, используем результат звонка
+    if result["status"] == "требует внимания" and result["callResult"] != "требует внимания":
+        result["status"] = result["callResult"]
+
+    # Оценка округляется до целого и проверяется диапазон
+    if "score" in fields:
+        score = round(float(fields["score"]))
+        if 0 <= score <= 10:
+            result["score"] = score
+
+    # Если ключевой вывод не найден, используем первое предложение из ключевых моментов
+    if not result["keyInsight"] and result["keyPoints"]:
+        sentences = result["keyPoints"].split('. ')
+        if sentences:
+            result["keyInsight"] = sentences[0]
+
+    if "clientInterests" in fields:
+        result["clientInterests"] = _split_list(fields["clientInterests"])
+    if "positive" in fields:
+        result["decisionFactors"]["positive"] = _split_list(fields["positive"])
+    if "negative" in fields:
+        result["decisionFactors"]["negative"] = _split_list(fields["negative"])
+
+    # Если не удалось найти значение полей из текста,
+    # установим их на основе имеющихся данных
+
+    # Определяем статус по evaluation, если еще нет
+    if result["status"] == "требует внимания" and result["evaluation"]:
+        if result["evaluation"] == "позитивная":
+            result["status"] = "успешный"
+        elif result["evaluation"] == "негативная":
+            result["status"] = "неуспешный"
+
+    # Определяем результат звонка по статусу, если еще нет
+    if result["callResult"] == "требует внимания" and result["status"] != "требует внимания":
+        result["callResult"] = result["status"]
+
+    # Если score отсутствует, определяем по статусу
+    if result["score"] == 5:
+        if result["status"] == "успешный":
+            result["score"] = 8
+        elif result["status"] == "неуспешный":
+            result["score"] = 3
+
+    return result
@@ -0,0 +1,38 @@
+import json
+
+from flask import Response, request, stream_with_context
+
+NDJSON_MIMETYPE = 'application/x-ndjson'
+FLUSH_BYTES = 64 * 1024  # Строки копятся до этого объема и уходят клиенту одним куском
+
+
+def wants_ndjson():
+    """Клиент запросил построчный ответ (?format=ndjson)"""
+    return request.args.get('format') == 'ndjson'
+
+
+def ndjson_response(records, headers=None, flush_bytes=FLUSH_BYTES):
+    """Потоковый ответ: по одному JSON-объекту на строку по мере получения records.
+
+    records - итератор (генератор), тело ответа не собирается в памяти целиком.
+    flush_bytes=0 отправляет каждую строку сразу (долгие операции вроде анализа
+    LLM). Ошибка посреди потока уже не может сменить статус ответа, поэтому
+    она передается последней строкой {"error": ...}.
+    """
+    def generate():
+        buffer, size = [], 0
+        try:
+            for record in records:
+                line = json.dumps(record, ensure_ascii=False, default=str) + '\n'
+                buffer.append(line)
+                size += len(line)
+                if size >= flush_bytes:
+                    yield ''.join(buffer)
+                    buffer, size = [], 0
+        except Exception as e:
+            print(f"Ошибка при потоковой отправке ответа: {str(e)}")
+            buffer.append(json.dumps({'error': str(e)}, ensure_ascii=False) + '\n')
+        if buffer:
+            yield ''.join(buffer)
+
+    return Response(stream_with_context(generate()), mimetype=NDJSON_MIMETYPE, headers=headers)
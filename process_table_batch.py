@@ -1,6 +1,6 @@
 import asyncio
 import aiohttp
-from openpyxl import load_workbook
+from call_store import CALL_ID_COLUMN, CallStore
 # from io import BytesIO
 # from pydub import AudioSegment
 from main import batch_transcribe  # Импортируем функцию для пакетной транскрипции
@@ -20,28 +20,26 @@ PAUSE_SECONDS = 100
 #     duration = len(audio) / 1000.0
 #     return duration, size_mb
 
-async def process_table_batches(
-    excel_file: str, 
-    sheet_name: str = None
-):
+async def process_table_batches(store_file: str):
     """
-    Обрабатывает Excel‑таблицу группами по 50 записей:
-     – выбирает строки, где в столбце E стоит прочерк, 
-     – собирает ссылки из столбца F группами по 50 штук,
+    Обрабатывает звонки хранилища группами по BATCH_SIZE записей:
+     – выбирает звонки, где в столбце «Транскрибация» стоит прочерк, а ссылка на запись есть,
      – отправляет собранную группу ссылок через groq для транскрипции,
-     – записывает транскрипцию в столбец E,
-     – в столбец G записывает тег "groq".
+     – записывает транскрипцию в «Транскрибация»,
+     – в столбец «Tag» записывает тег "groq".
+    Изменения пишутся построчно через CallStore: их применяет поток-писатель под
+    файловой блокировкой хранилища, поэтому скрипт можно запускать вместе с сервером.
+    Строки выбираются по стабильному ID звонка: если сервер за время пауз заменит
+    хранилище (id строк нумеруются заново), транскрипция не попадет на другой звонок.
     """
-    wb = load_workbook(excel_file)
-    ws = wb[sheet_name] if sheet_name else wb.active
+    # Без Parquet-снимка: его ведет сервер, а таймер фонового обновления не дал бы
+    # скрипту завершиться вовремя и переписывал бы файл снимка одновременно с сервером
+    store = CallStore(store_file, snapshot_path='')
+    df = store.load_dataframe()
 
     # Сбор строк для обработки
-    rows_to_process = []
-    for row in ws.iter_rows(min_row=2):
-        cell_E = row[4]  # столбец E
-        cell_F = row[5]  # столбец F
-        if cell_E.value == "-" and cell_F.value:
-            rows_to_process.append(row)
+    mask = (df['Транскрибация'] == '-') & df['Ссылка на запись'].notna()
+    rows_to_process = list(zip(df.loc[mask, CALL_ID_COLUMN], df.loc[mask, 'Ссылка на запись']))
 
     print(f"Найдено {len(rows_to_process)} записей для обработки")
 
@@ -50,36 +48,38 @@ async def process_table_batches(
     
     for i in range(0, len(rows_to_process), BATCH_SIZE):
         batch_rows = rows_to_process[i:i + BATCH_SIZE]
-        batch_urls = [row[5].value for row in batch_rows]
+        batch_urls = [url for _, url in batch_rows]
         
         print(f"Обработка группы {i//BATCH_SIZE + 1}, записей: {len(batch_urls)}")
         
         results = await batch_transcribe(batch_urls)
         
-        # Обновляем таблицу
-        for res, proc_row in zip(results, batch_rows):
+        # Обновляем хранилище построчными изменениями
+        updates = {}
+        for res, (call_id, _) in zip(results, batch_rows):
             if res["status"] == "success":
-                proc_row[4].value = res["text"]   # Обновляем столбец E транскрипцией
-                proc_row[6].value = "groq"        # В столбец G записываем тег "groq"
+                updates[call_id] = {'Транскрибация': res["text"], 'Tag': "groq"}
                 total_processed += 1
             else:
-                proc_row[4].value = f"Error: {res['error']}"
+                updates[call_id] = {'Транскрибация': f"Error: {res['error']}"}
         
         # Сохраняем промежуточные результаты
-        wb.save(excel_file)
-        print(f"Промежуточное сохранение файла '{excel_file}'")
+        _, missing = store.update_calls(updates)
+        if missing:
+            print(f"Пропущено {len(missing)} звонков, удаленных из хранилища во время обработки")
+        print(f"Промежуточное сохранение в хранилище '{store_file}'")
         
         # Пауза перед следующей группой
         if i + BATCH_SIZE < len(rows_to_process):
             print(f"Пауза {PAUSE_SECONDS} секунд перед следующей группой...")
             await asyncio.sleep(PAUSE_SECONDS)
 
-    print(f"Файл '{excel_file}' обновлен.")
+    print(f"Хранилище '{store_file}' обновлено.")
     print(f"Всего успешно обработано {total_processed} записей из {len(rows_to_process)}")
 
 if __name__ == "__main__":
     import sys
-    excel_file = "DFASDF.xlsx"  # Замените на актуальный путь
+    store_file = "calls.db"  # Замените на актуальный путь
     if len(sys.argv) > 1:
-        excel_file = sys.argv[1]
-    asyncio.run(process_table_batches(excel_file)) 
\ No newline at end of file
+        store_file = sys.argv[1]
+    asyncio.run(process_table_batches(store_file))
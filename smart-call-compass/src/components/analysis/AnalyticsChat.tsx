@@ -6,7 +6,7 @@ import { ScrollArea } from "@/components/ui/scroll-area";
 import { Loader2, Send, Brain, Filter, X, Calendar as CalendarIcon } from "lucide-react";
 import { Avatar, AvatarFallback, AvatarImage } from "@/components/ui/avatar";
 import { Call } from "@/components/calls/CallsTable";
-import { fetchCalls } from "@/lib/api";
+import { fetchCalls, fetchCallsPage, CallsPageParams } from "@/lib/api";
 import { globalState, EVENTS, CallsUpdatedEvent, DataSourceChangedEvent, AnalysisCompletedEvent } from "@/lib/globalState";
 import { 
   Select, 
@@ -210,100 +210,51 @@ const AnalyticsChat: React.FC<AnalyticsChatProps> = ({ dashboardData }) => {
     };
   }, []);
 
-  // Применение фильтров при изменении
+  // Применение фильтров при изменении: отбор выполняет сервер (/api/calls с фильтрами
+  // аналитики, те же условия, что у /api/custom-analyze), в ответе только ID звонков
   useEffect(() => {
     if (!callsLoaded) return;
     
-    try {
-      let filtered = [...calls];
-      
-      // Фильтр по статусу
-      if (statusFilter) {
-        filtered = filtered.filter(call => {
-          const status = call.callResult || call.status || "Не определен";
-          return status.toLowerCase() === statusFilter.toLowerCase();
-        });
-      }
-      
-      // Фильтр по оператору
-      if (operatorFilter) {
-        filtered = filtered.filter(call => {
-          const operator = call.agent || "Неизвестно";
-          return operator.toLowerCase() === operatorFilter.toLowerCase();
-        });
-      }
-      
-      // Фильтр по дате с защитой от ошибок форматирования
-      if (dateFilter) {
-        try {
-          const dateString = format(dateFilter, "dd.MM.yyyy");
-          filtered = filtered.filter(call => call.date === dateString);
-        } catch (err) {
-          console.error("Ошибка при фильтрации по дате:", err);
-          // Если не удалось отформатировать дату, не применяем фильтр
-        }
-      }
-      
-      // Фильтр по длительности звонка
-      if (durationFilter) {
-        filtered = filtered.filter(call => {
-          if (!call.duration) return false;
-          
-          // Распарсим длительность в формате "Xм Yс" или числовом формате
-          let minutes = 0;
-          let seconds = 0;
-          
-          if (typeof call.duration === 'string') {
-            const minMatch = call.duration.match(/(\d+)м/);
-            const secMatch = call.duration.match(/(\d+)с/);
-            
-            if (minMatch) minutes = parseInt(minMatch[1], 10);
-            if (secMatch) seconds = parseInt(secMatch[1], 10);
-          } else if (typeof call.duration === 'number') {
-            minutes = Math.floor(call.duration);
-            seconds = Math.round((call.duration - minutes) * 60);
-          }
-          
-          // Общая длительность в секундах
-          const totalSeconds = minutes * 60 + seconds;
-          
-          // Применение фильтра в зависимости от выбранного диапазона
-          switch (durationFilter) {
-            case "short": // Короткие звонки (до 1 минуты)
-              return totalSeconds < 60;
-            case "medium": // Средние звонки (от 1 до 3 минут)
-              return totalSeconds >= 60 && totalSeconds <= 180;
-            case "long": // Длинные звонки (больше 3 минут)
-              return totalSeconds > 180;
-            default:
-              return true;
-          }
-        });
-      }
-      
-      // Фильтр по тегу
-      if (tagFilter) {
-        filtered = filtered.filter(call => {
-          // Проверка на массив тегов
-          if (call.tags && Array.isArray(call.tags)) {
-            return call.tags.some(tag => 
-              tag.toLowerCase() === tagFilter.toLowerCase()
-            );
-          }
-          // Проверка на одиночный тег
-          if (call.tag) {
-            return call.tag.toLowerCase() === tagFilter.toLowerCase();
-          }
-          return false;
-        });
-      }
-      
-      setFilteredCalls(filtered);
-    } catch (error) {
-      console.error("Ошибка при применении фильтров:", error);
-      // В случае ошибки сохраняем исходный список
+    const hasFilters = statusFilter || operatorFilter || dateFilter || durationFilter || tagFilter;
+    if (!hasFilters) {
       setFilteredCalls(calls);
+      return;
     }
+    
+    let date: string | undefined;
+    if (dateFilter) {
+      try {
+        date = format(dateFilter, "dd.MM.yyyy");
+      } catch (err) {
+        console.error("Ошибка при фильтрации по дате:", err);
+        // Если не удалось отформатировать дату, не применяем фильтр
+      }
+    }
+    
+    let cancelled = false;
+    fetchCallsPage({
+      fields: ['id'],
+      result: statusFilter || undefined,
+      operator: operatorFilter || undefined,
+      date,
+      duration: (durationFilter || undefined) as CallsPageParams['duration'],
+      tags: tagFilter ? [tagFilter] : undefined,
+    })
+      .then(page => {
+        if (cancelled) return;
+        const ids = new Set(page.calls.map(call => String(call.id)));
+        setFilteredCalls(calls.filter(call => ids.has(String(call.id))));
+      })
+      .catch(error => {
+        if (cancelled) return;
+        console.error("Ошибка при применении фильтров:", error);
+        // В случае ошибки сохраняем исходный список
+        setFilteredCalls(calls);
+      });
+    
+    return () => {
+      cancelled = true;
+    };
   }, [statusFilter, operatorFilter, dateFilter, durationFilter, tagFilter, calls, callsLoaded]);
 
   // Сброс фильтров
@@ -3,7 +3,9 @@ import { Card, CardContent, CardHeader, CardTitle } from "@/components/ui/card";
 import { Tabs, TabsContent, TabsList, TabsTrigger } from "@/components/ui/tabs";
 import { Badge } from "@/components/ui/badge";
 import { Separator } from "@/components/ui/separator";
+import { Button } from "@/components/ui/button";
 import { cn } from "@/lib/utils";
+import { fetchCallTranscript, TRANSCRIPT_CHUNK_BYTES, type CallTranscript } from "@/lib/api";
 import type { Call } from "./CallsTable";
 import { Clock, PhoneCall, Tag, BarChart, AlertCircle, Target, Zap, CalendarClock, User, TrendingUp, ListChecks, Scale } from "lucide-react";
 
@@ -12,6 +14,33 @@ interface CallDetailsProps {
 }
 
 const CallDetails = ({ call }: CallDetailsProps) => {
+  // Списки звонков приходят без текста транскрипции - загружаем его при открытии карточки
+  const [loadedTranscript, setLoadedTranscript] = React.useState<CallTranscript | null>(null);
+  const [isTranscriptLoading, setIsTranscriptLoading] = React.useState(false);
+  const [transcriptError, setTranscriptError] = React.useState<string | null>(null);
+  const needsTranscript = call.transcription === undefined && (call.transcriptLength ?? 0) > 0;
+
+  const loadTranscript = React.useCallback(async (maxBytes?: number) => {
+    setIsTranscriptLoading(true);
+    setTranscriptError(null);
+    try {
+      setLoadedTranscript(await fetchCallTranscript(call.id, maxBytes));
+    } catch (error) {
+      console.error(`Не удалось загрузить транскрипцию звонка ${call.id}:`, error);
+      setTranscriptError("Не удалось загрузить транскрипцию");
+    } finally {
+      setIsTranscriptLoading(false);
+    }
+  }, [call.id]);
+
+  React.useEffect(() => {
+    setLoadedTranscript(null);
+    // Очень длинные тексты - сначала только первая часть
+    if (needsTranscript) loadTranscript(TRANSCRIPT_CHUNK_BYTES);
+  }, [call.id, needsTranscript, loadTranscript]);
+
+  const transcriptText = call.transcription ?? loadedTranscript?.text ?? call.transcriptPreview ?? "";
+
   // Формируем анализ звонка на основе данных LLM
   const callAnalysis = {
     summary: call.aiSummary || "Анализ не проводился",
@@ -27,7 +56,7 @@ const CallDetails = ({ call }: CallDetailsProps) => {
       client: "не определено",
       agent: "не определено"
     },
-    transcript: call.transcription || "Транскрипция отсутствует",
+    transcript: transcriptText || "Транскрипция отсутствует",
     type: call.callType || "не определен",
     result: call.callResult || "не определен",
     tags: call.tags || [],
@@ -63,7 +92,7 @@ const CallDetails = ({ call }: CallDetailsProps) => {
   };
 
   // Проверяем наличие транскрипции
-  const hasTranscription = call.transcription && call.transcription !== "-";
+  const hasTranscription = (!!call.transcription && call.transcription !== "-") || (call.transcriptLength ?? 0) > 0;
   const hasAnalysis = !!call.score;
   const hasAdvancedAnalysis = !!call.salesReadiness || !!call.objections?.length || !!call.customerPotential?.score;
   const hasKeyQuestionAnswers = !!call.keyQuestion1Answer || !!call.keyQuestion2Answer || !!call.keyQuestion3Answer;
@@ -206,7 +235,18 @@ const CallDetails = ({ call }: CallDetailsProps) => {
               <CardTitle className="text-lg">Полная транскрипция</CardTitle>
             </CardHeader>
             <CardContent>
-              <pre className="whitespace-pre-wrap text-sm font-sans">{formatTranscription(call.transcription || "")}</pre>
+              <pre className="whitespace-pre-wrap text-sm font-sans">{formatTranscription(transcriptText)}</pre>
+              {isTranscriptLoading && (
+                <p className="mt-2 text-muted-foreground italic text-xs">Загрузка транскрипции...</p>
+              )}
+              {transcriptError && (
+                <p className="mt-2 text-destructive text-xs">{transcriptError}</p>
+              )}
+              {loadedTranscript && !loadedTranscript.complete && !isTranscriptLoading && (
+                <Button variant="outline" size="sm" className="mt-3" onClick={() => loadTranscript()}>
+                  Показать полностью ({Math.ceil(loadedTranscript.totalBytes / 1024)} КБ)
+                </Button>
+              )}
             </CardContent>
           </Card>
         </TabsContent>
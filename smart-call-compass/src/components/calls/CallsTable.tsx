@@ -103,8 +103,13 @@ export interface Call {
   sourceFile?: string; // Источник файла (для локальных записей - имя файла, для облачных - телефон/ID)
   audioDuration?: string; // Длительность аудиофайла в формате "мм:сс"
   transcriptLength?: number; // Количество символов в транскрипции
+  transcriptPreview?: string; // Начало транскрипции (в списках вместо полного текста)
 }
 
+// Есть ли у звонка транскрипция (списки звонков приходят без текста, только с transcriptLength и transcriptPreview)
+export const hasTranscription = (call: Call): boolean =>
+  (!!call.transcription && call.transcription !== "-") || (call.transcriptLength ?? 0) > 0;
+
 interface CallsTableProps {
   calls: Call[];
   title?: string;
@@ -305,12 +310,12 @@ const CallsTable = ({
         <Badge
           variant="outline"
           className={cn(
-            call.transcription && call.transcription !== "-"
+            hasTranscription(call)
               ? "bg-green-100 text-green-800 hover:bg-green-100"
               : "bg-slate-100 text-slate-800 hover:bg-slate-100"
           )}
         >
-          {call.transcription && call.transcription !== "-" ? "Доступна" : "Отсутствует"}
+          {hasTranscription(call) ? "Доступна" : "Отсутствует"}
         </Badge>
       )
     },
@@ -604,6 +609,11 @@ const CallsTable = ({
           <div className="max-h-[300px] overflow-y-auto max-w-[350px] p-2 bg-slate-50 rounded text-sm whitespace-pre-wrap break-words">
             {call.transcription}
           </div>
+        ) : hasTranscription(call) ? (
+          <div className="max-w-[350px] p-2 text-sm whitespace-pre-wrap break-words">
+            {call.transcriptPreview}
+            <div className="text-muted-foreground italic text-xs mt-1">Полный текст - в карточке звонка</div>
+          </div>
         ) : (
           <span className="text-muted-foreground italic text-xs">Транскрипция отсутствует</span>
         )
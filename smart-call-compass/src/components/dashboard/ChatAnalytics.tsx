@@ -6,7 +6,7 @@ import { ScrollArea } from "@/components/ui/scroll-area";
 import { Input } from "@/components/ui/input";
 import { Label } from "@/components/ui/label";
 import { MessageSquare, Send, Loader2, Trash2, Filter, Calendar as CalendarIcon, X, RefreshCw } from "lucide-react";
-import { sendChatMessage, fetchCalls } from "@/lib/api";
+import { sendChatMessage, fetchCalls, fetchCallsPage, CallsPageParams } from "@/lib/api";
 import { globalState } from "@/lib/globalState";
 import { Call } from "@/components/calls/CallsTable";
 import { 
@@ -80,6 +80,8 @@ const ChatAnalytics = () => {
   const [operators, setOperators] = useState<string[]>([]);
   const [statuses, setStatuses] = useState<string[]>([]);
   const [tags, setTags] = useState<string[]>([]);
+  // Число звонков по тегам из индекса тегов сервера (/api/refresh-tags, ответы чата)
+  const [tagCounts, setTagCounts] = useState<Record<string, number>>({});
   
   // Простые фильтры без сложных компонентов
   const [filters, setFilters] = useState({
@@ -90,8 +92,35 @@ const ChatAnalytics = () => {
     tag: ""
   });
   
+  // Число звонков под текущими фильтрами считает сервер (те же условия, что у /api/chat)
+  const [filteredCallsCount, setFilteredCallsCount] = useState<number | null>(null);
+  
   const scrollAreaRef = useRef<HTMLDivElement>(null);
   
+  // Подсчет звонков под фильтрами: только total, без самих звонков (limit=0)
+  useEffect(() => {
+    if (!callsLoaded) return;
+    let cancelled = false;
+    fetchCallsPage({
+      limit: 0,
+      result: filters.status || undefined,
+      operator: filters.operator || undefined,
+      date: filters.date || undefined,
+      duration: (filters.duration || undefined) as CallsPageParams['duration'],
+      tags: filters.tag ? [filters.tag] : undefined,
+    })
+      .then(page => {
+        if (!cancelled) setFilteredCallsCount(page.total);
+      })
+      .catch(error => {
+        console.error("Ошибка при подсчете звонков по фильтрам:", error);
+        if (!cancelled) setFilteredCallsCount(null);
+      });
+    return () => {
+      cancelled = true;
+    };
+  }, [filters, calls, callsLoaded]);
+  
   // Загрузка данных из localStorage при монтировании компонента
   useEffect(() => {
     const loadMessagesFromStorage = () => {
@@ -243,6 +272,7 @@ const ChatAnalytics = () => {
         
         // Обновляем список тегов
         setTags(data.tags);
+        if (data.counts) setTagCounts(data.counts);
         
         // Проверяем, существует ли текущий тег в обновленном списке
         if (currentTag && !data.tags.includes(currentTag)) {
@@ -321,6 +351,9 @@ const ChatAnalytics = () => {
           setTags(response.availableTags);
         }
       }
+      if (response.tagCounts) {
+        setTagCounts(response.tagCounts);
+      }
     } catch (error) {
       console.error("Chat error:", error);
       const errorMessage: Message = {
@@ -536,8 +569,8 @@ const ChatAnalytics = () => {
                   >
                     <option value="">Любой тег ({tags.length})</option>
                     {tags.map(tag => {
-                      // Подсчет звонков с этим тегом
-                      const count = calls.filter(call => 
+                      // Число звонков с тегом - из индекса тегов сервера, до первого ответа считаем по загруженным звонкам
+                      const count = tagCounts[tag] ?? calls.filter(call => 
                         call.tags && Array.isArray(call.tags) && call.tags.includes(tag) || 
                         call.tag === tag
                       ).length;
@@ -553,47 +586,7 @@ const ChatAnalytics = () => {
               
               {/* Количество звонков, соответствующих текущим фильтрам */}
               <div className="mt-2 text-xs text-muted-foreground">
-                {(() => {
-                  // Подсчет звонков, соответствующих всем текущим фильтрам
-                  const filteredCallsCount = calls.filter(call => {
-                    // Проверка по статусу
-                    if (filters.status && call.callResult !== filters.status && call.status !== filters.status) {
-                      return false;
-                    }
-                    
-                    // Проверка по оператору
-                    if (filters.operator && call.agent !== filters.operator) {
-                      return false;
-                    }
-                    
-                    // Проверка по дате
-                    if (filters.date && call.date !== filters.date) {
-                      return false;
-                    }
-                    
-                    // Проверка по длительности
-                    if (filters.duration) {
-                      const match = call.duration?.match(/(\d+)м\s*(\d*)с?/);
-                      if (!match) return false;
-                      const minutes = parseInt(match[1], 10) || 0;
-                      
-                      if (filters.duration === 'short' && minutes >= 1) return false;
-                      if (filters.duration === 'medium' && (minutes < 1 || minutes > 3)) return false;
-                      if (filters.duration === 'long' && minutes <= 3) return false;
-                    }
-                    
-                    // Проверка по тегу
-                    if (filters.tag) {
-                      const hasTags = call.tags && Array.isArray(call.tags) && call.tags.includes(filters.tag);
-                      const hasTag = call.tag === filters.tag;
-                      if (!hasTags && !hasTag) return false;
-                    }
-                    
-                    return true;
-                  }).length;
-                  
-                  return <span>Найдено звонков: <strong>{filteredCallsCount}</strong> из {calls.length}</span>;
-                })()}
+                <span>Найдено звонков: <strong>{filteredCallsCount ?? '…'}</strong> из {calls.length}</span>
               </div>
               
               {/* Информация о применённых фильтрах */}
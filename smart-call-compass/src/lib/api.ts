@@ -8,6 +8,7 @@ const API_URL = 'http://localhost:5000/api';
 // Ключи для localStorage
 const STORAGE_KEYS = {
   ANALYZED_CALLS: 'smart-call-compass-analyzed-calls',
+  SYNC_GENERATION: 'smart-call-compass-sync-generation', // Поколение хранилища последней синхронизации
 };
 
 // Функции для работы с сохраненными результатами анализа
@@ -156,56 +157,249 @@ interface TranscribeResponse {
   message?: string;
 }
 
-// Получение списка звонков
-export async function fetchCalls(source: 'all' | 'cloud' | 'local' = 'all'): Promise<Call[]> {
+// Поля звонка без текста транскрипции (для списков, дашборда и страниц таблицы):
+// вместо текста - длина и начало, полный текст загружает fetchCallTranscript
+export const CALL_LIST_FIELDS = [
+  'id', 'agent', 'customer', 'date', 'time', 'duration', 'status', 'purpose', 'recordUrl', 'tag',
+  'aiSummary', 'keyInsight', 'recommendation', 'score', 'callType', 'callResult', 'salesReadiness',
+  'conversionProbability', 'managerPerformance', 'clientInterests', 'decisionFactors',
+  'keyQuestion1Answer', 'keyQuestion2Answer', 'keyQuestion3Answer', 'tags', 'sourceFile',
+  'audioDuration', 'transcriptLength', 'transcriptPreview'
+];
+
+// Параметры страницы звонков (обрабатываются на сервере)
+export interface CallsPageParams {
+  source?: 'all' | 'cloud' | 'local';
+  limit?: number;
+  offset?: number;
+  sort?: string; // Например, "-date,score" ("-" - по убыванию)
+  fields?: string[];
+  search?: string;
+  status?: string;
+  purpose?: string;
+  ids?: string[];
+  // Фильтры аналитики и чата (те же условия, что у /api/chat и /api/custom-analyze)
+  result?: string;
+  operator?: string;
+  date?: string; // дд.мм.гггг
+  dateFrom?: string;
+  dateTo?: string;
+  duration?: 'short' | 'medium' | 'long';
+  tags?: string[];
+}
+
+export interface CallsPage {
+  calls: Call[];
+  total: number;
+  offset: number;
+  limit: number | null;
+  nextCursor: string | null;
+}
+
+// Преобразуем JSON-строки тегов в массивы
+function normalizeCallTags(call: Call): Call {
+  // Создаем копию звонка, чтобы не изменять оригинал
+  const resultCall = {...call} as Call;
+  
+  // Обработка тегов в формате строки JSON
+  if (resultCall.tags && typeof resultCall.tags === 'string') {
+    try {
+      // Пробуем распарсить JSON-строку
+      const parsedTagsData = JSON.parse(resultCall.tags as unknown as string);
+      // Устанавливаем значение tags как массив
+      resultCall.tags = Array.isArray(parsedTagsData) ? parsedTagsData : [parsedTagsData];
+    } catch (e) {
+      console.warn(`Не удалось разобрать JSON-теги для звонка ${resultCall.id}: ${e}`);
+      // В случае ошибки, преобразуем строку в один тег
+      const tagStr = resultCall.tags as unknown as string;
+      resultCall.tags = [tagStr];
+    }
+  }
+  
+  // Если нет массива тегов, но есть тег, создаем массив tags
+  if (!resultCall.tags && resultCall.tag) {
+    resultCall.tags = [resultCall.tag];
+  }
+  
+  return resultCall;
+}
+
+// Получение списка звонков (fields - только нужные поля, например CALL_LIST_FIELDS)
+export async function fetchCalls(source: 'all' | 'cloud' | 'local' = 'all', fields?: string[]): Promise<Call[]> {
   if (USE_MOCK_DATA) {
     console.log('Используются тестовые данные вместо API');
     return Promise.resolve(MOCK_CALLS);
   }
 
   try {
-    const url = source === 'all' ? `${API_URL}/calls` : `${API_URL}/calls?source=${source}`;
-    const response = await fetch(url);
+    const params = new URLSearchParams();
+    if (source !== 'all') params.set('source', source);
+    if (fields && fields.length > 0) params.set('fields', fields.join(','));
+    const query = params.toString();
+    const response = await fetch(query ? `${API_URL}/calls?${query}` : `${API_URL}/calls`);
     if (!response.ok) {
       throw new Error(`HTTP error! status: ${response.status}`);
     }
     const data: ApiResponse<Call> = await response.json();
     
-    // Преобразуем JSON-строки тегов в массивы
-    const processedCalls = (data.calls || []).map(call => {
-      // Создаем копию звонка, чтобы не изменять оригинал
-      const resultCall = {...call} as Call;
-      
-      // Обработка тегов в формате строки JSON
-      if (resultCall.tags && typeof resultCall.tags === 'string') {
-        try {
-          // Пробуем распарсить JSON-строку
-          const parsedTagsData = JSON.parse(resultCall.tags as unknown as string);
-          // Устанавливаем значение tags как массив
-          resultCall.tags = Array.isArray(parsedTagsData) ? parsedTagsData : [parsedTagsData];
-        } catch (e) {
-          console.warn(`Не удалось разобрать JSON-теги для звонка ${resultCall.id}: ${e}`);
-          // В случае ошибки, преобразуем строку в один тег
-          const tagStr = resultCall.tags as unknown as string;
-          resultCall.tags = [tagStr];
-        }
-      }
-      
-      // Если нет массива тегов, но есть тег, создаем массив tags
-      if (!resultCall.tags && resultCall.tag) {
-        resultCall.tags = [resultCall.tag];
-      }
-      
-      return resultCall;
-    });
-    
-    return processedCalls;
+    return (data.calls || []).map(normalizeCallTags);
   } catch (error) {
     console.error('Error fetching calls:', error);
     return [];
   }
 }
 
+// Получение одной страницы звонков: фильтры, сортировка и срез выполняются на сервере
+export async function fetchCallsPage(pageParams: CallsPageParams): Promise<CallsPage> {
+  if (USE_MOCK_DATA) {
+    const offset = pageParams.offset || 0;
+    const limit = pageParams.limit ?? MOCK_CALLS.length;
+    return { calls: MOCK_CALLS.slice(offset, offset + limit), total: MOCK_CALLS.length, offset, limit, nextCursor: null };
+  }
+
+  const params = new URLSearchParams();
+  if (pageParams.source && pageParams.source !== 'all') params.set('source', pageParams.source);
+  if (pageParams.limit !== undefined) params.set('limit', String(pageParams.limit));
+  if (pageParams.offset) params.set('offset', String(pageParams.offset));
+  if (pageParams.sort) params.set('sort', pageParams.sort);
+  if (pageParams.fields && pageParams.fields.length > 0) params.set('fields', pageParams.fields.join(','));
+  if (pageParams.search) params.set('search', pageParams.search);
+  if (pageParams.status && pageParams.status !== 'all') params.set('status', pageParams.status);
+  if (pageParams.purpose && pageParams.purpose !== 'all') params.set('purpose', pageParams.purpose);
+  if (pageParams.ids && pageParams.ids.length > 0) params.set('ids', pageParams.ids.join(','));
+  if (pageParams.result && pageParams.result !== 'all') params.set('result', pageParams.result);
+  if (pageParams.operator) params.set('operator', pageParams.operator);
+  if (pageParams.date) params.set('date', pageParams.date);
+  if (pageParams.dateFrom) params.set('dateFrom', pageParams.dateFrom);
+  if (pageParams.dateTo) params.set('dateTo', pageParams.dateTo);
+  if (pageParams.duration) params.set('duration', pageParams.duration);
+  if (pageParams.tags && pageParams.tags.length > 0) params.set('tags', pageParams.tags.join(','));
+
+  const response = await fetch(`${API_URL}/calls?${params.toString()}`);
+  if (!response.ok) {
+    throw new Error(`HTTP error! status: ${response.status}`);
+  }
+  const data = await response.json();
+  return {
+    calls: (data.calls || []).map(normalizeCallTags),
+    total: data.total ?? (data.calls || []).length,
+    offset: data.offset ?? 0,
+    limit: data.limit ?? null,
+    nextCursor: data.nextCursor ?? null,
+  };
+}
+
+// Первая часть длинной транскрипции, остальное загружается по кнопке
+export const TRANSCRIPT_CHUNK_BYTES = 64 * 1024;
+
+export interface CallTranscript {
+  text: string;
+  complete: boolean; // false - загружена только первая часть текста
+  totalBytes: number;
+}
+
+// Текст транскрипции одного звонка (списки звонков загружаются без текстов).
+// maxBytes - загрузить только начало текста (Range-запрос)
+export async function fetchCallTranscript(callId: string, maxBytes?: number): Promise<CallTranscript> {
+  const headers: Record<string, string> = {};
+  if (maxBytes) headers['Range'] = `bytes=0-${maxBytes - 1}`;
+  const response = await fetch(`${API_URL}/calls/${encodeURIComponent(callId)}/transcript`, { headers });
+  if (!response.ok) {
+    throw new Error(`HTTP error! status: ${response.status}`);
+  }
+  const buffer = await response.arrayBuffer();
+  // Ответ 206: Content-Range вида "bytes 0-65535/180000"
+  const contentRange = response.headers.get('Content-Range');
+  const totalBytes = contentRange ? Number(contentRange.split('/')[1]) : buffer.byteLength;
+  const complete = response.status !== 206 || buffer.byteLength >= totalBytes;
+  let text = new TextDecoder('utf-8').decode(buffer);
+  // Граница диапазона может разрезать символ UTF-8 - отбрасываем его остаток
+  if (!complete) text = text.replace(/\uFFFD+$/, '');
+  return { text, complete, totalBytes };
+}
+
+// Полнотекстовый поиск по транскрипциям, AI-резюме и ключевым выводам
+export interface CallSearchResult {
+  id: string;
+  score: number; // Релевантность, больше - лучше
+  snippet: string; // HTML: экранированный фрагмент текста, совпадения в <mark>
+}
+
+export interface CallSearchPage {
+  query: string;
+  total: number;
+  results: CallSearchResult[];
+}
+
+export async function searchCalls(query: string, limit = 20, offset = 0): Promise<CallSearchPage> {
+  const params = new URLSearchParams({ q: query, limit: String(limit), offset: String(offset) });
+  const response = await fetch(`${API_URL}/search?${params.toString()}`);
+  if (!response.ok) {
+    throw new Error(`HTTP error! status: ${response.status}`);
+  }
+  const data = await response.json();
+  return { query: data.query ?? query, total: data.total ?? 0, results: data.results || [] };
+}
+
+// Изменения звонков после поколения хранилища since (журнал изменений на сервере)
+export interface CallChanges {
+  generation: number; // Передается как since в следующий раз
+  reset: boolean; // true - журнал не покрывает since, нужна полная загрузка
+  calls: Call[]; // Добавленные и измененные звонки
+  deleted: string[]; // ID удаленных звонков
+}
+
+export async function fetchCallChanges(since: number, fields: string[] = CALL_LIST_FIELDS): Promise<CallChanges> {
+  const params = new URLSearchParams({ since: String(since), fields: fields.join(',') });
+  const response = await fetch(`${API_URL}/calls/changes?${params.toString()}`);
+  if (!response.ok) {
+    throw new Error(`HTTP error! status: ${response.status}`);
+  }
+  const data = await response.json();
+  return {
+    generation: data.generation,
+    reset: !!data.reset,
+    calls: (data.calls || []).map(normalizeCallTags),
+    deleted: data.deleted || [],
+  };
+}
+
+// Обновляет сохраненные проанализированные звонки изменениями с прошлой синхронизации
+// (трафик пропорционален числу изменений) и возвращает измененные звонки по ID.
+// При первой синхронизации или после замены хранилища возвращается пустой Map
+export async function syncCallChanges(): Promise<Map<string, Call>> {
+  const saved = localStorage.getItem(STORAGE_KEYS.SYNC_GENERATION);
+  const changes = await fetchCallChanges(saved === null ? -1 : Number(saved));
+  const changed = new Map(changes.calls.map(call => [call.id, call]));
+
+  if (!changes.reset && (changed.size > 0 || changes.deleted.length > 0)) {
+    const deleted = new Set(changes.deleted);
+    const analyzed = getAnalyzedCalls()
+      .filter(call => !deleted.has(call.id))
+      .map(call => (changed.has(call.id) ? { ...call, ...changed.get(call.id) } : call));
+    localStorage.setItem(STORAGE_KEYS.ANALYZED_CALLS, JSON.stringify(analyzed));
+  }
+  localStorage.setItem(STORAGE_KEYS.SYNC_GENERATION, String(changes.generation));
+  return changed;
+}
+
+// Актуальные данные звонков ids: из изменений с прошлой синхронизации,
+// недостающие (первая синхронизация) - отдельным запросом только по этим ID
+async function fetchLatestCalls(ids: string[]): Promise<Map<string, Call>> {
+  let latest = new Map<string, Call>();
+  try {
+    latest = await syncCallChanges();
+  } catch (error) {
+    console.error('Ошибка синхронизации изменений звонков:', error);
+  }
+  const missingIds = ids.filter(id => !latest.has(id));
+  if (missingIds.length > 0) {
+    const page = await fetchCallsPage({ ids: missingIds, fields: CALL_LIST_FIELDS });
+    page.calls.forEach(call => latest.set(call.id, call));
+  }
+  return latest;
+}
+
 // Анализ выбранных звонков с помощью LLM
 export async function analyzeCalls(callIds: string[], keyQuestions?: string[]): Promise<Call[]> {
   if (USE_MOCK_DATA) {
@@ -254,16 +448,15 @@ export async function analyzeCalls(callIds: string[], keyQuestions?: string[]):
     const analyzedCalls = data.calls || [];
     
     if (analyzedCalls.length > 0) {
+      // Полные данные проанализированных звонков - только изменения с прошлой синхронизации
+      const allCallsMap = await fetchLatestCalls(analyzedCalls.map(call => call.id));
+      
       // Получаем существующие проанализированные звонки
       const existingCalls = getAnalyzedCalls();
       
       // Создаем Map для быстрого поиска по ID
       const callsMap = new Map(existingCalls.map(call => [call.id, call]));
       
-      // Загружаем все текущие звонки, чтобы получить их полные данные
-      const allCalls = await fetchCalls();
-      const allCallsMap = new Map(allCalls.map(call => [call.id, call]));
-      
       // Добавляем или обновляем звонки, сохраняя все поля исходного звонка
       analyzedCalls.forEach(analyzedCall => {
         // Получаем полную версию звонка из всех загруженных звонков
@@ -474,8 +667,14 @@ export async function uploadFile(file: File): Promise<{
   }
 }
 
+// Диапазон дат завершения звонков, включительно (гггг-мм-дд или дд.мм.гггг)
+export interface CallDateRange {
+  dateFrom?: string;
+  dateTo?: string;
+}
+
 // Анализ звонков с пользовательским запросом
-export async function customAnalyzeCalls(callIds: string[], prompt: string): Promise<Call[] & { availableTags?: string[] }> {
+export async function customAnalyzeCalls(callIds: string[], prompt: string, dateRange?: CallDateRange): Promise<Call[] & { availableTags?: string[] }> {
   if (USE_MOCK_DATA) {
     // Имитация анализа с тестовыми данными
     const analyzed = MOCK_CALLS.filter(call => callIds.includes(call.id))
@@ -509,7 +708,9 @@ export async function customAnalyzeCalls(callIds: string[], prompt: string): Pro
       },
       body: JSON.stringify({ 
         callIds,
-        prompt
+        prompt,
+        dateFromFilter: dateRange?.dateFrom,
+        dateToFilter: dateRange?.dateTo
       }),
     });
     
@@ -540,15 +741,14 @@ export async function customAnalyzeCalls(callIds: string[], prompt: string): Pro
         return call;
       });
       
+      // Полные данные проанализированных звонков - только изменения с прошлой синхронизации
+      const allCallsMap = await fetchLatestCalls(enhancedCalls.map(call => call.id));
+
       // Получаем существующие проанализированные звонки
       const existingCalls = getAnalyzedCalls();
       
       // Создаем Map для быстрого доступа по ID
       const callsMap = new Map(existingCalls.map(call => [call.id, call]));
-
-      // Загружаем все текущие звонки, чтобы получить их полные данные
-      const allCalls = await fetchCalls();
-      const allCallsMap = new Map(allCalls.map(call => [call.id, call]));
       
       // Добавляем или обновляем звонки с пометкой о пользовательском анализе
       enhancedCalls.forEach(analyzedCall => {
@@ -616,7 +816,7 @@ export async function customAnalyzeCalls(callIds: string[], prompt: string): Pro
 }
 
 // Функция для отправки сообщения в чат и получения ответа
-export const sendChatMessage = async (message: string, filters: Record<string, any>, dataSource?: 'all' | 'cloud' | 'local'): Promise<{ reply: string, availableTags?: string[] }> => {
+export const sendChatMessage = async (message: string, filters: Record<string, any>, dataSource?: 'all' | 'cloud' | 'local'): Promise<{ reply: string, availableTags?: string[], tagCounts?: Record<string, number> }> => {
   if (USE_MOCK_DATA) {
     console.log("Chat message (mock):", message, "Filters:", filters);
     // Простая логика для мок-ответа
@@ -628,6 +828,7 @@ export const sendChatMessage = async (message: string, filters: Record<string, a
     if (filters.status) activeFilters.push(`статус: ${filters.status}`);
     if (filters.operator) activeFilters.push(`оператор: ${filters.operator}`);
     if (filters.date) activeFilters.push(`дата: ${filters.date}`);
+    if (filters.dateFrom || filters.dateTo) activeFilters.push(`период: ${filters.dateFrom || '...'} - ${filters.dateTo || '...'}`);
     if (filters.duration) {
       const durationMap: Record<string, string> = {
         'short': 'короткие (до 1 мин)',
@@ -675,10 +876,11 @@ export const sendChatMessage = async (message: string, filters: Record<string, a
     }
 
     const data = await response.json();
-    // Возвращаем reply и availableTags если они есть в ответе
+    // Возвращаем reply, availableTags и число звонков по тегам, если они есть в ответе
     return {
       reply: data.reply,
-      availableTags: data.availableTags
+      availableTags: data.availableTags,
+      tagCounts: data.tagCounts
     };
   } catch (error) {
     console.error("Error sending chat message:", error);
@@ -1,4 +1,4 @@
-import React, { useState, useEffect, useRef } from "react";
+import React, { useState, useEffect, useRef, useMemo } from "react";
 import CallsTable, { Call } from "@/components/calls/CallsTable";
 import { Button } from "@/components/ui/button";
 import { Input } from "@/components/ui/input";
@@ -32,6 +32,8 @@ import { Badge } from "@/components/ui/badge";
 import { Separator } from "@/components/ui/separator";
 import { 
   fetchCalls, 
+  fetchCallsPage,
+  CALL_LIST_FIELDS,
   analyzeCalls, 
   transcribeCalls, 
   processAllCalls,
@@ -63,6 +65,9 @@ import { Progress } from "@/components/ui/progress";
 import { cn } from "@/lib/utils";
 import { useNavigate } from "react-router-dom";
 
+// Размер страницы таблицы звонков (страницы собираются на сервере)
+const PAGE_SIZE = 50;
+
 // Define types for custom fields and analysis results
 interface CustomField {
   label: string;
@@ -113,6 +118,13 @@ const Calls = () => {
   // Новые состояния для работы с API
   const [calls, setCalls] = useState<Call[]>([]);
   const [isLoading, setIsLoading] = useState(false);
+  // Текущая страница таблицы: фильтры, сортировка и срез выполняются на сервере
+  const [pageCalls, setPageCalls] = useState<Call[]>([]);
+  const [totalCalls, setTotalCalls] = useState(0);
+  const [page, setPage] = useState(0);
+  const [sortBy, setSortBy] = useState<string>("-date");
+  const [isPageLoading, setIsPageLoading] = useState(false);
+  const [pageReloadKey, setPageReloadKey] = useState(0); // Перезагрузка страницы после обновления данных
   const [selectedCallIds, setSelectedCallIds] = useState<string[]>([]);
   const [dataSource, setDataSource] = useState<'all' | 'cloud' | 'local'>('all');
   const [isProcessing, setIsProcessing] = useState(false);
@@ -177,6 +189,17 @@ const Calls = () => {
     loadCalls(dataSource);
   }, [dataSource]);
 
+  // При смене фильтров, сортировки или источника возвращаемся на первую страницу
+  useEffect(() => {
+    setPage(0);
+  }, [searchQuery, statusFilter, purposeFilter, sortBy, dataSource]);
+
+  // Загружаем страницу таблицы (поиск - с небольшой задержкой после ввода)
+  useEffect(() => {
+    const timer = setTimeout(() => loadPage(), searchQuery ? 300 : 0);
+    return () => clearTimeout(timer);
+  }, [searchQuery, statusFilter, purposeFilter, sortBy, dataSource, page, pageReloadKey]);
+
   // Обновляем выбранные звонки в глобальном состоянии
   useEffect(() => {
     if (calls.length > 0) {
@@ -189,8 +212,8 @@ const Calls = () => {
     setIsLoading(true);
     const sourceToUse = source || dataSource;
     try {
-      // Загружаем звонки из API
-      const callsData = await fetchCalls(sourceToUse);
+      // Загружаем звонки из API (без текстов транскрипций - таблица и дашборд их не показывают)
+      const callsData = await fetchCalls(sourceToUse, CALL_LIST_FIELDS);
       
       // Загружаем сохраненные результаты анализа
       const analyzedCalls = getAnalyzedCalls();
@@ -232,6 +255,8 @@ const Calls = () => {
         globalState.updateCalls(callsData, sourceToUse);
       }
       
+      setPageReloadKey(key => key + 1);
+      
       toast({
         title: "Данные загружены",
         description: `Загружено ${callsData.length} звонков`,
@@ -247,31 +272,44 @@ const Calls = () => {
     }
   };
 
-  const filteredCalls = calls.filter((call) => {
-    // Search filter
-    if (
-      searchQuery &&
-      !call.agent?.toLowerCase().includes(searchQuery.toLowerCase()) &&
-      !call.customer?.toLowerCase().includes(searchQuery.toLowerCase())
-    ) {
-      return false;
-    }
-
-    // Status filter
-    if (statusFilter !== "all" && call.status !== statusFilter) {
-      return false;
-    }
-
-    // Purpose filter
-    if (
-      purposeFilter !== "all" &&
-      !call.purpose?.toLowerCase().includes(purposeFilter.toLowerCase())
-    ) {
-      return false;
+  // Функция загрузки текущей страницы таблицы
+  const loadPage = async () => {
+    setIsPageLoading(true);
+    try {
+      const result = await fetchCallsPage({
+        source: dataSource,
+        limit: PAGE_SIZE,
+        offset: page * PAGE_SIZE,
+        sort: sortBy,
+        fields: CALL_LIST_FIELDS,
+        search: searchQuery.trim(),
+        status: statusFilter,
+        purpose: purposeFilter,
+      });
+      setPageCalls(result.calls);
+      setTotalCalls(result.total);
+    } catch (error) {
+      console.error("Ошибка загрузки страницы звонков:", error);
+      toast({
+        title: "Ошибка загрузки",
+        description: "Не удалось загрузить страницу звонков",
+        variant: "destructive",
+      });
+    } finally {
+      setIsPageLoading(false);
     }
+  };
 
-    return true;
-  });
+  // Строки страницы с локальными изменениями (результаты анализа и транскрибации из calls)
+  const callsById = useMemo(() => new Map(calls.map(call => [call.id, call])), [calls]);
+  const tableCalls = useMemo(
+    () => pageCalls.map(call => {
+      const local = callsById.get(call.id);
+      return local ? { ...call, ...local } : call;
+    }),
+    [pageCalls, callsById]
+  );
+  const pageCount = Math.max(1, Math.ceil(totalCalls / PAGE_SIZE));
 
   // Функция обработки загрузки файла
   const handleFileChange = (e: React.ChangeEvent<HTMLInputElement>) => {
@@ -751,12 +789,23 @@ const Calls = () => {
     }
   };
 
-  const selectAllCalls = (selected: boolean) => {
-    let newSelectedIds: string[];
+  const selectAllCalls = async (selected: boolean) => {
+    let newSelectedIds: string[] = [];
     if (selected) {
-      newSelectedIds = filteredCalls.map(call => call.id);
-    } else {
-      newSelectedIds = [];
+      // Все звонки под текущими фильтрами, а не только текущая страница: запрашиваем одни ID
+      try {
+        const result = await fetchCallsPage({
+          source: dataSource,
+          fields: ['id'],
+          search: searchQuery.trim(),
+          status: statusFilter,
+          purpose: purposeFilter,
+        });
+        newSelectedIds = result.calls.map(call => call.id);
+      } catch (error) {
+        console.error("Ошибка получения списка звонков для выбора:", error);
+        newSelectedIds = tableCalls.map(call => call.id);
+      }
     }
     setSelectedCallIds(newSelectedIds);
     globalState.updateSelection(newSelectedIds);
@@ -1086,6 +1135,19 @@ const Calls = () => {
                   <SelectItem value="техническая поддержка">Техническая поддержка</SelectItem>
                 </SelectContent>
               </Select>
+              <Select value={sortBy} onValueChange={setSortBy}>
+                <SelectTrigger className="w-[200px]">
+                  <SelectValue placeholder="Сортировка" />
+                </SelectTrigger>
+                <SelectContent>
+                  <SelectItem value="-date">Сначала новые</SelectItem>
+                  <SelectItem value="date">Сначала старые</SelectItem>
+                  <SelectItem value="-duration">Сначала длинные</SelectItem>
+                  <SelectItem value="duration">Сначала короткие</SelectItem>
+                  <SelectItem value="-score">По AI-оценке</SelectItem>
+                  <SelectItem value="customer">По клиенту</SelectItem>
+                </SelectContent>
+              </Select>
             </div>
             <div className="flex items-center gap-2">
               <Button
@@ -1189,11 +1251,11 @@ const Calls = () => {
                 <div className="flex items-center space-x-2">
                   <Checkbox 
                     id="select-all" 
-                    checked={selectedCallIds.length === filteredCalls.length && filteredCalls.length > 0}
+                    checked={selectedCallIds.length === totalCalls && totalCalls > 0}
                     onCheckedChange={(checked) => selectAllCalls(!!checked)}
                   />
                   <label htmlFor="select-all" className="text-sm font-medium">
-                    Выбрать все ({filteredCalls.length})
+                    Выбрать все ({totalCalls})
                   </label>
               </div>
                 <div className="flex items-center space-x-2">
@@ -1276,19 +1338,45 @@ const Calls = () => {
             previewResult={previewResult}
           />
 
-          {isLoading ? (
+          {isLoading || (isPageLoading && pageCalls.length === 0) ? (
             <div className="flex justify-center items-center py-12">
               <Loader2 className="h-8 w-8 animate-spin text-primary" />
               <span className="ml-2 text-lg">Загрузка звонков...</span>
             </div>
           ) : (
+          <>
           <CallsTable 
-              calls={filteredCalls}
-              title={`Все звонки (${filteredCalls.length})`}
+              calls={tableCalls}
+              title={`Все звонки (${totalCalls})`}
               selectedCallIds={selectedCallIds}
               onCallSelect={handleCallSelect}
               keyQuestions={(customKeyQuestions.some(q => q.trim()) ? customKeyQuestions.filter(q=>q.trim()).slice(0,3) : (previewResult?.keyQuestions || []))}
             />
+            <div className="flex items-center justify-between">
+              <span className="text-sm text-muted-foreground">
+                Страница {page + 1} из {pageCount} (показано {tableCalls.length} из {totalCalls})
+              </span>
+              <div className="flex items-center gap-2">
+                {isPageLoading && <Loader2 className="h-4 w-4 animate-spin text-muted-foreground" />}
+                <Button
+                  variant="outline"
+                  size="sm"
+                  onClick={() => setPage(p => Math.max(0, p - 1))}
+                  disabled={page === 0 || isPageLoading}
+                >
+                  Назад
+                </Button>
+                <Button
+                  variant="outline"
+                  size="sm"
+                  onClick={() => setPage(p => Math.min(pageCount - 1, p + 1))}
+                  disabled={page + 1 >= pageCount || isPageLoading}
+                >
+                  Вперед
+                </Button>
+              </div>
+            </div>
+          </>
           )}
         </TabsContent>
 
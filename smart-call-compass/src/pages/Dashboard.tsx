@@ -10,7 +10,7 @@ import CallsComparison from "@/components/calls/CallsComparison";
 import AlertsSystem from "@/components/calls/AlertsSystem";
 import { Card, CardContent, CardDescription, CardHeader, CardTitle } from "@/components/ui/card";
 import { ChartBar, CheckCircle, Clock, FileText, Phone, XCircle, Brain, Loader2, Users } from "lucide-react";
-import { fetchCalls, getAnalyzedCalls } from "@/lib/api";
+import { fetchCalls, getAnalyzedCalls, CALL_LIST_FIELDS } from "@/lib/api";
 import { globalState, EVENTS, CallsUpdatedEvent, DataSourceChangedEvent, AnalysisCompletedEvent } from "@/lib/globalState";
 import { TabsContent, TabsList, TabsTrigger, Tabs } from "@/components/ui/tabs";
 import {
@@ -163,7 +163,8 @@ const Dashboard = () => {
       // Загружаем звонки из API (если нет данных в глобальном состоянии)
       // Используем текущий источник данных из глобального состояния
       const currentSource = globalState.getDataSource();
-      let callsData = await fetchCalls(currentSource);
+      // Дашборду тексты транскрипций не нужны - запрашиваем звонки без них
+      let callsData = await fetchCalls(currentSource, CALL_LIST_FIELDS);
       console.log(`📊 Dashboard: Загружаем из API с источником ${currentSource}`);
       
       // Загружаем сохраненные результаты анализа
@@ -0,0 +1,225 @@
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+
+def _row_hash(raw):
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()[:20]
+
+
+def _write_json_gz(path, payload):
+    tmp_path = path + '.tmp'
+    with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+        json.dump(payload, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def _read_json_gz(path):
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        return json.load(f)
+
+
+class BackupManager:
+    """Резервные копии хранилища звонков с построчной дедупликацией и политикой хранения.
+
+    Копия - это манифест (колонки и список пар id строки -> хэш содержимого)
+    и пакет только тех строк, которых нет ни в одной сохраненной копии. Поэтому
+    повторная копия после анализа нескольких звонков занимает место только этих
+    звонков, а копия, совпадающая по содержимому с последней, не создается вовсе.
+
+    Хранятся последние keep_last копий и последняя копия каждого из keep_daily
+    последних дней; пакеты, строки которых больше не нужны, удаляются или
+    переписываются при очистке.
+
+    Структура каталога:
+        index.json                  - список копий (без строк)
+        manifests/<id>.json.gz      - колонки и строки копии
+        packs/<id>.jsonl.gz         - новые строки копии: {"h": хэш, "d": JSON строки}
+    """
+
+    def __init__(self, store, directory, keep_last=10, keep_daily=7):
+        self.store = store
+        self.directory = directory
+        self.keep_last = keep_last
+        self.keep_daily = keep_daily
+        self._lock = threading.Lock()
+        self._known_hashes = None  # Хэши строк, уже лежащих в пакетах (загружаются лениво)
+        os.makedirs(os.path.join(directory, 'manifests'), exist_ok=True)
+        os.makedirs(os.path.join(directory, 'packs'), exist_ok=True)
+
+    # --- Пути и индекс ---
+
+    def _index_path(self):
+        return os.path.join(self.directory, 'index.json')
+
+    def _manifest_path(self, backup_id):
+        return os.path.join(self.directory, 'manifests', f"{backup_id}.json.gz")
+
+    def _pack_path(self, pack_id):
+        return os.path.join(self.directory, 'packs', f"{pack_id}.jsonl.gz")
+
+    def _load_index(self):
+        try:
+            with open(self._index_path(), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return []
+
+    def _save_index(self, index):
+        tmp_path = self._index_path() + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(index, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, self._index_path())
+
+    def list_backups(self):
+        """Список копий от новых к старым"""
+        with self._lock:
+            return list(reversed(self._load_index()))
+
+    def _load_known_hashes(self, index):
+        if self._known_hashes is None:
+            known = set()
+            for entry in index:
+                known.update(row_hash for _, row_hash in _read_json_gz(self._manifest_path(entry['id']))['rows'])
+            self._known_hashes = known
+        return self._known_hashes
+
+    # --- Создание копии ---
+
+    def create(self, reason='manual'):
+        """Сохраняет копию текущего содержимого хранилища. Возвращает запись индекса"""
+        with self._lock:
+            started = time.time()
+            index = self._load_index()
+            known = self._load_known_hashes(index)
+            created = time.time()
+            backup_id = datetime.fromtimestamp(created).strftime('%Y%m%d_%H%M%S_%f')
+
+            rows = []
+            new_rows = 0
+            digest = hashlib.sha1()
+            pack_path = self._pack_path(backup_id)
+            pack_tmp = pack_path + '.tmp'
+            with self.store.read_rows() as (columns, generation, cursor), \
+                    gzip.open(pack_tmp, 'wt', encoding='utf-8') as pack:
+                digest.update(json.dumps(columns, ensure_ascii=False).encode('utf-8'))
+                for row_id, raw in cursor:
+                    row_hash = _row_hash(raw)
+                    rows.append([row_id, row_hash])
+                    digest.update(f"{row_id}:{row_hash};".encode())
+                    if row_hash not in known:
+                        pack.write(json.dumps({'h': row_hash, 'd': raw}, ensure_ascii=False) + '\n')
+                        known.add(row_hash)
+                        new_rows += 1
+            content_hash = digest.hexdigest()
+
+            # Содержимое не изменилось с последней копии - новую не создаем
+            if index and index[-1]['hash'] == content_hash:
+                os.remove(pack_tmp)
+                print(f"Резервная копия не требуется: данные совпадают с копией {index[-1]['id']}")
+                return index[-1]
+
+            if new_rows:
+                os.replace(pack_tmp, pack_path)
+            else:
+                os.remove(pack_tmp)
+            _write_json_gz(self._manifest_path(backup_id), {'columns': columns, 'rows': rows})
+            entry = {
+                'id': backup_id,
+                'created': created,
+                'reason': reason,
+                'generation': generation,
+                'rows': len(rows),
+                'newRows': new_rows,
+                'hash': content_hash,
+            }
+            index.append(entry)
+            self._save_index(index)
+            print(f"Создана резервная копия {backup_id}: {len(rows)} строк, новых {new_rows}, "
+                  f"за {time.time() - started:.2f} с")
+            self._prune(index)
+            return entry
+
+    # --- Политика хранения ---
+
+    def _retained_ids(self, index):
+        keep = {entry['id'] for entry in index[-self.keep_last:]} if self.keep_last else set()
+        days = {}
+        for entry in index:
+            # Последняя копия каждого дня
+            days[datetime.fromtimestamp(entry['created']).date()] = entry['id']
+        for day in sorted(days)[-self.keep_daily:] if self.keep_daily else []:
+            keep.add(days[day])
+        return keep
+
+    def _prune(self, index):
+        keep = self._retained_ids(index)
+        removed = [entry for entry in index if entry['id'] not in keep]
+        if not removed:
+            return
+        index = [entry for entry in index if entry['id'] in keep]
+        self._save_index(index)
+        for entry in removed:
+            try:
+                os.remove(self._manifest_path(entry['id']))
+            except FileNotFoundError:
+                pass
+        print(f"Удалено старых резервных копий: {len(removed)}")
+        self._collect_packs(index)
+
+    def _collect_packs(self, index):
+        """Удаляет пакеты без нужных строк и переписывает пакеты, где нужных меньше половины"""
+        live = set()
+        for entry in index:
+            live.update(row_hash for _, row_hash in _read_json_gz(self._manifest_path(entry['id']))['rows'])
+        packs_dir = os.path.join(self.directory, 'packs')
+        for name in os.listdir(packs_dir):
+            if not name.endswith('.jsonl.gz'):
+                continue
+            path = os.path.join(packs_dir, name)
+            with gzip.open(path, 'rt', encoding='utf-8') as f:
+                lines = f.readlines()
+            kept = [line for line in lines if json.loads(line)['h'] in live]
+            if not kept:
+                os.remove(path)
+            elif len(kept) * 2 < len(lines):
+                tmp_path = path + '.tmp'
+                with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+                    f.writelines(kept)
+                os.replace(tmp_path, path)
+        self._known_hashes = live
+
+    # --- Восстановление ---
+
+    def load(self, backup_id):
+        """Возвращает (колонки, список словарей строк) копии"""
+        with self._lock:
+            if not any(entry['id'] == backup_id for entry in self._load_index()):
+                raise KeyError(backup_id)
+            manifest = _read_json_gz(self._manifest_path(backup_id))
+            needed = {row_hash for _, row_hash in manifest['rows']}
+            found = {}
+            packs_dir = os.path.join(self.directory, 'packs')
+            for name in sorted(os.listdir(packs_dir)):
+                if not name.endswith('.jsonl.gz'):
+                    continue
+                with gzip.open(os.path.join(packs_dir, name), 'rt', encoding='utf-8') as f:
+                    for line in f:
+                        item = json.loads(line)
+                        if item['h'] in needed:
+                            found[item['h']] = item['d']
+            missing = needed - found.keys()
+            if missing:
+                raise ValueError(f"В копии {backup_id} не хватает {len(missing)} строк")
+            return manifest['columns'], [json.loads(found[row_hash]) for _, row_hash in manifest['rows']]
+
+    def restore(self, backup_id):
+        """Заменяет содержимое хранилища копией backup_id (текущие данные сначала сохраняются)"""
+        columns, records = self.load(backup_id)
+        self.create(reason=f"before-restore {backup_id}")
+        rows = (tuple(record.get(col) for col in columns) for record in records)
+        return self.store.replace_rows(columns, rows)
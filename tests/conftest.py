@@ -0,0 +1,71 @@
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+# Модули проекта лежат в корне репозитория (без пакета)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from call_store import CALL_ID_COLUMN, CallStore  # noqa: E402
+
+COLUMNS = [CALL_ID_COLUMN, 'Ссылка на запись', 'Дата/Время завершения звонка', 'Транскрибация', 'Статус']
+
+
+def make_rows(call_ids):
+    """Строки звонков для replace_rows: по строке на ID звонка"""
+    return [
+        (call_id, f'https://storage.yandexcloud.net/rec/{call_id}.mp3', f'2025-05-0{i % 9 + 1} 10:00:00',
+         f'Оператор: здравствуйте. Клиент: звонок {call_id}', '-')
+        for i, call_id in enumerate(call_ids)
+    ]
+
+
+@pytest.fixture
+def store(tmp_path):
+    """Хранилище без Parquet-снимка с тремя звонками a, b, c"""
+    store = CallStore(str(tmp_path / 'calls.db'), snapshot_path='')
+    store.replace_rows(COLUMNS, iter(make_rows(['a', 'b', 'c'])))
+    return store
+
+
+def row_of(store, call_id):
+    row_id, row = store.find_call(call_id)
+    return row
+
+
+def write_calls_excel(path, n=20):
+    """Excel-файл звонков в формате выгрузки телефонии: каждый четвертый звонок без транскрипции"""
+    pd.DataFrame({
+        'Номер телефона': [f'7701{i:07d}' for i in range(n)],
+        'Дата/Время завершения звонка': pd.date_range('2025-05-01', periods=n, freq='3h'),
+        'lanth': [(i * 37 % 600 + 5) / 100 for i in range(n)],
+        'Дозвон/Недозвон': ['doz' if i % 3 else 'nedoz' for i in range(n)],
+        'Транскрибация': ['-' if i % 4 == 0 else
+                          f'Оператор: Здравствуйте, чем могу помочь? Клиент: цена доставка скидка {i} дорого подумаю'
+                          for i in range(n)],
+        'Ссылка на запись': [f'https://storage.yandexcloud.net/rec/{i}.mp3' for i in range(n)],
+        'Tag': [['groq', 'gemini', None][i % 3] for i in range(n)],
+        'Цели': 'продажа',
+    }).to_excel(path, index=False)
+
+
+@pytest.fixture(scope='session')
+def api_module(tmp_path_factory):
+    """Модуль api, импортированный в отдельном каталоге: хранилище создается из DFASDF.xlsx на 20 звонков.
+
+    Пути api относительные, поэтому каталог остается текущим до конца сессии.
+    """
+    workdir = tmp_path_factory.mktemp('api')
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    os.environ.setdefault('GROQ_API_KEY', 'dummy')
+    write_calls_excel('DFASDF.xlsx')
+    import api
+    yield api
+    os.chdir(cwd)
+
+
+@pytest.fixture
+def client(api_module):
+    return api_module.app.test_client()
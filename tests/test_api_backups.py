@@ -0,0 +1,49 @@
+import io
+
+import pytest
+
+from call_store import CALL_ID_COLUMN
+from conftest import write_calls_excel
+
+
+@pytest.fixture
+def pending_result(api_module, monkeypatch):
+    """Результат в журнале, который не удается записать в хранилище; после теста он записывается"""
+    store, writer = api_module.store, api_module.result_writer
+    call_id = store.get_row(0)[CALL_ID_COLUMN]
+    writer.put(call_id, {'Статус': 'успешный'})
+
+    def fail(updates):
+        raise OSError('disk I/O error')
+
+    monkeypatch.setattr(store, 'update_calls', fail)
+    yield call_id
+    monkeypatch.undo()
+    writer.flush()
+    assert store.find_call(call_id)[1]['Статус'] == 'успешный'
+
+
+def test_upload_aborted_when_pending_results_cannot_be_written(api_module, client, pending_result, tmp_path):
+    store, backups = api_module.store, api_module.backups
+    before = (store.generation(), len(backups.list_backups()))
+    write_calls_excel(tmp_path / 'new.xlsx', n=3)
+
+    response = client.post('/api/upload', data={'file': (io.BytesIO((tmp_path / 'new.xlsx').read_bytes()), 'new.xlsx')},
+                           content_type='multipart/form-data')
+
+    assert response.status_code == 500
+    assert 'накопленные результаты' in response.get_json()['error']
+    assert (store.generation(), len(backups.list_backups())) == before
+    assert api_module.result_writer.pending_count() == 1
+
+
+def test_restore_aborted_when_pending_results_cannot_be_written(api_module, client, pending_result):
+    store, backups = api_module.store, api_module.backups
+    backup_id = backups.create(reason='test')['id']
+    before = (store.generation(), len(backups.list_backups()))
+
+    response = client.post(f'/api/backups/{backup_id}/restore')
+
+    assert response.status_code == 500
+    assert 'накопленные результаты' in response.get_json()['error']
+    assert (store.generation(), len(backups.list_backups())) == before
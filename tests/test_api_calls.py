@@ -0,0 +1,37 @@
+import json
+
+from call_store import CALL_ID_COLUMN
+from calls_serializer import DEFAULT_CALL_FIELDS
+
+
+def stored_calls(api_module):
+    with api_module.store.read_rows() as (columns, generation, cursor):
+        rows = [json.loads(data) for row_id, data in cursor]
+    return {row[CALL_ID_COLUMN]: row for row in rows}
+
+
+def test_calls_payload(api_module, client):
+    rows = stored_calls(api_module)
+    response = client.get('/api/calls')
+    assert response.status_code == 200
+    payload = response.get_json()
+    assert payload['total'] == len(payload['calls']) == len(rows)
+
+    for call in payload['calls']:
+        row = rows[call['id']]
+        assert list(call) == list(DEFAULT_CALL_FIELDS)
+        assert call['customer'] == str(row['Номер телефона'])
+        assert call['recordUrl'] == row['Ссылка на запись']
+        assert call['status'] == {'doz': 'успешный', 'nedoz': 'неуспешный'}[row['Дозвон/Недозвон']]
+        text = row['Транскрибация']
+        assert call['transcriptLength'] == (0 if text == '-' else len(text.strip()))
+        assert call['transcriptPreview'] == ('' if text == '-' else text.strip()[:200])
+
+
+def test_calls_selected_fields(api_module, client):
+    rows = stored_calls(api_module)
+    payload = client.get('/api/calls?fields=id,transcription').get_json()
+    assert [sorted(call) for call in payload['calls']] == [['id', 'transcription']] * len(rows)
+    assert {call['id']: call['transcription'] for call in payload['calls']} == {
+        call_id: row['Транскрибация'] for call_id, row in rows.items()}
+    assert client.get('/api/calls?fields=id,nope').status_code == 400
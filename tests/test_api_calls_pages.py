@@ -0,0 +1,46 @@
+import pytest
+
+
+def all_ids(client):
+    return [call['id'] for call in client.get('/api/calls?fields=id').get_json()['calls']]
+
+
+def test_cursor_walk_returns_every_call_once(client):
+    expected = all_ids(client)
+    page = client.get('/api/calls?limit=6&fields=id').get_json()
+    ids = [call['id'] for call in page['calls']]
+    while page['nextCursor']:
+        page = client.get('/api/calls?limit=6&fields=id&cursor=' + page['nextCursor']).get_json()
+        ids += [call['id'] for call in page['calls']]
+    assert ids == expected
+
+
+def test_offset_page_and_projection(client):
+    expected = all_ids(client)
+    payload = client.get('/api/calls?offset=3&limit=4&fields=id,customer').get_json()
+    assert (payload['total'], payload['offset'], payload['limit']) == (len(expected), 3, 4)
+    assert [call['id'] for call in payload['calls']] == expected[3:7]
+    assert all(sorted(call) == ['customer', 'id'] for call in payload['calls'])
+
+
+def test_sort_by_several_fields(client):
+    calls = client.get('/api/calls?sort=-date&fields=id,date,time').get_json()['calls']
+    stamps = [(call['date'][6:], call['date'][3:5], call['date'][:2], call['time']) for call in calls]
+    assert stamps == sorted(stamps, reverse=True)
+
+    calls = client.get('/api/calls?sort=status,-duration&fields=status,duration,audioDuration').get_json()['calls']
+    keys = [(call['status'], call['audioDuration']) for call in calls]
+    assert keys == sorted(keys, key=lambda key: (key[0], tuple(-int(part) for part in key[1].split(':'))))
+
+
+def test_ids_filter(client):
+    expected = all_ids(client)
+    payload = client.get(f'/api/calls?fields=id&ids={expected[4]},{expected[1]},нет').get_json()
+    assert sorted(call['id'] for call in payload['calls']) == sorted([expected[1], expected[4]])
+
+
+@pytest.mark.parametrize('query', ['limit=x', 'offset=-1', 'cursor=???', 'fields=bad', 'sort=nope'])
+def test_invalid_parameters(client, query):
+    response = client.get('/api/calls?' + query)
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
@@ -0,0 +1,37 @@
+from call_store import CALL_ID_COLUMN
+
+
+def test_changes_since_generation(api_module, client):
+    store = api_module.store
+    generation = store.generation()
+    response = client.get(f'/api/calls/changes?since={generation}')
+    assert response.get_json() == {'calls': [], 'generation': generation, 'reset': False, 'deleted': []}
+    assert client.get(f'/api/calls/changes?since={generation}',
+                      headers={'If-None-Match': response.headers['ETag']}).status_code == 304
+
+    call_id = store.get_row(2)[CALL_ID_COLUMN]
+    store.update_calls({call_id: {'AI-резюме': 'перезвонить завтра'}})
+    [new_id] = store.insert_rows([{'Номер телефона': '79990000000', 'Ссылка на запись': '/api/recordings/a.mp3',
+                                   'Транскрибация': 'привет мир'}])
+    new_call_id = store.get_row(new_id)[CALL_ID_COLUMN]
+
+    payload = client.get(f'/api/calls/changes?since={generation}&fields=id,aiSummary,transcriptPreview').get_json()
+    assert payload['generation'] == store.generation() and not payload['reset']
+    changed = {call['id']: call for call in payload['calls']}
+    assert sorted(changed) == sorted([call_id, new_call_id])
+    assert changed[call_id]['aiSummary'] == 'перезвонить завтра'
+    assert changed[new_call_id]['transcriptPreview'] == 'привет мир'
+    # Изменения те же, что видит /api/calls
+    calls = client.get('/api/calls?fields=id,aiSummary,transcriptPreview&ids=' + f'{call_id},{new_call_id}').get_json()
+    assert sorted(calls['calls'], key=lambda call: call['id']) == sorted(payload['calls'], key=lambda call: call['id'])
+
+    with store._transaction() as conn:
+        conn.execute('DELETE FROM calls WHERE id = ?', (new_id,))
+    payload = client.get(f"/api/calls/changes?since={payload['generation']}").get_json()
+    assert (payload['calls'], payload['deleted']) == ([], [new_call_id])
+
+
+def test_stale_or_invalid_since(client):
+    assert client.get('/api/calls/changes?since=0').get_json()['reset'] is True
+    assert client.get('/api/calls/changes').status_code == 400
+    assert client.get('/api/calls/changes?since=abc').status_code == 400
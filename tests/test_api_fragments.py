@@ -0,0 +1,26 @@
+from calls_serializer import serialize_calls
+
+FIELDS = 'id,customer,date,status,tags,aiSummary,score,transcriptLength'
+
+
+def expected_calls(api_module):
+    df = api_module.load_or_get_calls_df()
+    return serialize_calls(df, api_module.transcripts(), fields=FIELDS.split(','))
+
+
+def test_cached_fragments_follow_store_writes(api_module, client):
+    # Первый запрос после загрузки кэша звонков идет мимо кэша фрагментов, второй заполняет его
+    for _ in range(2):
+        client.get('/api/calls?fields=' + FIELDS)
+    before = client.get('/api/cache-stats').get_json()['fragments']
+    assert client.get('/api/calls?fields=' + FIELDS).get_json()['calls'] == expected_calls(api_module)
+    after = client.get('/api/cache-stats').get_json()['fragments']
+    assert after['hits'] - before['hits'] == len(expected_calls(api_module))
+
+    call_id = client.get('/api/calls?limit=1&offset=3&fields=id').get_json()['calls'][0]['id']
+    api_module.result_writer.put(call_id, {'AI-резюме': 'новое резюме', 'AI-оценка': 9}, kind='analysis')
+    api_module.result_writer.flush()
+    calls = client.get('/api/calls?fields=' + FIELDS).get_json()['calls']
+    assert calls == expected_calls(api_module)
+    changed = next(call for call in calls if call['id'] == call_id)
+    assert (changed['aiSummary'], changed['score']) == ('новое резюме', 9)
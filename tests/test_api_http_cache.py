@@ -0,0 +1,42 @@
+import gzip
+
+import pytest
+
+from call_store import CALL_ID_COLUMN
+
+
+@pytest.mark.parametrize('path', ['/api/calls', '/api/calls?limit=2&fields=id', '/api/get-tags', '/api/refresh-tags'])
+def test_repeat_request_gets_304(client, path):
+    response = client.get(path)
+    assert response.status_code == 200
+    assert response.headers['Cache-Control'] == 'no-cache'
+    repeat = client.get(path, headers={'If-None-Match': response.headers['ETag']})
+    assert repeat.status_code == 304 and repeat.data == b''
+    assert repeat.headers['ETag'] == response.headers['ETag']
+
+
+def test_etag_changes_after_store_write(api_module, client):
+    response = client.get('/api/calls?limit=1&fields=id')
+    call_id = response.get_json()['calls'][0]['id']
+    api_module.store.update_calls({call_id: {'Tag': 'изменен'}})
+    repeat = client.get('/api/calls?limit=1&fields=id', headers={'If-None-Match': response.headers['ETag']})
+    assert repeat.status_code == 200
+    assert repeat.headers['ETag'] != response.headers['ETag']
+
+
+def test_refresh_tags_keeps_calls_cache(api_module, client):
+    client.get('/api/calls?fields=id')
+    misses = api_module.calls_cache.misses
+    row = api_module.store.get_row(0)
+    api_module.store.update_calls({row[CALL_ID_COLUMN]: {'Tag': 'новый_тег'}})
+
+    payload = client.get('/api/refresh-tags').get_json()
+    assert payload['counts']['новый_тег'] == 1
+    # Запись сервера применена к кэшу, перезагрузки хранилища нет
+    assert api_module.calls_cache.misses == misses
+
+
+def test_large_response_is_compressed(client):
+    response = client.get('/api/calls', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert b'"calls"' in gzip.decompress(response.data)
@@ -0,0 +1,35 @@
+import json
+
+from flask import Flask
+
+from ndjson_stream import NDJSON_MIMETYPE, ndjson_response
+
+
+def test_ndjson_matches_json_payload(client):
+    expected = client.get('/api/calls?sort=-date').get_json()['calls']
+    response = client.get('/api/calls?sort=-date&format=ndjson')
+    assert response.mimetype == NDJSON_MIMETYPE
+    assert response.headers['X-Total-Count'] == str(len(expected))
+    assert 'X-Next-Cursor' not in response.headers
+    assert [json.loads(line) for line in response.data.decode('utf-8').splitlines()] == expected
+
+
+def test_ndjson_page_has_cursor_header(client):
+    response = client.get('/api/calls?limit=3&fields=id&format=ndjson')
+    assert len(response.data.decode('utf-8').splitlines()) == 3
+    cursor = response.headers['X-Next-Cursor']
+    page = client.get('/api/calls?limit=3&fields=id&cursor=' + cursor).get_json()
+    assert page['offset'] == 3
+
+
+def test_error_mid_stream_is_last_line():
+    app = Flask(__name__)
+
+    def records():
+        yield {'n': 1}
+        raise RuntimeError('сбой')
+
+    with app.test_request_context():
+        response = ndjson_response(records(), flush_bytes=0)
+        lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert lines == [{'n': 1}, {'error': 'сбой'}]
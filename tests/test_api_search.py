@@ -0,0 +1,22 @@
+def test_search_endpoint(client):
+    calls = client.get('/api/calls?fields=id,transcriptLength').get_json()['calls']
+    expected = {call['id'] for call in calls if call['transcriptLength'] > 0}
+    payload = client.get('/api/search?q=доставка скидка&limit=100').get_json()
+    assert payload['total'] == len(expected)
+    assert {result['id'] for result in payload['results']} == expected
+    assert '<mark>' in payload['results'][0]['snippet']
+    scores = [result['score'] for result in payload['results']]
+    assert scores == sorted(scores, reverse=True)
+
+    page = client.get('/api/search?q=доставка скидка&limit=2&offset=2').get_json()
+    assert (page['total'], page['results']) == (payload['total'], payload['results'][2:4])
+
+
+def test_search_escapes_snippet_and_rejects_empty_query(api_module, client):
+    store = api_module.store
+    call_id = client.get('/api/calls?limit=1&fields=id').get_json()['calls'][0]['id']
+    store.update_calls({call_id: {'AI-резюме': '<b>уникальное</b> резюме'}})
+    [result] = client.get('/api/search?q=уникальное').get_json()['results']
+    assert result['id'] == call_id
+    assert '&lt;b&gt;<mark>уникальное</mark>&lt;/b&gt;' in result['snippet']
+    assert client.get('/api/search?q=').status_code == 400
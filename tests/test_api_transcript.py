@@ -0,0 +1,44 @@
+import pytest
+
+
+@pytest.fixture
+def transcribed(client):
+    """(ID звонка, полный текст транскрипции) первого звонка с текстом"""
+    calls = client.get('/api/calls?fields=id,transcription,transcriptLength').get_json()['calls']
+    call = next(call for call in calls if call['transcriptLength'] > 0)
+    return call['id'], call['transcription']
+
+
+def test_full_transcript(client, transcribed):
+    call_id, text = transcribed
+    response = client.get(f'/api/calls/{call_id}/transcript')
+    assert response.status_code == 200
+    assert response.mimetype == 'text/plain'
+    assert response.get_data(as_text=True) == text
+    assert response.headers['Accept-Ranges'] == 'bytes'
+    assert client.get(f'/api/calls/{call_id}/transcript',
+                      headers={'If-None-Match': response.headers['ETag']}).status_code == 304
+
+
+def test_range_requests(client, transcribed):
+    call_id, text = transcribed
+    data = text.encode('utf-8')
+    response = client.get(f'/api/calls/{call_id}/transcript', headers={'Range': 'bytes=0-9'})
+    assert response.status_code == 206
+    assert response.headers['Content-Range'] == f'bytes 0-9/{len(data)}'
+    assert response.get_data() == data[:10]
+
+    etag = client.get(f'/api/calls/{call_id}/transcript').headers['ETag']
+    response = client.get(f'/api/calls/{call_id}/transcript', headers={'Range': 'bytes=10-19', 'If-Range': etag})
+    assert (response.status_code, response.get_data()) == (206, data[10:20])
+    # Текст изменился: If-Range не совпал, отдается весь текст
+    response = client.get(f'/api/calls/{call_id}/transcript', headers={'Range': 'bytes=10-19', 'If-Range': '"old"'})
+    assert (response.status_code, response.get_data()) == (200, data)
+
+
+def test_empty_and_missing_transcripts(client):
+    calls = client.get('/api/calls?fields=id,transcriptLength').get_json()['calls']
+    empty = next(call for call in calls if call['transcriptLength'] == 0)
+    response = client.get(f"/api/calls/{empty['id']}/transcript", headers={'Range': 'bytes=0-99'})
+    assert (response.status_code, response.get_data()) == (200, b'')
+    assert client.get('/api/calls/нет-такого/transcript').status_code == 404
@@ -0,0 +1,102 @@
+import os
+
+import pytest
+
+from call_store import CALL_ID_COLUMN, SNIPPET_END, SNIPPET_START, CallStore, derive_call_id
+from conftest import COLUMNS, make_rows
+
+
+def test_snapshot_is_used_while_current(tmp_path, monkeypatch):
+    store = CallStore(str(tmp_path / 'calls.db'))
+    store.replace_rows(COLUMNS, iter(make_rows(['a', 'b'])))
+    df = store.load_dataframe()
+    assert store.snapshot.version() == (store.store_id, store.generation())
+
+    def fail():
+        raise AssertionError('чтение базы вместо снимка')
+
+    monkeypatch.setattr(store, '_load_from_db', fail)
+    projection = store.load_dataframe(exclude=('Транскрибация',))
+    assert 'Транскрибация' not in projection.columns
+    assert projection.equals(df.drop(columns=['Транскрибация']))
+
+
+def test_snapshot_is_rejected_for_recreated_store(tmp_path):
+    path = str(tmp_path / 'calls.db')
+    store = CallStore(path)
+    store.replace_rows(COLUMNS, iter(make_rows(['a', 'b'])))
+    store.load_dataframe()
+    old_version = store.snapshot.version()
+    assert old_version == (store.store_id, store.generation())
+
+    for name in os.listdir(tmp_path):
+        if name.startswith('calls.db'):
+            os.remove(tmp_path / name)
+    # Новая база доходит до того же поколения, что и снимок старой
+    store = CallStore(path)
+    store.replace_rows(COLUMNS, iter(make_rows(['x', 'y'])))
+    assert store.generation() == old_version[1]
+    assert store.store_id != old_version[0]
+    assert list(store.load_dataframe()[CALL_ID_COLUMN]) == ['x', 'y']
+
+
+def test_call_ids_are_derived_from_record_url_and_deduplicated(tmp_path):
+    store = CallStore(str(tmp_path / 'calls.db'), snapshot_path='')
+    rows = [('https://example.com/1.mp3', '-'), (None, 'x'), (None, 'x')]
+    store.replace_rows(['Ссылка на запись', 'Статус'], iter(rows))
+    ids = [store.get_row(row_id)[CALL_ID_COLUMN] for row_id in range(3)]
+    assert ids[0] == derive_call_id({'Ссылка на запись': 'https://example.com/1.mp3'})
+    assert ids[2] == ids[1] + '-2'
+
+    # Повторная загрузка той же таблицы в другом порядке сохраняет ID звонков
+    store.replace_rows(['Ссылка на запись', 'Статус'], iter(rows[::-1]))
+    assert store.find_call(ids[0])[0] == 2
+
+
+def test_find_call_by_stable_id_and_legacy_position(store):
+    row_id, row = store.find_call('b')
+    assert row_id == 1 and row[CALL_ID_COLUMN] == 'b'
+    assert store.find_call('2')[0] == 2  # Старые числовые ID - позиция строки
+    assert store.find_call('missing') == (None, None)
+
+
+def test_update_calls_resolves_rows_in_transaction(store):
+    events = []
+    store.subscribe(lambda event, payload: events.append((event, payload)))
+    store.replace_rows(COLUMNS, iter(make_rows(['c', 'a'])))
+
+    updated, missing = store.update_calls({'a': {'Статус': 'успешный'}, 'b': {'Статус': 'неуспешный'}})
+    assert (updated, missing) == (1, ['b'])
+    assert store.get_row(1)['Статус'] == 'успешный'
+    assert events[-1] == ('update', {1: {'Статус': 'успешный'}})
+
+
+def test_changes_since(store):
+    generation = store.generation()
+    store.update_calls({'c': {'Статус': 'успешный'}})
+    [new_id] = store.insert_rows([{CALL_ID_COLUMN: 'd', 'Статус': '-'}])
+    current, changes = store.changes_since(generation)
+    assert current > generation
+    assert [(row_id, call_id, op) for row_id, call_id, op in changes] == [(2, 'c', 'upsert'), (new_id, 'd', 'upsert')]
+    assert store.changes_since(current) == (current, [])
+
+    # После замены хранилища журнал не покрывает старые поколения
+    store.replace_rows(COLUMNS, iter(make_rows(['x'])))
+    assert store.changes_since(current) == (store.generation(), None)
+
+
+def test_full_text_search_follows_updates(store):
+    store.update_calls({'b': {'Транскрибация': 'Клиент спросил про доставку', 'AI-резюме': 'доставка'}})
+    store.update_calls({'c': {'Транскрибация': 'Клиент спросил про доставку и цену'}})
+    total, results = store.search('достав')
+    assert total == 2
+    # Совпадение и в резюме поднимает звонок b выше
+    assert [call_id for row_id, call_id, score, snippet in results] == ['b', 'c']
+    assert all(SNIPPET_START in snippet and SNIPPET_END in snippet for *_, snippet in results)
+    assert store.search('доставку цену')[0] == 1
+    assert store.search('доставку', limit=1, offset=1)[1][0][1] == 'c'
+
+    store.update_calls({'c': {'Транскрибация': 'Оператор: до свидания'}})
+    assert store.search('достав')[0] == 1
+    with pytest.raises(ValueError):
+        store.search(' ,. ')
@@ -0,0 +1,20 @@
+from calls_cache import CallsCache
+from conftest import row_of
+
+
+def test_update_does_not_touch_frame_held_by_reader(store):
+    cache = CallsCache(store, loader=store.load_dataframe)
+    before = cache.get()
+    statuses = before['Статус'].tolist()
+    row_id, _ = store.find_call('b')
+
+    store.update_calls({'b': {'Статус': 'Перезвонить', 'Комментарий': 'новая колонка'}})
+
+    after = cache.get()
+    assert cache.patches == 1 and cache.misses == 1
+    assert after is not before
+    assert before['Статус'].tolist() == statuses
+    assert 'Комментарий' not in before.columns
+    assert after.at[row_id, 'Статус'] == 'Перезвонить'
+    assert after.at[row_id, 'Комментарий'] == 'новая колонка'
+    assert row_of(store, 'b')['Статус'] == 'Перезвонить'
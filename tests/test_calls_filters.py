@@ -0,0 +1,104 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from call_store import CALL_ID_COLUMN
+from calls_compact import ENDED_AT_COLUMN, normalize_calls
+from calls_filters import CallFilters, EndedAtIndex, normalize_spec
+from calls_tag_index import TagIndex
+
+
+@pytest.fixture
+def calls(store):
+    store.update_calls({
+        'a': {'tags': json.dumps(['доставка']), 'lanth': '0:45', 'Дозвон/Недозвон': 'doz', 'Имя': 'Анна',
+              'Цели': 'Продажа'},
+        'b': {'Tag': 'Жалоба', 'lanth': '2:30', 'Дозвон/Недозвон': 'nedoz', 'Имя': 'Борис',
+              'Результат звонка': 'успешный'},
+        'c': {'tags': json.dumps(['доставка', 'скидка']), 'lanth': '5:00', 'Дозвон/Недозвон': 'doz', 'Имя': 'анна',
+              'Цели': 'Возврат'},
+    })
+    df = normalize_calls(store.load_dataframe())
+    df['date'] = df[ENDED_AT_COLUMN].dt.strftime('%d.%m.%Y')
+    filters = CallFilters(store, TagIndex(store, lambda: 1))
+    return df, filters
+
+
+def selected(df, filters, spec):
+    return list(filters.apply(df, spec)[CALL_ID_COLUMN])
+
+
+def test_table_and_analytics_conditions(calls):
+    df, filters = calls
+    assert selected(df, filters, {'status': 'Неуспешный'}) == ['b']
+    assert selected(df, filters, {'purpose': 'прод'}) == ['a']
+    assert selected(df, filters, {'operator': 'АННА'}) == ['a', 'c']
+    assert selected(df, filters, {'result': 'успешный'}) == ['a', 'b', 'c']
+    assert selected(df, filters, {'ids': 'c,a,нет'}) == ['a', 'c']
+    assert selected(df, filters, {'date': '02.05.2025'}) == ['b']
+    assert selected(df, filters, {'duration': 'medium'}) == ['b']
+    assert selected(df, filters, {'operator': 'анна', 'duration': 'long'}) == ['c']
+    assert selected(df, filters, {'status': 'all', 'result': 'all'}) == ['a', 'b', 'c']
+
+
+def test_invalid_filter_values_raise(calls):
+    df, filters = calls
+    with pytest.raises(ValueError):
+        normalize_spec({'duration': 'huge'})
+    with pytest.raises(ValueError):
+        normalize_spec({'unknown': 'x'})
+    assert normalize_spec({'status': 'ALL', 'purpose': ' ', 'operator': ' Анна '}) == (('operator', 'анна'),)
+
+
+def test_masks_are_cached_until_store_changes(calls, store):
+    df, filters = calls
+    spec = {'operator': 'анна', 'duration': 'long'}
+    filters.mask(df, spec)
+    misses = filters.misses
+    filters.mask(df, spec)
+    assert filters.misses == misses
+
+    store.update_calls({'a': {'Статус': 'успешный'}})
+    filters.mask(df, spec)
+    assert filters.misses > misses
+
+
+def test_calls_endpoint_filters(client):
+    calls = client.get('/api/calls?fields=id,status,audioDuration').get_json()['calls']
+    expected = [call['id'] for call in calls if call['status'] == 'успешный' and call['audioDuration'] >= '03:00']
+    payload = client.get('/api/calls?fields=id&result=успешный&duration=long').get_json()
+    assert [call['id'] for call in payload['calls']] == expected
+    assert payload['total'] == len(expected)
+    assert client.get('/api/calls?duration=huge').status_code == 400
+
+
+def test_date_range_is_inclusive(calls):
+    df, filters = calls
+    assert selected(df, filters, {'date_from': '2025-05-02', 'date_to': '2025-05-03'}) == ['b', 'c']
+    assert selected(df, filters, {'date_from': '02.05.2025'}) == ['b', 'c']
+    assert selected(df, filters, {'date_to': '01.05.2025'}) == ['a']
+    assert selected(df, filters, {'date_from': '2025-05-03', 'date_to': '2025-05-01'}) == []
+    with pytest.raises(ValueError):
+        filters.apply(df, {'date_from': 'вчера'})
+
+
+def test_ended_at_index_range_positions():
+    df = pd.DataFrame({ENDED_AT_COLUMN: pd.to_datetime(['2025-05-03', None, '2025-05-01', '2025-05-02'])})
+    index = EndedAtIndex(df)
+    assert index.range_positions().tolist() == [2, 3, 0]  # Без NaT, по возрастанию времени
+    assert index.range_positions(pd.Timestamp('2025-05-02'), pd.Timestamp('2025-05-03')).tolist() == [3]
+    assert index.range_mask(end=pd.Timestamp('2025-05-02')).tolist() == [False, False, True, False]
+    assert not index.range_mask(pd.Timestamp('2025-06-01')).any()
+    assert np.array_equal(index.range_mask(pd.Timestamp('2025-05-03'), pd.Timestamp('2025-05-01')), np.zeros(4, bool))
+
+
+def test_calls_endpoint_date_range(client):
+    calls = client.get('/api/calls?fields=id,date,time&sort=date').get_json()['calls']
+    days = sorted({call['date'] for call in calls}, key=lambda day: day[6:] + day[3:5] + day[:2])
+    assert len(days) > 2
+    expected = [call['id'] for call in calls if call['date'] in days[1:-1]]
+    payload = client.get(f'/api/calls?fields=id&sort=date&dateFrom={days[1]}&dateTo={days[-2]}').get_json()
+    assert [call['id'] for call in payload['calls']] == expected
+    assert client.get('/api/calls?dateFrom=zz').status_code == 400
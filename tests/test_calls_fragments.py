@@ -0,0 +1,44 @@
+import json
+
+from calls_cache import CallsCache
+from calls_fragments import CallFragmentCache
+from conftest import COLUMNS, make_rows
+
+FIELDS = ['id', 'tag']
+
+
+def tags(fragments):
+    return {call['id']: call['tag'] for call in map(json.loads, fragments)}
+
+
+def test_update_between_frame_fetch_and_encode(store):
+    store.update_calls({'a': {'Tag': 'старый'}, 'b': {'Tag': 'старый'}})
+    cache = CallsCache(store, loader=store.load_dataframe)
+    fragments = CallFragmentCache(store, epoch=lambda: cache.loaded_at)
+    cache.get()
+    snapshot = fragments.snapshot()
+    fragments.encode(cache.get(), None, snapshot, fields=FIELDS)
+    assert fragments.stats()['rows'] == 3
+
+    snapshot = fragments.snapshot()
+    df = cache.get()
+    # Запись попала между получением DataFrame и кодированием
+    store.update_calls({'b': {'Tag': 'новый'}})
+    assert tags(fragments.encode(df, None, snapshot, fields=FIELDS))['b'] == 'старый'
+
+    snapshot = fragments.snapshot()
+    encoded = tags(fragments.encode(cache.get(), None, snapshot, fields=FIELDS))
+    assert (encoded['a'], encoded['b']) == ('старый', 'новый')
+    stats = fragments.stats()
+    assert (stats['hits'], stats['misses']) == (4, 5)
+
+
+def test_frame_from_before_replace_is_not_cached(store):
+    cache = CallsCache(store, loader=store.load_dataframe)
+    fragments = CallFragmentCache(store, epoch=lambda: cache.loaded_at)
+    cache.get()
+    snapshot = fragments.snapshot()
+    df = cache.get()
+    store.replace_rows(COLUMNS, iter(make_rows(['x'])))
+    fragments.encode(df, None, snapshot, fields=FIELDS)
+    assert fragments.stats()['rows'] == 0
@@ -0,0 +1,74 @@
+import random
+
+import pytest
+
+from calls_keywords import KEYWORD_GROUPS, KEYWORDS, KeywordMatcher, keyword_pattern
+from calls_text import tokenize
+
+
+def count_naive(text, keywords):
+    """Число совпадений каждого ключевого слова перебором всех позиций слов текста"""
+    words = tokenize(text)
+    counts = []
+    for pattern in keywords:
+        count = 0
+        for start in range(len(words) - len(pattern) + 1):
+            if all(words[start + i] == value if kind == '=' else words[start + i].startswith(value)
+                   for i, (kind, value) in enumerate(pattern)):
+                count += 1
+        counts.append(count)
+    return counts
+
+
+def counts_by_keyword(matcher, text):
+    return dict(zip(matcher.keywords, matcher.hits(text).tolist()))
+
+
+def test_word_matches_by_stem():
+    matcher = KeywordMatcher({'price': ('цен',), 'delivery': ('доставка',)})
+    counts = counts_by_keyword(matcher, 'Цены на доставку и ДОСТАВКИ, оценка цен')
+    assert counts[keyword_pattern('цен')] == 2  # 'цены', 'цен', но не 'оценка'
+    assert counts[keyword_pattern('доставка')] == 2  # Основа 'доставк'
+
+
+def test_phrase_words_are_consecutive():
+    matcher = KeywordMatcher({'complaint': ('не работает',)})
+    assert matcher.hits('Не работает. Не, всё работает; не совсем работает. Не работает!').tolist() == [2]
+    assert matcher.hits('не работают').tolist() == [1]  # Последнее слово - по основе
+
+
+def test_overlapping_phrases_are_all_counted():
+    matcher = KeywordMatcher({'a': ('не не',), 'b': ('не',)})
+    counts = counts_by_keyword(matcher, 'не не не')
+    assert counts[keyword_pattern('не не')] == 2
+    assert counts[keyword_pattern('не')] == 3
+
+
+def test_shared_keywords_are_counted_once_per_occurrence():
+    matcher = KeywordMatcher({'thanks': ('спасибо',), 'agreement': ('спасибо', 'договорились')})
+    hits = matcher.hits('Спасибо, договорились. Спасибо!')
+    assert len(matcher.keywords) == 2
+    assert matcher.found(hits, 'thanks')
+    assert matcher.present(hits, 'agreement') == 2
+    assert counts_by_keyword(matcher, 'Спасибо, договорились. Спасибо!')[keyword_pattern('спасибо')] == 2
+
+
+@pytest.mark.parametrize('text', [
+    '',
+    None,
+    'Здравствуйте! Добрый день. Подскажите цену и стоимость доставки, не уверен, подумаю, перезвоните',
+    'Клиент: это дорого, у конкурентов скидка. Не устраивает срок, долго ждать. Не интересно, нет времени',
+    'Ё-моё, всё хорошо, нравится качество; гарантия? Ошибка, проблема: не работает, техподдержка',
+])
+def test_default_groups_match_naive_count(text):
+    assert KEYWORDS.hits(text).tolist() == count_naive(text or '', KEYWORDS.keywords)
+
+
+def test_random_texts_match_naive_count():
+    vocabulary = sorted({word for keywords in KEYWORD_GROUPS.values() for keyword in keywords
+                         for word in tokenize(keyword)} | {'оценка', 'ценами', 'доставками', 'и', 'да'})
+    rng = random.Random(0)
+    matcher = KeywordMatcher(KEYWORD_GROUPS, cache_size=0)
+    for _ in range(300):
+        text = ' '.join(rng.choice(vocabulary) for _ in range(rng.randint(0, 30)))
+        assert matcher.hits(text).tolist() == count_naive(text, matcher.keywords)
@@ -0,0 +1,30 @@
+import math
+
+import pytest
+
+from calls_serializer import (
+    _format_audio_duration, _parse_client_interests, _parse_decision_factors, _parse_manager_performance,
+)
+
+
+@pytest.mark.parametrize('value, expected', [
+    ('8/10', {"общая_оценка": 8, "details": "Оценка: 8/10"}),
+    (7.0, {"общая_оценка": 7, "details": "Оценка: 7/10"}),
+    ('x/10', None),
+    (math.inf, None),
+    ('хорошо', None),
+])
+def test_manager_performance(value, expected):
+    assert _parse_manager_performance(value) == expected
+
+
+def test_client_interests_and_decision_factors():
+    assert _parse_client_interests(' цена, доставка ,, ') == ['цена', 'доставка']
+    assert _parse_decision_factors('Положительные: цена, сервис; Отрицательные: сроки') == {
+        "positive": ['цена', 'сервис'], "negative": ['сроки']}
+    assert _parse_decision_factors('без факторов') == {"positive": [], "negative": []}
+
+
+@pytest.mark.parametrize('value, expected', [(311, '05:11'), ('65.5', '01:05'), ('abc', ''), (math.inf, '')])
+def test_format_audio_duration(value, expected):
+    assert _format_audio_duration(value) == expected
@@ -0,0 +1,58 @@
+import json
+
+import pytest
+
+from call_store import CALL_ID_COLUMN
+from calls_cache import CallsCache
+from calls_compact import normalize_calls
+from calls_filters import CallFilters
+from calls_tag_index import TagIndex
+
+
+@pytest.fixture
+def tagged(store):
+    store.update_calls({
+        'a': {'tags': json.dumps(['доставка']), 'lanth': '0:45'},
+        'b': {'Tag': 'Жалоба', 'lanth': '2:30', 'analysis': json.dumps({'tags': ['Скидка']})},
+        'c': {'tags': json.dumps(['Доставка ', 'скидка']), 'lanth': '5:00'},
+    })
+    cache = CallsCache(store, loader=lambda exclude: normalize_calls(store.load_dataframe(exclude)))
+    index = TagIndex(store, lambda: cache.loaded_at)
+    return cache, index
+
+
+def test_counts_merge_sources_case_insensitively(tagged):
+    cache, index = tagged
+    assert index.counts(cache.get()) == {'доставка': 2, 'Жалоба': 1, 'скидка': 2}
+    assert index.rows(cache.get(), ' ДОСТАВКА').tolist() == [0, 2]
+    assert index.builds == 1
+
+
+def test_index_follows_store_updates(tagged, store):
+    cache, index = tagged
+    index.counts(cache.get())
+    store.update_calls({'a': {'Tag': 'жалоба', 'tags': json.dumps([])}})
+    assert index.counts(cache.get()) == {'доставка': 1, 'Жалоба': 2, 'скидка': 2}
+    # Изменения применены к индексу без перестроения
+    assert index.builds == 1
+
+
+def test_tags_filter(tagged, store):
+    cache, index = tagged
+    filters = CallFilters(store, index)
+    df = cache.get()
+
+    def selected(spec):
+        return list(filters.apply(df, spec)[CALL_ID_COLUMN])
+
+    assert selected({'tags': 'ДОСТАВКА'}) == ['a', 'c']
+    assert selected({'tags': ['жалоба', 'скидка']}) == ['b', 'c']
+    assert selected({'tags': ['доставка'], 'duration': 'long'}) == ['c']
+    assert selected({'tags': ['длинный разговор']}) == ['c']
+
+
+def test_get_tags_counts_match_calls_filter(client):
+    counts = client.get('/api/get-tags').get_json()['counts']
+    assert counts['длинный разговор'] > 0
+    for tag, count in counts.items():
+        assert client.get('/api/calls?fields=id&tags=' + tag).get_json()['total'] == count
@@ -0,0 +1,34 @@
+from calls_text import normalize_text, stem, text_tokens, tokenize
+
+
+def test_normalize_text():
+    assert normalize_text('ЁЛКА и Ёж') == 'елка и еж'
+    assert normalize_text('за́мок') == 'замок'  # Знак ударения убирается
+    assert normalize_text(None) == ''
+
+
+def test_tokenize_drops_punctuation():
+    assert tokenize('Здравствуйте! Цена: 1500 руб., не-работает') == ['здравствуйте', 'цена', '1500', 'руб', 'не', 'работает']
+
+
+def test_stem_keeps_short_stems():
+    assert stem('доставка') == 'доставк'
+    assert stem('доставки') == 'доставк'
+    assert stem('цен') == 'цен'
+    assert stem('работает') == 'работ'
+
+
+def test_text_tokens_are_cached():
+    assert text_tokens('Добрый день') is text_tokens('Добрый день')
+    assert text_tokens(None).words == ()
+
+
+def test_tokenize_non_basic_letters():
+    # Буквы вне кириллицы и латиницы (и совместимые формы NFKC) разбираются общим выражением
+    assert tokenize('Straße ﬁx café_bar ёж') == ['straße', 'fix', 'café', 'bar', 'еж']
+
+
+def test_search_matches_word_forms(store):
+    store.update_calls({'b': {'Транскрибация': 'Клиент спросил ещё про доставку'}})
+    total, results = store.search('доставка клиента еще')
+    assert total == 1 and results[0][1] == 'b'
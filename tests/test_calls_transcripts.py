@@ -0,0 +1,86 @@
+import os
+
+import numpy as np
+import pyarrow as pa
+import pytest
+
+from call_store import CallStore
+from calls_transcripts import TranscriptStore
+from conftest import COLUMNS, make_rows
+
+IDS = [10, 11, 12, 13, 14]
+TEXTS = ['  привет  ', '-', None, 'ещё текст', 'x' * 40]
+INDEX = [13, 99, 10, 11, 12, 14]  # 99 - строки нет в файле
+
+
+def test_file_is_rebuilt_for_recreated_store(tmp_path):
+    base_path = str(tmp_path / 'calls.transcripts')
+    store = CallStore(str(tmp_path / 'one.db'), snapshot_path='')
+    store.replace_rows(COLUMNS, iter(make_rows(['a'])))
+    assert TranscriptStore.load(base_path, store, 'Транскрибация').get(0).endswith('звонок a')
+
+    other = CallStore(str(tmp_path / 'two.db'), snapshot_path='')
+    other.replace_rows(COLUMNS, iter(make_rows(['z'])))
+    assert other.generation() == store.generation()
+    assert TranscriptStore.load(base_path, other, 'Транскрибация').get(0).endswith('звонок z')
+    # Файл старой базы удален, временный файл записи не остался
+    assert [name for name in os.listdir(tmp_path) if name.startswith('calls.transcripts')] == [
+        os.path.basename(TranscriptStore._file_path(base_path, other.store_id, other.generation()))]
+
+
+def test_file_is_named_by_generation_of_its_texts(store, tmp_path, monkeypatch):
+    base_path = str(tmp_path / 'calls.transcripts')
+    read_text_column = store.read_text_column
+
+    def read_after_update(column):
+        # Запись между проверкой файла и чтением текстов
+        store.update_calls({'a': {'Транскрибация': 'после записи'}})
+        return read_text_column(column)
+
+    monkeypatch.setattr(store, 'read_text_column', read_after_update)
+    stale_generation = store.generation()
+    transcripts = TranscriptStore.load(base_path, store, 'Транскрибация')
+
+    assert transcripts.get(0) == 'после записи'
+    assert store.generation() > stale_generation
+    assert not os.path.exists(TranscriptStore._file_path(base_path, store.store_id, stale_generation))
+    assert os.path.exists(TranscriptStore._file_path(base_path, store.store_id, store.generation()))
+
+
+def test_read_text_column_returns_generation_of_values(tmp_path):
+    store = CallStore(str(tmp_path / 'calls.db'))
+    store.replace_rows(COLUMNS, iter(make_rows(['a', 'b'])))
+    generation, ids, values = store.read_text_column('Статус')
+    assert (generation, list(ids), list(values)) == (store.generation(), [0, 1], ['-', '-'])
+    store.load_dataframe()  # Пишет снимок: колонка читается из него
+    generation, ids, values = store.read_text_column('Статус')
+    assert (generation, list(ids), values.to_pylist()) == (store.generation(), [0, 1], ['-', '-'])
+
+
+@pytest.fixture(params=['arrow', 'list'])
+def transcripts(request):
+    texts = pa.array(TEXTS, type=pa.large_string()) if request.param == 'arrow' else list(TEXTS)
+    return TranscriptStore(IDS, texts)
+
+
+def test_lengths_previews_and_equals(transcripts):
+    assert transcripts.lengths(INDEX).tolist() == [9, 0, 6, 0, 0, 40]
+    assert transcripts.previews(INDEX, 5) == ['ещё т…', '', 'приве…', '', '', 'xxxxx…']
+    assert transcripts.equals(INDEX, '-').tolist() == [False, False, False, True, False, False]
+
+
+def test_overlay_overrides_file(transcripts):
+    transcripts.set(11, 'новый текст')
+    transcripts.set(99, 'добавлен')
+    assert transcripts.lengths([11, 99]).tolist() == [11, 8]
+    assert transcripts.equals([11, 99], '-').tolist() == [False, False]
+    values = transcripts.values([11, 99, 12])
+    assert values[:2] == ['новый текст', 'добавлен']
+    assert np.isnan(values[2])
+
+
+def test_empty_file():
+    transcripts = TranscriptStore([], pa.array([], type=pa.large_string()))
+    assert transcripts.lengths([1]).tolist() == [0]
+    assert transcripts.equals([1], 'a').tolist() == [False]
+    assert transcripts.previews([1], 5) == ['']
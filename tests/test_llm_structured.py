@@ -0,0 +1,113 @@
+import importlib.util
+import json
+import os
+import random
+import re
+
+import pytest
+
+from llm_structured import (
+    _ANCHORS, _CASE_VARIANTS_RE, FIELD_PATTERNS, RESULT_OPTIONS, _compile_dispatch, extract_structured_data, scan_fields,
+)
+
+CORPUS_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                           'benchmarks', 'data', 'llm_responses_synthetic.jsonl')
+
+TEXTS = [
+    '',
+    'Ответ без полей',
+    '{"evaluation": "позитивная", "keyPoints": "Клиент спросил о цене", "score": 8.5, "tags": ["продажа", "цена"]}',
+    "{'status': 'успешный', 'callResult': 'неуспешный', 'salesReadiness': 7, 'conversionProbability': 140}",
+    'Оценка: хорошая. Ключевые моменты: доставка и сроки\nПроблемы: нет\nРекомендации: перезвонить\n'
+    'Теги: [доставка, сроки]\nСтатус: требует внимания. Результат звонка: успешный\nОценка звонка: 6',
+    # Приоритет образцов важнее позиции: ключ JSON ниже в тексте побеждает подпись выше
+    'Статус: неуспешный\n... "status": "успешный"',
+    'ТЕГИ: без скобок через пробел\nInteresы клиента: [цена]\nинтересы клиента: [цена, скидка]',
+    'положительные факторы: скидка\nчто не устроило: сроки\nnegative: [цена',
+    'Ключевой вывод: клиент готов. Главный вывод: перезвонить',
+    'ответ на запрос: да\nответ: нет\ncustomResponse: "подробно"',
+]
+
+
+def search_sequential(text):
+    """Прежний разбор: по каждому полю поочередный re.search по образцам до первого совпадения"""
+    found = {}
+    for field, patterns in FIELD_PATTERNS.items():
+        for pattern in patterns:
+            match = re.search(pattern, text, RESULT_OPTIONS)
+            if match:
+                found[field] = match.group(1)
+                break
+    return found
+
+
+def load_benchmark_baseline():
+    """search_baseline бенчмарка - разбор в исходном виде (ленивые списки с DOTALL, кавычка перед ключом)"""
+    path = os.path.join(os.path.dirname(CORPUS_PATH), os.pardir, 'bench_structured_parse.py')
+    spec = importlib.util.spec_from_file_location('bench_structured_parse', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.search_baseline
+
+
+def load_corpus():
+    with open(CORPUS_PATH, encoding='utf-8') as f:
+        return [json.loads(line)['text'] for line in f if line.strip()]
+
+
+@pytest.mark.parametrize('text', TEXTS)
+def test_scan_fields_matches_sequential_search(text):
+    assert scan_fields(text) == search_sequential(text)
+
+
+def test_scan_fields_matches_sequential_search_on_corpus():
+    for text in load_corpus():
+        assert scan_fields(text) == search_sequential(text)
+
+
+def test_scan_fields_matches_sequential_search_on_shuffled_fragments():
+    # Обрывки корпуса в случайном порядке: поля в неожиданных местах, повторы и оборванные значения
+    fragments = [line for text in load_corpus() + TEXTS for line in text.splitlines() if line.strip()]
+    rng = random.Random(0)
+    for _ in range(300):
+        text = '\n'.join(rng.sample(fragments, rng.randint(1, 8)))
+        cut = rng.randint(0, len(text))
+        assert scan_fields(text[:cut]) == search_sequential(text[:cut])
+
+
+def test_scan_fields_matches_original_patterns():
+    search_baseline = load_benchmark_baseline()
+    for text in load_corpus() + TEXTS:
+        assert scan_fields(text) == search_baseline(text)
+
+
+def test_case_variant_letters_use_fallback_scanner():
+    # 'ſ' (длинное s) совпадает с 's' при IGNORECASE, но str.lower() его не меняет
+    text = 'ſtatus: "успешный", ſcore: 9'
+    assert scan_fields(text) == search_sequential(text)
+
+
+def test_case_variants_match_full_unicode_scan():
+    letters = set(''.join(_ANCHORS))
+    letters_re = re.compile('[%s]' % re.escape(''.join(sorted(letters))), RESULT_OPTIONS)
+    everything = ''.join(map(chr, range(0x110000)))
+    variants = {c for c in letters_re.findall(everything) if c.lower() not in letters}
+    assert set(_CASE_VARIANTS_RE.findall(everything)) == variants
+
+
+def test_overlapping_anchors_are_rejected():
+    with pytest.raises(ValueError):
+        _compile_dispatch({'a': (r'стат\s*(\d+)',), 'b': (r'статус\s*(\d+)',)})
+
+
+def test_extract_structured_data_normalizes_values():
+    result = extract_structured_data(
+        'Статус: успешный звонок\nГотовность к продаже: 12\nВероятность конверсии: 80\nТеги: [цена, "доставка"]',
+        'запрос',
+    )
+    assert result['status'] == 'успешный'
+    assert result['callResult'] == 'успешный'
+    assert result['salesReadiness'] == 5  # 12 вне диапазона 0-10
+    assert result['conversionProbability'] == 80
+    assert result['tags'] == ['цена', 'доставка']
+    assert result['score'] == 8
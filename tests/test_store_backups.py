@@ -0,0 +1,43 @@
+from conftest import row_of
+from store_backups import BackupManager
+
+
+def test_backup_and_restore_round_trip(store, tmp_path):
+    backups = BackupManager(store, str(tmp_path / 'backups'))
+    first = backups.create()
+    store.update_calls({'a': {'Статус': 'успешный'}})
+
+    assert backups.restore(first['id']) == 3
+    assert row_of(store, 'a')['Статус'] == '-'
+    # Перед восстановлением сохраняется текущее содержимое
+    assert backups.list_backups()[0]['reason'] == f"before-restore {first['id']}"
+
+
+def test_unchanged_store_is_not_backed_up_twice(store, tmp_path):
+    backups = BackupManager(store, str(tmp_path / 'backups'))
+    first = backups.create()
+    assert backups.create()['id'] == first['id']
+    assert len(backups.list_backups()) == 1
+
+
+def test_backup_stores_only_changed_rows(store, tmp_path):
+    backups = BackupManager(store, str(tmp_path / 'backups'))
+    assert backups.create()['newRows'] == 3
+    store.update_calls({'b': {'Статус': 'успешный'}})
+    second = backups.create()
+    assert (second['rows'], second['newRows']) == (3, 1)
+
+    columns, records = backups.load(second['id'])
+    assert [record['Статус'] for record in records] == ['-', 'успешный', '-']
+
+
+def test_old_backups_are_pruned(store, tmp_path):
+    backups = BackupManager(store, str(tmp_path / 'backups'), keep_last=2, keep_daily=0)
+    for status in ('1', '2', '3'):
+        store.update_calls({'a': {'Статус': status}})
+        backups.create()
+    kept = backups.list_backups()
+    assert len(kept) == 2
+    # Список от новых к старым: самая старая из оставшихся - вторая копия
+    backups.restore(kept[-1]['id'])
+    assert row_of(store, 'a')['Статус'] == '2'
@@ -0,0 +1,134 @@
+import json
+
+import pytest
+
+from conftest import COLUMNS, make_rows, row_of
+from store_backups import BackupManager
+from write_behind import WriteBehindWriter
+
+
+def make_writer(store, tmp_path, **kwargs):
+    # Без фонового потока: уплотнение только по flush() и по порогу max_rows
+    kwargs.setdefault('max_rows', 1000)
+    return WriteBehindWriter(store, str(tmp_path / 'calls_pending.jsonl'), **kwargs)
+
+
+def test_put_is_applied_on_flush(store, tmp_path):
+    writer = make_writer(store, tmp_path)
+    writer.put('b', {'Статус': 'успешный'})
+    assert row_of(store, 'b')['Статус'] == '-'
+    assert writer.pending_count() == 1
+
+    assert writer.flush() == 1
+    assert row_of(store, 'b')['Статус'] == 'успешный'
+    assert writer.pending_count() == 0
+    assert open(writer.journal_path, encoding='utf-8').read() == ''
+
+
+def test_replay_after_crash(store, tmp_path):
+    writer = make_writer(store, tmp_path)
+    writer.put('a', {'Статус': 'неуспешный'})
+    writer.put('c', {'AI-оценка': 7})
+    writer.put('a', {'Статус': 'успешный'})
+    # Процесс упал посреди записи строки: журнал не уплотнен, последняя строка оборвана
+    writer._journal.write('{"call": "b", "val')
+    writer._journal.flush()
+
+    restarted = make_writer(store, tmp_path)
+    assert restarted.replay() == 3
+    assert row_of(store, 'a')['Статус'] == 'успешный'
+    assert row_of(store, 'c')['AI-оценка'] == 7
+    assert row_of(store, 'b')['Статус'] == '-'
+    assert open(restarted.journal_path, encoding='utf-8').read() == ''
+
+
+def test_replay_skips_calls_removed_before_restart(store, tmp_path):
+    writer = make_writer(store, tmp_path)
+    writer.put('a', {'Статус': 'успешный'})
+    writer.put('b', {'Статус': 'неуспешный'})
+    # После сбоя загружена другая таблица: звонка b больше нет, a сменил id строки
+    store.replace_rows(COLUMNS, iter(make_rows(['x', 'a'])))
+
+    restarted = make_writer(store, tmp_path)
+    restarted.replay()
+    assert row_of(store, 'a')['Статус'] == 'успешный'
+    assert row_of(store, 'x')['Статус'] == '-'
+    assert store.count() == 2
+
+
+def test_replay_skips_entries_without_call_id(store, tmp_path):
+    journal = tmp_path / 'calls_pending.jsonl'
+    entries = [
+        {'id': 2, 'kind': 'result', 'ts': 0, 'values': {'Статус': 'неуспешный'}},
+        {'call': 'c', 'kind': 'result', 'ts': 1, 'values': {'Статус': 'успешный'}},
+    ]
+    journal.write_text(''.join(json.dumps(entry) + '\n' for entry in entries), encoding='utf-8')
+    assert make_writer(store, tmp_path).replay() == 1
+    assert row_of(store, 'c')['Статус'] == 'успешный'
+    assert [row_of(store, call_id)['Статус'] for call_id in 'ab'] == ['-', '-']
+
+
+def test_pending_results_follow_call_across_replace(store, tmp_path):
+    writer = make_writer(store, tmp_path)
+    writer.put('a', {'Статус': 'успешный'})
+    with writer.exclusive():
+        # Журнал уплотнен до замены: результат записан в строку звонка a
+        assert writer.pending_count() == 0
+        store.replace_rows(COLUMNS, iter(make_rows(['c', 'b', 'a'])))
+    assert row_of(store, 'a')['Статус'] == '-'
+
+    # Результат после замены находит звонок по ID, а не по прежнему id строки 0
+    writer.put('b', {'Статус': 'неуспешный'})
+    writer.put('gone', {'Статус': 'успешный'})
+    assert writer.flush() == 1
+    assert row_of(store, 'b')['Статус'] == 'неуспешный'
+    assert store.get_row(0)['Статус'] == '-'
+
+
+def test_upload_backup_contains_pending_results(store, tmp_path):
+    writer = make_writer(store, tmp_path)
+    backups = BackupManager(store, str(tmp_path / 'backups'))
+    writer.put('c', {'Статус': 'успешный'})
+    with writer.exclusive():
+        entry = backups.create(reason='upload new.xlsx')
+        store.replace_rows(COLUMNS, iter(make_rows(['new'])))
+
+    columns, records = backups.load(entry['id'])
+    assert {record[columns[0]]: record['Статус'] for record in records}['c'] == 'успешный'
+
+
+def test_restore_keeps_results_written_before_restore(store, tmp_path):
+    writer = make_writer(store, tmp_path)
+    backups = BackupManager(store, str(tmp_path / 'backups'))
+    first = backups.create()
+    writer.put('b', {'Статус': 'успешный'})
+    with writer.exclusive():
+        backups.restore(first['id'])
+
+    assert row_of(store, 'b')['Статус'] == '-'
+    # Результат, ожидавший в журнале, попал в копию "до восстановления", а не потерян
+    before_restore = [entry for entry in backups.list_backups() if entry['reason'].startswith('before-restore')]
+    columns, records = backups.load(before_restore[0]['id'])
+    assert {record[columns[0]]: record['Статус'] for record in records}['b'] == 'успешный'
+
+
+def test_failed_flush_aborts_exclusive(store, tmp_path, monkeypatch):
+    writer = make_writer(store, tmp_path)
+    backups = BackupManager(store, str(tmp_path / 'backups'))
+    writer.put('a', {'Статус': 'успешный'})
+
+    def fail(updates):
+        raise OSError('disk I/O error')
+
+    monkeypatch.setattr(store, 'update_calls', fail)
+    replaced = []
+    with pytest.raises(RuntimeError):
+        with writer.exclusive():
+            backups.create(reason='upload new.xlsx')
+            replaced.append(True)
+    assert replaced == [] and backups.list_backups() == []
+    # Результат не потерян: он в памяти и в журнале до следующей попытки
+    assert writer.pending_count() == 1
+    monkeypatch.undo()
+    assert writer.flush() == 1
+    assert row_of(store, 'a')['Статус'] == 'успешный'
@@ -0,0 +1,55 @@
+import math
+
+LINK_COLUMN = 'Ссылка на запись'
+TRANSCRIPT_COLUMN = 'Транскрибация'
+REQUIRED_COLUMNS = (LINK_COLUMN, TRANSCRIPT_COLUMN)
+
+
+def _is_missing(value):
+    return value is None or (isinstance(value, float) and math.isnan(value))
+
+
+class UploadStats:
+    """Статистика загружаемой таблицы звонков, считаемая за один проход по строкам.
+
+    Передается как on_row в CallStore.import_excel: хранит только счетчики,
+    поэтому память не зависит от размера файла. Правила подсчета совпадают
+    с прежней проверкой через pandas в upload_file.
+    """
+
+    def __init__(self):
+        self.rows = 0
+        self.empty_links = 0
+        self.invalid_links = 0
+        self.present_links = 0
+        self.needs_transcribe = 0
+
+    def __call__(self, data):
+        self.rows += 1
+
+        link = data.get(LINK_COLUMN)
+        if _is_missing(link):
+            self.empty_links += 1
+        else:
+            self.present_links += 1
+            if not str(link).startswith('http'):
+                self.invalid_links += 1
+
+        # Звонок требует транскрибации, если значение '-', отсутствует, пустое или из пробелов
+        transcript = data.get(TRANSCRIPT_COLUMN)
+        if _is_missing(transcript):
+            self.needs_transcribe += 1
+        else:
+            if transcript == '-':
+                self.needs_transcribe += 1
+            if transcript == '':
+                self.needs_transcribe += 1
+            if str(transcript).strip() == '':
+                self.needs_transcribe += 1
+
+    @property
+    def has_transcriptions(self):
+        return self.rows - self.needs_transcribe
+
+    def missing_columns(self, columns):
+        return [col for col in REQUIRED_COLUMNS if col not in columns]
@@ -0,0 +1,173 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from call_store import to_storage_value
+
+
+class WriteBehindWriter:
+    """Журнал результатов (append-only JSONL) с фоновым уплотнением в хранилище звонков.
+
+    put() - это путь записи результатов анализа и транскрибации: строка
+    {call, kind, ts, values} дописывается в конец журнала, а изменения
+    накапливаются в памяти. Записи привязаны к стабильному ID звонка (ID звонка),
+    а не к id строки: id строк нумеруются заново при каждой загрузке или
+    восстановлении, поэтому строка находится по ID только при записи в
+    хранилище, а результаты звонков, которых больше нет, отбрасываются.
+    Стоимость put() не зависит от размера данных: fsync журнала выполняется
+    пакетно фоновым потоком раз в fsync_interval секунд. Тот же поток
+    уплотняет журнал - применяет накопленное одной транзакцией
+    store.update_calls и очищает журнал, когда набралось max_rows строк или
+    прошло max_delay секунд. flush() делает то же явно (в конце запроса),
+    replay() при старте доигрывает неуплотненный хвост журнала. Полная
+    замена хранилища выполняется внутри exclusive(): журнал уплотняется,
+    а новые put() ждут окончания замены. Если накопленное не удалось
+    записать, exclusive() бросает RuntimeError и замена не выполняется.
+    """
+
+    def __init__(self, store, journal_path, max_rows=50, max_delay=5.0, fsync_interval=0.2):
+        self.store = store
+        self.journal_path = journal_path
+        self.max_rows = max_rows
+        self.max_delay = max_delay
+        self.fsync_interval = fsync_interval
+        self._lock = threading.RLock()
+        self._pending = {}  # ID звонка -> {колонка: значение}
+        self._first_pending_at = None
+        self._journal = None
+        self._unsynced = 0
+        self._wake = threading.Event()
+        self._thread = None
+
+    def _open_journal(self):
+        if self._journal is None:
+            self._journal = open(self.journal_path, 'a', encoding='utf-8')
+        return self._journal
+
+    def start(self):
+        """Запускает фоновый поток fsync и уплотнения журнала"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='result-journal', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.fsync_interval)
+            self._wake.clear()
+            try:
+                with self._lock:
+                    self._sync_journal()
+                    if self._pending and (
+                        len(self._pending) >= self.max_rows
+                        or time.time() - self._first_pending_at >= self.max_delay
+                    ):
+                        self.flush()
+            except Exception as e:
+                print(f"❌ Ошибка фонового уплотнения журнала: {e}")
+
+    def _sync_journal(self):
+        if self._journal is not None and self._unsynced:
+            os.fsync(self._journal.fileno())
+            self._unsynced = 0
+
+    def put(self, call_id, values, kind='result'):
+        """Дописывает результат для звонка (по стабильному ID) в журнал и ставит его в очередь на запись"""
+        if not values:
+            return
+        call_id = str(call_id).strip()
+        values = {col: to_storage_value(value) for col, value in values.items()}
+        entry = {'call': call_id, 'kind': kind, 'ts': time.time(), 'values': values}
+        with self._lock:
+            journal = self._open_journal()
+            journal.write(json.dumps(entry, ensure_ascii=False) + '\n')
+            # Сброс буфера в ОС защищает от падения процесса, fsync выполняет фоновый поток
+            journal.flush()
+            self._unsynced += 1
+            if not self._pending:
+                self._first_pending_at = entry['ts']
+            self._pending.setdefault(call_id, {}).update(values)
+            if len(self._pending) >= self.max_rows:
+                if self._thread is None:
+                    # Без фонового потока (скрипты) уплотняем сразу по порогу
+                    self.flush()
+                else:
+                    self._wake.set()
+
+    def pending_count(self):
+        with self._lock:
+            return len(self._pending)
+
+    def flush(self):
+        """Записывает накопленные изменения в хранилище одной транзакцией и очищает журнал"""
+        with self._lock:
+            try:
+                return self._write_pending()
+            except Exception as e:
+                # Изменения остаются в памяти и в журнале до следующей попытки
+                print(f"❌ Ошибка пакетной записи в хранилище: {e}")
+                return 0
+
+    def _write_pending(self):
+        with self._lock:
+            if not self._pending:
+                return 0
+            started = time.time()
+            # Строки находятся по ID звонка в той же транзакции, что и запись изменений
+            updated, missing = self.store.update_calls(self._pending)
+            if missing:
+                print(f"⚠️ Пропущены результаты {len(missing)} звонков, которых больше нет в хранилище: {', '.join(missing[:5])}")
+            rows_count = len(self._pending)
+            self._pending = {}  # ID звонка -> {колонка: значение}
+            self._first_pending_at = None
+            self._truncate_journal()
+            print(f"💾 Записано {updated} из {rows_count} строк в хранилище за {time.time() - started:.3f} с")
+            return updated
+
+    @contextmanager
+    def exclusive(self):
+        """Уплотняет журнал и не принимает новые результаты, пока выполняется блок (полная замена хранилища)"""
+        with self._lock:
+            try:
+                self._write_pending()
+            except Exception as e:
+                # Резервная копия и замена без накопленных результатов потеряли бы их
+                print(f"❌ Ошибка пакетной записи в хранилище: {e}")
+                raise RuntimeError(f"Не удалось записать накопленные результаты анализа в хранилище: {e}") from e
+            yield
+
+    def _truncate_journal(self):
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+        self._unsynced = 0
+        with open(self.journal_path, 'w', encoding='utf-8') as f:
+            f.flush()
+            os.fsync(f.fileno())
+
+    def replay(self):
+        """Применяет неуплотненный хвост журнала, оставшийся после аварийного завершения"""
+        if not os.path.exists(self.journal_path):
+            return 0
+        with self._lock:
+            replayed = 0
+            with open(self.journal_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # Недописанная последняя строка при сбое - пропускаем
+                        continue
+                    call_id = entry.get('call')
+                    if not call_id:
+                        # Записи без ID звонка не к чему привязать
+                        continue
+                    if not self._pending:
+                        self._first_pending_at = entry.get('ts', time.time())
+                    self._pending.setdefault(call_id, {}).update(entry['values'])
+                    replayed += 1
+            if replayed:
+                print(f"Восстановлено {replayed} записей из журнала {self.journal_path}")
+            self.flush()
+            return replayed